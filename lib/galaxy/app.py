@@ -16,17 +16,20 @@ from galaxy.jobs import metrics as job_metrics
 from galaxy.managers.collections import DatasetCollectionManager
 from galaxy.managers.folders import FolderManager
 from galaxy.managers.histories import HistoryManager
+from galaxy.managers.history_contents import HistoryContentsSummaryCache
 from galaxy.managers.libraries import LibraryManager
 from galaxy.managers.tools import DynamicToolManager
 from galaxy.model.tags import GalaxyTagHandler
 from galaxy.queue_worker import GalaxyQueueWorker
 from galaxy.tools.cache import (
     ToolCache,
-    ToolShedRepositoryCache
+    ToolShedRepositoryCache,
+    ToolSourceCache
 )
 from galaxy.tools.data_manager.manager import DataManagers
 from galaxy.tools.deps.views import DependencyResolversView
 from galaxy.tools.error_reports import ErrorReports
+from galaxy.tools.parameters.dataset_matcher import DatasetOptionsCache
 from galaxy.tools.special_tools import load_lib_tools
 from galaxy.tools.verify import test_data
 from galaxy.tours import ToursRegistry
@@ -34,7 +37,9 @@ from galaxy.util import (
     ExecutionTimer,
     heartbeat
 )
+from galaxy.visualization.data_providers.cache import RegionCache
 from galaxy.visualization.data_providers.registry import DataProviderRegistry
+from galaxy.visualization.data_providers.summary import CoverageSummaryStore
 from galaxy.visualization.genomes import Genomes
 from galaxy.visualization.plugins.registry import VisualizationsRegistry
 from galaxy.web import url_for
@@ -99,6 +104,14 @@ class UniverseApplication(config.ConfiguresGalaxyMixin):
         # Tag handler
         self.tag_handler = GalaxyTagHandler(self.model.context)
         self.dataset_collections_service = DatasetCollectionManager(self)
+        # Per-history content counts kept between requests
+        self.history_contents_summary_cache = None
+        if self.config.history_counts_reconcile_interval > 0:
+            self.history_contents_summary_cache = HistoryContentsSummaryCache(self.config.history_counts_reconcile_interval)
+        # Dataset options of tool form data parameters kept between requests
+        self.dataset_options_cache = None
+        if self.config.tool_form_dataset_options_cache_size > 0:
+            self.dataset_options_cache = DatasetOptionsCache(max_histories=self.config.tool_form_dataset_options_cache_size)
         self.history_manager = HistoryManager(self)
         self.dependency_resolvers_view = DependencyResolversView(self)
         self.test_data_resolver = test_data.TestDataResolver(file_dirs=self.config.tool_test_data_directories)
@@ -114,7 +127,14 @@ class UniverseApplication(config.ConfiguresGalaxyMixin):
         # Genomes
         self.genomes = Genomes(self)
         # Data providers registry.
-        self.data_provider_registry = DataProviderRegistry()
+        region_cache = None
+        if self.config.visualization_region_cache_size > 0:
+            region_cache = RegionCache(self.config.visualization_region_cache_size * 1024 * 1024,
+                                       prefetch=self.config.visualization_region_cache_prefetch)
+        summary_store = None
+        if self.config.visualization_summary_dir:
+            summary_store = CoverageSummaryStore(self.config.visualization_summary_dir)
+        self.data_provider_registry = DataProviderRegistry(region_cache=region_cache, summary_store=summary_store)
 
         # Initialize job metrics manager, needs to be in place before
         # config so per-destination modifications can be made.
@@ -128,6 +148,9 @@ class UniverseApplication(config.ConfiguresGalaxyMixin):
 
         # Setup a Tool Cache
         self.tool_cache = ToolCache()
+        self.tool_source_cache = None
+        if self.config.tool_cache_data_dir:
+            self.tool_source_cache = ToolSourceCache(self.config.tool_cache_data_dir)
         self.tool_shed_repository_cache = ToolShedRepositoryCache(self)
         # Watch various config files for immediate reload
         self.watchers = ConfigWatchers(self)
@@ -272,6 +295,12 @@ class UniverseApplication(config.ConfiguresGalaxyMixin):
         except Exception as e:
             exception = exception or e
             log.exception("Failed to shutdown object store cleanly")
+        try:
+            if self.data_provider_registry.region_cache:
+                self.data_provider_registry.region_cache.shutdown()
+        except Exception as e:
+            exception = exception or e
+            log.exception("Failed to shutdown visualization region cache cleanly")
         try:
             if self.heartbeat:
                 self.heartbeat.shutdown()
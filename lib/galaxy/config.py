@@ -277,6 +277,7 @@ class Configuration(object):
         self.galaxy_data_manager_data_path = kwargs.get('galaxy_data_manager_data_path', self.tool_data_path)
         self.tool_secret = kwargs.get("tool_secret", "")
         self.id_secret = kwargs.get("id_secret", "USING THE DEFAULT IS NOT SECURE!")
+        self.id_encoding_cache_size = int(kwargs.get("id_encoding_cache_size", 20000))
         self.retry_metadata_internally = string_as_bool(kwargs.get("retry_metadata_internally", "True"))
         self.max_metadata_value_size = int(kwargs.get("max_metadata_value_size", 5242880))
         self.metadata_strategy = kwargs.get("metadata_strategy", "directory")
@@ -389,6 +390,11 @@ class Configuration(object):
         # These are not even beta - just experiments - don't use them unless
         # you want yours tools to be broken in the future.
         self.enable_beta_tool_formats = string_as_bool(kwargs.get('enable_beta_tool_formats', 'False'))
+        # Persistent cache of parsed (macro-expanded) tool sources shared by all processes.
+        self.tool_cache_data_dir = kwargs.get("tool_cache_data_dir", None)
+        if self.tool_cache_data_dir:
+            self.tool_cache_data_dir = self.resolve_path(self.tool_cache_data_dir)
+        self.tool_parsing_processes = int(kwargs.get("tool_parsing_processes", 1))
         # Beta containers interface used by GIEs
         self.enable_beta_containers_interface = string_as_bool(kwargs.get('enable_beta_containers_interface', 'False'))
 
@@ -415,6 +421,21 @@ class Configuration(object):
         self.workflow_resource_params_mapper = workflow_resource_params_mapper
 
         self.cache_user_job_count = string_as_bool(kwargs.get('cache_user_job_count', False))
+        self.job_handler_monitor_max_sleep = float(kwargs.get('job_handler_monitor_max_sleep', 1))
+        self.job_handler_incremental_ready_check = string_as_bool(kwargs.get('job_handler_incremental_ready_check', False))
+        self.job_count_reconcile_interval = int(kwargs.get('job_count_reconcile_interval', 0))
+        self.tool_execution_batch_size = int(kwargs.get('tool_execution_batch_size', 0))
+        self.history_counts_reconcile_interval = int(kwargs.get('history_counts_reconcile_interval', 0))
+        self.visualization_region_cache_size = int(kwargs.get('visualization_region_cache_size', 0))
+        self.visualization_region_cache_prefetch = string_as_bool(kwargs.get('visualization_region_cache_prefetch', False))
+        self.visualization_summary_dir = kwargs.get("visualization_summary_dir", None)
+        if self.visualization_summary_dir:
+            self.visualization_summary_dir = self.resolve_path(self.visualization_summary_dir)
+        self.history_export_compression_threads = int(kwargs.get('history_export_compression_threads', 1))
+        self.history_import_streaming = string_as_bool(kwargs.get('history_import_streaming', False))
+        self.history_import_batch_size = int(kwargs.get('history_import_batch_size', 0))
+        self.tool_form_dataset_options_cache_size = int(kwargs.get('tool_form_dataset_options_cache_size', 0))
+        self.tool_form_dynamic_options_cache_size = int(kwargs.get('tool_form_dynamic_options_cache_size', 16))
         self.pbs_application_server = kwargs.get('pbs_application_server', "")
         self.pbs_dataset_server = kwargs.get('pbs_dataset_server', "")
         self.pbs_dataset_path = kwargs.get('pbs_dataset_path', "")
@@ -545,6 +566,8 @@ class Configuration(object):
         self.object_store_check_old_style = string_as_bool(kwargs.get('object_store_check_old_style', False))
         self.object_store_cache_path = resolve_path(kwargs.get("object_store_cache_path", "database/object_store_cache"), self.root)
         self.object_store_store_by = kwargs.get("object_store_store_by", "id")
+        self.object_store_metadata_cache_size = int(kwargs.get("object_store_metadata_cache_size", 0))
+        self.object_store_metadata_cache_ttl = float(kwargs.get("object_store_metadata_cache_ttl", 60))
 
         # Handle AWS-specific config options for backward compatibility
         if kwargs.get('aws_access_key', None) is not None:
@@ -1077,7 +1100,10 @@ class ConfiguresGalaxyMixin(object):
         self.container_finder = containers.ContainerFinder(app_info)
         self._set_enabled_container_types()
         index_help = getattr(self.config, "index_tool_help", True)
-        self.toolbox_search = galaxy.tools.search.ToolBoxSearch(self.toolbox, index_help)
+        index_dir = None
+        if getattr(self.config, "tool_cache_data_dir", None):
+            index_dir = os.path.join(self.config.tool_cache_data_dir, "search")
+        self.toolbox_search = galaxy.tools.search.ToolBoxSearch(self.toolbox, index_help, index_dir=index_dir)
         self.reindex_tool_search()
 
     def reindex_tool_search(self):
@@ -1132,7 +1158,7 @@ class ConfiguresGalaxyMixin(object):
 
     def _configure_security(self):
         from galaxy.security import idencoding
-        self.security = idencoding.IdEncodingHelper(id_secret=self.config.id_secret)
+        self.security = idencoding.IdEncodingHelper(id_secret=self.config.id_secret, id_cache_size=self.config.id_encoding_cache_size)
 
     def _configure_tool_shed_registry(self):
         import tool_shed.tool_shed_registry
@@ -13,7 +13,10 @@ import sys
 from galaxy.datatypes import data
 from galaxy.datatypes import sequence
 from galaxy.datatypes.metadata import MetadataElement
-from galaxy.datatypes.sniff import build_sniff_from_prefix
+from galaxy.datatypes.sniff import (
+    build_sniff_from_prefix,
+    requires_text
+)
 from galaxy.datatypes.text import Html
 
 log = logging.getLogger(__name__)
@@ -26,6 +29,7 @@ class Amos(data.Text):
     edam_format = "format_3582"
     file_ext = 'afg'
 
+    @requires_text('{')
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is an amos assembly file format
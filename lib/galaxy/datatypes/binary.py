@@ -24,12 +24,17 @@ from galaxy import util
 from galaxy.datatypes import metadata
 from galaxy.datatypes.data import get_file_peek
 from galaxy.datatypes.metadata import DictParameter, ListParameter, MetadataElement, MetadataParameter
+from galaxy.datatypes.sniff import magic_prefix, requires_tar
 from galaxy.util import nice_size, sqlite
 from galaxy.util.checkers import is_bz2, is_gzip
 from . import data, dataproviders
 
 log = logging.getLogger(__name__)
 
+# The first bytes of OLE2 compound documents (e.g. Excel 97-2003 files)
+OLE2_MAGIC = binascii.unhexlify("d0cf11e0a1b11ae1")
+SQLITE_MAGIC = b'SQLite format 3\0'
+
 # Currently these supported binary data types must be manually set on upload
 
 
@@ -88,6 +93,7 @@ class Idat(Binary):
     edam_format = "format_2058"
     edam_data = "data_2603"
 
+    @magic_prefix(b'IDAT')
     def sniff(self, filename):
         try:
             header = open(filename, 'rb').read(4)
@@ -283,6 +289,7 @@ class BamNative(CompressedArchive):
     def init_meta(self, dataset, copy_from=None):
         Binary.init_meta(self, dataset, copy_from=copy_from)
 
+    @magic_prefix(util.gzip_magic)
     def sniff(self, filename):
         # BAM is compressed in the BGZF format, and must not be uncompressed in Galaxy.
         # The first 4 bytes of any bam file is 'BAM\1', and the file is binary.
@@ -467,6 +474,7 @@ class Bam(BamNative):
         pysam.index(dataset.file_name, index_file.file_name)
         dataset.metadata.bam_index = index_file
 
+    @magic_prefix(util.gzip_magic)
     def sniff(self, file_name):
         return super(Bam, self).sniff(file_name) and not self.dataset_content_needs_grooming(file_name)
 
@@ -593,6 +601,7 @@ class BamQuerynameSorted(BamInputSorted):
     sort_flag = '-n'
     file_ext = "qname_sorted.bam"
 
+    @magic_prefix(util.gzip_magic)
     def sniff(self, file_name):
         return BamNative().sniff(file_name) and not self.dataset_content_needs_grooming(file_name)
 
@@ -649,6 +658,7 @@ class CRAM(Binary):
             dataset.peek = 'file does not exist'
             dataset.blurb = 'file purged from disk'
 
+    @magic_prefix(b'CRAM')
     def sniff(self, filename):
         try:
             header = open(filename, 'rb').read(4)
@@ -673,6 +683,7 @@ class Bcf(BaseBcf):
 
     MetadataElement(name="bcf_index", desc="BCF Index File", param=metadata.FileParameter, file_ext="csi", readonly=True, no_value=None, visible=False, optional=True)
 
+    @magic_prefix(util.gzip_magic)
     def sniff(self, filename):
         # BCF is compressed in the BGZF format, and must not be uncompressed in Galaxy.
         try:
@@ -720,6 +731,7 @@ class BcfUncompressed(BaseBcf):
     """
     file_ext = "bcf_uncompressed"
 
+    @magic_prefix(b'BCF')
     def sniff(self, filename):
         try:
             header = open(filename, mode='rb').read(3)
@@ -750,6 +762,7 @@ class H5(Binary):
         Binary.__init__(self, **kwd)
         self._magic = binascii.unhexlify("894844460d0a1a0a")
 
+    @magic_prefix(binascii.unhexlify("894844460d0a1a0a"))
     def sniff(self, filename):
         # The first 8 bytes of any hdf5 file are 0x894844460d0a1a0a
         try:
@@ -1134,6 +1147,7 @@ class Sff(Binary):
     edam_data = "data_0924"
     file_ext = "sff"
 
+    @magic_prefix(b'.sff')
     def sniff(self, filename):
         # The first 4 bytes of any sff file is '.sff', and the file is binary. For details
         # about the format, see http://www.ncbi.nlm.nih.gov/Traces/trace.cgi?cmd=show&f=formats&m=doc&s=format
@@ -1221,6 +1235,7 @@ class TwoBit(Binary):
     edam_data = "data_0848"
     file_ext = "twobit"
 
+    @magic_prefix(struct.pack(">L", TWOBIT_MAGIC_NUMBER), struct.pack(">L", TWOBIT_MAGIC_NUMBER_SWAP))
     def sniff(self, filename):
         try:
             # All twobit files start with a 16-byte header. If the file is smaller than 16 bytes, it's obviously not a valid twobit file.
@@ -1289,12 +1304,13 @@ class SQlite(Binary):
         except Exception as exc:
             log.warning('%s, set_meta Exception: %s', self, exc)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         # The first 16 bytes of any SQLite3 database file is 'SQLite format 3\0', and the file is binary. For details
         # about the format, see http://www.sqlite.org/fileformat.html
         try:
             header = open(filename, 'rb').read(16)
-            if header == b'SQLite format 3\0':
+            if header == SQLITE_MAGIC:
                 return True
             return False
         except Exception:
@@ -1359,6 +1375,7 @@ class GeminiSQLite(SQlite):
         except Exception as e:
             log.warning('%s, set_meta Exception: %s', self, e)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(GeminiSQLite, self).sniff(filename):
             gemini_table_names = ["gene_detailed", "gene_summary", "resources", "sample_genotype_counts", "sample_genotypes", "samples",
@@ -1433,6 +1450,7 @@ class CuffDiffSQlite(SQlite):
         except Exception as e:
             log.warning('%s, set_meta Exception: %s', self, e)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(CuffDiffSQlite, self).sniff(filename):
             # These tables should be in any CuffDiff SQLite output.
@@ -1474,6 +1492,7 @@ class MzSQlite(SQlite):
     def set_meta(self, dataset, overwrite=True, **kwd):
         super(MzSQlite, self).set_meta(dataset, overwrite=overwrite, **kwd)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(MzSQlite, self).sniff(filename):
             mz_table_names = ["DBSequence", "Modification", "Peaks", "Peptide", "PeptideEvidence", "Score", "SearchDatabase", "Source", "SpectraData", "Spectrum", "SpectrumIdentification"]
@@ -1509,6 +1528,7 @@ class BlibSQlite(SQlite):
         except Exception as e:
             log.warning('%s, set_meta Exception: %s', self, e)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(BlibSQlite, self).sniff(filename):
             blib_table_names = ['IonMobilityTypes', 'LibInfo', 'Modifications', 'RefSpectra', 'RefSpectraPeakAnnotations', 'RefSpectraPeaks', 'ScoreTypes', 'SpectrumSourceFiles']
@@ -1544,6 +1564,7 @@ class IdpDB(SQlite):
     def set_meta(self, dataset, overwrite=True, **kwd):
         super(IdpDB, self).set_meta(dataset, overwrite=overwrite, **kwd)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(IdpDB, self).sniff(filename):
             mz_table_names = ["About", "Analysis", "AnalysisParameter", "PeptideSpectrumMatch", "Spectrum", "SpectrumSource"]
@@ -1597,6 +1618,7 @@ class GAFASQLite(SQlite):
         except Exception as e:
             log.warning("%s, set_meta Exception: %s", self, e)
 
+    @magic_prefix(SQLITE_MAGIC)
     def sniff(self, filename):
         if super(GAFASQLite, self).sniff(filename):
             gafa_table_names = frozenset(['gene', 'gene_family', 'gene_family_member', 'meta', 'transcript'])
@@ -1631,6 +1653,7 @@ class ExcelXls(Binary):
     file_ext = "excel.xls"
     edam_format = "format_3468"
 
+    @magic_prefix(OLE2_MAGIC, b'\x09')
     def sniff(self, filename):
         mime_type = subprocess.check_output(['file', '--mime-type', filename])
         return b"application/vnd.ms-excel" in mime_type
@@ -1658,6 +1681,7 @@ class Sra(Binary):
     """ Sequence Read Archive (SRA) datatype originally from mdshw5/sra-tools-galaxy"""
     file_ext = 'sra'
 
+    @magic_prefix(b'NCBI.sra')
     def sniff(self, filename):
         """ The first 8 bytes of any NCBI sra file is 'NCBI.sra', and the file is binary.
         For details about the format, see http://www.ncbi.nlm.nih.gov/books/n/helpsra/SRA_Overview_BK/#SRA_Overview_BK.4_SRA_Data_Structure
@@ -1690,6 +1714,7 @@ class RData(Binary):
     """Generic R Data file datatype implementation"""
     file_ext = 'rdata'
 
+    @magic_prefix(b'RDX2\nX\n', util.gzip_magic)
     def sniff(self, filename):
         rdata_header = b'RDX2\nX\n'
         try:
@@ -1742,6 +1767,7 @@ class OxliCountGraph(OxliBinary):
     """
     file_ext = 'oxlicg'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"01")
 
@@ -1767,6 +1793,7 @@ class OxliNodeGraph(OxliBinary):
     """
     file_ext = 'oxling'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"02")
 
@@ -1793,6 +1820,7 @@ class OxliTagSet(OxliBinary):
     """
     file_ext = 'oxlits'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"03")
 
@@ -1814,6 +1842,7 @@ class OxliStopTags(OxliBinary):
     """
     file_ext = 'oxlist'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"04")
 
@@ -1840,6 +1869,7 @@ class OxliSubset(OxliBinary):
     """
     file_ext = 'oxliss'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"05")
 
@@ -1867,6 +1897,7 @@ class OxliGraphLabels(OxliBinary):
     """
     file_ext = 'oxligl'
 
+    @magic_prefix(b'OXLI')
     def sniff(self, filename):
         return OxliBinary._sniff(filename, b"06")
 
@@ -1897,6 +1928,7 @@ class PostgresqlArchive(CompressedArchive):
         except Exception as e:
             log.warning('%s, set_meta Exception: %s', self, e)
 
+    @requires_tar
     def sniff(self, filename):
         if filename and tarfile.is_tarfile(filename):
             try:
@@ -1945,6 +1977,7 @@ class Fast5Archive(CompressedArchive):
         except Exception as e:
             log.warning('%s, set_meta Exception: %s', self, e)
 
+    @requires_tar
     def sniff(self, filename):
         try:
             if filename and tarfile.is_tarfile(filename):
@@ -1992,6 +2025,7 @@ class Fast5ArchiveGz(Fast5Archive):
     """
     file_ext = "fast5.tar.gz"
 
+    @magic_prefix(util.gzip_magic)
     def sniff(self, filename):
         if not is_gzip(filename):
             return False
@@ -2015,6 +2049,7 @@ class Fast5ArchiveBz2(Fast5Archive):
     """
     file_ext = "fast5.tar.bz2"
 
+    @magic_prefix(util.bz2_magic)
     def sniff(self, filename):
         if not is_bz2(filename):
             return False
@@ -2089,6 +2124,7 @@ class NetCDF(Binary):
         except Exception:
             return "Binary netCDF file (%s)" % (nice_size(dataset.get_size()))
 
+    @magic_prefix(b'CDF')
     def sniff(self, filename):
         try:
             with open(filename, 'rb') as f:
@@ -2313,6 +2349,7 @@ class BafTar(CompressedArchive):
     def get_signature_file(self):
         return "analysis.baf"
 
+    @requires_tar
     def sniff(self, filename):
         if tarfile.is_tarfile(filename):
             with tarfile.open(filename) as rawtar:
@@ -2397,6 +2434,7 @@ class WiffTar(BafTar):
     """
     file_ext = "wiff.tar"
 
+    @requires_tar
     def sniff(self, filename):
         if tarfile.is_tarfile(filename):
             with tarfile.open(filename) as rawtar:
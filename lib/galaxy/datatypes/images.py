@@ -6,6 +6,7 @@ import zipfile
 
 from six.moves.urllib.parse import quote_plus
 
+from galaxy.datatypes.sniff import magic_prefix
 from galaxy.datatypes.text import Html as HtmlFromText
 from galaxy.util import nice_size
 from galaxy.util.image_util import check_image_type
@@ -156,6 +157,7 @@ class Pdf(Image):
     edam_format = "format_3508"
     file_ext = "pdf"
 
+    @magic_prefix(b"%PDF")
     def sniff(self, filename):
         """Determine if the file is in pdf format."""
         with open(filename, 'rb') as fh:
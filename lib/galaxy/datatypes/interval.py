@@ -15,7 +15,9 @@ from galaxy.datatypes.metadata import MetadataElement
 from galaxy.datatypes.sniff import (
     build_sniff_from_prefix,
     get_headers,
-    iter_headers
+    iter_headers,
+    requires_lines,
+    requires_text
 )
 from galaxy.datatypes.tabular import Tabular
 from galaxy.datatypes.util.gff_util import parse_gff3_attributes, parse_gff_attributes
@@ -294,6 +296,7 @@ class Interval(Tabular):
         """Return options for removing errors along with a description"""
         return [("lines", "Remove erroneous lines")]
 
+    @requires_text('\t')
     def sniff_prefix(self, file_prefix):
         """
         Checks for 'intervalness'
@@ -803,6 +806,7 @@ class Gff(Tabular, _RemoteCallMixin):
                     ret_val.append((site_name, link))
         return ret_val
 
+    @requires_lines(2)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in gff format
@@ -918,6 +922,7 @@ class Gff3(Gff):
                         break
         Tabular.set_meta(self, dataset, overwrite=overwrite, skip=i)
 
+    @requires_lines(2)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in GFF version 3 format
@@ -1001,6 +1006,7 @@ class Gtf(Gff):
     MetadataElement(name="column_types", default=['str', 'str', 'str', 'int', 'int', 'float', 'str', 'int', 'list'],
                     param=metadata.ColumnTypesParameter, desc="Column types", readonly=True, visible=False)
 
+    @requires_lines(2)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in gtf format
@@ -14,7 +14,8 @@ from galaxy.datatypes.metadata import MetadataElement
 from galaxy.datatypes.sniff import (
     build_sniff_from_prefix,
     get_headers,
-    iter_headers
+    iter_headers,
+    requires_text
 )
 from galaxy.datatypes.tabular import Tabular
 from galaxy.datatypes.util.generic_util import count_special_lines
@@ -613,6 +614,8 @@ class PQR(GenericMolFile):
               r'([-+]?\d*\.\d+|\d+)\s+'
         return re.compile(pat)
 
+    @requires_text('REMARK')
+    @requires_text('ATOM')
     def sniff_prefix(self, file_prefix):
         """
         Try to guess if the file is a PQR file.
@@ -7,7 +7,10 @@ import re
 from galaxy.datatypes import data
 from galaxy.datatypes.binary import Binary
 from galaxy.datatypes.data import Text
-from galaxy.datatypes.sniff import build_sniff_from_prefix
+from galaxy.datatypes.sniff import (
+    build_sniff_from_prefix,
+    requires_first_char
+)
 from galaxy.datatypes.tabular import Tabular
 from galaxy.datatypes.xml import GenericXml
 from galaxy.util import nice_size
@@ -98,6 +101,7 @@ class ProteomicsXml(GenericXml):
     edam_data = "data_2536"
     edam_format = "format_2032"
 
+    @requires_first_char('<')
     def sniff_prefix(self, file_prefix):
         """ Determines whether the file is the correct XML type. """
         contents = file_prefix.string_io()
@@ -319,6 +323,7 @@ class Msp(Text):
         next_line = contents.readline()
         return next_line is not None and next_line.startswith(prefix)
 
+    @requires_first_char('N')
     def sniff_prefix(self, file_prefix):
         """ Determines whether the file is a NIST MSP output file."""
         begin_contents = file_prefix.contents_header
@@ -24,6 +24,8 @@ from galaxy.datatypes.sniff import (
     build_sniff_from_prefix,
     get_headers,
     iter_headers,
+    requires_first_char,
+    requires_lines,
 )
 from galaxy.util import (
     compression_utils,
@@ -318,6 +320,7 @@ class Fasta(Sequence):
     edam_format = "format_1929"
     file_ext = "fasta"
 
+    @requires_first_char('>', skip_space=True)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in fasta format
@@ -682,6 +685,8 @@ class BaseFastq(Sequence):
             dataset.metadata.data_lines = data_lines
             dataset.metadata.sequences = sequences
 
+    @requires_lines(4)
+    @requires_first_char('@')
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in generic fastq format
@@ -925,6 +930,7 @@ class Maf(Alignment):
             out = "Can't create peek %s" % exc
         return out
 
+    @requires_lines(2)
     def sniff_prefix(self, file_prefix):
         """
         Determines wether the file is in maf format
@@ -1007,6 +1013,7 @@ class Axt(data.Text):
     edam_format = "format_3013"
     file_ext = "axt"
 
+    @requires_lines(4)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in axt format
@@ -1064,6 +1071,7 @@ class Lav(data.Text):
     edam_format = "format_3014"
     file_ext = "lav"
 
+    @requires_lines(2)
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is in lav format
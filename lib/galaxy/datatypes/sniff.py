@@ -6,6 +6,7 @@ from __future__ import absolute_import
 import codecs
 import gzip
 import io
+import itertools
 import logging
 import os
 import re
@@ -40,6 +41,14 @@ else:
 log = logging.getLogger(__name__)
 
 SNIFF_PREFIX_BYTES = int(os.environ.get("GALAXY_SNIFF_PREFIX_BYTES", None) or 2 ** 20)
+# Number of raw bytes read from the start of a file to check magic numbers
+SNIFF_MAGIC_BYTES = 64
+# Lines of the decoded prefix are counted up to this number for text sniffer requirements
+SNIFF_MAX_LINE_COUNT = 100
+# Size of the blocks newline and separator conversion works on
+CONVERSION_BLOCK_SIZE = 2 ** 20
+# Matches what sep2tabs' default pattern would within a line
+WHITESPACE_WITHIN_LINES = re.compile(r"[^\S\n]+", re.UNICODE)
 
 
 def get_test_fname(fname):
@@ -108,6 +117,9 @@ def convert_newlines(fname, in_place=True, tmp_dir=None, tmp_prefix="gxupload"):
     Converts in place a file from universal line endings
     to Posix line endings.
 
+    If the file already uses Posix line endings it is not rewritten, and if
+    ``in_place`` is False ``fname`` itself is returned.
+
     >>> fname = get_test_fname('temp.txt')
     >>> with open(fname, 'wt') as fh:
     ...     _ = fh.write("1 2\\r3 4")
@@ -115,22 +127,13 @@ def convert_newlines(fname, in_place=True, tmp_dir=None, tmp_prefix="gxupload"):
     (2, None)
     >>> open(fname).read()
     '1 2\\n3 4\\n'
+    >>> convert_newlines(fname, in_place=False) == (2, fname)
+    True
     """
-    fd, temp_name = tempfile.mkstemp(prefix=tmp_prefix, dir=tmp_dir)
-    with io.open(fd, mode="wt", encoding='utf-8') as fp:
-        i = None
-        for i, line in enumerate(io.open(fname, encoding='utf-8')):
-            fp.write("%s\n" % line.rstrip("\r\n"))
-    if i is None:
-        i = 0
-    else:
-        i += 1
-    if in_place:
-        shutil.move(temp_name, fname)
-        # Return number of lines in file.
-        return (i, None)
-    else:
-        return (i, temp_name)
+    line_count = _posix_line_count(fname)
+    if line_count is not None:
+        return (line_count, None if in_place else fname)
+    return _convert_text_file(fname, in_place, tmp_dir, tmp_prefix)
 
 
 def sep2tabs(fname, in_place=True, patt=r"\s+", tmp_dir=None, tmp_prefix="gxupload"):
@@ -145,29 +148,7 @@ def sep2tabs(fname, in_place=True, patt=r"\s+", tmp_dir=None, tmp_prefix="gxuplo
     >>> open(fname).read()
     '1\\t2\\n3\\t4\\n'
     """
-    regexp = re.compile(patt)
-    fd, temp_name = tempfile.mkstemp(prefix=tmp_prefix, dir=tmp_dir)
-    with io.open(fd, mode="wt", encoding='utf-8') as fp:
-        i = None
-        for i, line in enumerate(io.open(fname, encoding='utf-8')):
-            if line.endswith("\r"):
-                line = line.rstrip('\r')
-                elems = regexp.split(line)
-                fp.write(u"%s\r" % '\t'.join(elems))
-            else:
-                line = line.rstrip('\n')
-                elems = regexp.split(line)
-                fp.write(u"%s\n" % '\t'.join(elems))
-    if i is None:
-        i = 0
-    else:
-        i += 1
-    if in_place:
-        shutil.move(temp_name, fname)
-        # Return number of lines in file.
-        return (i, None)
-    else:
-        return (i, temp_name)
+    return _convert_text_file(fname, in_place, tmp_dir, tmp_prefix, patt=patt)
 
 
 def convert_newlines_sep2tabs(fname, in_place=True, patt=r"\s+", tmp_dir=None, tmp_prefix="gxupload"):
@@ -183,19 +164,87 @@ def convert_newlines_sep2tabs(fname, in_place=True, patt=r"\s+", tmp_dir=None, t
     >>> open(fname).read()
     '1\\t2\\n3\\t4\\n'
     """
-    regexp = re.compile(patt)
+    return _convert_text_file(fname, in_place, tmp_dir, tmp_prefix, patt=patt)
+
+
+def _iter_blocks(fname):
+    with open(fname, 'rb') as fh:
+        while True:
+            block = fh.read(CONVERSION_BLOCK_SIZE)
+            if not block:
+                break
+            yield block
+
+
+def _posix_line_count(fname):
+    """
+    Return the number of lines in ``fname`` if it is valid UTF-8 with Posix
+    line endings only (including after the last line), None otherwise.
+    """
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    line_count = 0
+    last_block = b''
+    for block in _iter_blocks(fname):
+        if b'\r' in block:
+            return None
+        decoder.decode(block)
+        line_count += block.count(b'\n')
+        last_block = block
+    decoder.decode(b'', final=True)
+    if last_block and not last_block.endswith(b'\n'):
+        return None
+    return line_count
+
+
+def _convert_text_file(fname, in_place, tmp_dir, tmp_prefix, patt=None):
+    """
+    Rewrite UTF-8 file ``fname`` with Posix line endings, a line ending after
+    the last line and - if ``patt`` is set - each match of ``patt`` within a
+    line replaced by a tab. The file is converted in large blocks rather
+    than line by line.
+    """
+    if patt == r"\s+":
+        # Whitespace within lines, lines are converted in one go per block.
+        def convert(text):
+            return WHITESPACE_WITHIN_LINES.sub(u'\t', text)
+    elif patt is not None:
+        regexp = re.compile(patt)
+
+        def convert(text):
+            return u"".join(u"%s\n" % u'\t'.join(regexp.split(line)) for line in text.split(u'\n')[:-1])
+    else:
+        def convert(text):
+            return text
+
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    line_count = 0
     fd, temp_name = tempfile.mkstemp(prefix=tmp_prefix, dir=tmp_dir)
-    with io.open(fd, mode="wt", encoding='utf-8') as fp:
-        for i, line in enumerate(io.open(fname, encoding='utf-8')):
-            line = line.rstrip('\r\n')
-            elems = regexp.split(line)
-            fp.write(u"%s\n" % '\t'.join(elems))
+    with io.open(fd, mode="wb") as fp:
+        # Incomplete last line of the previous block, a trailing carriage
+        # return may be followed by a line feed in the next block.
+        remainder = u''
+        for block in _iter_blocks(fname):
+            text = remainder + decoder.decode(block)
+            held = u''
+            if text.endswith(u'\r'):
+                text, held = text[:-1], u'\r'
+            text = text.replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+            end_of_lines = text.rfind(u'\n') + 1
+            text, remainder = text[:end_of_lines], text[end_of_lines:] + held
+            line_count += text.count(u'\n')
+            fp.write(convert(text).encode('utf-8'))
+        text = (remainder + decoder.decode(b'', final=True)).replace(u'\r\n', u'\n').replace(u'\r', u'\n')
+        if text:
+            if not text.endswith(u'\n'):
+                text += u'\n'
+            line_count += text.count(u'\n')
+            fp.write(convert(text).encode('utf-8'))
     if in_place:
         shutil.move(temp_name, fname)
         # Return number of lines in file.
-        return (i + 1, None)
+        return (line_count, None)
     else:
-        return (i + 1, temp_name)
+        return (line_count, temp_name)
 
 
 def iter_headers(fname_or_file_prefix, sep, count=60, comment_designator=None):
@@ -521,6 +570,10 @@ def run_sniffers_raw(filename_or_file_prefix, sniff_order, is_binary=False):
         """
         try:
             if hasattr(datatype, "sniff_prefix"):
+                if file_prefix.binary:
+                    # The prefix could not be decoded as text, so there is
+                    # nothing for sniff_prefix to look at.
+                    continue
                 datatype_compressed = getattr(datatype, "compressed", False)
                 if datatype_compressed and not file_prefix.compressed_format:
                     continue
@@ -531,11 +584,15 @@ def run_sniffers_raw(filename_or_file_prefix, sniff_order, is_binary=False):
                     # to the expected.
                     if file_prefix.compressed_format != datatype.compressed_format:
                         continue
+                if not sniff_requirement_met(datatype, file_prefix):
+                    continue
                 if datatype.sniff_prefix(file_prefix):
                     file_ext = datatype.file_ext
                     break
             elif is_binary and not datatype.is_binary:
                 continue
+            elif not sniff_requirement_met(datatype, file_prefix):
+                continue
             elif datatype.sniff(fname):
                 file_ext = datatype.file_ext
                 break
@@ -580,6 +637,12 @@ class FilePrefix(object):
         self.compressed_format = compressed_format
         self.contents_header = contents_header
         self._file_size = None
+        self._magic_header = None
+        self._is_tar = None
+        self._first_char = None
+        self._first_nonspace_char = None
+        self._line_count = None
+        self._contains = {}
 
     @property
     def file_size(self):
@@ -587,6 +650,55 @@ class FilePrefix(object):
             self._file_size = os.path.getsize(self.filename)
         return self._file_size
 
+    @property
+    def magic_header(self):
+        """The first SNIFF_MAGIC_BYTES bytes of the file, read without decompressing it."""
+        if self._magic_header is None:
+            with open(self.filename, 'rb') as f:
+                self._magic_header = f.read(SNIFF_MAGIC_BYTES)
+        return self._magic_header
+
+    def startswith_bytes(self, prefixes):
+        """Check whether the raw file starts with a byte string or with any of a tuple of byte strings."""
+        return self.magic_header.startswith(prefixes)
+
+    @property
+    def is_tar(self):
+        if self._is_tar is None:
+            self._is_tar = is_tar(self.filename)
+        return self._is_tar
+
+    @property
+    def first_char(self):
+        """The first character of the decoded prefix, '' if it is empty."""
+        if self._first_char is None:
+            self._first_char = self.contents_header[:1]
+        return self._first_char
+
+    @property
+    def first_nonspace_char(self):
+        """The first character of the decoded prefix that is not whitespace, '' if there is none."""
+        if self._first_nonspace_char is None:
+            self._first_nonspace_char = ''
+            for char in self.contents_header:
+                if not char.isspace():
+                    self._first_nonspace_char = char
+                    break
+        return self._first_nonspace_char
+
+    @property
+    def line_count(self):
+        """The number of lines line_iterator() yields, counted up to SNIFF_MAX_LINE_COUNT."""
+        if self._line_count is None:
+            self._line_count = sum(1 for _ in itertools.islice(self.line_iterator(), SNIFF_MAX_LINE_COUNT))
+        return self._line_count
+
+    def contains(self, text):
+        """Check whether the decoded prefix contains ``text``, e.g. a delimiter."""
+        if text not in self._contains:
+            self._contains[text] = text in self.contents_header
+        return self._contains[text]
+
     def string_io(self):
         if self.binary:
             raise Exception("Attempting to create a StringIO object for binary data.")
@@ -638,6 +750,88 @@ def build_sniff_from_prefix(klass):
     return klass
 
 
+def sniff_requires(check):
+    """
+    Decorate the ``sniff(filename)`` or ``sniff_prefix(file_prefix)`` method
+    of a datatype with a cheap test ``check(file_prefix)`` that a file must
+    pass for the sniffer to match.
+
+    run_sniffers_raw() skips the sniffer when the test fails, e.g. binary
+    formats with a magic number at the start of the file don't need to read
+    each file that is being sniffed, and text formats can be ruled out by
+    features of the prefix that are computed once per file (and shared by the
+    compressed variants of a datatype). The test is attached to the function,
+    so subclasses overriding the method have to declare their own. Tests of
+    stacked decorators all have to pass.
+    """
+    def decorator(func):
+        previous = getattr(func, "sniff_requires", None)
+        if previous is None:
+            func.sniff_requires = check
+        else:
+            func.sniff_requires = lambda file_prefix: previous(file_prefix) and check(file_prefix)
+        return func
+    return decorator
+
+
+def magic_prefix(*prefixes):
+    """Require the raw file to start with one of the byte strings in ``prefixes``, see sniff_requires()."""
+    return sniff_requires(lambda file_prefix: file_prefix.startswith_bytes(prefixes))
+
+
+def requires_tar(func):
+    """Require the file to be a (possibly compressed) tar archive, see sniff_requires()."""
+    return sniff_requires(lambda file_prefix: file_prefix.is_tar)(func)
+
+
+def requires_first_char(chars, skip_space=False):
+    """
+    Require the decoded prefix to start with one of the characters in
+    ``chars`` (ignoring leading whitespace if ``skip_space``), see
+    sniff_requires().
+    """
+    def check(file_prefix):
+        char = file_prefix.first_nonspace_char if skip_space else file_prefix.first_char
+        return char != '' and char in chars
+    return sniff_requires(check)
+
+
+def requires_lines(count):
+    """Require the decoded prefix to have at least ``count`` lines, see sniff_requires()."""
+    assert count <= SNIFF_MAX_LINE_COUNT
+    return sniff_requires(lambda file_prefix: file_prefix.line_count >= count)
+
+
+def requires_text(*texts):
+    """
+    Require the decoded prefix to contain one of ``texts`` (e.g. a column
+    delimiter), see sniff_requires().
+    """
+    return sniff_requires(lambda file_prefix: any(file_prefix.contains(text) for text in texts))
+
+
+def sniff_requirement_met(datatype, file_prefix):
+    """
+    Check the requirement declared with sniff_requires() (if any) for the
+    sniff method of ``datatype`` that run_sniffers_raw() uses.
+
+    >>> from galaxy.datatypes.binary import Sff
+    >>> sniff_requirement_met(Sff(), FilePrefix(get_test_fname('1.sff')))
+    True
+    >>> sniff_requirement_met(Sff(), FilePrefix(get_test_fname('interval.interval')))
+    False
+    >>> from galaxy.datatypes.tabular import Tabular
+    >>> sniff_requirement_met(Tabular(), FilePrefix(get_test_fname('1.sff')))
+    True
+    """
+    if hasattr(datatype, "sniff_prefix"):
+        sniff = datatype.sniff_prefix
+    else:
+        sniff = getattr(datatype, "sniff", None)
+    check = getattr(sniff, "sniff_requires", None)
+    return check is None or check(file_prefix)
+
+
 def disable_parent_class_sniffing(klass):
     klass.sniff = lambda self, filename: False
     klass.sniff_prefix = lambda self, file_prefix: False
@@ -771,7 +965,7 @@ def handle_uploaded_dataset_file_internal(
             else:
                 convert_fxn = convert_newlines
             line_count, _converted_path = convert_fxn(converted_path, in_place=in_place, tmp_dir=tmp_dir, tmp_prefix=tmp_prefix)
-            if not in_place:
+            if not in_place and _converted_path != converted_path:
                 if converted_path and filename != converted_path:
                     os.unlink(converted_path)
                 converted_path = _converted_path
@@ -23,7 +23,8 @@ from galaxy.datatypes.metadata import MetadataElement
 from galaxy.datatypes.sniff import (
     build_sniff_from_prefix,
     get_headers,
-    iter_headers
+    iter_headers,
+    sniff_requires
 )
 from galaxy.util import compression_utils
 from . import dataproviders
@@ -902,6 +903,15 @@ class FeatureLocationIndex(Tabular):
     MetadataElement(name="column_types", default=['str', 'str'], param=metadata.ColumnTypesParameter, desc="Column types", readonly=True, visible=False, no_value=[])
 
 
+def _may_be_delimited(file_prefix):
+    # The header row of the dialects of the BaseCSV subclasses needs a
+    # delimiter. BaseCSV.sniff reads the file itself, so only plain text files
+    # whose prefix holds all of the file can be ruled out.
+    if file_prefix.binary or file_prefix.compressed_format or file_prefix.truncated:
+        return True
+    return file_prefix.contains(csv.excel.delimiter) or file_prefix.contains(csv.excel_tab.delimiter)
+
+
 @dataproviders.decorators.has_dataproviders
 class BaseCSV(TabularData):
     """
@@ -939,6 +949,7 @@ class BaseCSV(TabularData):
         else:
             return 'str'
 
+    @sniff_requires(_may_be_delimited)
     def sniff(self, filename):
         """ Return True if if recognizes dialect and header. """
         try:
@@ -42,6 +42,7 @@ class GenericXml(data.Text):
         pattern = r'^<(\w*:)?%s' % root
         return line is not None and re.match(pattern, line) is not None
 
+    @sniff.requires_first_char('<')
     def sniff_prefix(self, file_prefix):
         """
         Determines whether the file is XML or not
@@ -115,6 +116,7 @@ class Phyloxml(GenericXml):
             dataset.peek = 'file does not exist'
             dataset.blurb = 'file purged from disk'
 
+    @sniff.requires_first_char('<')
     def sniff_prefix(self, file_prefix):
         """"Checking for keyword - 'phyloxml' always in lowercase in the first few lines.
 
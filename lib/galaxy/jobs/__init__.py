@@ -1057,6 +1057,7 @@ class JobWrapper(HasResourceParameters):
         # If the job was deleted, call tool specific fail actions (used for e.g. external metadata) and clean up
         if self.tool:
             self.tool.job_failed(self, message, exception)
+        self._notify_job_handlers()
         cleanup_job = self.cleanup_job
         delete_files = cleanup_job == 'always' or (cleanup_job == 'onsuccess' and job.state == job.states.DELETED)
         self.cleanup(delete_files=delete_files)
@@ -1462,12 +1463,21 @@ class JobWrapper(HasResourceParameters):
             self._collect_metrics(job)
         self.sa_session.flush()
         log.debug('job %d ended (finish() executed in %s)' % (self.job_id, finish_timer))
+        self._notify_job_handlers()
         if job.state == job.states.ERROR:
             self._report_error()
         cleanup_job = self.cleanup_job
         delete_files = cleanup_job == 'always' or (job.state == job.states.OK and cleanup_job == 'onsuccess')
         self.cleanup(delete_files=delete_files)
 
+    def _notify_job_handlers(self):
+        # Jobs waiting on this job's outputs or on a concurrency slot may now
+        # be ready to run.
+        job_manager = getattr(self.app, 'job_manager', None)
+        if job_manager is not None:
+            job_manager.job_handler.job_queue.job_finished(self.job_id)
+            job_manager.notify_job_handlers()
+
     def discover_outputs(self, job, inp_data, out_data, out_collections):
         input_ext = 'data'
         input_dbkey = '?'
@@ -2222,6 +2232,12 @@ class NoopQueue(object):
     def put_stop(self, *args):
         return
 
+    def notify(self):
+        return
+
+    def job_finished(self, job_id):
+        return
+
     def shutdown(self):
         return
 
@@ -4,6 +4,7 @@ Galaxy job handler, prepares, runs, tracks, and finishes Galaxy jobs
 import datetime
 import logging
 import os
+import threading
 import time
 from collections import defaultdict
 
@@ -28,6 +29,7 @@ from galaxy.jobs import (
     TaskWrapper
 )
 from galaxy.jobs.mapper import JobNotReadyException
+from galaxy.model.orm.now import now
 from galaxy.util.monitors import Monitors
 from galaxy.web.stack.handlers import HANDLER_ASSIGNMENT_METHODS
 from galaxy.web.stack.message import JobHandlerMessage
@@ -37,6 +39,8 @@ log = logging.getLogger(__name__)
 # States for running a job. These are NOT the same as data states
 JOB_WAIT, JOB_ERROR, JOB_INPUT_ERROR, JOB_INPUT_DELETED, JOB_READY, JOB_DELETED, JOB_ADMIN_DELETED, JOB_USER_OVER_QUOTA, JOB_USER_OVER_TOTAL_WALLTIME = 'wait', 'error', 'input_error', 'input_deleted', 'ready', 'deleted', 'admin_deleted', 'user_over_quota', 'user_over_total_walltime'
 DEFAULT_JOB_PUT_FAILURE_MESSAGE = 'Unable to run job due to a misconfiguration of the Galaxy job running system.  Please contact a site administrator.'
+# Maximum number of ids used in a single IN clause when checking jobs incrementally
+READY_CHECK_CHUNK_SIZE = 500
 
 
 class JobHandler(object):
@@ -61,12 +65,123 @@ class JobHandler(object):
         self.job_stop_queue.shutdown()
 
 
+class WaitingJobsIndex(object):
+    """
+    Index of jobs waiting on input datasets that are not ready yet, keyed on
+    the id of those datasets. When datasets change state only the jobs
+    depending on them need to be checked again.
+    """
+
+    def __init__(self):
+        self.job_ids_by_dataset_id = defaultdict(set)
+        self.dataset_ids_by_job_id = {}
+
+    def __len__(self):
+        return len(self.dataset_ids_by_job_id)
+
+    def __contains__(self, job_id):
+        return job_id in self.dataset_ids_by_job_id
+
+    def add(self, job_id, dataset_id):
+        self.job_ids_by_dataset_id[dataset_id].add(job_id)
+        self.dataset_ids_by_job_id.setdefault(job_id, set()).add(dataset_id)
+
+    def remove(self, job_id):
+        for dataset_id in self.dataset_ids_by_job_id.pop(job_id, ()):
+            job_ids = self.job_ids_by_dataset_id[dataset_id]
+            job_ids.discard(job_id)
+            if not job_ids:
+                del self.job_ids_by_dataset_id[dataset_id]
+
+    def job_ids_for_datasets(self, dataset_ids):
+        job_ids = set()
+        for dataset_id in dataset_ids:
+            job_ids.update(self.job_ids_by_dataset_id.get(dataset_id, ()))
+        return job_ids
+
+    def clear(self):
+        self.job_ids_by_dataset_id.clear()
+        self.dataset_ids_by_job_id.clear()
+
+
+class JobConcurrencyLedger(object):
+    """
+    Counts of queued and running jobs per user and per destination, used to
+    enforce concurrency limits. The counts are rebuilt from the database by
+    `reconcile()` and kept up to date in between as jobs are dispatched and
+    finish, so checking a limit does not need to query the database.
+
+    The count dictionaries have the same structure as the ones built by the
+    queries in `JobHandlerQueue` and follow the same rules: resubmitted jobs
+    count towards the user's total but not towards any destination.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # job id -> (user id, destination id, counted towards destination)
+        self.jobs = {}
+        self.user_job_count = {}
+        self.user_job_count_per_destination = {}
+        self.total_job_count_per_destination = {}
+        self.last_reconcile = None
+
+    def reconcile(self, rows):
+        """
+        Replace the counts with ones built from `rows` of (job id, user id,
+        destination id, job state) for all queued, running and resubmitted
+        jobs.
+        """
+        with self.lock:
+            self.jobs = {}
+            self.user_job_count = {}
+            self.user_job_count_per_destination = {}
+            self.total_job_count_per_destination = {}
+            for job_id, user_id, destination_id, state in rows:
+                self.__add(job_id, user_id, destination_id, state != model.Job.states.RESUBMITTED)
+            self.last_reconcile = time.time()
+
+    def needs_reconcile(self, interval):
+        return self.last_reconcile is None or time.time() - self.last_reconcile >= interval
+
+    def job_dispatched(self, job_id, user_id, destination_id):
+        with self.lock:
+            self.__remove(job_id)
+            self.__add(job_id, user_id, destination_id, True)
+
+    def job_finished(self, job_id):
+        with self.lock:
+            self.__remove(job_id)
+
+    def __add(self, job_id, user_id, destination_id, counts_towards_destination):
+        self.jobs[job_id] = (user_id, destination_id, counts_towards_destination)
+        self.__update(user_id, destination_id, counts_towards_destination, 1)
+
+    def __remove(self, job_id):
+        if job_id in self.jobs:
+            user_id, destination_id, counts_towards_destination = self.jobs.pop(job_id)
+            self.__update(user_id, destination_id, counts_towards_destination, -1)
+
+    def __update(self, user_id, destination_id, counts_towards_destination, delta):
+        if user_id is not None:
+            self.user_job_count[user_id] = self.user_job_count.get(user_id, 0) + delta
+        if counts_towards_destination:
+            per_destination = self.user_job_count_per_destination.setdefault(user_id, {})
+            per_destination[destination_id] = per_destination.get(destination_id, 0) + delta
+            self.total_job_count_per_destination[destination_id] = self.total_job_count_per_destination.get(destination_id, 0) + delta
+
+
 class JobHandlerQueue(Monitors):
     """
     Job Handler's Internal Queue, this is what actually implements waiting for
     jobs to be runnable and dispatching to a JobRunner.
     """
     STOP_SIGNAL = object()
+    MIN_MONITOR_SLEEP = 1
+    # Timestamps are set by the clients that update rows, allow for some clock
+    # skew and for transactions that take a while to be committed.
+    READY_CHECK_SLACK = datetime.timedelta(seconds=30)
+    # Check all new jobs every so often in case an update was missed.
+    READY_CHECK_FULL_SCAN_INTERVAL = datetime.timedelta(minutes=5)
 
     def __init__(self, app, dispatcher):
         """Initializes the Job Handler Queue, creates (unstarted) monitoring thread"""
@@ -76,7 +191,13 @@ class JobHandlerQueue(Monitors):
         self.sa_session = app.model.context
         self.track_jobs_in_database = self.app.config.track_jobs_in_database
 
-        # Initialize structures for handling job limits
+        # Initialize structures for handling job limits. If a reconcile
+        # interval is set the job counts are kept between iterations and only
+        # rebuilt from the database every job_count_reconcile_interval seconds.
+        self.job_count_reconcile_interval = getattr(app.config, "job_count_reconcile_interval", 0)
+        self.job_count_ledger = None
+        if self.job_count_reconcile_interval > 0:
+            self.job_count_ledger = JobConcurrencyLedger()
         self.__clear_job_count()
 
         # Keep track of the pid that started the job manager, only it
@@ -88,6 +209,19 @@ class JobHandlerQueue(Monitors):
         self.waiting_jobs = []
         # Contains wrappers of jobs that are limited or ready (so they aren't created unnecessarily/multiple times)
         self.job_wrappers = {}
+        # The monitor thread polls every MIN_MONITOR_SLEEP seconds while there
+        # is work to do and backs off up to job_handler_monitor_max_sleep
+        # seconds while idle. notify() wakes it up immediately.
+        self.monitor_max_sleep = max(getattr(app.config, "job_handler_monitor_max_sleep", self.MIN_MONITOR_SLEEP), self.MIN_MONITOR_SLEEP)
+        self._wake_requested = False
+        # If enabled, only new jobs, jobs whose input datasets changed state and
+        # jobs waiting on limits are checked in each iteration.
+        self.waiting_jobs_index = None
+        if getattr(app.config, "job_handler_incremental_ready_check", False) and self.track_jobs_in_database:
+            self.waiting_jobs_index = WaitingJobsIndex()
+        self.__last_ready_check = None
+        self.__last_full_ready_check = None
+        self.__limited_job_ids = []
         name = "JobHandlerQueue.monitor_thread"
         self._init_monitor_thread(name, target=self.__monitor, config=app.config)
         self.__grab_query = None
@@ -225,32 +359,51 @@ class JobHandlerQueue(Monitors):
         Continually iterate the waiting jobs, checking is each is ready to
         run and dispatching if so.
         """
+        sleep_time = self.MIN_MONITOR_SLEEP
         while self.monitor_running:
+            active = False
+            # Notifications received while the step runs must cause another step.
+            self._wake_requested = False
             try:
                 # If jobs are locked, there's nothing to monitor and we skip
                 # to the sleep.
                 if not self.app.job_manager.job_lock:
-                    self.__monitor_step()
+                    active = self.__monitor_step()
             except Exception:
                 log.exception("Exception in monitor_step")
                 # With sqlite backends we can run into locked databases occasionally
                 # To avoid that the monitor step locks again we backoff a little longer.
                 self._monitor_sleep(5)
-            self._monitor_sleep(1)
+            if active or self._wake_requested:
+                sleep_time = self.MIN_MONITOR_SLEEP
+            else:
+                sleep_time = min(sleep_time * 2, self.monitor_max_sleep)
+            if not self._wake_requested:
+                self._monitor_sleep(sleep_time)
 
     def __monitor_step(self):
         """
-        Called repeatedly by `monitor` to process waiting jobs.
+        Called repeatedly by `monitor` to process waiting jobs. Returns True
+        if any job was grabbed or changed state.
         """
+        grabbed = False
         if self.__grab_query is not None:
-            self.__grab_unhandled_jobs()
-        self.__handle_waiting_jobs()
+            grabbed = self.__grab_unhandled_jobs()
+        return self.__handle_waiting_jobs() or grabbed
+
+    def notify(self):
+        """
+        Wake up the monitor thread because jobs or their inputs changed state
+        and waiting jobs may have become ready to run.
+        """
+        self._wake_requested = True
+        self.sleeper.wake()
 
     def __grab_unhandled_jobs(self):
         """
         Attempts to "grab" jobs (assign unassigned jobs to itself) using DB serialization methods, if enabled. This
         simply sets `Job.handler` to the current server name, which causes the job to be picked up by
-        `__handle_waiting_jobs()`.
+        `__handle_waiting_jobs()`. Returns True if any jobs were grabbed.
         """
         # an excellent discussion on PostgreSQL concurrency safety:
         # https://blog.2ndquadrant.com/what-is-select-skip-locked-for-in-postgresql-9-5/
@@ -262,6 +415,7 @@ class JobHandlerQueue(Monitors):
                 if rows:
                     log.debug('Grabbed job(s): %s', ', '.join([str(row[0]) for row in rows]))
                     trans.commit()
+                    return True
                 else:
                     trans.rollback()
             except OperationalError as e:
@@ -270,6 +424,7 @@ class JobHandlerQueue(Monitors):
                 if int(getattr(e.orig, 'pgcode', -1)) != 40001:
                     log.debug('Grabbing job failed (serialization failures are ok): %s', str(e))
                 trans.rollback()
+        return False
 
     def __handle_waiting_jobs(self):
         """
@@ -277,11 +432,21 @@ class JobHandlerQueue(Monitors):
         to check the state of the jobs each depends on. If the job has dependencies that have not finished, it goes to
         the waiting queue. If the job has dependencies with errors, it is marked as having errors and removed from the
         queue. If the job belongs to an inactive user it is ignored.  Otherwise, the job is dispatched.
+
+        Returns True if any job was dispatched or otherwise left the waiting state.
         """
         # Pull all new jobs from the queue at once
         jobs_to_check = []
         resubmit_jobs = []
-        if self.track_jobs_in_database:
+        if self.track_jobs_in_database and self.waiting_jobs_index is not None:
+            # Clear the session so we get fresh states for job and all datasets
+            self.sa_session.expunge_all()
+            jobs_to_check = self.__incremental_jobs_to_check()
+            # Filter jobs with invalid input states
+            jobs_to_check = self.__filter_jobs_with_invalid_input_states(jobs_to_check)
+            # Fetch all "resubmit" jobs
+            resubmit_jobs = self.__resubmit_jobs()
+        elif self.track_jobs_in_database:
             # Clear the session so we get fresh states for job and all datasets
             self.sa_session.expunge_all()
             # Fetch all new jobs
@@ -316,10 +481,7 @@ class JobHandlerQueue(Monitors):
             # Filter jobs with invalid input states
             jobs_to_check = self.__filter_jobs_with_invalid_input_states(jobs_to_check)
             # Fetch all "resubmit" jobs
-            resubmit_jobs = self.sa_session.query(model.Job).enable_eagerloads(False) \
-                .filter(and_((model.Job.state == model.Job.states.RESUBMITTED),
-                             (model.Job.handler == self.app.config.server_name))) \
-                .order_by(model.Job.id).all()
+            resubmit_jobs = self.__resubmit_jobs()
         else:
             # Get job objects and append to watch queue for any which were
             # previously waiting
@@ -329,7 +491,7 @@ class JobHandlerQueue(Monitors):
                 while 1:
                     message = self.queue.get_nowait()
                     if message is self.STOP_SIGNAL:
-                        return
+                        return False
                     # Unpack the message
                     job_id, tool_id = message
                     # Get the job object and append to watch queue
@@ -344,7 +506,7 @@ class JobHandlerQueue(Monitors):
             # Reassemble resubmit job destination from persisted value
             jw = self.__recover_job_wrapper(job)
             if jw.is_ready_for_resubmission(job):
-                self.increase_running_job_count(job.user_id, jw.job_destination.id)
+                self.increase_running_job_count(job.user_id, jw.job_destination.id, job_id=job.id)
                 self.dispatcher.put(jw)
         # Iterate over new and waiting jobs and look for any that are
         # ready to run
@@ -407,6 +569,8 @@ class JobHandlerQueue(Monitors):
         # Update the waiting list
         if not self.track_jobs_in_database:
             self.waiting_jobs = new_waiting_jobs
+        # Jobs waiting on limits are checked again in the next iteration
+        self.__limited_job_ids = new_waiting_jobs
         # Remove cached wrappers for any jobs that are no longer being tracked
         for id in list(self.job_wrappers.keys()):
             if id not in new_waiting_jobs:
@@ -415,6 +579,73 @@ class JobHandlerQueue(Monitors):
         self.sa_session.flush()
         # Done with the session
         self.sa_session.remove()
+        return len(jobs_to_check) + len(resubmit_jobs) > len(new_waiting_jobs)
+
+    def __resubmit_jobs(self):
+        return self.sa_session.query(model.Job).enable_eagerloads(False) \
+            .filter(and_((model.Job.state == model.Job.states.RESUBMITTED),
+                         (model.Job.handler == self.app.config.server_name))) \
+            .order_by(model.Job.id).all()
+
+    def __incremental_jobs_to_check(self):
+        """
+        Return new jobs whose inputs are ready, like the query in
+        `__handle_waiting_jobs()`, but only look at jobs that were created or
+        updated since the last iteration, jobs that depend on datasets that
+        changed state since then and jobs that were waiting on limits. Jobs
+        with inputs that are not ready are recorded in `waiting_jobs_index`.
+        """
+        index = self.waiting_jobs_index
+        check_time = now()
+        new_job_query = self.sa_session.query(model.Job.id).enable_eagerloads(False) \
+            .filter(and_((model.Job.state == model.Job.states.NEW),
+                         (model.Job.handler == self.app.config.server_name)))
+        if self.__last_full_ready_check is None or check_time - self.__last_full_ready_check > self.READY_CHECK_FULL_SCAN_INTERVAL:
+            index.clear()
+            candidate_ids = set(row[0] for row in new_job_query)
+            self.__last_full_ready_check = check_time
+        else:
+            since = self.__last_ready_check - self.READY_CHECK_SLACK
+            candidate_ids = set(row[0] for row in new_job_query.filter(model.Job.update_time >= since))
+            changed_dataset_ids = [row[0] for row in self.sa_session.query(model.Dataset.id)
+                                   .filter(model.Dataset.update_time >= since)]
+            candidate_ids.update(index.job_ids_for_datasets(changed_dataset_ids))
+            candidate_ids.update(self.__limited_job_ids)
+        self.__last_ready_check = check_time
+        candidate_ids = sorted(candidate_ids)
+        for job_id in candidate_ids:
+            index.remove(job_id)
+        jobs = []
+        for i in range(0, len(candidate_ids), READY_CHECK_CHUNK_SIZE):
+            chunk = candidate_ids[i:i + READY_CHECK_CHUNK_SIZE]
+            not_ready_job_ids = set()
+            for job_to_input_table, input_table, input_column in [
+                    (model.JobToInputDatasetAssociation.table, model.HistoryDatasetAssociation.table, "dataset_id"),
+                    (model.JobToInputLibraryDatasetAssociation.table, model.LibraryDatasetDatasetAssociation.table, "ldda_id")]:
+                not_ready = self.sa_session.query(model.Job.id, model.Dataset.id).enable_eagerloads(False) \
+                    .select_from(model.Job.table) \
+                    .join(job_to_input_table, job_to_input_table.c.job_id == model.Job.id) \
+                    .join(input_table, input_table.c.id == job_to_input_table.c[input_column]) \
+                    .join(model.Dataset, model.Dataset.id == input_table.c.dataset_id) \
+                    .filter(and_(model.Job.id.in_(chunk),
+                                 model.Job.state == model.Job.states.NEW,
+                                 model.Dataset.state.in_(model.Dataset.non_ready_states)))
+                for job_id, dataset_id in not_ready:
+                    index.add(job_id, dataset_id)
+                    not_ready_job_ids.add(job_id)
+            ready_ids = [job_id for job_id in chunk if job_id not in not_ready_job_ids]
+            if not ready_ids:
+                continue
+            ready_jobs = self.sa_session.query(model.Job).enable_eagerloads(False)
+            if self.app.config.user_activation_on:
+                ready_jobs = ready_jobs.outerjoin(model.User) \
+                    .filter(or_((model.Job.user_id == null()), (model.User.active == true())))
+            jobs.extend(ready_jobs.filter(and_(model.Job.id.in_(ready_ids),
+                                               (model.Job.state == model.Job.states.NEW),
+                                               (model.Job.handler == self.app.config.server_name))).order_by(model.Job.id))
+        if candidate_ids:
+            log.debug("Checked %d candidate job(s) for readiness, %d job(s) waiting on inputs", len(candidate_ids), len(index))
+        return jobs
 
     def __filter_jobs_with_invalid_input_states(self, jobs):
         """
@@ -510,7 +741,7 @@ class JobHandlerQueue(Monitors):
 
         if state == JOB_READY:
             # PASS.  increase usage by one job (if caching) so that multiple jobs aren't dispatched on this queue iteration
-            self.increase_running_job_count(job.user_id, job_destination.id)
+            self.increase_running_job_count(job.user_id, job_destination.id, job_id=job.id)
             for job_to_input_dataset_association in job.input_datasets:
                 # We record the input dataset version, now that we know the inputs are ready
                 if job_to_input_dataset_association.dataset:
@@ -620,15 +851,38 @@ class JobHandlerQueue(Monitors):
         return None
 
     def __clear_job_count(self):
+        if self.job_count_ledger is not None:
+            self.__reconcile_job_count_ledger()
+            return
         self.user_job_count = None
         self.user_job_count_per_destination = None
         self.total_job_count_per_destination = None
 
+    def __reconcile_job_count_ledger(self):
+        ledger = self.job_count_ledger
+        if ledger.needs_reconcile(self.job_count_reconcile_interval):
+            result = self.sa_session.execute(select([model.Job.table.c.id,
+                                                     model.Job.table.c.user_id,
+                                                     model.Job.table.c.destination_id,
+                                                     model.Job.table.c.state])
+                                             .where(model.Job.table.c.state.in_((model.Job.states.QUEUED,
+                                                                                 model.Job.states.RUNNING,
+                                                                                 model.Job.states.RESUBMITTED))))
+            ledger.reconcile(result)
+        self.user_job_count = ledger.user_job_count
+        self.user_job_count_per_destination = ledger.user_job_count_per_destination
+        self.total_job_count_per_destination = ledger.total_job_count_per_destination
+
+    def job_finished(self, job_id):
+        """Release a job that reached a terminal state from the job counts."""
+        if self.job_count_ledger is not None:
+            self.job_count_ledger.job_finished(job_id)
+
     def get_user_job_count(self, user_id):
         self.__cache_user_job_count()
         # This could have been incremented by a previous job dispatched on this iteration, even if we're not caching
         rval = self.user_job_count.get(user_id, 0)
-        if not self.app.config.cache_user_job_count:
+        if not self.app.config.cache_user_job_count and self.job_count_ledger is None:
             result = self.sa_session.execute(select([func.count(model.Job.table.c.id)])
                                              .where(and_(model.Job.table.c.state.in_((model.Job.states.QUEUED,
                                                          model.Job.states.RUNNING,
@@ -657,7 +911,7 @@ class JobHandlerQueue(Monitors):
     def get_user_job_count_per_destination(self, user_id):
         self.__cache_user_job_count_per_destination()
         cached = self.user_job_count_per_destination.get(user_id, {})
-        if self.app.config.cache_user_job_count:
+        if self.app.config.cache_user_job_count or self.job_count_ledger is not None:
             rval = cached
         else:
             # The cached count is still used even when we're not caching, it is
@@ -688,7 +942,10 @@ class JobHandlerQueue(Monitors):
         elif self.user_job_count_per_destination is None:
             self.user_job_count_per_destination = {}
 
-    def increase_running_job_count(self, user_id, destination_id):
+    def increase_running_job_count(self, user_id, destination_id, job_id=None):
+        if self.job_count_ledger is not None and job_id is not None:
+            self.job_count_ledger.job_dispatched(job_id, user_id, destination_id)
+            return
         if self.app.job_config.limits.registered_user_concurrent_jobs or \
            self.app.job_config.limits.anonymous_user_concurrent_jobs or \
            self.app.job_config.limits.destination_user_concurrent_jobs:
@@ -804,7 +1061,7 @@ class JobHandlerQueue(Monitors):
         """Add a job to the queue (by job identifier)"""
         if not self.track_jobs_in_database:
             self.queue.put((job_id, tool_id))
-            self.sleeper.wake()
+        self.notify()
 
     def shutdown(self):
         """Attempts to gracefully shut down the worker thread"""
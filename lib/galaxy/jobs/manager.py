@@ -2,6 +2,7 @@
 Top-level Galaxy job manager, moves jobs to handler(s)
 """
 import logging
+import time
 from functools import partial
 
 from sqlalchemy.sql.expression import null
@@ -9,10 +10,14 @@ from sqlalchemy.sql.expression import null
 from galaxy.exceptions import HandlerAssignmentError, ToolExecutionError
 from galaxy.jobs import handler, NoopQueue
 from galaxy.model import Job
+from galaxy.queue_worker import send_control_task
 from galaxy.web.stack.message import JobHandlerMessage
 
 log = logging.getLogger(__name__)
 
+# Minimum number of seconds between job handler wake up messages sent by a process.
+NOTIFY_JOB_HANDLERS_INTERVAL = 1
+
 
 class JobManager(object):
     """
@@ -21,6 +26,7 @@ class JobManager(object):
     def __init__(self, app):
         self.app = app
         self.job_lock = False
+        self._last_handler_notification = 0
         if self.app.is_job_handler:
             log.debug("Initializing job handler")
             self.job_handler = handler.JobHandler(app)
@@ -49,7 +55,7 @@ class JobManager(object):
     def _message_callback(self, job):
         return JobHandlerMessage(task='setup', job_id=job.id)
 
-    def enqueue(self, job, tool=None):
+    def enqueue(self, job, tool=None, flush=True):
         """Queue a job for execution.
 
         Due to the nature of some handler assignment methods which are wholly DB-based, the enqueue method will flush
@@ -60,6 +66,9 @@ class JobManager(object):
         :type job:      Instance of :class:`galaxy.model.Job`.
         :param tool:    Tool that the job will execute.
         :type tool:     Instance of :class:`galaxy.tools.Tool`.
+        :param flush:   Flush the job after assigning a handler. Callers enqueuing many jobs at once may pass False,
+                        flush the jobs beforehand (so they have ids) and flush them again once all have been enqueued.
+        :type flush:    bool
 
         :raises ToolExecutionError: if a handler was unable to be assigned.
         returns: str or None -- Handler ID, tag, or pool assigned to the job.
@@ -75,10 +84,33 @@ class JobManager(object):
         queue_callback = partial(self._queue_callback, job, tool_id)
         message_callback = partial(self._message_callback, job)
         try:
-            return self.app.job_config.assign_handler(
-                job, configured=configured_handler, queue_callback=queue_callback, message_callback=message_callback)
+            handler = self.app.job_config.assign_handler(
+                job, configured=configured_handler, flush=flush, queue_callback=queue_callback, message_callback=message_callback)
         except HandlerAssignmentError as exc:
             raise ToolExecutionError(exc.args[0], job=exc.obj)
+        self.notify_job_handlers()
+        return handler
+
+    def notify_job_handlers(self):
+        """Wake up job handlers so they check for new or newly ready jobs.
+
+        The handler in this process (if any) is woken up directly. If job
+        handlers back off polling while idle (``job_handler_monitor_max_sleep``
+        is larger than one second) the other processes are notified with a
+        ``wake_job_handlers`` control task, sent at most once every
+        ``NOTIFY_JOB_HANDLERS_INTERVAL`` seconds.
+        """
+        self.job_handler.job_queue.notify()
+        if getattr(self.app.config, "job_handler_monitor_max_sleep", 1) <= 1:
+            return
+        now = time.time()
+        if now - self._last_handler_notification < NOTIFY_JOB_HANDLERS_INTERVAL:
+            return
+        self._last_handler_notification = now
+        try:
+            send_control_task(self.app, 'wake_job_handlers', noop_self=True)
+        except Exception:
+            log.exception("Failed to send wake_job_handlers control task")
 
     def stop(self, job, message=None):
         """Stop a job that is currently executing.
@@ -109,6 +141,9 @@ class NoopManager(object):
     def stop(self, *args, **kwargs):
         pass
 
+    def notify_job_handlers(self):
+        pass
+
 
 class NoopHandler(object):
     """
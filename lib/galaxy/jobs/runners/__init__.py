@@ -13,6 +13,7 @@ import traceback
 
 from six.moves.queue import (
     Empty,
+    Full,
     Queue
 )
 
@@ -44,6 +45,11 @@ log = logging.getLogger(__name__)
 
 STOP_SIGNAL = object()
 
+# Work queue methods handled by the job finishing stage, if there is one.
+FINISHING_METHODS = frozenset(['finish_job', 'fail_job'])
+# Seconds between log messages reporting the runner's stage statistics.
+STAGE_STATS_LOG_INTERVAL = 60
+
 
 JOB_RUNNER_PARAMETER_UNKNOWN_MESSAGE = "Invalid job runner parameter for this plugin: %s"
 JOB_RUNNER_PARAMETER_MAP_PROBLEM_MESSAGE = "Job runner parameter '%s' value '%s' could not be converted to the correct type"
@@ -65,8 +71,107 @@ class RunnerParams(ParamsWithSpecs):
         raise Exception(JOB_RUNNER_PARAMETER_VALIDATION_FAILED_MESSAGE % name)
 
 
+class JobFinishingStage(object):
+    """
+    Pool of threads finishing and failing jobs, separate from a runner's
+    worker threads so that queueing new jobs and finishing quick jobs does
+    not wait behind the collection of one huge output.
+
+    Jobs are sharded across the threads by Galaxy job id, so work for one job
+    is handled in order. Each shard's queue is bounded; once it is full,
+    whoever hands over more work (usually the runner's monitor thread) blocks
+    until the shard catches up.
+    """
+
+    def __init__(self, name, nworkers, max_queue_size=0):
+        self.name = name
+        self.queues = [Queue(maxsize=max_queue_size) for _ in range(nworkers)]
+        self.threads = []
+        for i, queue in enumerate(self.queues):
+            thread = threading.Thread(name="%s.finish_thread-%d" % (name, i), target=self.run, args=(queue,))
+            thread.daemon = True
+            self.threads.append(thread)
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.total_wait = 0.0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+
+    def start(self):
+        for thread in self.threads:
+            thread.start()
+
+    def shard(self, job_state):
+        try:
+            return int(job_state.job_wrapper.job_id) % len(self.queues)
+        except (TypeError, ValueError):
+            return hash(job_state.job_wrapper.get_id_tag()) % len(self.queues)
+
+    def put(self, method, job_state):
+        self.queues[self.shard(job_state)].put((method, job_state, time.time()))
+
+    def run(self, queue):
+        while True:
+            method, job_state, queued_at = queue.get()
+            if method is STOP_SIGNAL:
+                return
+            started_at = time.time()
+            try:
+                method(job_state)
+            except Exception:
+                log.exception("(%s) Unhandled exception calling %s" % (job_state.job_wrapper.get_id_tag(), method.__name__))
+            duration = time.time() - started_at
+            with self._lock:
+                self.processed += 1
+                self.total_wait += started_at - queued_at
+                self.total_duration += duration
+                self.max_duration = max(self.max_duration, duration)
+
+    def stats(self):
+        """Return the depth of each shard's queue and wait and finishing times in seconds."""
+        with self._lock:
+            processed = self.processed
+            return dict(
+                queue_depths=[queue.qsize() for queue in self.queues],
+                processed=processed,
+                mean_wait=self.total_wait / processed if processed else 0.0,
+                mean_duration=self.total_duration / processed if processed else 0.0,
+                max_duration=self.max_duration,
+            )
+
+    def shutdown(self):
+        for queue in self.queues:
+            try:
+                queue.put_nowait((STOP_SIGNAL, None, None))
+            except Full:
+                # The threads are daemon threads, give up on this one.
+                pass
+
+
+class RunnerWorkQueue(Queue):
+    """
+    A runner's work queue, passing work on to the runner's job finishing
+    stage where there is one.
+    """
+
+    def __init__(self, finishing_stage=None):
+        Queue.__init__(self)
+        self.finishing_stage = finishing_stage
+
+    def put(self, item, block=True, timeout=None):
+        method, arg = item
+        if self.finishing_stage is not None and getattr(method, '__name__', None) in FINISHING_METHODS and isinstance(arg, AsynchronousJobState):
+            self.finishing_stage.put(method, arg)
+        else:
+            Queue.put(self, item, block, timeout)
+
+
 class BaseJobRunner(object):
-    DEFAULT_SPECS = dict(recheck_missing_job_retries=dict(map=int, valid=lambda x: int(x) >= 0, default=0))
+    DEFAULT_SPECS = dict(
+        recheck_missing_job_retries=dict(map=int, valid=lambda x: int(x) >= 0, default=0),
+        finish_workers=dict(map=int, valid=lambda x: int(x) >= 0, default=0),
+        finish_queue_size=dict(map=int, valid=lambda x: int(x) >= 0, default=100),
+    )
 
     def __init__(self, app, nworkers, **kwargs):
         """Start the job runner
@@ -85,8 +190,15 @@ class BaseJobRunner(object):
 
     def _init_worker_threads(self):
         """Start ``nworkers`` worker threads.
+
+        If the ``finish_workers`` plugin parameter is set, jobs are finished
+        by a separate :class:`JobFinishingStage` with that many threads.
         """
-        self.work_queue = Queue()
+        self.finishing_stage = None
+        if self.runner_params.finish_workers:
+            self.finishing_stage = JobFinishingStage(self.runner_name, self.runner_params.finish_workers, self.runner_params.finish_queue_size)
+            self.app.application_stack.register_postfork_function(self.finishing_stage.start)
+        self.work_queue = RunnerWorkQueue(self.finishing_stage)
         self.work_threads = []
         log.debug('Starting %s %s workers' % (self.nworkers, self.runner_name))
         for i in range(self.nworkers):
@@ -149,6 +261,8 @@ class BaseJobRunner(object):
         log.info("%s: Sending stop signal to %s job worker threads", self.runner_name, len(self.work_threads))
         for i in range(len(self.work_threads)):
             self.work_queue.put((STOP_SIGNAL, None))
+        if getattr(self, 'finishing_stage', None) is not None:
+            self.finishing_stage.shutdown()
 
         join_timeout = self.app.config.monitor_thread_join_timeout
         if join_timeout > 0:
@@ -177,6 +291,13 @@ class BaseJobRunner(object):
                 log.warning("Timed out waiting for job worker thread %s to terminate, shutdown will be unclean! Thread "
                             "stack is:\n%s", thread.name, ''.join(traceback.format_stack(frame)))
 
+    def get_stage_stats(self):
+        """Return the number of items waiting for the worker threads and the finishing stage's statistics."""
+        stats = dict(work_queue_depth=self.work_queue.qsize())
+        if getattr(self, 'finishing_stage', None) is not None:
+            stats['finishing'] = self.finishing_stage.stats()
+        return stats
+
     # Most runners should override the legacy URL handler methods and destination param method
     def url_to_destination(self, url):
         """
@@ -665,6 +786,7 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
         # to 'watched' and then manage the watched jobs.
         self.watched = []
         self.monitor_queue = Queue()
+        self._stage_stats_logged = 0
 
     def _init_monitor_thread(self):
         name = "%s.monitor_thread" % self.runner_name
@@ -696,6 +818,9 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
                 self.check_watched_items()
             except Exception:
                 log.exception('Unhandled exception checking active jobs')
+            if getattr(self, 'finishing_stage', None) is not None and time.time() > self._stage_stats_logged + STAGE_STATS_LOG_INTERVAL:
+                log.debug("%s: %d watched jobs, stages: %s", self.runner_name, len(self.watched), self.get_stage_stats())
+                self._stage_stats_logged = time.time()
             # Sleep a bit before the next state check
             time.sleep(1)
 
@@ -729,6 +854,16 @@ class AsynchronousJobRunner(BaseJobRunner, Monitors):
     def check_watched_item(self, job_state):
         raise NotImplementedError()
 
+    def get_watched_job_states(self, watched):
+        """
+        Return the states of the jobs in ``watched`` as a dict keyed by
+        external job id, fetched with one (or at least few) queries to the
+        external system, or None if this runner cannot query job states in
+        bulk. Runners fall back to checking jobs missing from the returned
+        dict individually.
+        """
+        return None
+
     def finish_job(self, job_state):
         """
         Get the output/error for a finished job, pass to `job_wrapper.finish`
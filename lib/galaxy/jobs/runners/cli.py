@@ -2,6 +2,7 @@
 Job control via a command line interface (e.g. qsub/qstat), possibly over a remote connection (e.g. ssh).
 """
 
+import json
 import logging
 import time
 
@@ -150,7 +151,7 @@ class ShellJobRunner(AsynchronousJobRunner):
         """
         new_watched = []
 
-        job_states = self.__get_job_states()
+        job_states = self.get_watched_job_states(self.watched)
 
         for ajs in self.watched:
             external_job_id = ajs.job_id
@@ -202,21 +203,29 @@ class ShellJobRunner(AsynchronousJobRunner):
                 ajs.runner_state = JobState.runner_states.MEMORY_LIMIT_REACHED
                 ajs.fail_message = "Tool failed due to insufficient memory. Try with more memory."
 
-    def __get_job_states(self):
-        job_destinations = {}
+    def get_watched_job_states(self, watched):
+        """
+        Query job states once for all watched jobs of destinations sharing a
+        shell and status command (i.e. the same cluster), instead of once per
+        destination.
+        """
+        status_queries = {}
+        query_keys_by_destination = {}
+        for ajs in watched:
+            job_destination = ajs.job_destination
+            if job_destination.id not in query_keys_by_destination:
+                shell_params, job_params = self.parse_destination_params(job_destination.params)
+                shell, job_interface = self.get_cli_plugins(shell_params, job_params)
+                query_key = (json.dumps(shell_params, sort_keys=True), job_params.get('plugin'), job_interface.get_status())
+                query_keys_by_destination[job_destination.id] = query_key
+                if query_key not in status_queries:
+                    status_queries[query_key] = dict(shell=shell, job_interface=job_interface, job_ids=set())
+            status_queries[query_keys_by_destination[job_destination.id]]['job_ids'].add(ajs.job_id)
         job_states = {}
-        # unique the list of destinations
-        for ajs in self.watched:
-            if ajs.job_destination.id not in job_destinations:
-                job_destinations[ajs.job_destination.id] = dict(job_destination=ajs.job_destination, job_ids=[ajs.job_id])
-            else:
-                job_destinations[ajs.job_destination.id]['job_ids'].append(ajs.job_id)
-        # check each destination for the listed job ids
-        for job_destination_id, v in job_destinations.items():
-            job_destination = v['job_destination']
-            job_ids = v['job_ids']
-            shell_params, job_params = self.parse_destination_params(job_destination.params)
-            shell, job_interface = self.get_cli_plugins(shell_params, job_params)
+        for status_query in status_queries.values():
+            shell = status_query['shell']
+            job_interface = status_query['job_interface']
+            job_ids = status_query['job_ids']
             cmd_out = shell.execute(job_interface.get_status(job_ids))
             assert cmd_out.returncode == 0, cmd_out.stderr
             job_states.update(job_interface.parse_status(cmd_out.stdout, job_ids))
@@ -92,6 +92,8 @@ class DRMAAJobRunner(AsynchronousJobRunner):
         self.ds = DrmaaSessionFactory().get()
 
         self.userid = None
+        # External states of watched jobs fetched in bulk this monitor cycle.
+        self.watched_job_states = {}
 
         self._init_monitor_thread()
         self._init_worker_threads()
@@ -271,7 +273,9 @@ class DRMAAJobRunner(AsynchronousJobRunner):
         state = None
         try:
             assert external_job_id not in (None, 'None'), '(%s/%s) Invalid job id' % (galaxy_id_tag, external_job_id)
-            state = self.ds.job_status(external_job_id)
+            state = self.watched_job_states.get(external_job_id)
+            if state is None:
+                state = self.ds.job_status(external_job_id)
             # Reset exception retries
             for retry_exception in RETRY_EXCEPTIONS_LOWER:
                 setattr(ajs, retry_exception + '_retries', 0)
@@ -315,6 +319,7 @@ class DRMAAJobRunner(AsynchronousJobRunner):
         with state changes.
         """
         new_watched = []
+        self.watched_job_states = self.get_watched_job_states(self.watched) or {}
         for ajs in self.watched:
             external_job_id = ajs.job_id
             galaxy_id_tag = ajs.job_wrapper.get_id_tag()
@@ -340,6 +345,7 @@ class DRMAAJobRunner(AsynchronousJobRunner):
             new_watched.append(ajs)
         # Replace the watch list with the updated version
         self.watched = new_watched
+        self.watched_job_states = {}
 
     def stop_job(self, job_wrapper):
         """Attempts to delete a job from the DRM queue"""
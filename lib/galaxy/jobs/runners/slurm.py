@@ -10,6 +10,10 @@ import time
 
 from galaxy import model
 from galaxy.jobs.runners.drmaa import DRMAAJobRunner
+from galaxy.util import (
+    asbool,
+    unicodify,
+)
 from galaxy.util.logging import get_logger
 
 log = get_logger(__name__)
@@ -41,11 +45,50 @@ SLURM_TOP_WARNING_RES = (
 OUT_OF_MEMORY_MSG = 'This job was terminated because it used more memory than it was allocated.'
 PROBABLY_OUT_OF_MEMORY_MSG = 'This job was cancelled probably because it used more memory than it was allocated.'
 
+# Lists the id and compact state of all jobs in one call for bulk status checks
+SQUEUE_STATUS_COMMAND = ['squeue', '-a', '-h', '-o', '%A %t']
+# Compact squeue states of jobs that have not terminated, mapped to the names
+# of the corresponding DRMAA job states. Other states are left to DRMAA.
+SQUEUE_DRMAA_STATES = {
+    'PD': 'QUEUED_ACTIVE',
+    'CF': 'RUNNING',
+    'R': 'RUNNING',
+    'CG': 'RUNNING',
+}
+
 
 class SlurmJobRunner(DRMAAJobRunner):
     runner_name = "SlurmRunner"
     restrict_job_name_length = False
 
+    def __init__(self, app, nworkers, **kwargs):
+        runner_param_specs = dict(bulk_status_check=dict(map=asbool, default=False))
+        if 'runner_param_specs' not in kwargs:
+            kwargs['runner_param_specs'] = dict()
+        kwargs['runner_param_specs'].update(runner_param_specs)
+        super(SlurmJobRunner, self).__init__(app, nworkers, **kwargs)
+
+    def get_watched_job_states(self, watched):
+        """
+        With the ``bulk_status_check`` plugin parameter, get the state of all
+        queued and running jobs with a single ``squeue`` call instead of
+        asking DRMAA about each job.
+
+        Jobs that have terminated (and jobs using the cluster job id syntax)
+        are not included and so are still checked through DRMAA.
+        """
+        if not self.runner_params.bulk_status_check:
+            return None
+        job_ids = set(ajs.job_id for ajs in watched if '.' not in ajs.job_id)
+        if not job_ids:
+            return {}
+        p = subprocess.Popen(SQUEUE_STATUS_COMMAND, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate()
+        if p.returncode != 0:
+            log.warning('`%s` returned %s, checking job states individually, stderr: %s', ' '.join(SQUEUE_STATUS_COMMAND), p.returncode, unicodify(stderr).strip())
+            return None
+        return parse_squeue_states(unicodify(stdout), job_ids, self.drmaa_job_states)
+
     def _complete_terminal_job(self, ajs, drmaa_state, **kwargs):
         def _get_slurm_state_with_sacct(job_id, cluster):
             cmd = ['sacct', '-n', '-o', 'state%-32']
@@ -204,6 +247,27 @@ class SlurmJobRunner(DRMAAJobRunner):
         return False
 
 
+def parse_squeue_states(stdout, job_ids, drmaa_job_states):
+    """
+    Map the output of ``SQUEUE_STATUS_COMMAND`` to DRMAA states for the jobs
+    in ``job_ids``.
+
+    >>> from galaxy.util.bunch import Bunch
+    >>> states = Bunch(QUEUED_ACTIVE='queued_active', RUNNING='running')
+    >>> sorted(parse_squeue_states("12 PD\\n13 R\\n14 CD\\n15 R\\n", set(["12", "13", "14"]), states).items())
+    [('12', 'queued_active'), ('13', 'running')]
+    """
+    states = {}
+    for line in stdout.splitlines():
+        fields = line.split()
+        if len(fields) != 2 or fields[0] not in job_ids:
+            continue
+        state = SQUEUE_DRMAA_STATES.get(fields[1])
+        if state is not None:
+            states[fields[0]] = getattr(drmaa_job_states, state)
+    return states
+
+
 def _remove_spurious_top_lines(rfh, ajs, maxlines=3):
     bad = []
     putback = None
@@ -40,6 +40,9 @@ from galaxy.util import namedtuple
 
 log = logging.getLogger(__name__)
 
+# Number of items whose ids are encoded together when serializing lists.
+ENCODE_IDS_BATCH_SIZE = 1000
+
 parsed_filter = namedtuple("ParsedFilter", "filter_type filter")
 
 
@@ -649,6 +652,16 @@ class ModelSerializer(HasAModelManager):
         # Note: it may not be best to encode the id at this layer
         return self.app.security.encode_id(id) if id is not None else None
 
+    def encode_ids_of(self, items, keys=('id', )):
+        """
+        Encode the ids in the attributes `keys` of `items` with one call,
+        serializing the items then reads them from the encoded id cache.
+        """
+        if not getattr(self.app.security, 'id_cache_size', 0):
+            return
+        ids = [getattr(item, key) for item in items for key in keys]
+        self.app.security.encode_ids([id for id in ids if id is not None])
+
     def serialize_type_id(self, item, key, **context):
         """
         Serialize an type-id for `item`.
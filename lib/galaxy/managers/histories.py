@@ -293,6 +293,13 @@ class HistorySerializer(sharable.SharableModelSerializer, deletable.PurgableSeri
         for state in model.Dataset.states.values():
             state_counts[state] = 0
 
+        cached_counts = self.manager.contents_manager.dataset_state_counts(history,
+            exclude_deleted=exclude_deleted, exclude_hidden=exclude_hidden)
+        if cached_counts is not None:
+            for state, count in cached_counts.items():
+                state_counts[state] = state_counts.get(state, 0) + count
+            return state_counts
+
         # TODO:?? collections and coll. states?
         for hda in history.datasets:
             if exclude_deleted and hda.deleted:
@@ -2,7 +2,11 @@
 Heterogenous lists/contents are difficult to query properly since unions are
 not easily made.
 """
+import datetime
 import logging
+import threading
+import time
+from collections import OrderedDict
 
 from sqlalchemy import (
     asc,
@@ -36,6 +40,119 @@ from galaxy.managers import (
 log = logging.getLogger(__name__)
 
 
+class HistoryContentsSummary(object):
+    """
+    Counts of the contents of a single history keyed by
+    (history_content_type, state, dataset instance state, deleted, visible).
+
+    The state of each content item is remembered so rows for items that
+    have changed can be applied again without counting an item twice.
+    """
+
+    def __init__(self):
+        # (history_content_type, id) -> counts key
+        self.items = {}
+        self.counts = {}
+        # (utc) time the rows last applied were queried
+        self.checked_at = None
+        self.last_reconcile = None
+
+    def reconcile(self, dataset_rows, collection_rows, checked_at):
+        self.items = {}
+        self.counts = {}
+        self.update(dataset_rows, collection_rows, checked_at)
+        self.last_reconcile = time.time()
+
+    def update(self, dataset_rows, collection_rows, checked_at):
+        """
+        Apply `dataset_rows` of (id, dataset state, instance state, deleted,
+        visible) for changed datasets and `collection_rows` of (id, populated
+        state, deleted, visible) for all collections, queried at `checked_at`.
+        """
+        for id, state, instance_state, deleted, visible in dataset_rows:
+            self._set_item(('dataset', id), ('dataset', state, instance_state or state, bool(deleted), bool(visible)))
+        collection_keys = set()
+        for id, state, deleted, visible in collection_rows:
+            collection_keys.add(('dataset_collection', id))
+            self._set_item(('dataset_collection', id), ('dataset_collection', state, state, bool(deleted), bool(visible)))
+        removed = [k for k in self.items if k[0] == 'dataset_collection' and k not in collection_keys]
+        for item_key in removed:
+            self._remove_item(item_key)
+        self.checked_at = checked_at
+
+    def _set_item(self, item_key, counts_key):
+        previous = self.items.get(item_key)
+        if previous == counts_key:
+            return
+        if previous is not None:
+            self._remove_item(item_key)
+        self.items[item_key] = counts_key
+        self.counts[counts_key] = self.counts.get(counts_key, 0) + 1
+
+    def _remove_item(self, item_key):
+        counts_key = self.items.pop(item_key)
+        self.counts[counts_key] -= 1
+        if not self.counts[counts_key]:
+            del self.counts[counts_key]
+
+
+class HistoryContentsSummaryCache(object):
+    """
+    Keeps a `HistoryContentsSummary` for recently used histories so the state
+    and active counts of a history can be read without aggregating over all
+    of its contents.
+
+    Summaries are rebuilt from the database every `reconcile_interval`
+    seconds. In between, only the datasets whose instance or dataset
+    update_time is later than the time of the previous read (less
+    `UPDATE_TIME_OVERLAP`, to allow for clock differences and for changes
+    committed after they were stamped) are read again, which picks up state,
+    deleted and visible changes. Dataset collections carry no update_time for
+    these changes and, being few, are read in full.
+    """
+    UPDATE_TIME_OVERLAP = datetime.timedelta(seconds=5)
+
+    def __init__(self, reconcile_interval, max_histories=1000):
+        self.reconcile_interval = reconcile_interval
+        self.max_histories = max_histories
+        self.lock = threading.Lock()
+        self._summaries = OrderedDict()
+
+    def counts(self, history_id, query_rows):
+        """
+        Return a copy of the counts for the history with `history_id`.
+
+        `query_rows(history_id, since)` must return the dataset and collection
+        rows for `HistoryContentsSummary.update` with `since` the update_time
+        after which datasets should be returned, or None for all of them.
+        """
+        with self.lock:
+            summary = self._summaries.pop(history_id, None)
+            if summary is not None:
+                self._summaries[history_id] = summary
+        checked_at = datetime.datetime.utcnow()
+        if summary is None or time.time() - summary.last_reconcile >= self.reconcile_interval:
+            summary = HistoryContentsSummary()
+            summary.reconcile(*query_rows(history_id, None), checked_at=checked_at)
+        else:
+            dataset_rows, collection_rows = query_rows(history_id, summary.checked_at - self.UPDATE_TIME_OVERLAP)
+            with self.lock:
+                summary.update(dataset_rows, collection_rows, checked_at)
+        with self.lock:
+            self._summaries.pop(history_id, None)
+            self._summaries[history_id] = summary
+            while len(self._summaries) > self.max_histories:
+                self._summaries.popitem(last=False)
+            return dict(summary.counts)
+
+    def clear(self, history_id=None):
+        with self.lock:
+            if history_id is None:
+                self._summaries.clear()
+            else:
+                self._summaries.pop(history_id, None)
+
+
 # into its own class to have it's own filters, etc.
 # TODO: but can't inherit from model manager (which assumes only one model)
 class HistoryContentsManager(containers.ContainerManagerMixin):
@@ -76,6 +193,8 @@ class HistoryContentsManager(containers.ContainerManagerMixin):
         self.app = app
         self.contained_manager = self.contained_class_manager_class(app)
         self.subcontainer_manager = self.subcontainer_class_manager_class(app)
+        # shared between managers, see HistoryContentsSummaryCache
+        self.summary_cache = getattr(app, 'history_contents_summary_cache', None)
 
     # ---- interface
     def contained(self, container, filters=None, limit=None, offset=None, order_by=None, **kwargs):
@@ -105,6 +224,21 @@ class HistoryContentsManager(containers.ContainerManagerMixin):
         return self._union_of_contents(container,
             filters=filters, limit=limit, offset=offset, order_by=order_by, **kwargs)
 
+    def contents_rows(self, container, filters=None, limit=None, offset=None, order_by=None, **kwargs):
+        """
+        Returns the rows of the contents union query (the `common_columns` of
+        both types of contents) without loading the models themselves.
+
+        Filters that need a loaded model (`function` filters) can't be applied
+        to these rows and will raise an error.
+        """
+        for filter_fn in (filters or []):
+            if filter_fn.filter_type == 'function':
+                raise glx_exceptions.RequestParameterInvalidException(
+                    'Filter cannot be applied without loading the contents: %s' % (filter_fn.filter, ))
+        return self._union_of_contents(container, expand_models=False,
+            filters=filters, limit=limit, offset=offset, order_by=order_by, **kwargs)
+
     def contents_count(self, container, filters=None, limit=None, offset=None, order_by=None, **kwargs):
         """
         Returns a count of both/all types of contents, based on the given filters.
@@ -152,6 +286,12 @@ class HistoryContentsManager(containers.ContainerManagerMixin):
 
         Note: does not include deleted/hidden contents.
         """
+        if self.summary_cache is not None:
+            returned = {}
+            for (content_type, state, instance_state, deleted, visible), count in self._summary_counts(history).items():
+                if not deleted and visible:
+                    returned[state] = returned.get(state, 0) + count
+            return returned
         filters = [
             base.ModelFilterParser.parsed_filter("orm", sql.column('deleted') == false()),
             base.ModelFilterParser.parsed_filter("orm", sql.column('visible') == true())
@@ -172,16 +312,19 @@ class HistoryContentsManager(containers.ContainerManagerMixin):
         both deleted and hidden will be added to both totals.
         """
         returned = dict(deleted=0, hidden=0, active=0)
-        contents_subquery = self._union_of_contents_query(history).subquery()
-        columns = [
-            sql.column('deleted'),
-            sql.column('visible'),
-            func.count('*')
-        ]
-        statement = (sql.select(columns)
-            .select_from(contents_subquery)
-            .group_by(sql.column('deleted'), sql.column('visible')))
-        groups = self.app.model.context.execute(statement).fetchall()
+        if self.summary_cache is not None:
+            groups = [(deleted, visible, count) for (_, _, _, deleted, visible), count in self._summary_counts(history).items()]
+        else:
+            contents_subquery = self._union_of_contents_query(history).subquery()
+            columns = [
+                sql.column('deleted'),
+                sql.column('visible'),
+                func.count('*')
+            ]
+            statement = (sql.select(columns)
+                .select_from(contents_subquery)
+                .group_by(sql.column('deleted'), sql.column('visible')))
+            groups = self.app.model.context.execute(statement).fetchall()
         for deleted, visible, count in groups:
             if deleted:
                 returned['deleted'] += count
@@ -191,6 +334,55 @@ class HistoryContentsManager(containers.ContainerManagerMixin):
                 returned['active'] += count
         return returned
 
+    def dataset_state_counts(self, history, exclude_deleted=True, exclude_hidden=False):
+        """
+        Return a dictionary of the number of datasets in `history` in each
+        state (as reported by the datasets themselves), read from the summary
+        cache. Returns None if the summary cache is not enabled.
+        """
+        if self.summary_cache is None:
+            return None
+        returned = {}
+        for (content_type, state, instance_state, deleted, visible), count in self._summary_counts(history).items():
+            if content_type != 'dataset' or (exclude_deleted and deleted) or (exclude_hidden and not visible):
+                continue
+            returned[instance_state] = returned.get(instance_state, 0) + count
+        return returned
+
+    def _summary_counts(self, history):
+        return self.summary_cache.counts(history.id, self._summary_rows)
+
+    def _summary_rows(self, history_id, since):
+        """
+        Return the rows needed by `HistoryContentsSummary.update`: datasets of
+        the history updated after `since` (all if None) and all collections.
+        """
+        HDA = self.contained_class
+        HDCA = self.subcontainer_class
+
+        def dataset_query(*criteria):
+            return (self._session().query(HDA.id, model.Dataset.state, HDA._state, HDA.deleted, HDA.visible)
+                .join(model.Dataset, model.Dataset.id == HDA.dataset_id)
+                .filter(HDA.history_id == history_id, *criteria))
+
+        if since is None:
+            dataset_rows = dataset_query().all()
+        else:
+            # select the changed ids with subqueries (rather than an OR) so they're found
+            # using the update_time indexes and not by scanning the whole history
+            hda_table = HDA.table
+            dataset_table = model.Dataset.table
+            changed_datasets = sql.select([dataset_table.c.id]).where(dataset_table.c.update_time >= since)
+            dataset_rows = dataset_query(HDA.id.in_(sql.select([hda_table.c.id])
+                .where(hda_table.c.dataset_id.in_(changed_datasets)))).all()
+            dataset_rows.extend(dataset_query(HDA.id.in_(sql.select([hda_table.c.id])
+                .where(hda_table.c.update_time >= since))).all())
+        collection_rows = (self._session().query(HDCA.id, model.DatasetCollection.populated_state, HDCA.deleted, HDCA.visible)
+            .join(model.DatasetCollection, model.DatasetCollection.id == HDCA.collection_id)
+            .filter(HDCA.history_id == history_id)
+            .all())
+        return dataset_rows, collection_rows
+
     def map_datasets(self, history, fn, **kwargs):
         """
         Iterate over the datasets of a given history, recursing into collections, and
@@ -438,6 +630,8 @@ class HistoryContentsSerializer(base.ModelSerializer, deletable.PurgableSerializ
             "create_time",
             "update_time",
         ])
+        # the columns of the contents union query can be serialized directly from its rows
+        self.serializable_keyset.update(self.model_manager_class.common_columns)
 
     # assumes: outgoing to json.dumps and sanitized
     def add_serializers(self):
@@ -457,6 +651,22 @@ class HistoryContentsSerializer(base.ModelSerializer, deletable.PurgableSerializ
             raise base.SkipAttribute('no such attribute')
         return self.serialize_id(content, key, **context)
 
+    def serialize_columns(self, rows, keys, **context):
+        """
+        Serialize `rows` (from `HistoryContentsManager.contents_rows`) into a
+        dictionary mapping each of `keys` to the list of its values.
+        """
+        columns = dict((key, []) for key in keys)
+        id_keys = [key for key in ('id', 'dataset_id', 'collection_id') if key in keys or key == 'id' and 'type_id' in keys]
+        rows = list(rows)
+        for i, row in enumerate(rows):
+            if id_keys and i % base.ENCODE_IDS_BATCH_SIZE == 0:
+                self.encode_ids_of(rows[i:i + base.ENCODE_IDS_BATCH_SIZE], id_keys)
+            serialized = self.serialize(row, keys, **context)
+            for key in keys:
+                columns[key].append(serialized.get(key))
+        return columns
+
 
 class HistoryContentsFilters(base.ModelFilterParser,
                              annotatable.AnnotatableFilterMixin,
@@ -487,7 +697,20 @@ class HistoryContentsFilters(base.ModelFilterParser,
                     return sql.column('type_id').in_(self.parse_type_id_list(val))
                 self.raise_filter_err(attr, op, val, 'bad op in filter')
 
+            if attr == 'hid':
+                if op in ('eq', 'gt', 'ge', 'lt', 'le'):
+                    try:
+                        hid = int(val)
+                    except ValueError:
+                        self.raise_filter_err(attr, op, val, 'bad value in filter')
+                    return self._convert_op_string_to_fn(sql.column('hid'), op)(hid)
+                self.raise_filter_err(attr, op, val, 'bad op in filter')
+
             if attr in ('update_time', 'create_time'):
+                if op == 'gt':
+                    return sql.column(attr) > self.parse_date(val)
+                if op == 'lt':
+                    return sql.column(attr) < self.parse_date(val)
                 if op == 'ge':
                     return sql.column(attr) >= self.parse_date(val)
                 if op == 'le':
@@ -533,12 +756,12 @@ class HistoryContentsFilters(base.ModelFilterParser,
         self.orm_filter_parsers.update({
             'history_content_type' : {'op': ('eq')},
             'type_id'       : {'op': ('eq', 'in'), 'val': self.parse_type_id_list},
-            'hid'           : {'op': ('eq', 'ge', 'le'), 'val': int},
+            'hid'           : {'op': ('eq', 'gt', 'ge', 'lt', 'le'), 'val': int},
             # TODO: needs a different val parser - but no way to add to the above
             # 'hid-in'        : { 'op': ( 'in' ), 'val': self.parse_int_list },
             'name'          : {'op': ('eq', 'contains', 'like')},
             'state'         : {'op': ('eq', 'in')},
             'visible'       : {'op': ('eq'), 'val': self.parse_bool},
-            'create_time'   : {'op': ('le', 'ge'), 'val': self.parse_date},
-            'update_time'   : {'op': ('le', 'ge'), 'val': self.parse_date},
+            'create_time'   : {'op': ('le', 'ge', 'lt', 'gt'), 'val': self.parse_date},
+            'update_time'   : {'op': ('le', 'ge', 'lt', 'gt'), 'val': self.parse_date},
         })
@@ -25,6 +25,8 @@ from social_core.storage import AssociationMixin, CodeMixin, NonceMixin, Partial
 from sqlalchemy import (
     alias,
     and_,
+    exists,
+    false,
     func,
     inspect,
     join,
@@ -503,19 +505,67 @@ class User(Dictifiable, RepresentById):
         Return byte count total of disk space used by all non-purged, non-library
         HDAs in non-purged histories.
         """
-        # maintain a list so that we don't double count
-        dataset_ids = []
-        total = 0
-        # this can be a huge number and can run out of memory, so we avoid the mappers
-        db_session = object_session(self)
-        for history in db_session.query(History).enable_eagerloads(False).filter_by(user_id=self.id, purged=False).yield_per(1000):
-            for hda in db_session.query(HistoryDatasetAssociation).enable_eagerloads(False).filter_by(history_id=history.id, purged=False).yield_per(1000):
-                # TODO: def hda.counts_toward_disk_usage():
-                #   return ( not self.dataset.purged and not self.dataset.library_associations )
-                if hda.dataset.id not in dataset_ids and not hda.dataset.purged and not hda.dataset.library_associations:
-                    dataset_ids.append(hda.dataset.id)
-                    total += hda.dataset.get_total_size()
-        return total
+        return User.calculate_disk_usages(object_session(self), [self.id])[self.id]
+
+    @staticmethod
+    def calculate_disk_usages(db_session, user_ids):
+        """
+        Return a dictionary of user id to the byte count total of disk space
+        used by all non-purged, non-library HDAs in non-purged histories of
+        each of `user_ids`, counting each dataset once per user.
+
+        The usage is summed in the database in a single query over the
+        datasets; only datasets without a total size are loaded to set it.
+        """
+        usages = dict((user_id, 0) for user_id in user_ids)
+        if not usages:
+            return usages
+        hda_table = HistoryDatasetAssociation.table
+        history_table = History.table
+        dataset_table = Dataset.table
+        ldda_table = LibraryDatasetDatasetAssociation.table
+        # the distinct datasets of each user counting toward disk usage
+        user_datasets = (
+            select([
+                history_table.c.user_id.label('user_id'),
+                dataset_table.c.id.label('dataset_id'),
+                dataset_table.c.total_size.label('total_size'),
+            ])
+            .select_from(
+                hda_table
+                .join(history_table, hda_table.c.history_id == history_table.c.id)
+                .join(dataset_table, hda_table.c.dataset_id == dataset_table.c.id))
+            .where(history_table.c.user_id.in_(list(usages)))
+            .where(history_table.c.purged == false())
+            .where(hda_table.c.purged == false())
+            .where(dataset_table.c.purged == false())
+            .where(~exists().where(ldda_table.c.dataset_id == dataset_table.c.id))
+            .distinct()
+            .alias('user_datasets')
+        )
+        totals = (
+            select([
+                user_datasets.c.user_id,
+                func.coalesce(func.sum(user_datasets.c.total_size), 0),
+                func.count() - func.count(user_datasets.c.total_size),
+            ])
+            .group_by(user_datasets.c.user_id)
+        )
+        stale_user_ids = []
+        for user_id, total, stale_count in db_session.execute(totals):
+            usages[user_id] = int(total)
+            if stale_count:
+                stale_user_ids.append(user_id)
+        if stale_user_ids:
+            # for backwards compatibility, set total sizes if unset
+            stale = (
+                select([user_datasets.c.user_id, user_datasets.c.dataset_id])
+                .where(user_datasets.c.user_id.in_(stale_user_ids))
+                .where(user_datasets.c.total_size.is_(None))
+            )
+            for user_id, dataset_id in db_session.execute(stale).fetchall():
+                usages[user_id] += db_session.query(Dataset).get(dataset_id).get_total_size()
+        return usages
 
     def calculate_and_set_disk_usage(self):
         """
@@ -0,0 +1,32 @@
+"""
+Migration script to add an index on history_dataset_association.update_time,
+used to find the datasets of a history changed since a given time.
+"""
+from __future__ import print_function
+
+import logging
+
+from sqlalchemy import MetaData
+
+from galaxy.model.migrate.versions.util import (
+    add_index,
+    drop_index
+)
+
+log = logging.getLogger(__name__)
+metadata = MetaData()
+
+
+def upgrade(migrate_engine):
+    print(__doc__)
+    metadata.bind = migrate_engine
+    metadata.reflect()
+
+    add_index("ix_history_dataset_association_update_time", "history_dataset_association", "update_time", metadata)
+
+
+def downgrade(migrate_engine):
+    metadata.bind = migrate_engine
+    metadata.reflect()
+
+    drop_index("ix_history_dataset_association_update_time", "history_dataset_association", "update_time", metadata)
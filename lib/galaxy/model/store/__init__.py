@@ -1,28 +1,37 @@
 import abc
 import contextlib
 import datetime
+import io
+import logging
 import os
 import shutil
+import subprocess
 import tarfile
 import tempfile
+from collections import defaultdict
 from json import dump, dumps, load
 from uuid import uuid4
 
 import six
 from bdbag import bdbag_api as bdb
 from boltons.iterutils import remap
-from sqlalchemy.orm import eagerload_all
+from sqlalchemy import inspect, Sequence
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import eagerload_all, joinedload, object_mapper
 from sqlalchemy.sql import expression
 
 from galaxy.exceptions import MalformedContents, ObjectNotFound
 from galaxy.security.idencoding import IdEncodingHelper
 from galaxy.util import FILENAME_VALID_CHARS
 from galaxy.util import in_directory
+from galaxy.util import which
 from galaxy.util.bunch import Bunch
 from galaxy.util.path import safe_walk
 from ..item_attrs import add_item_annotation, get_item_annotation_str
 from ... import model
 
+log = logging.getLogger(__name__)
+
 ATTRS_FILENAME_HISTORY = 'history_attrs.txt'
 ATTRS_FILENAME_DATASETS = 'datasets_attrs.txt'
 ATTRS_FILENAME_JOBS = 'jobs_attrs.txt'
@@ -31,6 +40,13 @@ ATTRS_FILENAME_COLLECTIONS = 'collections_attrs.txt'
 ATTRS_FILENAME_EXPORT = 'export_attrs.txt'
 ATTRS_FILENAME_LIBRARIES = 'libraries_attrs.txt'
 GALAXY_EXPORT_VERSION = "2"
+# Name of a history archive fetched without being extracted (see
+# get_import_model_store_for_directory).
+STREAMED_ARCHIVE_FILENAME = 'history_archive'
+STREAM_CHUNK_SIZE = 1024 * 1024
+# Set in the export attributes of archives whose attribute files all come
+# before export_attrs.txt (see tar_export_directory).
+ATTRS_FIRST_KEY = 'attrs_first'
 
 
 class ImportOptions(object):
@@ -77,11 +93,16 @@ class ModelImportStore(object):
         if app is not None:
             self.sa_session = app.model.context.current
             self.sessionless = False
+            self.batch_size = getattr(app.config, "history_import_batch_size", 0)
         else:
             self.sa_session = SessionlessContext()
             self.sessionless = True
+            self.batch_size = 0
         self.user = user
         self.import_options = import_options or ImportOptions()
+        # Names of the sequences of the id columns by table name (None if ids
+        # of a table can't be preallocated).
+        self._id_sequences = {}
 
     @abc.abstractmethod
     def defines_new_history(self):
@@ -180,39 +201,9 @@ class ModelImportStore(object):
         self._flush()
 
     def _import_datasets(self, object_import_tracker, datasets_attrs, history, new_history, job):
-        object_key = self.object_key
-
+        # New dataset instances are flushed together, batch_size at a time.
+        batch = []
         for dataset_attrs in datasets_attrs:
-
-            def handle_dataset_object_edit(dataset_instance):
-                if "dataset" in dataset_attrs:
-                    assert self.import_options.allow_dataset_object_edit
-                    dataset_attributes = [
-                        "state",
-                        "deleted",
-                        "purged",
-                        "external_filename",
-                        "_extra_files_path",
-                        "file_size",
-                        "object_store_id",
-                        "total_size",
-                        "uuid"
-                    ]
-
-                    for attribute in dataset_attributes:
-                        if attribute in dataset_attrs["dataset"]:
-                            setattr(dataset_instance.dataset, attribute, dataset_attrs["dataset"][attribute])
-                    if "hashes" in dataset_attrs["dataset"]:
-                        for hash_attrs in dataset_attrs["dataset"]["hashes"]:
-                            hash_obj = model.DatasetHash()
-                            hash_obj.hash_value = hash_attrs["hash_value"]
-                            hash_obj.hash_function = hash_attrs["hash_function"]
-                            hash_obj.extra_files_path = hash_attrs["extra_files_path"]
-                            dataset_instance.dataset.hashes.append(hash_obj)
-
-                    if 'id' in dataset_attrs["dataset"] and self.import_options.allow_edit:
-                        dataset_instance.dataset.id = dataset_attrs["dataset"]['id']
-
             if 'id' in dataset_attrs and self.import_options.allow_edit and not self.sessionless:
                 hda = self.sa_session.query(model.HistoryDatasetAssociation).get(dataset_attrs["id"])
                 attributes = [
@@ -238,133 +229,201 @@ class ModelImportStore(object):
 
                         setattr(hda, attribute, value)
 
-                handle_dataset_object_edit(hda)
+                self._edit_dataset_object(hda, dataset_attrs)
                 self._flush()
             else:
-                metadata = dataset_attrs['metadata']
-
-                model_class = dataset_attrs.get("model_class", "HistoryDatasetAssociation")
-                if model_class == "HistoryDatasetAssociation":
-                    # Create dataset and HDA.
-                    dataset_instance = model.HistoryDatasetAssociation(name=dataset_attrs['name'],
-                                                                       extension=dataset_attrs['extension'],
-                                                                       info=dataset_attrs['info'],
-                                                                       blurb=dataset_attrs['blurb'],
-                                                                       peek=dataset_attrs['peek'],
-                                                                       designation=dataset_attrs['designation'],
-                                                                       visible=dataset_attrs['visible'],
-                                                                       deleted=dataset_attrs.get('deleted', False),
-                                                                       dbkey=metadata['dbkey'],
-                                                                       metadata=metadata,
-                                                                       history=history,
-                                                                       create_dataset=True,
-                                                                       flush=False,
-                                                                       sa_session=self.sa_session)
-                elif model_class == "LibraryDatasetDatasetAssociation":
-                    # Create dataset and HDA.
-                    dataset_instance = model.LibraryDatasetDatasetAssociation(name=dataset_attrs['name'],
-                                                                              extension=dataset_attrs['extension'],
-                                                                              info=dataset_attrs['info'],
-                                                                              blurb=dataset_attrs['blurb'],
-                                                                              peek=dataset_attrs['peek'],
-                                                                              designation=dataset_attrs['designation'],
-                                                                              visible=dataset_attrs['visible'],
-                                                                              deleted=dataset_attrs.get('deleted', False),
-                                                                              dbkey=metadata['dbkey'],
-                                                                              metadata=metadata,
-                                                                              create_dataset=True,
-                                                                              sa_session=self.sa_session)
-                else:
-                    raise Exception("Unknown dataset instance type encountered")
-                self._attach_raw_id_if_editing(dataset_instance, dataset_attrs)
+                dataset_instance = self._create_dataset_instance(dataset_attrs, history)
+                self._session_add(dataset_instance)
+                batch.append((dataset_instance, dataset_attrs))
+                if len(batch) >= self.batch_size:
+                    self._import_dataset_batch(object_import_tracker, batch, history, new_history, job)
+                    batch = []
+        if batch:
+            self._import_dataset_batch(object_import_tracker, batch, history, new_history, job)
+
+    def _create_dataset_instance(self, dataset_attrs, history):
+        metadata = dataset_attrs['metadata']
+
+        model_class = dataset_attrs.get("model_class", "HistoryDatasetAssociation")
+        if model_class == "HistoryDatasetAssociation":
+            # Create dataset and HDA.
+            dataset_instance = model.HistoryDatasetAssociation(name=dataset_attrs['name'],
+                                                               extension=dataset_attrs['extension'],
+                                                               info=dataset_attrs['info'],
+                                                               blurb=dataset_attrs['blurb'],
+                                                               peek=dataset_attrs['peek'],
+                                                               designation=dataset_attrs['designation'],
+                                                               visible=dataset_attrs['visible'],
+                                                               deleted=dataset_attrs.get('deleted', False),
+                                                               dbkey=metadata['dbkey'],
+                                                               metadata=metadata,
+                                                               history=history,
+                                                               create_dataset=True,
+                                                               flush=False,
+                                                               sa_session=self.sa_session)
+        elif model_class == "LibraryDatasetDatasetAssociation":
+            # Create dataset and HDA.
+            dataset_instance = model.LibraryDatasetDatasetAssociation(name=dataset_attrs['name'],
+                                                                      extension=dataset_attrs['extension'],
+                                                                      info=dataset_attrs['info'],
+                                                                      blurb=dataset_attrs['blurb'],
+                                                                      peek=dataset_attrs['peek'],
+                                                                      designation=dataset_attrs['designation'],
+                                                                      visible=dataset_attrs['visible'],
+                                                                      deleted=dataset_attrs.get('deleted', False),
+                                                                      dbkey=metadata['dbkey'],
+                                                                      metadata=metadata,
+                                                                      create_dataset=True,
+                                                                      flush=False,
+                                                                      sa_session=self.sa_session)
+        else:
+            raise Exception("Unknown dataset instance type encountered")
+        self._attach_raw_id_if_editing(dataset_instance, dataset_attrs)
+
+        # Older style...
+        if 'uuid' in dataset_attrs:
+            dataset_instance.dataset.uuid = dataset_attrs["uuid"]
+        if 'dataset_uuid' in dataset_attrs:
+            dataset_instance.dataset.uuid = dataset_attrs["dataset_uuid"]
+        return dataset_instance
+
+    def _import_dataset_batch(self, object_import_tracker, batch, history, new_history, job):
+        """Flush new dataset instances (created by _create_dataset_instance) and import their files."""
+        object_key = self.object_key
 
-                # Older style...
-                if 'uuid' in dataset_attrs:
-                    dataset_instance.dataset.uuid = dataset_attrs["uuid"]
-                if 'dataset_uuid' in dataset_attrs:
-                    dataset_instance.dataset.uuid = dataset_attrs["dataset_uuid"]
+        for dataset_instance, dataset_attrs in batch:
+            if isinstance(dataset_instance, model.HistoryDatasetAssociation):
+                # don't use add_history to manage HID handling across full import to try to preserve
+                # HID structure.
+                dataset_instance.history = history
+                if new_history and self.trust_hid(dataset_attrs):
+                    dataset_instance.hid = dataset_attrs['hid']
+                else:
+                    object_import_tracker.requires_hid.append(dataset_instance)
 
-                self._session_add(dataset_instance)
-                self._flush()
+        # The object store needs the dataset ids.
+        self._flush()
+        if len(batch) > 1:
+            # Flushing expires the new objects, load them back with one query
+            # rather than one per object.
+            hda_ids = [inspect(i).identity[0] for i, _ in batch if isinstance(i, model.HistoryDatasetAssociation)]
+            if hda_ids:
+                self.sa_session.query(model.HistoryDatasetAssociation).filter(
+                    model.HistoryDatasetAssociation.table.c.id.in_(hda_ids)
+                ).options(joinedload("dataset")).all()
+
+        for dataset_instance, dataset_attrs in batch:
+            is_hda = isinstance(dataset_instance, model.HistoryDatasetAssociation)
+            if 'dataset' in dataset_attrs:
+                self._edit_dataset_object(dataset_instance, dataset_attrs)
+            else:
+                self._import_dataset_files(dataset_instance, dataset_attrs)
 
-                if model_class == "HistoryDatasetAssociation":
-                    # don't use add_history to manage HID handling across full import to try to preserve
-                    # HID structure.
-                    dataset_instance.history = history
-                    if new_history and self.trust_hid(dataset_attrs):
-                        dataset_instance.hid = dataset_attrs['hid']
-                    else:
-                        object_import_tracker.requires_hid.append(dataset_instance)
+                if dataset_instance.deleted:
+                    dataset_instance.dataset.deleted = True
 
-                self._flush()
-                if 'dataset' in dataset_attrs:
-                    handle_dataset_object_edit(dataset_instance)
-                else:
-                    file_name = dataset_attrs.get('file_name')
-                    if file_name:
-                        # Do security check and move/copy dataset data.
-                        archive_path = os.path.abspath(os.path.join(self.archive_dir, file_name))
-                        if os.path.islink(archive_path):
-                            raise MalformedContents("Invalid dataset path: %s" % archive_path)
-
-                        temp_dataset_file_name = \
-                            os.path.realpath(archive_path)
-
-                        if not in_directory(temp_dataset_file_name, self.archive_dir):
-                            raise MalformedContents("Invalid dataset path: %s" % temp_dataset_file_name)
-
-                    if not file_name or not os.path.exists(temp_dataset_file_name):
-                        dataset_instance.state = dataset_instance.states.DISCARDED
-                        dataset_instance.deleted = True
-                        dataset_instance.purged = True
-                        dataset_instance.dataset.deleted = True
-                        dataset_instance.dataset.purged = True
-                    else:
-                        dataset_instance.state = dataset_instance.states.OK
-                        self.object_store.update_from_file(dataset_instance.dataset, file_name=temp_dataset_file_name, create=True)
-
-                        # Import additional files if present. Histories exported previously might not have this attribute set.
-                        dataset_extra_files_path = dataset_attrs.get('extra_files_path', None)
-                        if dataset_extra_files_path:
-                            store_by = self.object_store.store_by
-                            dir_name = 'dataset_%s_files' % getattr(dataset_instance.dataset, store_by)
-                            dataset_extra_files_path = os.path.join(self.archive_dir, dataset_extra_files_path)
-                            for root, dirs, files in safe_walk(dataset_extra_files_path):
-                                extra_dir = os.path.join(dir_name, root.replace(dataset_extra_files_path, '', 1).lstrip(os.path.sep))
-                                extra_dir = os.path.normpath(extra_dir)
-                                for extra_file in files:
-                                    source = os.path.join(root, extra_file)
-                                    if not in_directory(source, self.archive_dir):
-                                        raise MalformedContents("Invalid dataset path: %s" % source)
-                                    self.object_store.update_from_file(
-                                        dataset_instance.dataset, extra_dir=extra_dir,
-                                        alt_name=extra_file, file_name=source,
-                                        create=True)
-                        dataset_instance.dataset.set_total_size()  # update the filesize record in the database
-
-                    if dataset_instance.deleted:
-                        dataset_instance.dataset.deleted = True
-
-                if model_class == "HistoryDatasetAssociation" and self.user:
+            if is_hda and self.user:
+                if dataset_attrs['annotation'] is not None:
                     add_item_annotation(self.sa_session, self.user, dataset_instance, dataset_attrs['annotation'])
-                    tag_list = dataset_attrs.get('tags')
-                    if tag_list:
-                        tag_handler = model.tags.GalaxyTagHandler(sa_session=self.sa_session)
-                        tag_handler.set_tags_from_list(user=self.user, item=dataset_instance, new_tags_list=tag_list)
-
-                if self.app:
-                    self.app.datatypes_registry.set_external_metadata_tool.regenerate_imported_metadata_if_needed(
-                        dataset_instance, history, job
-                    )
+                tag_list = dataset_attrs.get('tags')
+                if tag_list:
+                    tag_handler = model.tags.GalaxyTagHandler(sa_session=self.sa_session)
+                    tag_handler.set_tags_from_list(user=self.user, item=dataset_instance, new_tags_list=tag_list)
 
-                if model_class == "HistoryDatasetAssociation":
-                    if object_key in dataset_attrs:
-                        object_import_tracker.hdas_by_key[dataset_attrs[object_key]] = dataset_instance
-                    else:
-                        assert 'id' in dataset_attrs
-                        object_import_tracker.hdas_by_id[dataset_attrs['id']] = dataset_instance
+            self._regenerate_imported_metadata(dataset_instance, history, job)
+
+            if is_hda:
+                if object_key in dataset_attrs:
+                    object_import_tracker.hdas_by_key[dataset_attrs[object_key]] = dataset_instance
                 else:
-                    object_import_tracker.lddas_by_key[dataset_attrs[object_key]] = dataset_instance
+                    assert 'id' in dataset_attrs
+                    object_import_tracker.hdas_by_id[dataset_attrs['id']] = dataset_instance
+            else:
+                object_import_tracker.lddas_by_key[dataset_attrs[object_key]] = dataset_instance
+
+    def _edit_dataset_object(self, dataset_instance, dataset_attrs):
+        if "dataset" in dataset_attrs:
+            assert self.import_options.allow_dataset_object_edit
+            dataset_attributes = [
+                "state",
+                "deleted",
+                "purged",
+                "external_filename",
+                "_extra_files_path",
+                "file_size",
+                "object_store_id",
+                "total_size",
+                "uuid"
+            ]
+
+            for attribute in dataset_attributes:
+                if attribute in dataset_attrs["dataset"]:
+                    setattr(dataset_instance.dataset, attribute, dataset_attrs["dataset"][attribute])
+            if "hashes" in dataset_attrs["dataset"]:
+                for hash_attrs in dataset_attrs["dataset"]["hashes"]:
+                    hash_obj = model.DatasetHash()
+                    hash_obj.hash_value = hash_attrs["hash_value"]
+                    hash_obj.hash_function = hash_attrs["hash_function"]
+                    hash_obj.extra_files_path = hash_attrs["extra_files_path"]
+                    dataset_instance.dataset.hashes.append(hash_obj)
+
+            if 'id' in dataset_attrs["dataset"] and self.import_options.allow_edit:
+                dataset_instance.dataset.id = dataset_attrs["dataset"]['id']
+
+    def _import_dataset_files(self, dataset_instance, dataset_attrs):
+        """Copy the files of an imported dataset into the object store."""
+        file_name = dataset_attrs.get('file_name')
+        if file_name:
+            # Do security check and move/copy dataset data.
+            archive_path = os.path.abspath(os.path.join(self.archive_dir, file_name))
+            if os.path.islink(archive_path):
+                raise MalformedContents("Invalid dataset path: %s" % archive_path)
+
+            temp_dataset_file_name = \
+                os.path.realpath(archive_path)
+
+            if not in_directory(temp_dataset_file_name, self.archive_dir):
+                raise MalformedContents("Invalid dataset path: %s" % temp_dataset_file_name)
+
+        if not file_name or not os.path.exists(temp_dataset_file_name):
+            self._discard_dataset(dataset_instance)
+        else:
+            # Set on the dataset, setting the state of the instance flushes the session.
+            dataset_instance.dataset.state = dataset_instance.states.OK
+            self.object_store.update_from_file(dataset_instance.dataset, file_name=temp_dataset_file_name, create=True)
+
+            # Import additional files if present. Histories exported previously might not have this attribute set.
+            dataset_extra_files_path = dataset_attrs.get('extra_files_path', None)
+            if dataset_extra_files_path:
+                store_by = self.object_store.store_by
+                dir_name = 'dataset_%s_files' % getattr(dataset_instance.dataset, store_by)
+                dataset_extra_files_path = os.path.join(self.archive_dir, dataset_extra_files_path)
+                for root, dirs, files in safe_walk(dataset_extra_files_path):
+                    extra_dir = os.path.join(dir_name, root.replace(dataset_extra_files_path, '', 1).lstrip(os.path.sep))
+                    extra_dir = os.path.normpath(extra_dir)
+                    for extra_file in files:
+                        source = os.path.join(root, extra_file)
+                        if not in_directory(source, self.archive_dir):
+                            raise MalformedContents("Invalid dataset path: %s" % source)
+                        self.object_store.update_from_file(
+                            dataset_instance.dataset, extra_dir=extra_dir,
+                            alt_name=extra_file, file_name=source,
+                            create=True)
+            dataset_instance.dataset.set_total_size()  # update the filesize record in the database
+
+    def _discard_dataset(self, dataset_instance):
+        """Mark an imported dataset whose files are missing from the archive as discarded."""
+        dataset_instance.dataset.state = dataset_instance.states.DISCARDED
+        dataset_instance.deleted = True
+        dataset_instance.purged = True
+        dataset_instance.dataset.deleted = True
+        dataset_instance.dataset.purged = True
+
+    def _regenerate_imported_metadata(self, dataset_instance, history, job):
+        if self.app:
+            self.app.datatypes_registry.set_external_metadata_tool.regenerate_imported_metadata_if_needed(
+                dataset_instance, history, job
+            )
 
     def _import_libraries(self, object_import_tracker):
         object_key = self.object_key
@@ -625,6 +684,7 @@ class ModelImportStore(object):
         # Create jobs.
         #
         jobs_attrs = self.jobs_properties()
+        unflushed_jobs = 0
         # Create each job.
         for job_attrs in jobs_attrs:
             if 'id' in job_attrs:
@@ -667,7 +727,6 @@ class ModelImportStore(object):
             except Exception:
                 pass
             self._session_add(imported_job)
-            self._flush()
 
             # Connect jobs to input and output datasets.
             params = self._normalize_job_parameters(imported_job, job_attrs, _find_hda, _find_hdca)
@@ -676,10 +735,14 @@ class ModelImportStore(object):
                 imported_job.add_parameter(name, dumps(value))
 
             self._connect_job_io(imported_job, job_attrs, _find_hda, _find_hdca)
-            self._flush()
+            unflushed_jobs += 1
+            if unflushed_jobs >= self.batch_size:
+                self._flush()
+                unflushed_jobs = 0
 
             if object_key in job_attrs:
                 object_import_tracker.jobs_by_key[job_attrs[object_key]] = imported_job
+        self._flush()
 
     def _import_implicit_collection_jobs(self, object_import_tracker):
         implicit_collection_jobs_attrs = self.implicit_collection_jobs_properties()
@@ -703,8 +766,58 @@ class ModelImportStore(object):
         self.sa_session.add(obj)
 
     def _flush(self):
+        if self.batch_size > 1:
+            self._preallocate_ids()
         self.sa_session.flush()
 
+    def _preallocate_ids(self):
+        """Assign ids from the table sequences to the new objects in the session.
+
+        SQLAlchemy inserts objects of a table with known primary keys in a single
+        executemany statement instead of one statement per object (to get the
+        generated key back). Only done for PostgreSQL, objects of tables whose
+        sequence can't be found or used get their ids on insert as usual.
+        """
+        if self.sessionless or self.sa_session.bind.dialect.name != "postgresql":
+            return
+        new_objects_by_table = defaultdict(list)
+        for obj in self.sa_session.new:
+            mapper = object_mapper(obj)
+            if len(mapper.primary_key) != 1 or mapper.primary_key[0].name != "id":
+                continue
+            key = mapper.get_property_by_column(mapper.primary_key[0]).key
+            if getattr(obj, key) is None:
+                new_objects_by_table[mapper.local_table].append((obj, key))
+        for table, objects in new_objects_by_table.items():
+            try:
+                sequence = self._id_sequence(table)
+                if sequence is None:
+                    continue
+                ids = self.sa_session.execute(
+                    expression.text("SELECT nextval(:sequence) FROM generate_series(1, :count)"),
+                    {"sequence": sequence, "count": len(objects)},
+                ).fetchall()
+            except SQLAlchemyError:
+                log.warning("Failed to preallocate ids of table %s, importing without", table.name, exc_info=True)
+                self._id_sequences[table.name] = None
+                continue
+            for (obj, key), row in zip(objects, ids):
+                setattr(obj, key, row[0])
+
+    def _id_sequence(self, table):
+        """Return the name of the sequence of the id column of ``table``."""
+        if table.name not in self._id_sequences:
+            default = table.c.id.default
+            if isinstance(default, Sequence):
+                sequence = default.name if default.schema is None else "%s.%s" % (default.schema, default.name)
+            else:
+                sequence = self.sa_session.execute(
+                    expression.text("SELECT pg_get_serial_sequence(:table, 'id')"),
+                    {"table": table.fullname},
+                ).scalar()
+            self._id_sequences[table.name] = sequence
+        return self._id_sequences[table.name]
+
 
 def _copied_from_object_key(copied_from_chain, objects_by_key):
     if len(copied_from_chain) == 0:
@@ -749,6 +862,10 @@ class ObjectImportTracker(object):
 
 def get_import_model_store_for_directory(archive_dir, **kwd):
     assert os.path.isdir(archive_dir)
+    streamed_archive = os.path.join(archive_dir, STREAMED_ARCHIVE_FILENAME)
+    if os.path.exists(streamed_archive):
+        # The archive was fetched but not extracted, read it now.
+        return get_import_model_store_for_archive(streamed_archive, archive_dir=archive_dir, **kwd)
     if os.path.exists(os.path.join(archive_dir, ATTRS_FILENAME_EXPORT)):
         return DirectoryImportModelStoreLatest(archive_dir, **kwd)
     else:
@@ -941,6 +1058,149 @@ class BagArchiveImportModelStore(DirectoryImportModelStoreLatest):
         super(BagArchiveImportModelStore, self).__init__(archive_dir, **kwd)
 
 
+def get_import_model_store_for_archive(archive_file, archive_dir=None, **kwd):
+    """
+    Return an import store for the tar archive archive_file, reading it once
+    as a stream.
+
+    The attribute files, and any dataset files before them, are extracted to
+    archive_dir (a new temporary directory if not given). If the export
+    attributes are marked as written after the other attribute files (by
+    `tar_export_directory`), the dataset files after them are copied into the
+    object store straight from the archive by the returned
+    TarImportModelStore. Otherwise (older archives, whose attribute files may
+    come in any order) the whole archive is extracted.
+    """
+    archive_dir = os.path.realpath(archive_dir or tempfile.mkdtemp())
+    archive = tarfile.open(archive_file, mode="r|*")
+    try:
+        for member in iter(archive.next, None):
+            name = _check_archive_member(member, archive_dir)
+            if name == STREAMED_ARCHIVE_FILENAME:
+                continue
+            archive.extract(member, archive_dir)
+            if name == ATTRS_FILENAME_EXPORT:
+                with open(os.path.join(archive_dir, name)) as f:
+                    export_attrs = load(f)
+                if export_attrs.get(ATTRS_FIRST_KEY):
+                    return TarImportModelStore(archive, archive_dir, **kwd)
+    except Exception:
+        archive.close()
+        raise
+    archive.close()
+    # extracted, see get_import_model_store_for_directory
+    if os.path.exists(os.path.join(archive_dir, ATTRS_FILENAME_EXPORT)):
+        return DirectoryImportModelStoreLatest(archive_dir, **kwd)
+    return DirectoryImportModelStore1901(archive_dir, **kwd)
+
+
+def _check_archive_member(member, archive_dir):
+    """
+    Return the normalized name of an archive member, raising MalformedContents
+    if it's not a file or directory inside archive_dir.
+    """
+    name = os.path.normpath(member.name)
+    if not (member.isfile() or member.isdir()):
+        raise MalformedContents("Invalid archive member: %s" % member.name)
+    if not in_directory(os.path.join(archive_dir, name), archive_dir):
+        raise MalformedContents("Archive member would extract outside target directory: %s" % member.name)
+    return name
+
+
+class TarImportModelStore(DirectoryImportModelStoreLatest):
+    """
+    Import store for a tar archive read as a stream (see
+    `get_import_model_store_for_archive`).
+
+    The attribute files have been extracted to archive_dir before the store
+    is created. Dataset files are read after the model objects have been
+    imported and copied into the object store one at a time, so at most one
+    of them is staged on disk.
+    """
+
+    def __init__(self, archive, archive_dir, **kwd):
+        super(TarImportModelStore, self).__init__(archive_dir, **kwd)
+        self.archive = archive
+        # archive names of dataset files and extra files directories not
+        # extracted yet to the dataset instances using them
+        self.streamed_files = {}
+        self.streamed_extra_files = {}
+        self.deferred_metadata = []
+
+    def perform_import(self, history=None, new_history=False, job=None):
+        try:
+            super(TarImportModelStore, self).perform_import(history=history, new_history=new_history, job=job)
+            self._import_streamed_files()
+        finally:
+            self.archive.close()
+        for dataset_instance, history, job in self.deferred_metadata:
+            super(TarImportModelStore, self)._regenerate_imported_metadata(dataset_instance, history, job)
+
+    def _import_dataset_files(self, dataset_instance, dataset_attrs):
+        file_name = dataset_attrs.get('file_name')
+        if not file_name or os.path.lexists(os.path.join(self.archive_dir, file_name)):
+            # Not in the archive or extracted with the attribute files.
+            return super(TarImportModelStore, self)._import_dataset_files(dataset_instance, dataset_attrs)
+        self.streamed_files.setdefault(os.path.normpath(file_name), []).append(dataset_instance)
+        extra_files_path = dataset_attrs.get('extra_files_path')
+        if extra_files_path:
+            self.streamed_extra_files.setdefault(os.path.normpath(extra_files_path), []).append(dataset_instance)
+
+    def _regenerate_imported_metadata(self, dataset_instance, history, job):
+        # Wait for the dataset files to be imported.
+        self.deferred_metadata.append((dataset_instance, history, job))
+
+    def _import_streamed_files(self):
+        store_by = self.object_store.store_by
+        imported = set()
+        for member in iter(self.archive.next, None):
+            name = _check_archive_member(member, self.archive_dir)
+            if not member.isfile():
+                continue
+            extra_file = None
+            dataset_instances = self.streamed_files.get(name)
+            if dataset_instances is None:
+                # Is this in the extra files directory of a dataset?
+                extra_files_path = os.path.dirname(name)
+                while extra_files_path and extra_files_path not in self.streamed_extra_files:
+                    extra_files_path = os.path.dirname(extra_files_path)
+                if not extra_files_path:
+                    continue
+                dataset_instances = self.streamed_extra_files[extra_files_path]
+                extra_file = os.path.relpath(name, extra_files_path)
+
+            staged_file_name = self._stage_archive_member(member)
+            try:
+                for dataset_instance in dataset_instances:
+                    if extra_file is None:
+                        self.object_store.update_from_file(dataset_instance.dataset, file_name=staged_file_name, create=True)
+                        imported.add(dataset_instance)
+                    else:
+                        extra_dir = os.path.normpath(os.path.join('dataset_%s_files' % getattr(dataset_instance.dataset, store_by),
+                                                                  os.path.dirname(extra_file)))
+                        self.object_store.update_from_file(
+                            dataset_instance.dataset, extra_dir=extra_dir,
+                            alt_name=os.path.basename(extra_file), file_name=staged_file_name,
+                            create=True)
+            finally:
+                os.remove(staged_file_name)
+
+        for dataset_instances in self.streamed_files.values():
+            for dataset_instance in dataset_instances:
+                if dataset_instance in imported:
+                    dataset_instance.dataset.state = dataset_instance.states.OK
+                    dataset_instance.dataset.set_total_size()
+                else:
+                    self._discard_dataset(dataset_instance)
+        self._flush()
+
+    def _stage_archive_member(self, member):
+        fd, staged_file_name = tempfile.mkstemp(dir=self.archive_dir)
+        with os.fdopen(fd, "wb") as staged_file:
+            shutil.copyfileobj(self.archive.extractfile(member), staged_file, STREAM_CHUNK_SIZE)
+        return staged_file_name
+
+
 @six.add_metaclass(abc.ABCMeta)
 class ModelExportStore(object):
 
@@ -1011,16 +1271,6 @@ class DirectoryModelExportStore(ModelExportStore):
     def serialize_files(self, dataset, as_dict):
         if self.export_files is None:
             return None
-        elif self.export_files == "symlink":
-            add = os.symlink
-        elif self.export_files == "copy":
-            def add(src, dest):
-                if os.path.isdir(src):
-                    shutil.copytree(src, dest)
-                else:
-                    shutil.copyfile(src, dest)
-
-        export_directory = self.export_directory
 
         _, include_files = self.included_datasets[dataset.id]
         if not include_files:
@@ -1040,7 +1290,6 @@ class DirectoryModelExportStore(ModelExportStore):
             pass
 
         dir_name = 'datasets'
-        dir_path = os.path.join(export_directory, dir_name)
         dataset_hid = as_dict['hid']
         assert dataset_hid, as_dict
 
@@ -1053,15 +1302,9 @@ class DirectoryModelExportStore(ModelExportStore):
             return
 
         if file_name:
-            if not os.path.exists(dir_path):
-                os.makedirs(dir_path)
-
             target_filename = get_export_dataset_filename(as_dict['name'], as_dict['extension'], dataset_hid)
             arcname = os.path.join(dir_name, target_filename)
-
-            src = file_name
-            dest = os.path.join(export_directory, arcname)
-            add(src, dest)
+            self._export_file(file_name, arcname)
             as_dict['file_name'] = arcname
 
         if extra_files_path:
@@ -1072,13 +1315,26 @@ class DirectoryModelExportStore(ModelExportStore):
 
             if len(file_list):
                 arcname = os.path.join(dir_name, 'extra_files_path_%s' % dataset_hid)
-                add(extra_files_path, os.path.join(export_directory, arcname))
+                self._export_file(extra_files_path, arcname)
                 as_dict['extra_files_path'] = arcname
             else:
                 as_dict['extra_files_path'] = ''
 
         self.dataset_id_to_path[dataset.dataset.id] = (as_dict.get("file_name"), as_dict.get("extra_files_path"))
 
+    def _export_file(self, src, arcname):
+        """Add the file or directory src to the export as arcname."""
+        dest = os.path.join(self.export_directory, arcname)
+        dest_dir = os.path.dirname(dest)
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        if self.export_files == "symlink":
+            os.symlink(src, dest)
+        elif os.path.isdir(src):
+            shutil.copytree(src, dest)
+        else:
+            shutil.copyfile(src, dest)
+
     def exported_key(self, obj):
         return self.serialization_options.get_identifier(self.security, obj)
 
@@ -1344,16 +1600,28 @@ class DirectoryModelExportStore(ModelExportStore):
 
 
 class TarModelExportStore(DirectoryModelExportStore):
+    """
+    Export store writing a tar archive. Only the attribute files are staged in
+    a temporary directory, dataset files are written to the archive straight
+    from the object store.
+    """
 
-    def __init__(self, out_file, gzip=True, **kwds):
+    def __init__(self, out_file, gzip=True, compression_threads=1, **kwds):
         self.gzip = gzip
+        self.compression_threads = compression_threads
         self.out_file = out_file
+        # (path, arcname) of files and directories to add to the archive
+        self.exported_files = []
         temp_output_dir = tempfile.mkdtemp()
         super(TarModelExportStore, self).__init__(temp_output_dir, **kwds)
 
+    def _export_file(self, src, arcname):
+        self.exported_files.append((src, arcname))
+
     def _finalize(self):
         super(TarModelExportStore, self)._finalize()
-        tar_export_directory(self.export_directory, self.out_file, self.gzip)
+        tar_export_directory(self.export_directory, self.out_file, self.gzip,
+                             compression_threads=self.compression_threads, files=self.exported_files)
         shutil.rmtree(self.export_directory)
 
 
@@ -1384,14 +1652,60 @@ class BagArchiveModelExportStore(BagDirectoryModelExportStore):
         shutil.rmtree(self.export_directory)
 
 
-def tar_export_directory(export_directory, out_file, gzip):
-    tarfile_mode = "w"
-    if gzip:
-        tarfile_mode += ":gz"
+def tar_export_directory(export_directory, out_file, gzip, compression_threads=1, files=None):
+    """
+    Write the export in export_directory, and the files and directories in
+    `files` ((path, arcname) pairs), to the tar archive out_file.
 
-    with tarfile.open(out_file, tarfile_mode, dereference=True) as history_archive:
-        for export_path in os.listdir(export_directory):
-            history_archive.add(os.path.join(export_directory, export_path), arcname=export_path)
+    Attribute files are written first, ending with the export attributes
+    marked with ATTRS_FIRST_KEY, so that archives can be imported reading
+    them only once (see `get_import_model_store_for_archive`).
+    """
+    export_paths = sorted(os.listdir(export_directory))
+    attrs_paths = [p for p in export_paths if os.path.isfile(os.path.join(export_directory, p)) and p != ATTRS_FILENAME_EXPORT]
+    if ATTRS_FILENAME_EXPORT in export_paths:
+        attrs_paths.append(ATTRS_FILENAME_EXPORT)
+    export_paths = attrs_paths + [p for p in export_paths if p not in attrs_paths]
+
+    with _open_tar_for_writing(out_file, gzip, compression_threads) as history_archive:
+        for export_path in export_paths:
+            path = os.path.join(export_directory, export_path)
+            if export_path == ATTRS_FILENAME_EXPORT:
+                with open(path) as f:
+                    export_attrs = load(f)
+                export_attrs[ATTRS_FIRST_KEY] = True
+                content = dumps(export_attrs).encode('utf-8')
+                tarinfo = history_archive.gettarinfo(path, arcname=export_path)
+                tarinfo.size = len(content)
+                history_archive.addfile(tarinfo, io.BytesIO(content))
+            else:
+                history_archive.add(path, arcname=export_path)
+        for path, arcname in files or []:
+            history_archive.add(path, arcname=arcname)
+
+
+@contextlib.contextmanager
+def _open_tar_for_writing(out_file, gzip, compression_threads=1):
+    pigz = which("pigz") if gzip and compression_threads > 1 else None
+    if not pigz:
+        tarfile_mode = "w"
+        if gzip:
+            tarfile_mode += ":gz"
+        with tarfile.open(out_file, tarfile_mode, dereference=True) as history_archive:
+            yield history_archive
+        return
+
+    # Compress in parallel with pigz, the archive is written to it as a stream.
+    with open(out_file, "wb") as out:
+        pigz_process = subprocess.Popen([pigz, "-p", str(compression_threads), "-c"], stdin=subprocess.PIPE, stdout=out)
+        try:
+            with tarfile.open(fileobj=pigz_process.stdin, mode="w|", dereference=True) as history_archive:
+                yield history_archive
+        finally:
+            pigz_process.stdin.close()
+            returncode = pigz_process.wait()
+        if returncode:
+            raise Exception("Compressing history archive with pigz failed (exit code %d)" % returncode)
 
 
 def get_export_dataset_filename(name, ext, hid):
@@ -11,6 +11,7 @@ import random
 import shutil
 import threading
 import time
+from collections import OrderedDict
 from xml.etree import ElementTree
 
 import yaml
@@ -33,6 +34,11 @@ from galaxy.util.path import (
 from galaxy.util.sleeper import Sleeper
 
 NO_SESSION_ERROR_MESSAGE = "Attempted to 'create' object store entity in configuration with no database session present."
+# Only the size of datasets in this state is cached, other datasets may still
+# be written to by jobs.
+CACHE_SIZE_FOR_STATE = "ok"
+# How DistributedObjectStore selects the backend for new objects.
+PLACEMENT_POLICIES = ["weighted", "adaptive"]
 
 log = logging.getLogger(__name__)
 
@@ -245,6 +251,77 @@ class ObjectStore(object):
             return obj.id
 
 
+class ObjectMetadataCache(object):
+    """
+    Bounded LRU memo of object store lookups (existence, size and resolved
+    path) for individual objects.
+
+    Entries are grouped per object so that :meth:`invalidate` can drop
+    everything known about an object when it is created, updated or
+    deleted through the object store. Entries also expire after ``ttl``
+    seconds to pick up changes made outside of this process.
+
+    >>> cache = ObjectMetadataCache(max_objects=2, ttl=60)
+    >>> cache.get(("Dataset", 1), "size", lambda: 42)
+    42
+    >>> cache.get(("Dataset", 1), "size", lambda: 43)
+    42
+    >>> cache.invalidate(("Dataset", 1))
+    >>> cache.get(("Dataset", 1), "size", lambda: 43)
+    43
+    >>> cache.hits, cache.misses
+    (1, 2)
+    """
+
+    def __init__(self, max_objects, ttl):
+        self.max_objects = max_objects
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, object_key, key, compute, cache_if=None):
+        """
+        Return the value cached for ``key`` of the object identified by
+        ``object_key`` or compute, and if ``cache_if`` accepts it, store it.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(object_key)
+            if entry is not None:
+                expires, values = entry
+                if expires < now:
+                    del self._entries[object_key]
+                elif key in values:
+                    self.hits += 1
+                    # Mark as recently used.
+                    del self._entries[object_key]
+                    self._entries[object_key] = entry
+                    return values[key]
+            self.misses += 1
+        value = compute()
+        if cache_if is None or cache_if(value):
+            with self._lock:
+                entry = self._entries.pop(object_key, None)
+                if entry is None:
+                    entry = (now + self.ttl, {})
+                entry[1][key] = value
+                self._entries[object_key] = entry
+                while len(self._entries) > self.max_objects:
+                    self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, object_key):
+        with self._lock:
+            self._entries.pop(object_key, None)
+
+    def stats(self):
+        """Return hit and miss counts and the number of cached objects."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "objects": len(self._entries)}
+
+
 class DiskObjectStore(ObjectStore):
     """
     Standard Galaxy object store.
@@ -272,6 +349,11 @@ class DiskObjectStore(ObjectStore):
 
             * file_path -- Default directory to store objects to disk in.
             * umask -- the permission bits for newly created files.
+            * object_store_metadata_cache_size -- number of objects to
+              cache existence, size and path lookups for (optional, the
+              cache is disabled if unset or 0).
+            * object_store_metadata_cache_ttl -- seconds after which cached
+              lookups expire.
 
         :type file_path: str
         :param file_path: Override for the `config.file_path` value.
@@ -281,6 +363,10 @@ class DiskObjectStore(ObjectStore):
         """
         super(DiskObjectStore, self).__init__(config, config_dict)
         self.file_path = config_dict.get("files_dir") or config.file_path
+        self.metadata_cache = None
+        metadata_cache_size = getattr(config, "object_store_metadata_cache_size", 0)
+        if metadata_cache_size:
+            self.metadata_cache = ObjectMetadataCache(metadata_cache_size, getattr(config, "object_store_metadata_cache_ttl", 60))
 
     @classmethod
     def parse_xml(clazz, config_xml):
@@ -383,8 +469,27 @@ class DiskObjectStore(ObjectStore):
             path = os.path.join(path, alt_name if alt_name else "dataset_%s.dat" % obj_id)
         return os.path.abspath(path)
 
+    def _cached(self, obj, method, kwargs, compute, cache_if=None):
+        if self.metadata_cache is None:
+            return compute()
+        key = (method, tuple(sorted(kwargs.items())))
+        return self.metadata_cache.get(self._metadata_cache_key(obj), key, compute, cache_if=cache_if)
+
+    def _metadata_cache_key(self, obj):
+        # Jobs and datasets share the id namespace of the store.
+        return (obj.__class__.__name__, self._get_object_id(obj))
+
+    def _invalidate_metadata(self, obj):
+        if self.metadata_cache is not None:
+            self.metadata_cache.invalidate(self._metadata_cache_key(obj))
+
     def exists(self, obj, **kwargs):
         """Override `ObjectStore`'s stub and check on disk."""
+        # Objects may be created outside of the object store, so only cache
+        # that an object exists.
+        return self._cached(obj, "exists", kwargs, lambda: self._exists(obj, **kwargs), cache_if=bool)
+
+    def _exists(self, obj, **kwargs):
         if self.check_old_style:
             path = self._construct_path(obj, old_style=True, **kwargs)
             # For backward compatibility: check root path first; otherwise
@@ -395,6 +500,7 @@ class DiskObjectStore(ObjectStore):
 
     def create(self, obj, **kwargs):
         """Override `ObjectStore`'s stub by creating any files and folders on disk."""
+        self._invalidate_metadata(obj)
         if not self.exists(obj, **kwargs):
             path = self._construct_path(obj, **kwargs)
             dir_only = kwargs.get('dir_only', False)
@@ -415,6 +521,11 @@ class DiskObjectStore(ObjectStore):
 
         Returns 0 if the object doesn't exist yet or other error.
         """
+        if getattr(obj, "state", None) == CACHE_SIZE_FOR_STATE:
+            return self._cached(obj, "size", kwargs, lambda: self._size(obj, **kwargs), cache_if=bool)
+        return self._size(obj, **kwargs)
+
+    def _size(self, obj, **kwargs):
         if self.exists(obj, **kwargs):
             try:
                 filepath = self.get_filename(obj, **kwargs)
@@ -444,6 +555,8 @@ class DiskObjectStore(ObjectStore):
                 return True
         except OSError as ex:
             log.critical('%s delete error %s' % (self._get_filename(obj, **kwargs), ex))
+        finally:
+            self._invalidate_metadata(obj)
         return False
 
     def get_data(self, obj, start=0, count=-1, **kwargs):
@@ -462,11 +575,16 @@ class DiskObjectStore(ObjectStore):
         root path is checked first.
         """
         if self.check_old_style:
-            path = self._construct_path(obj, old_style=True, **kwargs)
-            # For backward compatibility, check root path first; otherwise,
-            # construct and return hashed path
-            if os.path.exists(path):
-                return path
+            # Resolving the path requires checking the disk, remember it.
+            return self._cached(obj, "get_filename", kwargs, lambda: self._old_style_or_hashed_path(obj, **kwargs))
+        return self._construct_path(obj, **kwargs)
+
+    def _old_style_or_hashed_path(self, obj, **kwargs):
+        path = self._construct_path(obj, old_style=True, **kwargs)
+        # For backward compatibility, check root path first; otherwise,
+        # construct and return hashed path
+        if os.path.exists(path):
+            return path
         return self._construct_path(obj, **kwargs)
 
     def update_from_file(self, obj, file_name=None, create=False, **kwargs):
@@ -488,6 +606,8 @@ class DiskObjectStore(ObjectStore):
             except IOError as ex:
                 log.critical('Error copying %s to %s: %s' % (file_name, self._get_filename(obj, **kwargs), ex))
                 raise ex
+            finally:
+                self._invalidate_metadata(obj)
 
     def get_object_url(self, obj, **kwargs):
         """
@@ -586,6 +706,48 @@ class NestedObjectStore(ObjectStore):
             return default
 
 
+class BackendPlacementStats(object):
+    """
+    Free space and recently observed I/O performance of a backend of a
+    :class:`DistributedObjectStore`, used for adaptive placement.
+
+    Throughput and latency are exponentially weighted moving averages so
+    that recent writes dominate.
+    """
+    smoothing = 0.2
+
+    def __init__(self, weight):
+        self.weight = weight
+        self.usage_percent = None
+        self.usage_checked = 0
+        self.write_throughput = None
+        self.latency = None
+        self.score = None
+        self.placements = 0
+
+    def record_latency(self, seconds):
+        self.latency = self._average(self.latency, seconds)
+
+    def record_write(self, size, seconds):
+        if size and seconds > 0:
+            self.write_throughput = self._average(self.write_throughput, size / seconds)
+
+    def _average(self, current, value):
+        if current is None:
+            return value
+        return (1 - self.smoothing) * current + self.smoothing * value
+
+    def to_dict(self):
+        return {
+            "weight": self.weight,
+            "usage_percent": self.usage_percent,
+            "write_bytes_per_second": self.write_throughput,
+            "create_latency_seconds": self.latency,
+            "score": self.score,
+            "placements": self.placements,
+        }
+
+
 class DistributedObjectStore(NestedObjectStore):
 
     """
@@ -593,9 +755,15 @@ class DistributedObjectStore(NestedObjectStore):
 
     When getting objects the first store where the object exists is used.
     When creating objects they are created in a store selected randomly, but
-    with weighting.
+    with weighting. With the ``adaptive`` placement policy the weights are
+    additionally scaled by each backend's free space, recent write
+    throughput and create latency.
     """
     store_type = 'distributed'
+    # Seconds between disk usage checks for adaptive placement.
+    usage_check_interval = 30
+    # Create latencies below this are considered equally fast.
+    min_latency = 0.001
 
     def __init__(self, config, config_dict, fsmon=False):
         """
@@ -619,6 +787,10 @@ class DistributedObjectStore(NestedObjectStore):
         self.original_weighted_backend_ids = []
         self.max_percent_full = {}
         self.global_max_percent_full = config_dict.get("global_max_percent_full", 0)
+        self.placement = config_dict.get("placement") or "weighted"
+        assert self.placement in PLACEMENT_POLICIES, "Unknown placement policy for distributed object store: %s" % self.placement
+        self.placement_stats = {}
+        self._placement_lock = threading.Lock()
         random.seed()
 
         backends_def = config_dict["backends"]
@@ -631,6 +803,7 @@ class DistributedObjectStore(NestedObjectStore):
             disk_config_dict = dict(files_dir=file_path, extra_dirs=extra_dirs)
             self.backends[backened_id] = DiskObjectStore(config, disk_config_dict)
             self.max_percent_full[backened_id] = maxpctfull
+            self.placement_stats[backened_id] = BackendPlacementStats(weight)
             log.debug("Loaded disk backend '%s' with weight %s and file_path: %s" % (backened_id, weight, file_path))
 
             for i in range(0, weight):
@@ -658,6 +831,7 @@ class DistributedObjectStore(NestedObjectStore):
         backends = []
         config_dict = {
             'global_max_percent_full': float(backends_root.get('maxpctfull', 0)),
+            'placement': backends_root.get('placement', 'weighted'),
             'backends': backends,
         }
 
@@ -711,6 +885,7 @@ class DistributedObjectStore(NestedObjectStore):
     def to_dict(self):
         as_dict = super(DistributedObjectStore, self).to_dict()
         as_dict["global_max_percent_full"] = self.global_max_percent_full
+        as_dict["placement"] = self.placement
         backends = []
         for backend_id, backend in self.backends.items():
             backend_as_dict = backend.to_dict()
@@ -733,6 +908,8 @@ class DistributedObjectStore(NestedObjectStore):
             for id, backend in self.backends.items():
                 maxpct = self.max_percent_full[id] or self.global_max_percent_full
                 pct = backend.get_store_usage_percent()
+                self.placement_stats[id].usage_percent = pct
+                self.placement_stats[id].usage_checked = time.time()
                 if pct > maxpct:
                     new_weighted_backend_ids = [_ for _ in new_weighted_backend_ids if _ != id]
             self.weighted_backend_ids = new_weighted_backend_ids
@@ -743,7 +920,7 @@ class DistributedObjectStore(NestedObjectStore):
         if obj.object_store_id is None or not self.exists(obj, **kwargs):
             if obj.object_store_id is None or obj.object_store_id not in self.backends:
                 try:
-                    obj.object_store_id = random.choice(self.weighted_backend_ids)
+                    obj.object_store_id = self._choose_backend_id()
                 except IndexError:
                     raise ObjectInvalid('objectstore.create, could not generate '
                                         'obj.object_store_id: %s, kwargs: %s'
@@ -754,7 +931,81 @@ class DistributedObjectStore(NestedObjectStore):
             else:
                 log.debug("Using preferred backend '%s' for creation of %s %s"
                           % (obj.object_store_id, obj.__class__.__name__, obj.id))
+            start = time.time()
             self.backends[obj.object_store_id].create(obj, **kwargs)
+            stats = self.placement_stats[obj.object_store_id]
+            with self._placement_lock:
+                stats.placements += 1
+                stats.record_latency(time.time() - start)
+
+    def update_from_file(self, obj, **kwargs):
+        """Update `obj` from the given file, recording the backend's write throughput."""
+        if kwargs.get('create', False):
+            self.create(obj, **kwargs)
+            kwargs['create'] = False
+        start = time.time()
+        rval = self._call_method('update_from_file', obj, ObjectNotFound, True, **kwargs)
+        file_name = kwargs.get('file_name')
+        if file_name and not os.path.islink(file_name) and obj.object_store_id in self.placement_stats:
+            try:
+                size = os.path.getsize(file_name)
+            except OSError:
+                size = 0
+            with self._placement_lock:
+                self.placement_stats[obj.object_store_id].record_write(size, time.time() - start)
+        return rval
+
+    def placement_metrics(self):
+        """Return the placement policy and, per backend, the inputs and number of placements."""
+        with self._placement_lock:
+            return {
+                "placement": self.placement,
+                "backends": dict((id, stats.to_dict()) for id, stats in self.placement_stats.items()),
+            }
+
+    def _choose_backend_id(self):
+        """
+        Select a backend for a new object from those not considered full.
+
+        Raises `IndexError` if there are none.
+        """
+        if self.placement == "weighted" or not self.weighted_backend_ids:
+            return random.choice(self.weighted_backend_ids)
+        scores = self._placement_scores()
+        total = sum(scores.values())
+        if total <= 0:
+            return random.choice(self.weighted_backend_ids)
+        choice = random.uniform(0, total)
+        for backend_id, score in sorted(scores.items()):
+            choice -= score
+            if choice <= 0:
+                break
+        log.debug("Adaptive placement scores %s, selected backend '%s'" % (scores, backend_id))
+        return backend_id
+
+    def _placement_scores(self):
+        """Scale backend weights by free space, relative throughput and relative latency."""
+        now = time.time()
+        backend_ids = sorted(set(self.weighted_backend_ids))
+        for backend_id in backend_ids:
+            stats = self.placement_stats[backend_id]
+            if stats.usage_checked + self.usage_check_interval < now:
+                stats.usage_percent = self.backends[backend_id].get_store_usage_percent()
+                stats.usage_checked = now
+        with self._placement_lock:
+            stats_by_id = dict((backend_id, self.placement_stats[backend_id]) for backend_id in backend_ids)
+            throughputs = [s.write_throughput for s in stats_by_id.values() if s.write_throughput]
+            latencies = [max(s.latency, self.min_latency) for s in stats_by_id.values() if s.latency is not None]
+            scores = {}
+            for backend_id, stats in stats_by_id.items():
+                score = stats.weight * max(0.0, 100.0 - stats.usage_percent) / 100.0
+                if stats.write_throughput and throughputs:
+                    score *= stats.write_throughput / max(throughputs)
+                if stats.latency is not None and latencies:
+                    score *= min(latencies) / max(stats.latency, self.min_latency)
+                stats.score = score
+                scores[backend_id] = score
+        return scores
 
     def _call_method(self, method, obj, default, default_is_exception, **kwargs):
         object_store_id = self.__get_store_id_for(obj, **kwargs)
@@ -280,6 +280,11 @@ def admin_job_lock(app, **kwargs):
              % (job_lock, "not" if job_lock else "now"))
 
 
+def wake_job_handlers(app, **kwargs):
+    # Jobs or their inputs changed state in another process.
+    app.job_manager.job_handler.job_queue.notify()
+
+
 control_message_to_task = {'create_panel_section': create_panel_section,
                            'reload_tool': reload_tool,
                            'reload_toolbox': reload_toolbox,
@@ -288,6 +293,7 @@ control_message_to_task = {'create_panel_section': create_panel_section,
                            'reload_tool_data_tables': reload_tool_data_tables,
                            'reload_job_rules': reload_job_rules,
                            'admin_job_lock': admin_job_lock,
+                           'wake_job_handlers': wake_job_handlers,
                            'reload_sanitize_whitelist': reload_sanitize_whitelist,
                            'recalculate_user_disk_usage': recalculate_user_disk_usage,
                            'rebuild_toolbox_search_index': rebuild_toolbox_search_index}
@@ -73,7 +73,7 @@ class RBACAgent(object):
     def history_set_default_permissions(self, history, permissions=None, dataset=False, bypass_manage_permission=False):
         raise Exception("Unimplemented Method")
 
-    def set_all_dataset_permissions(self, dataset, permissions, new=False):
+    def set_all_dataset_permissions(self, dataset, permissions, new=False, flush=True):
         raise Exception("Unimplemented Method")
 
     def set_dataset_permission(self, dataset, permission):
@@ -1,6 +1,7 @@
 import codecs
 import collections
 import logging
+import threading
 
 from Crypto.Cipher import Blowfish
 from Crypto.Random import get_random_bytes
@@ -16,6 +17,8 @@ log = logging.getLogger(__name__)
 MAXIMUM_ID_SECRET_BITS = 448
 MAXIMUM_ID_SECRET_LENGTH = int(MAXIMUM_ID_SECRET_BITS / 8)
 KIND_TOO_LONG_MESSAGE = "Galaxy coding error, keep encryption 'kinds' smaller to utilize more bites of randomness from id_secret values."
+# Number of encoded and of decoded ids kept in memory by default.
+DEFAULT_ID_CACHE_SIZE = 20000
 
 
 class IdEncodingHelper(object):
@@ -28,16 +31,50 @@ class IdEncodingHelper(object):
         per_kind_id_secret_base = config.get('per_kind_id_secret_base', self.id_secret)
         self.id_ciphers_for_kind = _cipher_cache(per_kind_id_secret_base)
 
+        # The most recently used encoded and decoded ids, by kind.
+        self.id_cache_size = int(config.get('id_cache_size', DEFAULT_ID_CACHE_SIZE))
+        self._encoded_ids = _LRUCache(self.id_cache_size)
+        self._decoded_ids = _LRUCache(self.id_cache_size)
+
     def encode_id(self, obj_id, kind=None):
         if obj_id is None:
             raise galaxy.exceptions.MalformedId("Attempted to encode None id")
-        id_cipher = self.__id_cipher(kind)
-        # Convert to bytes
-        s = smart_str(obj_id)
-        # Pad to a multiple of 8 with leading "!"
-        s = (b"!" * (8 - len(s) % 8)) + s
-        # Encrypt
-        return unicodify(codecs.encode(id_cipher.encrypt(s), 'hex'))
+        key = (kind, _cache_key(obj_id))
+        encoded_id = self._encoded_ids.get(key)
+        if encoded_id is None:
+            id_cipher = self.__id_cipher(kind)
+            # Encrypt
+            encoded_id = unicodify(codecs.encode(id_cipher.encrypt(_pad(obj_id)), 'hex'))
+            self._encoded_ids.put(key, encoded_id)
+        return encoded_id
+
+    def encode_ids(self, obj_ids, kind=None):
+        """
+        Encode each id of the list `obj_ids`. The ids that are not cached are
+        encrypted together with a single call to the cipher (ids are encrypted
+        in independent blocks).
+        """
+        if any(obj_id is None for obj_id in obj_ids):
+            raise galaxy.exceptions.MalformedId("Attempted to encode None id")
+        keys = [(kind, _cache_key(obj_id)) for obj_id in obj_ids]
+        encoded_ids = self._encoded_ids.get_many(keys)
+        missing = collections.OrderedDict()
+        for i, encoded_id in enumerate(encoded_ids):
+            if encoded_id is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            padded = [_pad(obj_ids[indexes[0]]) for indexes in missing.values()]
+            encrypted = codecs.encode(self.__id_cipher(kind).encrypt(b"".join(padded)), 'hex').decode('ascii')
+            new_ids = []
+            offset = 0
+            for s, indexes in zip(padded, missing.values()):
+                encoded_id = encrypted[offset:offset + 2 * len(s)]
+                offset += 2 * len(s)
+                new_ids.append(encoded_id)
+                for i in indexes:
+                    encoded_ids[i] = encoded_id
+            self._encoded_ids.put_many(zip(missing, new_ids))
+        return encoded_ids
 
     def encode_dict_ids(self, a_dict, kind=None, skip_startswith=None):
         """
@@ -66,10 +103,7 @@ class IdEncodingHelper(object):
                     pass  # probably already encoded
             if (k.endswith("_ids") and isinstance(v, list)):
                 try:
-                    o = []
-                    for i in v:
-                        o.append(self.encode_id(i))
-                    rval[k] = o
+                    rval[k] = self.encode_ids(v)
                 except Exception:
                     pass
             else:
@@ -80,8 +114,41 @@ class IdEncodingHelper(object):
         return rval
 
     def decode_id(self, obj_id, kind=None):
-        id_cipher = self.__id_cipher(kind)
-        return int(unicodify(id_cipher.decrypt(codecs.decode(obj_id, 'hex'))).lstrip("!"))
+        key = (kind, obj_id)
+        decoded_id = self._decoded_ids.get(key)
+        if decoded_id is None:
+            id_cipher = self.__id_cipher(kind)
+            decoded_id = int(unicodify(id_cipher.decrypt(codecs.decode(obj_id, 'hex'))).lstrip("!"))
+            self._decoded_ids.put(key, decoded_id)
+        return decoded_id
+
+    def decode_ids(self, obj_ids, kind=None):
+        """
+        Decode each encoded id of the list `obj_ids`, decrypting the ids that
+        are not cached with a single call to the cipher.
+        """
+        keys = [(kind, obj_id) for obj_id in obj_ids]
+        decoded_ids = self._decoded_ids.get_many(keys)
+        missing = collections.OrderedDict()
+        for i, decoded_id in enumerate(decoded_ids):
+            if decoded_id is None:
+                missing.setdefault(keys[i], []).append(i)
+        if missing:
+            encrypted = [codecs.decode(obj_id, 'hex') for _, obj_id in missing]
+            if any(len(e) % 8 for e in encrypted):
+                # what decrypting each id separately would raise
+                raise ValueError("Data must be aligned to block boundary in ECB mode")
+            decrypted = self.__id_cipher(kind).decrypt(b"".join(encrypted))
+            new_ids = []
+            offset = 0
+            for e, indexes in zip(encrypted, missing.values()):
+                decoded_id = int(decrypted[offset:offset + len(e)].lstrip(b"!"))
+                offset += len(e)
+                new_ids.append(decoded_id)
+                for i in indexes:
+                    decoded_ids[i] = decoded_id
+            self._decoded_ids.put_many(zip(missing, new_ids))
+        return decoded_ids
 
     def encode_guid(self, session_key):
         # Session keys are strings
@@ -108,6 +175,59 @@ class IdEncodingHelper(object):
         return id_cipher
 
 
+class _LRUCache(object):
+    """
+    Thread safe mapping holding the `max_size` most recently used entries.
+    """
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()
+        if hasattr(self._entries, 'move_to_end'):
+            self._move_to_end = self._entries.move_to_end
+        else:
+            self._move_to_end = self._reinsert
+
+    def _reinsert(self, key):
+        self._entries[key] = self._entries.pop(key)
+
+    def get(self, key):
+        if not self.max_size:
+            return None
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._move_to_end(key)
+            return value
+
+    def get_many(self, keys):
+        """Return the list of the values of `keys`, None for missing keys."""
+        if not self.max_size:
+            return [None] * len(keys)
+        values = []
+        with self._lock:
+            for key in keys:
+                value = self._entries.get(key)
+                if value is not None:
+                    self._move_to_end(key)
+                values.append(value)
+        return values
+
+    def put(self, key, value):
+        self.put_many([(key, value)])
+
+    def put_many(self, items):
+        if not self.max_size:
+            return
+        with self._lock:
+            for key, value in items:
+                self._entries.pop(key, None)
+                self._entries[key] = value
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
 class _cipher_cache(collections.defaultdict):
 
     def __init__(self, secret_base):
@@ -119,6 +239,17 @@ class _cipher_cache(collections.defaultdict):
         return Blowfish.new(_last_bits(secret), mode=Blowfish.MODE_ECB)
 
 
+def _cache_key(obj_id):
+    """Integer ids are cached as is, others by their padded bytes."""
+    return obj_id if type(obj_id) is int else _pad(obj_id)
+
+
+def _pad(obj_id):
+    """Convert `obj_id` to bytes padded to a multiple of 8 with leading "!"."""
+    s = str(obj_id).encode('ascii') if type(obj_id) is int else smart_str(obj_id)
+    return (b"!" * (8 - len(s) % 8)) + s
+
+
 def _last_bits(secret):
     """We append the kind at the end, so just use the bits at the end.
     """
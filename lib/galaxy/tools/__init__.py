@@ -101,6 +101,7 @@ from .loader import (
     raw_tool_xml_tree,
     template_macro_params
 )
+from .loader_directory import parse_tool_xml_in_parallel
 from .provided_metadata import parse_tool_provided_metadata
 
 log = logging.getLogger(__name__)
@@ -236,6 +237,9 @@ class ToolBox(BaseGalaxyToolBox):
     def __init__(self, config_filenames, tool_root_dir, app):
         self._reload_count = 0
         self.tool_location_fetcher = ToolLocationFetcher()
+        # XML tool sources expanded ahead of time by a pool of worker processes,
+        # keyed on tool path and consumed as the tools are created.
+        self._preparsed_tool_sources = {}
         super(ToolBox, self).__init__(
             config_filenames=config_filenames,
             tool_root_dir=tool_root_dir,
@@ -265,12 +269,44 @@ class ToolBox(BaseGalaxyToolBox):
         # Deprecated method, TODO - eliminate calls to this in test/.
         return self._tools_by_id
 
+    def _init_tools_from_configs(self, config_filenames):
+        try:
+            super(ToolBox, self)._init_tools_from_configs(config_filenames)
+        finally:
+            # Don't let sources of tools that were not loaded go stale.
+            self._preparsed_tool_sources = {}
+
+    def _prepare_tool_sources(self, config_filenames):
+        processes = getattr(self.app.config, "tool_parsing_processes", 1)
+        # Only fan out while the application starts up, forking once threads
+        # are running (i.e. on toolbox reloads) may deadlock the children.
+        if processes < 2 or getattr(self.app, "toolbox", None) is not None:
+            return
+        tool_paths = self._tool_paths_for_configs(config_filenames)
+        if getattr(self.app.config, "enable_beta_tool_formats", False):
+            tool_paths = [path for path in tool_paths if not path.endswith((".yml", ".json", ".cwl"))]
+        if len(tool_paths) < 2:
+            return
+        execution_timer = ExecutionTimer()
+        tool_cache_data_dir = getattr(self.app.config, "tool_cache_data_dir", None)
+        for path, xml_string, macro_paths in parse_tool_xml_in_parallel(tool_paths, processes, tool_cache_data_dir=tool_cache_data_dir):
+            if xml_string is not None:
+                self._preparsed_tool_sources[path] = (xml_string, macro_paths)
+        log.debug("Parsed %d tool sources using %d processes %s", len(tool_paths), processes, execution_timer)
+
     def create_tool(self, config_file, **kwds):
+        preparsed = self._preparsed_tool_sources.pop(config_file, None)
+        if preparsed is not None:
+            xml_string, macro_paths = preparsed
+            tree = ElementTree.ElementTree(ElementTree.fromstring(xml_string.encode("utf-8")))
+            tool_source = get_tool_source(config_file, xml_tree=tree, macro_paths=macro_paths)
+            return self._create_tool_from_source(tool_source, config_file=config_file, **kwds)
         try:
             tool_source = get_tool_source(
                 config_file,
                 enable_beta_formats=getattr(self.app.config, "enable_beta_tool_formats", False),
                 tool_location_fetcher=self.tool_location_fetcher,
+                tool_source_cache=getattr(self.app, "tool_source_cache", None),
             )
         except Exception as e:
             # capture and log parsing errors
@@ -1454,7 +1490,7 @@ class Tool(Dictifiable):
                         output_collections=execution_tracker.output_collections,
                         implicit_collections=execution_tracker.implicit_collections)
 
-    def handle_single_execution(self, trans, rerun_remap_job_id, execution_slice, history, execution_cache=None, completed_job=None, collection_info=None):
+    def handle_single_execution(self, trans, rerun_remap_job_id, execution_slice, history, execution_cache=None, completed_job=None, collection_info=None, enqueue_job=True):
         """
         Return a pair with whether execution is successful as well as either
         resulting output data or an error message indicating the problem.
@@ -1469,6 +1505,7 @@ class Tool(Dictifiable):
                 dataset_collection_elements=execution_slice.dataset_collection_elements,
                 completed_job=completed_job,
                 collection_info=collection_info,
+                enqueue_job=enqueue_job,
             )
         except webob.exc.HTTPFound as e:
             # if it's a webob redirect exception, pass it up the stack
@@ -4,6 +4,7 @@ import re
 from json import dumps
 
 from six import string_types
+from sqlalchemy import and_
 
 from galaxy import model
 from galaxy.jobs.actions.post import ActionBox
@@ -31,6 +32,12 @@ class ToolExecutionCache(object):
         self.trans = trans
         self.current_user_roles = trans.get_current_user_roles()
         self.chrom_info = {}
+        self.dataset_permissions = {}
+        self.derived_permissions = {}
+        self.history_default_permissions = {}
+        # Number of upcoming jobs to allocate output hids for at once, see next_hid().
+        self.expected_jobs = 0
+        self.hid_reservations = {}
 
     def get_chrom_info(self, tool_id, input_dbkey):
         genome_builds = self.trans.app.genome_builds
@@ -44,6 +51,81 @@ class ToolExecutionCache(object):
 
         return chrom_info_pair
 
+    def get_dataset_permissions(self, dataset):
+        """ Return a pair with whether the current user can access the
+        dataset and a list of (action, role_id) pairs of its permissions.
+
+        Inputs shared by all the jobs of a mapped-over execution (e.g. a
+        reference dataset) are only checked once.
+        """
+        dataset_id = dataset.id
+        if dataset_id is not None and dataset_id in self.dataset_permissions:
+            return self.dataset_permissions[dataset_id]
+
+        security_agent = self.trans.app.security_agent
+        can_access = security_agent.can_access_dataset(self.current_user_roles, dataset)
+        action_tuples = []
+        if can_access:
+            for action, roles in security_agent.get_permissions(dataset).items():
+                for role in roles:
+                    action_tuples.append((action.action, model.cached_id(role)))
+        dataset_permissions = (can_access, action_tuples)
+        if dataset_id is not None:
+            self.dataset_permissions[dataset_id] = dataset_permissions
+        return dataset_permissions
+
+    def guess_derived_permissions(self, all_permissions):
+        key = tuple(sorted((action, tuple(sorted(role_ids))) for action, role_ids in all_permissions.items()))
+        if key not in self.derived_permissions:
+            self.derived_permissions[key] = self.trans.app.security_agent.guess_derived_permissions(all_permissions)
+        return self.derived_permissions[key]
+
+    def history_get_default_permissions(self, history):
+        history_id = history.id
+        if history_id is None:
+            return self.trans.app.security_agent.history_get_default_permissions(history)
+        if history_id not in self.history_default_permissions:
+            self.history_default_permissions[history_id] = self.trans.app.security_agent.history_get_default_permissions(history)
+        return self.history_default_permissions[history_id]
+
+    @property
+    def allocates_hids(self):
+        return bool(self.expected_jobs or self.hid_reservations)
+
+    def next_hid(self, history, n=1):
+        """ Return the first of n consecutive new hids for history.
+
+        Allocating a hid commits the session, so when expected_jobs is set
+        hids for that many jobs are allocated at once and handed out to the
+        following calls. Unused hids are given back by release_hids().
+        """
+        history_id = model.cached_id(history)
+        reservation = self.hid_reservations.get(history_id)
+        if reservation and reservation[1] - reservation[0] >= n:
+            hid = reservation[0]
+            reservation[0] += n
+            return hid
+        self.release_hids(history_id)
+        count = n * max(self.expected_jobs, 1)
+        hid = history._next_hid(n=count)
+        if count > n:
+            self.hid_reservations[history_id] = [hid + n, hid + count]
+        self.expected_jobs = 0
+        return hid
+
+    def release_hids(self, history_id=None):
+        """ Give back reserved hids that were not used, unless another hid
+        has been allocated for the history in the meantime.
+        """
+        history_ids = [history_id] if history_id is not None else list(self.hid_reservations.keys())
+        table = self.trans.app.model.History.table
+        for history_id in history_ids:
+            reservation = self.hid_reservations.pop(history_id, None)
+            if reservation and reservation[0] < reservation[1]:
+                self.trans.sa_session.execute(table.update().where(
+                    and_(table.c.id == history_id, table.c.hid_counter == reservation[1])
+                ).values(hid_counter=reservation[0]))
+
 
 class ToolAction(object):
     """
@@ -58,15 +140,19 @@ class ToolAction(object):
 
 class DefaultToolAction(object):
     """Default tool action is to run an external command"""
+    # execute() can leave jobs to be flushed and enqueued by the caller (enqueue_job=False)
+    supports_batch_execution = True
 
-    def _collect_input_datasets(self, tool, param_values, trans, history, current_user_roles=None, dataset_collection_elements=None, collection_info=None):
+    def _collect_input_datasets(self, tool, param_values, trans, history, current_user_roles=None, dataset_collection_elements=None, collection_info=None, execution_cache=None):
         """
         Collect any dataset inputs from incoming. Returns a mapping from
         parameter name to Dataset instance for each tool parameter that is
         of the DataToolParameter type.
         """
+        if execution_cache is None:
+            execution_cache = ToolExecutionCache(trans)
         if current_user_roles is None:
-            current_user_roles = trans.get_current_user_roles()
+            current_user_roles = execution_cache.current_user_roles
         input_datasets = odict()
         all_permissions = {}
 
@@ -102,12 +188,11 @@ class DefaultToolAction(object):
                     for action, role_id in action_tuples:
                         record_permission(action, role_id)
                 else:
-                    if not trans.app.security_agent.can_access_dataset(current_user_roles, data.dataset):
+                    can_access, action_tuples = execution_cache.get_dataset_permissions(data.dataset)
+                    if not can_access:
                         raise Exception("User does not have permission to use a dataset (%s) provided for input." % data.id)
-                    permissions = trans.app.security_agent.get_permissions(data.dataset)
-                    for action, roles in permissions.items():
-                        for role in roles:
-                            record_permission(action.action, model.cached_id(role))
+                    for action, role_id in action_tuples:
+                        record_permission(action, role_id)
                 return data
             if isinstance(input, DataToolParameter):
                 if isinstance(value, list):
@@ -240,7 +325,7 @@ class DefaultToolAction(object):
     def _check_access(self, tool, trans):
         assert tool.allow_user_access(trans.user), "User (%s) is not allowed to access this tool." % (trans.user)
 
-    def _collect_inputs(self, tool, trans, incoming, history, current_user_roles, collection_info):
+    def _collect_inputs(self, tool, trans, incoming, history, current_user_roles, collection_info, execution_cache=None):
         """ Collect history as well as input datasets and collections. """
         app = trans.app
         # Set history.
@@ -253,7 +338,7 @@ class DefaultToolAction(object):
         # input datasets can process these normally.
         inp_dataset_collections = self.collect_input_dataset_collections(tool, incoming)
         # Collect any input datasets from the incoming parameters
-        inp_data, all_permissions = self._collect_input_datasets(tool, incoming, trans, history=history, current_user_roles=current_user_roles, collection_info=collection_info)
+        inp_data, all_permissions = self._collect_input_datasets(tool, incoming, trans, history=history, current_user_roles=current_user_roles, collection_info=collection_info, execution_cache=execution_cache)
 
         # grap tags from incoming HDAs
         preserved_tags = {}
@@ -274,11 +359,15 @@ class DefaultToolAction(object):
                         preserved_tags[tag.value] = tag
         return history, inp_data, inp_dataset_collections, preserved_tags, all_permissions
 
-    def execute(self, tool, trans, incoming=None, return_job=False, set_output_hid=True, history=None, job_params=None, rerun_remap_job_id=None, execution_cache=None, dataset_collection_elements=None, completed_job=None, collection_info=None):
+    def execute(self, tool, trans, incoming=None, return_job=False, set_output_hid=True, history=None, job_params=None, rerun_remap_job_id=None, execution_cache=None, dataset_collection_elements=None, completed_job=None, collection_info=None, enqueue_job=True):
         """
         Executes a tool, creating job and tool outputs, associating them, and
         submitting the job to the job queue. If history is not specified, use
         trans.history as destination for tool's output datasets.
+
+        If enqueue_job is False the job is only added to the session, the
+        caller is responsible for flushing and enqueuing it (this allows many
+        jobs to be flushed together, see ``galaxy.tools.execute``).
         """
         trans.check_user_activation()
         incoming = incoming or {}
@@ -287,7 +376,7 @@ class DefaultToolAction(object):
         if execution_cache is None:
             execution_cache = ToolExecutionCache(trans)
         current_user_roles = execution_cache.current_user_roles
-        history, inp_data, inp_dataset_collections, preserved_tags, all_permissions = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info)
+        history, inp_data, inp_dataset_collections, preserved_tags, all_permissions = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info, execution_cache=execution_cache)
         # Build name for output datasets based on tool name and input names
         on_text = self._get_on_text(inp_data)
 
@@ -327,10 +416,10 @@ class DefaultToolAction(object):
             # Determine output dataset permission/roles list
             existing_datasets = [inp for inp in inp_data.values() if inp]
             if existing_datasets:
-                output_permissions = app.security_agent.guess_derived_permissions(all_permissions)
+                output_permissions = execution_cache.guess_derived_permissions(all_permissions)
             else:
                 # No valid inputs, we will use history defaults
-                output_permissions = app.security_agent.history_get_default_permissions(history)
+                output_permissions = execution_cache.history_get_default_permissions(history)
 
         # Add the dbkey to the incoming parameters
         incoming["dbkey"] = input_dbkey
@@ -402,7 +491,8 @@ class DefaultToolAction(object):
                     dataset_collection_elements[name].hda = data
                 trans.sa_session.add(data)
                 if not completed_job:
-                    trans.app.security_agent.set_all_dataset_permissions(data.dataset, output_permissions, new=True)
+                    # The permissions are flushed along with the job.
+                    trans.app.security_agent.set_all_dataset_permissions(data.dataset, output_permissions, new=True, flush=False)
             data.copy_tags_to(preserved_tags)
 
             if not completed_job and trans.app.config.legacy_eager_objectstore_initialization:
@@ -518,8 +608,14 @@ class DefaultToolAction(object):
                 data = out_data[name]
                 datasets_to_persist.append(data)
         # Set HID and add to history.
+        set_hid = set_output_hid
+        if set_output_hid and datasets_to_persist and execution_cache.allocates_hids:
+            base_hid = execution_cache.next_hid(history, len(datasets_to_persist))
+            for i, data in enumerate(datasets_to_persist):
+                data.hid = base_hid + i
+            set_hid = False
         # This is brand new and certainly empty so don't worry about quota.
-        history.add_datasets(trans.sa_session, datasets_to_persist, set_hid=set_output_hid, quota=False, flush=False)
+        history.add_datasets(trans.sa_session, datasets_to_persist, set_hid=set_hid, quota=False, flush=False)
 
         # Add all the children to their parents
         for parent_name, child_name in parent_to_child_pairs:
@@ -569,6 +665,9 @@ class DefaultToolAction(object):
             trans.sa_session.add(job)
             trans.sa_session.flush()
             trans.response.send_redirect(url_for(controller='tool_runner', action='redirect', redirect_url=redirect_url))
+        elif not enqueue_job:
+            trans.sa_session.add(job)
+            return job, out_data
         else:
             # Dispatch to a job handler. enqueue() is responsible for flushing the job
             app.job_manager.enqueue(job, tool=tool)
@@ -13,7 +13,9 @@ class DataManagerToolAction(DefaultToolAction):
         if isinstance(rval, tuple) and len(rval) == 2 and isinstance(rval[0], trans.app.model.Job):
             assoc = trans.app.model.DataManagerJobAssociation(job=rval[0], data_manager_id=tool.data_manager_id)
             trans.sa_session.add(assoc)
-            trans.sa_session.flush()
+            # Jobs executed in a batch are flushed (with their associations) by the caller.
+            if kwds.get("enqueue_job", True):
+                trans.sa_session.flush()
         else:
             log.error("Got bad return value from DefaultToolAction.execute(): %s" % (rval))
         return rval
@@ -11,13 +11,15 @@ log = logging.getLogger(__name__)
 
 
 class ModelOperationToolAction(DefaultToolAction):
+    # Jobs are flushed and never enqueued, so they cannot be batched.
+    supports_batch_execution = False
 
     def check_inputs_ready(self, tool, trans, incoming, history, execution_cache=None, collection_info=None):
         if execution_cache is None:
             execution_cache = ToolExecutionCache(trans)
 
         current_user_roles = execution_cache.current_user_roles
-        history, inp_data, inp_dataset_collections, _, _ = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info)
+        history, inp_data, inp_dataset_collections, _, _ = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info, execution_cache=execution_cache)
 
         tool.check_inputs_ready(inp_data, inp_dataset_collections)
 
@@ -28,7 +30,7 @@ class ModelOperationToolAction(DefaultToolAction):
             execution_cache = ToolExecutionCache(trans)
 
         current_user_roles = execution_cache.current_user_roles
-        history, inp_data, inp_dataset_collections, preserved_tags, all_permissions = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info)
+        history, inp_data, inp_dataset_collections, preserved_tags, all_permissions = self._collect_inputs(tool, trans, incoming, history, current_user_roles, collection_info, execution_cache=execution_cache)
 
         # Build name for output datasets based on tool name and input names
         on_text = self._get_on_text(inp_data)
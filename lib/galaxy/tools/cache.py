@@ -1,13 +1,22 @@
+import hashlib
+import json
 import logging
 import os
+import tempfile
 from threading import (
     local,
     Lock,
 )
+from xml.etree import ElementTree
 
 from sqlalchemy.orm.exc import DetachedInstanceError
 
+from galaxy.util import (
+    unicodify,
+    xml_to_string,
+)
 from galaxy.util.hash_util import md5_hash_file
+from galaxy.util.path import safe_makedirs
 
 log = logging.getLogger(__name__)
 
@@ -128,6 +137,130 @@ class ToolCache(object):
             self._removed_tools_by_path = {}
 
 
+class ToolSourceCache(object):
+    """
+    Persist macro-expanded XML tool sources on disk so that they can be
+    shared by all Galaxy processes on a node and across restarts.
+
+    Entries are keyed on the absolute path of the tool file and the md5 hash
+    of its content, as tools with the same content in different directories
+    may import different macro files. Each entry also records the hashes of
+    the macro files imported while expanding the tool, so a change to a macro
+    file invalidates every tool that uses it.
+    """
+
+    CACHE_VERSION = 2
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self._lock = Lock()
+        self._macro_hashes = {}
+        self.hits = 0
+        self.misses = 0
+        safe_makedirs(cache_dir)
+
+    def get_tool_source_tree(self, config_file, load_func):
+        """
+        Return a ``(tree, macro_paths)`` tuple for the XML tool at
+        `config_file`, loading it from the on-disk cache if an up-to-date
+        entry exists. Otherwise `load_func` is called with `config_file` to
+        parse the tool and the result is written to the cache.
+        """
+        entry_path, entry = self._current_entry(config_file)
+        if entry is not None:
+            root = ElementTree.fromstring(entry["xml"].encode("utf-8"))
+            return ElementTree.ElementTree(root), entry["macro_paths"]
+        tree, macro_paths = load_func(config_file)
+        if entry_path is not None:
+            self._write_entry(entry_path, self._build_entry(config_file, tree, macro_paths))
+        return tree, macro_paths
+
+    def get_tool_source_xml(self, config_file, load_func):
+        """
+        Like :meth:`get_tool_source_tree` but return the expanded tool as an
+        XML string, avoiding a needless parse when the entry is cached.
+        """
+        entry_path, entry = self._current_entry(config_file)
+        if entry is None:
+            tree, macro_paths = load_func(config_file)
+            entry = self._build_entry(config_file, tree, macro_paths)
+            if entry_path is not None:
+                self._write_entry(entry_path, entry)
+        return entry["xml"], entry["macro_paths"]
+
+    def _current_entry(self, config_file):
+        tool_hash = md5_hash_file(config_file)
+        if tool_hash is None:
+            return None, None
+        tool_path = os.path.abspath(config_file)
+        entry_path = self._entry_path(tool_path, tool_hash)
+        entry = self._read_entry(entry_path)
+        if entry is not None and entry["tool_path"] == tool_path and self._entry_is_current(entry):
+            with self._lock:
+                self.hits += 1
+            return entry_path, entry
+        with self._lock:
+            self.misses += 1
+        return entry_path, None
+
+    def _entry_path(self, tool_path, tool_hash):
+        key = hashlib.md5(("%s\n%s" % (tool_path, tool_hash)).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], "%s.json" % key)
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, "r") as f:
+                entry = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if entry.get("version") != self.CACHE_VERSION:
+            return None
+        return entry
+
+    def _entry_is_current(self, entry):
+        for macro_path, macro_hash in entry["macro_hashes"].items():
+            if self._macro_hash(macro_path) != macro_hash:
+                return False
+        return True
+
+    def _macro_hash(self, macro_path):
+        """Return the md5 hash of a macro file, memoized on its mtime and size."""
+        try:
+            stat = os.stat(macro_path)
+        except OSError:
+            return None
+        key = (stat.st_mtime, stat.st_size)
+        cached = self._macro_hashes.get(macro_path)
+        if cached and cached[0] == key:
+            return cached[1]
+        macro_hash = md5_hash_file(macro_path)
+        self._macro_hashes[macro_path] = (key, macro_hash)
+        return macro_hash
+
+    def _build_entry(self, config_file, tree, macro_paths):
+        macro_paths = macro_paths or []
+        return {
+            "version": self.CACHE_VERSION,
+            "tool_path": os.path.abspath(config_file),
+            "xml": unicodify(xml_to_string(tree.getroot())),
+            "macro_paths": macro_paths,
+            "macro_hashes": {path: self._macro_hash(path) for path in macro_paths},
+        }
+
+    def _write_entry(self, entry_path, entry):
+        entry_dir = os.path.dirname(entry_path)
+        try:
+            safe_makedirs(entry_dir)
+            # Write to a temporary file and rename it into place so that
+            # concurrent readers in other processes never see partial entries.
+            fd, temp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(entry, f)
+            os.rename(temp_path, entry_path)
+        except (IOError, OSError) as e:
+            log.debug("Failed to write tool source cache entry %s: %s", entry_path, e)
+
+
 class ToolShedRepositoryCache(object):
     """
     Cache installed ToolShedRepository objects.
@@ -6,12 +6,14 @@ users to configure data tables for a local Galaxy instance without needing
 to modify the tool configurations.
 """
 
+import functools
 import hashlib
 import logging
 import os
 import os.path
 import re
 import string
+import threading
 import time
 from glob import glob
 from tempfile import NamedTemporaryFile
@@ -209,6 +211,9 @@ class ToolDataTableManager(object):
         elif not isinstance(table_names, list):
             table_names = [table_names]
         for table_name in table_names:
+            if not tables[table_name].files_modified():
+                log.debug("Files of tool data table '%s' not modified, not reloading.", table_name)
+                continue
             tables[table_name].reload_from_files()
             log.debug("Reloaded tool data table '%s' from files.", table_name)
         return table_names
@@ -282,6 +287,13 @@ class ToolDataTable(object):
     def merge_tool_data_table(self, other_table, allow_duplicates=True, persist=False, persist_on_error=False, entry_source=None, **kwd):
         raise NotImplementedError("Abstract method")
 
+    def files_modified(self):
+        """
+        Return True if the files of the table may have been modified since
+        they were loaded.
+        """
+        return True
+
     def reload_from_files(self):
         new_version = self._update_version()
         merged_info = self._merged_load_info
@@ -303,6 +315,9 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
             <file path="..." />
         </table>
 
+    Files are read on the first access to the data of the table, and the
+    rows are indexed by the value of a column on the first lookup by that
+    column.
     """
     dict_collection_visible_keys = ['name']
 
@@ -311,7 +326,15 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
     def __init__(self, config_element, tool_data_path, from_shed_config=False, filename=None, tool_data_path_files=None):
         super(TabularToolDataTable, self).__init__(config_element, tool_data_path, from_shed_config, filename, tool_data_path_files)
         self.config_element = config_element
-        self.data = []
+        self._data = []
+        # Column index -> {value: [rows with value in column]}
+        self._indexes = {}
+        # Loads of files and merges of tables deferred to the first access.
+        self._pending_loads = []
+        self._load_lock = threading.Lock()
+        self._loading_thread = None
+        # Filename -> (modification time, size) of the file when read.
+        self._file_signatures = {}
         self.configure_and_load(config_element, tool_data_path, from_shed_config)
 
     def configure_and_load(self, config_element, tool_data_path, from_shed_config=False, url_timeout=10):
@@ -386,7 +409,13 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
 
             errors = []
             if found:
-                self.extend_data_with(filename, errors=errors)
+                if tmp_file is not None:
+                    # the temporary file is removed below, read it now
+                    here = os.path.dirname(os.path.abspath(filename))
+                    fields = self.parse_file_fields(open(filename), errors=errors, here=here)
+                    self._pending_loads.append(functools.partial(self._extend_data, fields))
+                else:
+                    self._pending_loads.append(functools.partial(self.extend_data_with, filename, errors=errors))
                 self._update_version()
             else:
                 self.missing_index_file = filename
@@ -401,6 +430,41 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
             if tmp_file is not None:
                 tmp_file.close()
 
+    @property
+    def data(self):
+        self._load_pending()
+        return self._data
+
+    def _load_pending(self):
+        """
+        Read the files of the table and merge the tables whose loading was
+        deferred to the first access of the data.
+        """
+        if not self._pending_loads or self._loading_thread is threading.current_thread():
+            return
+        with self._load_lock:
+            self._loading_thread = threading.current_thread()
+            try:
+                while self._pending_loads:
+                    try:
+                        self._pending_loads[0]()
+                    except Exception:
+                        log.exception("Error loading tool data table '%s'", self.name)
+                    # removed once done, other threads wait for the lock meanwhile
+                    self._pending_loads.pop(0)
+            finally:
+                self._loading_thread = None
+
+    def files_modified(self):
+        for filename, info in self.filenames.items():
+            if info['found']:
+                # files not read yet are read again on reload
+                if filename not in self._file_signatures or self._file_signatures[filename] != _file_signature(filename):
+                    return True
+            elif os.path.exists(filename):
+                return True
+        return False
+
     def merge_tool_data_table(self, other_table, allow_duplicates=True, persist=False, persist_on_error=False, entry_source=None, **kwd):
         assert self.columns == other_table.columns, "Merging tabular data tables with non matching columns is not allowed: %s:%s != %s:%s" % (self.name, self.columns, other_table.name, other_table.columns)
         # merge filename info
@@ -409,13 +473,22 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
                 self.filenames[filename] = info
         # save info about table
         self._merged_load_info.append((other_table.__class__, other_table._load_info))
+        merge = functools.partial(self._merge_data, other_table, allow_duplicates=allow_duplicates, persist=persist, persist_on_error=persist_on_error, entry_source=entry_source, **kwd)
+        if self._pending_loads or other_table._pending_loads:
+            self._pending_loads.append(merge)
+            return self._loaded_content_version
+        return merge()
+
+    def _merge_data(self, other_table, allow_duplicates=True, persist=False, persist_on_error=False, entry_source=None, **kwd):
+        other_data = other_table.data
+        self._file_signatures.update(other_table._file_signatures)
         # If we are merging in a data table that does not allow duplicates, enforce that upon the data table
         if self.allow_duplicate_entries and not other_table.allow_duplicate_entries:
             log.debug('While attempting to merge tool data table "%s", the other instance of the table specified that duplicate entries are not allowed, now deduplicating all previous entries.', self.name)
             self.allow_duplicate_entries = False
             self._deduplicate_data()
         # add data entries and return current data table version
-        return self.add_entries(other_table.data, allow_duplicates=allow_duplicates, persist=persist, persist_on_error=persist_on_error, entry_source=entry_source, **kwd)
+        return self.add_entries(other_data, allow_duplicates=allow_duplicates, persist=persist, persist_on_error=persist_on_error, entry_source=entry_source, **kwd)
 
     def handle_found_index_file(self, filename):
         self.missing_index_file = None
@@ -424,27 +497,43 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
     def get_fields(self):
         return self.data
 
+    def get_fields_by_column(self, column, value):
+        """
+        Return the rows having `value` in the column with index `column`.
+        """
+        index = self._indexes.get(column)
+        if index is None:
+            index = {}
+            for fields in self.get_fields():
+                index.setdefault(fields[column], []).append(fields)
+            self._indexes[column] = index
+        try:
+            return list(index.get(value, ()))
+        except TypeError:
+            # unhashable values match no field
+            return []
+
     def get_field(self, value):
         rval = None
-        for i in self.get_named_fields_list():
-            if i['value'] == value:
-                rval = TabularToolDataField(i)
+        rows = self.get_fields_by_column(self.columns['value'], value)
+        if rows:
+            rval = TabularToolDataField(self._named_fields(rows[-1], self.get_column_name_list()))
         return rval
 
     def get_named_fields_list(self):
-        rval = []
         named_columns = self.get_column_name_list()
-        for fields in self.get_fields():
-            field_dict = {}
-            for i, field in enumerate(fields):
-                if i == len(named_columns):
-                    break
-                field_name = named_columns[i]
-                if field_name is None:
-                    field_name = i  # check that this is supposed to be 0 based.
-                field_dict[field_name] = field
-            rval.append(field_dict)
-        return rval
+        return [self._named_fields(fields, named_columns) for fields in self.get_fields()]
+
+    def _named_fields(self, fields, named_columns):
+        field_dict = {}
+        for i, field in enumerate(fields):
+            if i == len(named_columns):
+                break
+            field_name = named_columns[i]
+            if field_name is None:
+                field_name = i  # check that this is supposed to be 0 based.
+            field_dict[field_name] = field
+        return field_dict
 
     def get_version_fields(self):
         return (self._loaded_content_version, self.get_fields())
@@ -485,7 +574,13 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
 
     def extend_data_with(self, filename, errors=None):
         here = os.path.dirname(os.path.abspath(filename))
-        self.data.extend(self.parse_file_fields(open(filename), errors=errors, here=here))
+        self._file_signatures[filename] = _file_signature(filename)
+        with open(filename) as reader:
+            self._extend_data(self.parse_file_fields(reader, errors=errors, here=here))
+
+    def _extend_data(self, fields):
+        self.data.extend(fields)
+        self._indexes = {}
         if not self.allow_duplicate_entries:
             self._deduplicate_data()
 
@@ -554,17 +649,18 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
                 return default
         rval = []
         # Look for table entry.
-        for fields in self.get_fields():
-            if fields[query_col] == query_val:
-                if return_attr is None:
-                    field_dict = {}
-                    for i, col_name in enumerate(self.get_column_name_list()):
-                        field_dict[col_name or i] = fields[i]
-                    rval.append(field_dict)
-                else:
-                    rval.append(fields[return_col])
-                if limit is not None and len(rval) == limit:
-                    break
+        rows = self.get_fields_by_column(query_col, query_val)
+        if limit is not None:
+            rows = rows[:limit]
+        if return_attr is None:
+            column_names = self.get_column_name_list()
+            for fields in rows:
+                field_dict = {}
+                for i, col_name in enumerate(column_names):
+                    field_dict[col_name or i] = fields[i]
+                rval.append(field_dict)
+        else:
+            rval = [fields[return_col] for fields in rows]
         return rval or default
 
     def get_filename_for_source(self, source, default=None):
@@ -600,8 +696,10 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
         is_error = False
         if self.largest_index < len(fields):
             fields = self._replace_field_separators(fields)
-            if (allow_duplicates and self.allow_duplicate_entries) or fields not in self.get_fields():
+            if (allow_duplicates and self.allow_duplicate_entries) or fields not in self.get_fields_by_column(0, fields[0]):
                 self.data.append(fields)
+                for column, index in self._indexes.items():
+                    index.setdefault(fields[column], []).append(fields)
             else:
                 log.debug("Attempted to add fields (%s) to data table '%s', but this entry already exists and allow_duplicates is False.", fields, self.name)
                 is_error = True
@@ -700,6 +798,8 @@ class TabularToolDataTable(ToolDataTable, Dictifiable):
                 hash_set.add(fields_hash)
         for i in reversed(dup_lines):
             self.data.pop(i)
+        if dup_lines:
+            self._indexes = {}
 
     @property
     def xml_string(self):
@@ -765,6 +865,15 @@ class TabularToolDataField(Dictifiable):
         return rval
 
 
+def _file_signature(path):
+    """Return the modification time and size of the file `path`, None if missing."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime, stat.st_size)
+
+
 def expand_here_template(content, here=None):
     if here and content:
         content = string.Template(content).safe_substitute({"__HERE__": here})
@@ -5,6 +5,8 @@ import os
 import shutil
 import sys
 import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 import bdbag.bdbag_api
 from six.moves import StringIO
@@ -35,7 +37,7 @@ def main(argv=None):
     with open(request_path) as f:
         request = json.load(f)
 
-    upload_config = UploadConfig(request, registry)
+    upload_config = UploadConfig(request, registry, workers=args.workers)
     galaxy_json = _request_to_galaxy_json(upload_config, request)
     with open("galaxy.json", "w") as f:
         json.dump(galaxy_json, f)
@@ -90,9 +92,9 @@ def _fetch_target(upload_config, target):
     if "name" in target:
         fetched_target["name"] = target["name"]
 
-    def _resolve_src(item):
-        converted_path = None
-
+    def _prepare_src(item):
+        # Fetch, validate, decompress, convert and sniff the item - this
+        # doesn't depend on other items so it may run concurrently.
         name, path = _has_src_to_path(upload_config, item, is_dataset=True)
         sources = []
 
@@ -105,11 +107,7 @@ def _fetch_target(upload_config, target):
             hash_value = hash_dict.get("hash_value")
             _handle_hash_validation(upload_config, hash_function, hash_value, path)
 
-        dbkey = item.get("dbkey", "?")
         requested_ext = item.get("ext", "auto")
-        info = item.get("info", None)
-        tags = item.get("tags", [])
-        object_id = item.get("object_id", None)
         link_data_only = upload_config.link_data_only
         if "link_data_only" in item:
             # Allow overriding this on a per file basis.
@@ -118,7 +116,6 @@ def _fetch_target(upload_config, target):
         space_to_tab = upload_config.get_option(item, "space_to_tab")
         auto_decompress = upload_config.get_option(item, "auto_decompress")
         in_place = item.get("in_place", False)
-        purge_source = item.get("purge_source", True)
 
         registry = upload_config.registry
         check_content = upload_config.check_content
@@ -137,13 +134,24 @@ def _fetch_target(upload_config, target):
             convert_to_posix_lines=to_posix_lines,
             convert_spaces_to_tabs=space_to_tab,
         )
-
         if link_data_only:
             # Never alter a file that will not be copied to Galaxy's local file store.
             if datatype.dataset_content_needs_grooming(path):
                 err_msg = 'The uploaded files need grooming, so change your <b>Copy data into Galaxy?</b> selection to be ' + \
                     '<b>Copy files into Galaxy</b> instead of <b>Link to files without copying into Galaxy</b> so grooming can be performed.'
                 raise UploadProblemException(err_msg)
+        return item, name, path, sources, hashes, ext, datatype, link_data_only, converted_path
+
+    def _finish_src(prepared):
+        # Move the item into the working directory - done in request order so
+        # output paths are the same regardless of concurrency.
+        item, name, path, sources, hashes, ext, datatype, link_data_only, converted_path = prepared
+        dbkey = item.get("dbkey", "?")
+        info = item.get("info", None)
+        tags = item.get("tags", [])
+        object_id = item.get("object_id", None)
+        in_place = item.get("in_place", False)
+        purge_source = item.get("purge_source", True)
 
         # If this file is not in the workdir make sure it gets there.
         if not link_data_only and converted_path:
@@ -164,7 +172,10 @@ def _fetch_target(upload_config, target):
             rval["tags"] = tags
         return rval
 
-    elements = elements_tree_map(_resolve_src, items)
+    leaves = []
+    elements_tree_map(leaves.append, items)
+    resolved = iter(map_in_order(_prepare_src, _finish_src, leaves, upload_config.workers))
+    elements = elements_tree_map(lambda item: next(resolved), items)
 
     fetched_target["elements"] = elements
     return fetched_target
@@ -196,6 +207,34 @@ def elements_tree_map(f, items):
     return new_items
 
 
+def map_in_order(prepare, finish, items, workers=1):
+    """Return ``[finish(prepare(item)) for item in items]``.
+
+    With more than one worker, ``prepare`` is applied to up to ``workers``
+    items ahead of the one being finished, in a thread pool, while ``finish``
+    is always called in order from the calling thread. Only that many items
+    are in flight at any time, bounding the open files, temporary files and
+    memory used.
+    """
+    if workers <= 1:
+        return [finish(prepare(item)) for item in items]
+    results = []
+    pending = deque()
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        for item in items:
+            pending.append(executor.submit(prepare, item))
+            if len(pending) > workers:
+                results.append(finish(pending.popleft().result()))
+        while pending:
+            results.append(finish(pending.popleft().result()))
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=True)
+    return results
+
+
 def _directory_to_items(directory):
     items = []
     dir_elements = {}
@@ -255,13 +294,15 @@ def _arg_parser():
     parser.add_argument("--datatypes-registry")
     parser.add_argument("--request-version")
     parser.add_argument("--request")
+    parser.add_argument("--workers", type=int, default=1, help="number of datasets to fetch and process concurrently")
     return parser
 
 
 class UploadConfig(object):
 
-    def __init__(self, request, registry):
+    def __init__(self, request, registry, workers=1):
         self.registry = registry
+        self.workers = workers
         self.check_content = request.get("check_content" , True)
         self.to_posix_lines = request.get("to_posix_lines", False)
         self.space_to_tab = request.get("space_to_tab", False)
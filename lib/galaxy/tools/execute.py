@@ -10,6 +10,7 @@ import six
 import six.moves
 
 from galaxy import model
+from galaxy.exceptions import ToolExecutionError
 from galaxy.model.dataset_collections.structure import get_structure, tool_output_to_structure
 from galaxy.tools.actions import filter_output, on_text_for_names, ToolExecutionCache
 from galaxy.tools.parser import ToolOutputCollectionPart
@@ -45,6 +46,12 @@ def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, colle
     else:
         execution_tracker = WorkflowStepExecutionTracker(trans, tool, mapping_params, collection_info, invocation_step, job_callback=job_callback)
     execution_cache = ToolExecutionCache(trans)
+    tool_action = tool.tool_action
+    # Jobs of a batch are flushed and enqueued together, rather than one
+    # transaction (or more) per job.
+    batch_size = getattr(trans.app.config, "tool_execution_batch_size", 0) or 0
+    batch_execution = batch_size > 1 and rerun_remap_job_id is None and getattr(tool_action, "supports_batch_execution", False)
+    pending_jobs = []
 
     def execute_single_job(execution_slice, completed_job):
         job_timer = ExecutionTimer()
@@ -61,15 +68,42 @@ def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, colle
             # Only workflow invocation code gets to set this, ignore user supplied
             # values or rerun parameters.
             del params['__workflow_resource_params__']
-        job, result = tool.handle_single_execution(trans, rerun_remap_job_id, execution_slice, history, execution_cache, completed_job, collection_info)
-        if job:
+        job, result = tool.handle_single_execution(trans, rerun_remap_job_id, execution_slice, history, execution_cache, completed_job, collection_info, enqueue_job=not batch_execution)
+        if not job:
+            execution_tracker.record_error(result)
+        elif batch_execution:
+            pending_jobs.append((execution_slice, job, result, job_timer))
+        else:
             message = EXECUTION_SUCCESS_MESSAGE % (tool.id, job.id, job_timer)
             log.debug(message)
             execution_tracker.record_success(execution_slice, job, result)
-        else:
-            execution_tracker.record_error(result)
 
-    tool_action = tool.tool_action
+    def enqueue_pending_jobs():
+        execution_cache.release_hids()
+        if not pending_jobs:
+            return
+        batch_timer = ExecutionTimer()
+        # Flush all the jobs, outputs and associations of the batch at once so the jobs have ids,
+        # then assign handlers to all of them and flush the assignments at once.
+        trans.sa_session.flush()
+        enqueued = []
+        for execution_slice, job, result, job_timer in pending_jobs:
+            try:
+                trans.app.job_manager.enqueue(job, tool=tool, flush=False)
+            except ToolExecutionError as exc:
+                job.mark_failed(info=exc.err_msg, blurb=exc.err_code.default_error_message)
+                log.error("Tool execution failed for job: %s", job.id)
+                execution_tracker.record_error('Error executing tool: %s' % str(exc))
+                continue
+            enqueued.append((execution_slice, job, result, job_timer))
+        trans.sa_session.flush()
+        for execution_slice, job, result, job_timer in enqueued:
+            trans.log_event("Added job to the job queue, id: %s" % str(job.id), tool_id=job.tool_id)
+            log.debug(EXECUTION_SUCCESS_MESSAGE % (tool.id, job.id, job_timer))
+            execution_tracker.record_success(execution_slice, job, result)
+        log.debug("Flushed and enqueued batch of %d job(s) for tool %s %s" % (len(pending_jobs), tool.id, batch_timer))
+        del pending_jobs[:]
+
     if hasattr(tool_action, "check_inputs_ready"):
         for params in execution_tracker.param_combinations:
             # This will throw an exception if the tool is not ready.
@@ -93,7 +127,12 @@ def execute(trans, tool, mapping_params, history, rerun_remap_job_id=None, colle
             has_remaining_jobs = True
             break
         else:
+            if batch_execution and not pending_jobs:
+                execution_cache.expected_jobs = min(batch_size, job_count - i)
             execute_single_job(execution_slice, completed_jobs[i])
+            if batch_execution and len(pending_jobs) >= batch_size:
+                enqueue_pending_jobs()
+    enqueue_pending_jobs()
 
     if has_remaining_jobs:
         raise PartialJobExecution(execution_tracker)
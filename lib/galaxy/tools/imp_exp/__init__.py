@@ -102,6 +102,9 @@ class JobExportHistoryArchiveWrapper:
         options = "--galaxy-version '%s'" % VERSION_MAJOR
         if jeha.compressed:
             options += " -G"
+            compression_threads = getattr(app.config, "history_export_compression_threads", 1)
+            if compression_threads > 1:
+                options += " --compression-threads %d" % compression_threads
         return "%s %s" % (options, temp_output_dir)
 
     def cleanup_after_job(self):
@@ -4,6 +4,7 @@ Export a history to an archive file using attribute files.
 
 usage: %prog history_attrs dataset_attrs job_attrs out_file
     -G, --gzip: gzip archive file
+    --compression-threads: number of threads used to gzip the archive
 """
 from __future__ import print_function
 
@@ -15,10 +16,10 @@ import sys
 from galaxy.model.store import tar_export_directory
 
 
-def create_archive(export_directory, out_file, gzip=False):
+def create_archive(export_directory, out_file, gzip=False, compression_threads=1):
     """Create archive from the given attribute/metadata files and save it to out_file."""
     try:
-        tar_export_directory(export_directory, out_file, gzip)
+        tar_export_directory(export_directory, out_file, gzip, compression_threads=compression_threads)
         # Status.
         print('Created history archive.')
         return 0
@@ -32,6 +33,7 @@ def main(argv=None):
     parser = optparse.OptionParser()
     parser.add_option('-G', '--gzip', dest='gzip', action="store_true", help='Compress archive using gzip.')
     parser.add_option('--galaxy-version', dest='galaxy_version', help='Galaxy version that initiated the command.', default=None)
+    parser.add_option('--compression-threads', dest='compression_threads', type='int', default=1, help='Number of threads used to gzip the archive (with pigz).')
     (options, args) = parser.parse_args(argv)
     galaxy_version = options.galaxy_version
     if galaxy_version is None:
@@ -61,7 +63,7 @@ def main(argv=None):
         shutil.move(args[2], job_attrs)
 
     # Create archive.
-    return create_archive(temp_directory, out_file, gzip=gzip)
+    return create_archive(temp_directory, out_file, gzip=gzip, compression_threads=options.compression_threads)
 
 
 if __name__ == "__main__":
@@ -4,6 +4,7 @@ Unpack a tar or tar.gz archive into a directory.
 
 usage: %prog archive_source dest_dir
     --[url|file] source type, either a URL or a file.
+    --stream: only fetch the archive, Galaxy reads it when finishing the import.
 """
 from __future__ import print_function
 
@@ -20,6 +21,9 @@ import requests
 # Set max size of archive/file that will be handled to be 100 GB. This is
 # arbitrary and should be adjusted as needed.
 MAX_SIZE = 100 * math.pow(2, 30)
+# Name of the archive in dest_dir if it's not unpacked, must match
+# galaxy.model.store.STREAMED_ARCHIVE_FILENAME.
+STREAMED_ARCHIVE_FILENAME = 'history_archive'
 
 
 def url_to_file(url, dest_file):
@@ -78,6 +82,17 @@ def main(options, args):
         archive_source = b64decode(archive_source).decode('utf-8')
         dest_dir = b64decode(dest_dir).decode('utf-8')
 
+    if getattr(options, 'stream', False):
+        # Members are checked when the archive is read by Galaxy.
+        if not os.path.exists(dest_dir):
+            os.makedirs(dest_dir)
+        streamed_archive = os.path.join(dest_dir, STREAMED_ARCHIVE_FILENAME)
+        if is_url:
+            url_to_file(archive_source, streamed_archive)
+        elif is_file:
+            os.symlink(os.path.abspath(archive_source), streamed_archive)
+        return
+
     # Get archive from URL.
     if is_url:
         archive_file = url_to_file(archive_source, tempfile.NamedTemporaryFile(dir=dest_dir).name)
@@ -95,6 +110,7 @@ if __name__ == "__main__":
     parser.add_option('-U', '--url', dest='is_url', action="store_true", help='Source is a URL.')
     parser.add_option('-F', '--file', dest='is_file', action="store_true", help='Source is a file.')
     parser.add_option('-e', '--encoded', dest='is_b64encoded', action="store_true", default=False, help='Source and destination dir values are base64 encoded.')
+    parser.add_option('-S', '--stream', dest='stream', action="store_true", default=False, help='Fetch the archive without unpacking it.')
     (options, args) = parser.parse_args()
     try:
         main(options, args)
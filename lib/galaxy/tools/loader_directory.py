@@ -2,13 +2,19 @@
 import fnmatch
 import glob
 import logging
+import multiprocessing
 import os
 import re
 import sys
 
 import yaml
 
-from galaxy.util import checkers
+from galaxy.util import (
+    checkers,
+    unicodify,
+    xml_to_string,
+)
+from .cache import ToolSourceCache
 from .parser import get_tool_source
 from ..tools import loader
 
@@ -116,6 +122,41 @@ def _load_tools_from_path(
     return loaded_objects
 
 
+def parse_tool_xml_in_parallel(paths, processes, tool_cache_data_dir=None, chunksize=8):
+    """Expand XML tool files (including macros) across a pool of processes.
+
+    Yields ``(path, xml_string, macro_paths)`` tuples in the order of
+    ``paths``. ``xml_string`` is only returned for tools that use macros,
+    handing back plain tools would merely trade parsing the file for parsing
+    the string. It is ``None`` for those and for tools that could not be
+    parsed, the caller should then load them normally (so errors are reported
+    as usual). If ``tool_cache_data_dir`` is set workers read from and
+    populate the persistent tool source cache.
+    """
+    pool = multiprocessing.Pool(processes)
+    try:
+        args = ((path, tool_cache_data_dir) for path in paths)
+        for result in pool.imap(_parse_tool_xml, args, chunksize):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def _parse_tool_xml(args):
+    path, tool_cache_data_dir = args
+    try:
+        if tool_cache_data_dir:
+            xml_string, macro_paths = ToolSourceCache(tool_cache_data_dir).get_tool_source_xml(path, loader.load_tool_with_refereces)
+        else:
+            tree, macro_paths = loader.load_tool_with_refereces(path)
+            xml_string = unicodify(xml_to_string(tree.getroot())) if macro_paths else None
+        if not macro_paths:
+            return path, None, []
+        return path, xml_string, macro_paths
+    except Exception:
+        return path, None, None
+
+
 def is_tool_load_error(obj):
     """Predicate to determine if object loaded for tool is a tool error."""
     return obj is TOOL_LOAD_ERROR
@@ -312,4 +353,5 @@ __all__ = (
     "looks_like_a_tool_cwl",
     "looks_like_a_tool_xml",
     "looks_like_a_tool_yaml",
+    "parse_tool_xml_in_parallel",
 )
@@ -1600,6 +1600,12 @@ class BaseDataToolParameter(ToolParameter):
             dataset_matcher_factory = get_dataset_matcher_factory(trans)
             dataset_matcher = dataset_matcher_factory.dataset_matcher(self, other_values)
             if isinstance(self, DataToolParameter):
+                if getattr(trans, "dataset_matcher_factory", None):
+                    # reuse the options shared with to_dict in this request
+                    options = dataset_matcher_factory.hda_options(dataset_matcher, history)
+                    if options:
+                        return dataset_matcher_factory.option_hda(options[-1])
+                    return None
                 for hda in reversed(history.active_visible_datasets_and_roles):
                     match = dataset_matcher.hda_match(hda)
                     if match:
@@ -1943,14 +1949,20 @@ class DataToolParameter(BaseDataToolParameter):
 
         # add datasets
         hda_list = util.listify(other_values.get(self.name))
-        # Prefetch all at once, big list of visible, non-deleted datasets.
-        for hda in history.active_visible_datasets_and_roles:
-            match = dataset_matcher.hda_match(hda)
-            if match:
-                m = match.hda
-                hda_list = [h for h in hda_list if h != m and h != hda]
-                m_name = '%s (as %s)' % (match.original_hda.name, match.target_ext) if match.implicit_conversion else m.name
-                append(d['options']['hda'], m, m_name, 'hda')
+        # Matched once per request (and set of formats) from a prefetched
+        # list of visible, non-deleted datasets.
+        option_ids = set()
+        for option in dataset_matcher_factory.hda_options(dataset_matcher, history):
+            option_ids.update((option.id, option.original_id))
+            d['options']['hda'].append({
+                'id'   : trans.security.encode_id(option.id),
+                'hid'  : option.hid,
+                'name' : option.name,
+                'tags' : option.tags,
+                'src'  : 'hda',
+                'keep' : False
+            })
+        hda_list = [h for h in hda_list if isinstance(h, galaxy.model.HistoryDatasetCollectionAssociation) or getattr(h, 'id', None) not in option_ids]
         for hda in hda_list:
             if hasattr(hda, 'hid'):
                 if hda.deleted:
@@ -1,9 +1,20 @@
+import threading
+from collections import namedtuple, OrderedDict
 from logging import getLogger
 
+from sqlalchemy import func, select
+from sqlalchemy.orm import object_session
+
 import galaxy.model
 
 log = getLogger(__name__)
 
+# A dataset that can be selected for a data parameter: `id`, `hid`, `name`
+# and `tags` describe the dataset to select (the converted dataset if the
+# match is an existing implicit conversion), `original_id` the history
+# dataset it was matched from.
+HdaOption = namedtuple("HdaOption", ["id", "hid", "name", "tags", "original_id"])
+
 
 def set_dataset_matcher_factory(trans, tool):
     trans.dataset_matcher_factory = DatasetMatcherFactory(trans, tool)
@@ -26,6 +37,8 @@ class DatasetMatcherFactory(object):
         self._tool = tool
         self._data_inputs = []
         self._matches_format_cache = {}
+        self._hda_options = {}
+        self._matched_hdas = {}
         if tool:
             valid_input_states = tool.valid_input_states
         else:
@@ -63,6 +76,50 @@ class DatasetMatcherFactory(object):
 
         return formats[format]
 
+    def hda_options(self, dataset_matcher, history):
+        """
+        Return the active, visible datasets of `history` matching
+        `dataset_matcher` as a list of `HdaOption`s ordered by hid.
+
+        Unless the parameter filters datasets on other parameter values, the
+        options only depend on the formats and valid states, so they are
+        computed once per request for each of these and, if the app has a
+        `DatasetOptionsCache`, reused across requests while the history is
+        unchanged.
+        """
+        param = dataset_matcher.param
+        if param.options:
+            return _hda_options(dataset_matcher, history.active_visible_datasets_and_roles, self._matched_hdas)
+        require_public = dataset_matcher.require_public
+        key = (
+            tuple(sorted(set(extension.strip().lower() for extension in param.extensions))),
+            tuple(sorted(self.valid_input_states)),
+            require_public,
+        )
+        options = self._hda_options.get(key)
+        if options is None:
+            def build():
+                return _hda_options(dataset_matcher, history.active_visible_datasets_and_roles, self._matched_hdas)
+
+            options_cache = getattr(self._trans.app, "dataset_options_cache", None)
+            # the public status of datasets does not change their update time
+            if options_cache is not None and not require_public and history.id is not None:
+                options = options_cache.get_options(history, key, build)
+            else:
+                options = build()
+            self._hda_options[key] = options
+        return options
+
+    def option_hda(self, option):
+        """
+        Return the dataset to select for `option`, loading it only if the
+        options were cached by a previous request.
+        """
+        hda = self._matched_hdas.get(option.id)
+        if hda is None:
+            hda = self._trans.sa_session.query(galaxy.model.HistoryDatasetAssociation).get(option.id)
+        return hda
+
     def _collect_data_inputs(self, input):
         type_name = input.type
         if type_name == "repeat" or type_name == "upload_dataset" or type_name == "section":
@@ -99,6 +156,7 @@ class DatasetMatcher(object):
         self.trans = trans
         self.param = param
         self.tool = param.tool
+        self.require_public = bool(self.tool and self.tool.tool_type == 'data_destination')
         filter_values = set()
         if param.options and other_values:
             try:
@@ -143,8 +201,7 @@ class DatasetMatcher(object):
         if valid_state and (not ensure_visible or hda.visible):
             # If we are sending data to an external application, then we need to make sure there are no roles
             # associated with the dataset that restrict its access from "public".
-            require_public = self.tool and self.tool.tool_type == 'data_destination'
-            if require_public and not self.trans.app.security_agent.dataset_is_public(dataset):
+            if self.require_public and not self.trans.app.security_agent.dataset_is_public(dataset):
                 return False
             return self.valid_hda_match(hda, check_implicit_conversions=check_implicit_conversions)
 
@@ -156,6 +213,80 @@ class DatasetMatcher(object):
         return param.options and param.get_options_filter_attribute(hda) not in self.filter_values
 
 
+def _hda_options(dataset_matcher, hdas, matched_hdas):
+    options = []
+    for hda in hdas:
+        match = dataset_matcher.hda_match(hda)
+        if match:
+            m = match.hda
+            matched_hdas[m.id] = m
+            name = '%s (as %s)' % (match.original_hda.name, match.target_ext) if match.implicit_conversion else m.name
+            tags = [t.user_tname if not t.value else "%s:%s" % (t.user_tname, t.value) for t in m.tags]
+            options.append(HdaOption(m.id, m.hid, name, tags, hda.id))
+    return options
+
+
+class DatasetOptionsCache(object):
+    """
+    Keeps the dataset options of data parameters (see
+    `DatasetMatcherFactory.hda_options`) of recently used histories between
+    requests.
+
+    The options of a history are dropped when its update time changes, or
+    the number or latest update time of its datasets or the number or last
+    id of their tags - all read with one aggregate query per request.
+    """
+
+    def __init__(self, max_histories=1000):
+        self.max_histories = max_histories
+        self.lock = threading.Lock()
+        self._histories = OrderedDict()
+
+    def get_options(self, history, key, build):
+        """
+        Return the options for `key` in `history`, calling `build()` to
+        compute them if they are not cached for its current version.
+        """
+        version = self._history_version(history)
+        with self.lock:
+            entry = self._histories.pop(history.id, None)
+            if entry is None or entry[0] != version:
+                entry = (version, {})
+            self._histories[history.id] = entry
+            while len(self._histories) > self.max_histories:
+                self._histories.popitem(last=False)
+            options = entry[1].get(key)
+        if options is None:
+            options = build()
+            with self.lock:
+                entry[1][key] = options
+        return options
+
+    def clear(self, history_id=None):
+        with self.lock:
+            if history_id is None:
+                self._histories.clear()
+            else:
+                self._histories.pop(history_id, None)
+
+    def _history_version(self, history):
+        hda_table = galaxy.model.HistoryDatasetAssociation.table
+        dataset_table = galaxy.model.Dataset.table
+        tag_table = galaxy.model.HistoryDatasetAssociationTagAssociation.table
+        history_hdas = hda_table.c.history_id == history.id
+        datasets = select([
+            func.count(hda_table.c.id),
+            func.max(hda_table.c.update_time),
+            func.max(dataset_table.c.update_time),
+        ]).select_from(hda_table.join(dataset_table, hda_table.c.dataset_id == dataset_table.c.id)).where(history_hdas)
+        tags = select([
+            func.count(tag_table.c.id),
+            func.max(tag_table.c.id),
+        ]).select_from(tag_table.join(hda_table, tag_table.c.history_dataset_association_id == hda_table.c.id)).where(history_hdas)
+        sa_session = object_session(history)
+        return (history.update_time,) + tuple(sa_session.execute(datasets).first()) + tuple(sa_session.execute(tags).first())
+
+
 class HdaDirectMatch(object):
     """ Supplied HDA was a valid option directly (did not need to find implicit
     conversion).
@@ -278,4 +409,4 @@ class DatasetCollectionMatcher(object):
         return valid and (HdcaImplicitMatch() if uses_implicit_conversion else HdcaDirectMatch())
 
 
-__all__ = ('get_dataset_matcher_factory', 'set_dataset_matcher_factory', 'unset_dataset_matcher_factory')
+__all__ = ('DatasetOptionsCache', 'get_dataset_matcher_factory', 'HdaOption', 'set_dataset_matcher_factory', 'unset_dataset_matcher_factory')
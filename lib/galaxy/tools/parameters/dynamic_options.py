@@ -4,6 +4,8 @@ on the values of other parameters or other aspects of the current state)
 """
 import logging
 import os
+import threading
+from collections import OrderedDict
 
 from six import StringIO
 
@@ -18,6 +20,11 @@ from . import validation
 
 log = logging.getLogger(__name__)
 
+# Returned for references to inputs that no option can match.
+INVALID_REF = object()
+# Default number of results kept by DynamicOptions.
+DEFAULT_CACHE_SIZE = 16
+
 
 class Filter(object):
     """
@@ -42,6 +49,22 @@ class Filter(object):
         """Returns a list of options after the filter is applied"""
         raise TypeError("Abstract Method")
 
+    def filter_table(self, table, trans, other_values):
+        """
+        Returns the list of options of the tool data table `table` after the
+        filter is applied, filters keeping the rows with a value in a column
+        look the rows up in the table.
+        """
+        return self.filter_options(table.get_fields(), trans, other_values)
+
+    def get_cache_key(self, trans, other_values):
+        """
+        Returns the values, other than the options, the result of the filter
+        depends on. Filters reading other inputs, the user or the transaction
+        must return what they read.
+        """
+        return ()
+
 
 class StaticValueFilter(Filter):
     """
@@ -66,18 +89,30 @@ class StaticValueFilter(Filter):
         self.column = d_option.column_spec_to_index(column)
         self.keep = string_as_bool(elem.get("keep", 'True'))
 
-    def filter_options(self, options, trans, other_values):
-        rval = []
+    def _filter_value(self, trans):
         filter_value = self.value
         try:
             filter_value = User.expand_user_properties(trans.user, filter_value)
         except Exception:
             pass
+        return filter_value
+
+    def filter_options(self, options, trans, other_values):
+        rval = []
+        filter_value = self._filter_value(trans)
         for fields in options:
             if (self.keep and fields[self.column] == filter_value) or (not self.keep and fields[self.column] != filter_value):
                 rval.append(fields)
         return rval
 
+    def filter_table(self, table, trans, other_values):
+        if not self.keep:
+            return Filter.filter_table(self, table, trans, other_values)
+        return table.get_fields_by_column(self.column, self._filter_value(trans))
+
+    def get_cache_key(self, trans, other_values):
+        return self._filter_value(trans)
+
 
 class DataMetaFilter(Filter):
     """
@@ -119,19 +154,11 @@ class DataMetaFilter(Filter):
     def get_dependency_name(self):
         return self.ref_name
 
-    def filter_options(self, options, trans, other_values):
-        def compare_meta_value(file_value, dataset_value):
-            if isinstance(dataset_value, list):
-                if self.multiple:
-                    file_value = file_value.split(self.separator)
-                    for value in dataset_value:
-                        if value not in file_value:
-                            return False
-                    return True
-                return file_value in dataset_value
-            if self.multiple:
-                return dataset_value in file_value.split(self.separator)
-            return file_value == dataset_value
+    def _get_meta_value(self, other_values):
+        """
+        Returns the metadata value of the referenced dataset(s), INVALID_REF
+        if there is no valid dataset or the datasets have different values.
+        """
         ref = other_values.get(self.ref_name, None)
         if isinstance(ref, HistoryDatasetCollectionAssociation):
             ref = ref.to_hda_representative(self.multiple)
@@ -139,7 +166,7 @@ class DataMetaFilter(Filter):
         is_data_list = isinstance(ref, galaxy.tools.wrappers.DatasetListWrapper) or isinstance(ref, list)
         is_data_or_data_list = is_data or is_data_list
         if not isinstance(ref, HistoryDatasetAssociation) and not is_data_or_data_list:
-            return []  # not a valid dataset
+            return INVALID_REF  # not a valid dataset
 
         if is_data_list:
             meta_value = None
@@ -150,10 +177,28 @@ class DataMetaFilter(Filter):
                 elif meta_value is None:
                     meta_value = this_meta_value
                 else:
-                    # Different values with mismatching metadata, return []
-                    return []
+                    # Different values with mismatching metadata
+                    return INVALID_REF
         else:
             meta_value = ref.metadata.get(self.key, None)
+        return meta_value
+
+    def filter_options(self, options, trans, other_values):
+        def compare_meta_value(file_value, dataset_value):
+            if isinstance(dataset_value, list):
+                if self.multiple:
+                    file_value = file_value.split(self.separator)
+                    for value in dataset_value:
+                        if value not in file_value:
+                            return False
+                    return True
+                return file_value in dataset_value
+            if self.multiple:
+                return dataset_value in file_value.split(self.separator)
+            return file_value == dataset_value
+        meta_value = self._get_meta_value(other_values)
+        if meta_value is INVALID_REF:
+            return []
 
         if meta_value is None:
             return [(disp_name, optval, selected) for disp_name, optval, selected in options]
@@ -178,6 +223,22 @@ class DataMetaFilter(Filter):
                 options.append((value, value, False))
             return options
 
+    def filter_table(self, table, trans, other_values):
+        if self.column is None or self.multiple:
+            return Filter.filter_table(self, table, trans, other_values)
+        meta_value = self._get_meta_value(other_values)
+        if meta_value is INVALID_REF:
+            return []
+        if meta_value is None or isinstance(meta_value, list):
+            return self.filter_options(table.get_fields(), trans, other_values)
+        return table.get_fields_by_column(self.column, meta_value)
+
+    def get_cache_key(self, trans, other_values):
+        meta_value = self._get_meta_value(other_values)
+        if isinstance(meta_value, list):
+            meta_value = tuple(meta_value)
+        return meta_value
+
 
 class ParamValueFilter(Filter):
     """
@@ -215,21 +276,41 @@ class ParamValueFilter(Filter):
     def get_dependency_name(self):
         return self.ref_name
 
-    def filter_options(self, options, trans, other_values):
+    def _get_ref_value(self, trans, other_values):
+        """
+        Returns the value of the referenced input to filter with, INVALID_REF
+        if no option can match.
+        """
         if trans is not None and trans.workflow_building_mode:
-            return []
+            return INVALID_REF
         ref = other_values.get(self.ref_name, None)
         for ref_attribute in self.ref_attribute:
             if not hasattr(ref, ref_attribute):
-                return []  # ref does not have attribute, so we cannot filter, return empty list
+                return INVALID_REF  # ref does not have attribute, so we cannot filter
             ref = getattr(ref, ref_attribute)
-        ref = str(ref)
+        return str(ref)
+
+    def filter_options(self, options, trans, other_values):
+        ref = self._get_ref_value(trans, other_values)
+        if ref is INVALID_REF:
+            return []
         rval = []
         for fields in options:
             if (self.keep and fields[self.column] == ref) or (not self.keep and fields[self.column] != ref):
                 rval.append(fields)
         return rval
 
+    def filter_table(self, table, trans, other_values):
+        if not self.keep:
+            return Filter.filter_table(self, table, trans, other_values)
+        ref = self._get_ref_value(trans, other_values)
+        if ref is INVALID_REF:
+            return []
+        return table.get_fields_by_column(self.column, ref)
+
+    def get_cache_key(self, trans, other_values):
+        return self._get_ref_value(trans, other_values)
+
 
 class UniqueValueFilter(Filter):
     """
@@ -392,8 +473,35 @@ class RemoveValueFilter(Filter):
         self.multiple = string_as_bool(elem.get("multiple", "False"))
         self.separator = elem.get("separator", ",")
 
-    def filter_options(self, options, trans, other_values):
+    def _get_value(self, trans, other_values):
+        """
+        Returns the value to remove, INVALID_REF if the options are kept as
+        they are.
+        """
         if trans is not None and trans.workflow_building_mode:
+            return INVALID_REF
+        value = self.value
+        if value is None:
+            if self.ref_name is not None:
+                value = other_values.get(self.ref_name)
+            else:
+                data_ref = other_values.get(self.meta_ref)
+                if isinstance(data_ref, HistoryDatasetCollectionAssociation):
+                    data_ref = data_ref.to_hda_representative()
+                if not isinstance(data_ref, HistoryDatasetAssociation) and not isinstance(data_ref, galaxy.tools.wrappers.DatasetFilenameWrapper):
+                    return INVALID_REF  # cannot modify options
+                value = data_ref.metadata.get(self.metadata_key, None)
+        return value
+
+    def get_cache_key(self, trans, other_values):
+        value = self._get_value(trans, other_values)
+        if isinstance(value, list):
+            value = tuple(value)
+        return value
+
+    def filter_options(self, options, trans, other_values):
+        value = self._get_value(trans, other_values)
+        if value is INVALID_REF:
             return options
 
         def compare_value(option_value, filter_value):
@@ -409,17 +517,6 @@ class RemoveValueFilter(Filter):
                 return filter_value in option_value.split(self.separator)
             return option_value == filter_value
 
-        value = self.value
-        if value is None:
-            if self.ref_name is not None:
-                value = other_values.get(self.ref_name)
-            else:
-                data_ref = other_values.get(self.meta_ref)
-                if isinstance(data_ref, HistoryDatasetCollectionAssociation):
-                    data_ref = data_ref.to_hda_representative()
-                if not isinstance(data_ref, HistoryDatasetAssociation) and not isinstance(data_ref, galaxy.tools.wrappers.DatasetFilenameWrapper):
-                    return options  # cannot modify options
-                value = data_ref.metadata.get(self.metadata_key, None)
         # Default to the second column (i.e. 1) since this used to work only on options produced by the data_meta filter
         value_col = self.dynamic_option.columns.get('value', 1)
         return [option for option in options if not compare_value(option[value_col], value)]
@@ -486,6 +583,11 @@ class DynamicOptions(object):
         self.has_dataset_dependencies = False
         self.validators = []
         self.converter_safe = True
+        # Recent results of get_fields by _cache_key
+        app = getattr(tool_param.tool, 'app', None)
+        self.cache_size = getattr(getattr(app, 'config', None), 'tool_form_dynamic_options_cache_size', DEFAULT_CACHE_SIZE)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
 
         # Parse the <options> tag
         self.separator = elem.get('separator', '\t')
@@ -611,6 +713,56 @@ class DynamicOptions(object):
         return rval
 
     def get_fields(self, trans, other_values):
+        """
+        Returns the rows of the options after the filters are applied, the
+        rows of recently used sources and filter inputs are kept.
+        """
+        key = self._cache_key(trans, other_values)
+        if key is None:
+            return self._get_fields(trans, other_values)
+        with self._cache_lock:
+            fields = self._cache.pop(key, None)
+            if fields is not None:
+                self._cache[key] = fields
+        if fields is None:
+            fields = self._get_fields(trans, other_values)
+            with self._cache_lock:
+                self._cache[key] = fields
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return list(fields)
+
+    def _cache_key(self, trans, other_values):
+        """
+        Returns the version of the source of the options and the inputs of the
+        filters, None if the fields can't be cached.
+        """
+        if not self.cache_size:
+            return None
+        if self.dataset_ref_name:
+            dataset = other_values.get(self.dataset_ref_name, None)
+            if not dataset or not hasattr(dataset, 'file_name'):
+                return None
+            try:
+                stat = os.stat(dataset.file_name)
+            except (OSError, TypeError):
+                return None
+            source = (dataset.file_name, stat.st_mtime, stat.st_size)
+        else:
+            tool_data_table = self.tool_data_table
+            if tool_data_table:
+                source = (tool_data_table, tool_data_table.get_version_fields()[0])
+            else:
+                source = ()
+        key = (source, tuple(filter.get_cache_key(trans, other_values) for filter in self.filters))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _get_fields(self, trans, other_values):
+        filters = self.filters
         if self.dataset_ref_name:
             dataset = other_values.get(self.dataset_ref_name, None)
             if not dataset or not hasattr(dataset, 'file_name'):
@@ -627,12 +779,17 @@ class DynamicOptions(object):
                     contents = fh.read(1048576)
                 options = self.parse_file_fields(StringIO(contents))
         elif self.tool_data_table:
-            options = self.tool_data_table.get_fields()
+            if self.filters:
+                # the first filter looks up the rows of the table it keeps
+                options = self.filters[0].filter_table(self.tool_data_table, trans, other_values)
+                filters = self.filters[1:]
+            else:
+                options = self.tool_data_table.get_fields()
         elif self.file_fields:
             options = list(self.file_fields)
         else:
             options = []
-        for filter in self.filters:
+        for filter in filters:
             options = filter.filter_options(options, trans, other_values)
         return options
 
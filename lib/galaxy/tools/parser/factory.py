@@ -16,14 +16,18 @@ from ..fetcher import ToolLocationFetcher
 log = logging.getLogger(__name__)
 
 
-def get_tool_source(config_file=None, xml_tree=None, enable_beta_formats=True, tool_location_fetcher=None):
+def get_tool_source(config_file=None, xml_tree=None, enable_beta_formats=True, tool_location_fetcher=None, tool_source_cache=None, macro_paths=None):
     """Return a ToolSource object corresponding to supplied source.
 
     The supplied source may be specified as a file path (using the config_file
     parameter) or as an XML object loaded with load_tool_with_refereces.
+
+    If a ``galaxy.tools.cache.ToolSourceCache`` is supplied as
+    ``tool_source_cache``, macro-expanded XML tools are read from and written
+    to that persistent cache instead of being re-parsed on every load.
     """
     if xml_tree is not None:
-        return XmlToolSource(xml_tree, source_path=config_file)
+        return XmlToolSource(xml_tree, source_path=config_file, macro_paths=macro_paths)
     elif config_file is None:
         raise ValueError("get_tool_source called with invalid config_file None.")
 
@@ -32,7 +36,7 @@ def get_tool_source(config_file=None, xml_tree=None, enable_beta_formats=True, t
 
     config_file = tool_location_fetcher.to_tool_path(config_file)
     if not enable_beta_formats:
-        tree, macro_paths = load_tool_with_refereces(config_file)
+        tree, macro_paths = _load_tool_xml(config_file, tool_source_cache)
         return XmlToolSource(tree, source_path=config_file, macro_paths=macro_paths)
 
     if config_file.endswith(".yml"):
@@ -44,10 +48,16 @@ def get_tool_source(config_file=None, xml_tree=None, enable_beta_formats=True, t
         log.info("Loading CWL tool - this is experimental - tool likely will not function in future at least in same way.")
         return CwlToolSource(config_file)
     else:
-        tree, macro_paths = load_tool_with_refereces(config_file)
+        tree, macro_paths = _load_tool_xml(config_file, tool_source_cache)
         return XmlToolSource(tree, source_path=config_file, macro_paths=macro_paths)
 
 
+def _load_tool_xml(config_file, tool_source_cache=None):
+    if tool_source_cache is None:
+        return load_tool_with_refereces(config_file)
+    return tool_source_cache.get_tool_source_tree(config_file, load_tool_with_refereces)
+
+
 def ordered_load(stream):
     class OrderedLoader(yaml.Loader):
         pass
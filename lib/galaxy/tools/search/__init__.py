@@ -2,106 +2,167 @@
 Module for building and searching the index of tools
 installed within this Galaxy.
 """
+import hashlib
+import json
 import logging
+import os
 import re
-import tempfile
 
 from bleach import clean
-from whoosh import analysis
-from whoosh.analysis import StandardAnalyzer
-from whoosh.fields import (
-    KEYWORD,
-    Schema,
-    STORED,
-    TEXT
-)
-from whoosh.filedb.filestore import (
-    FileStorage,
-    RamStorage
-)
-from whoosh.qparser import MultifieldParser
-from whoosh.scoring import BM25F
 
 from galaxy.util import ExecutionTimer
 from galaxy.web.framework.helpers import to_unicode
+from .index import (
+    FIELDS,
+    ngrams,
+    tokenize,
+    ToolSearchIndex,
+)
 
 log = logging.getLogger(__name__)
 
+# Number of saved indexes kept in the index directory.
+MAX_SAVED_INDEXES = 4
+
 
 class ToolBoxSearch(object):
     """
-    Support searching tools in a toolbox. This implementation uses
-    the Whoosh search library.
+    Support searching tools in a toolbox. This implementation uses an
+    in-memory inverted index (see `galaxy.tools.search.index`) scored with
+    BM25F.
+
+    If `index_dir` is set, the index is saved there after it changes, in a
+    file named after the state of the indexed tools, and a process starting
+    with the same tools loads it instead of indexing them again.
     """
 
-    def __init__(self, toolbox, index_help=True):
+    def __init__(self, toolbox, index_help=True, index_dir=None):
         """
         Create a searcher for `toolbox`.
         """
-        self.schema = Schema(id=STORED,
-                             stub=KEYWORD,
-                             name=TEXT(analyzer=analysis.SimpleAnalyzer()),
-                             description=TEXT,
-                             section=TEXT,
-                             help=TEXT,
-                             labels=KEYWORD)
-        self.rex = analysis.RegexTokenizer()
         self.toolbox = toolbox
-        self.storage, self.index = self._index_setup()
+        self.index_help = index_help
+        self.index_dir = index_dir
+        # Replaced, never modified, once built so searches don't need a lock.
+        self.index = ToolSearchIndex()
         # We keep track of how many times the tool index has been rebuilt.
         # We start at -1, so that after the first index the count is at 0,
         # which is the same as the toolbox reload count. This way we can skip
         # reindexing if the index count is equal to the toolbox reload count.
         self.index_count = -1
 
-    def _index_setup(self):
-        RamStorage.temp_storage = _temp_storage
-        # Works around https://bitbucket.org/mchaput/whoosh/issues/391/race-conditions-with-temp-storage
-        storage = RamStorage()
-        index = storage.create_index(self.schema)
-        return storage, index
-
-    def build_index(self, tool_cache, index_help=True):
+    def build_index(self, tool_cache, index_help=None):
         """
         Prepare search index for tools loaded in toolbox.
         Use `tool_cache` to determine which tools need indexing and which tools should be expired.
         """
         log.debug('Starting to build toolbox index.')
+        if index_help is None:
+            index_help = self.index_help
         self.index_count += 1
         execution_timer = ExecutionTimer()
-        writer = self.index.writer()
-        for tool_id in tool_cache._removed_tool_ids:
-            writer.delete_by_term('id', tool_id)
+        tools = {}
         for tool_id in tool_cache._new_tool_ids:
             tool = tool_cache.get_tool_by_id(tool_id)
-            if tool:
-                add_doc_kwds = self._create_doc(tool_id=tool_id, tool=tool, index_help=index_help)
-                writer.add_document(**add_doc_kwds)
-        writer.commit()
-        log.debug("Toolbox index finished %s", execution_timer)
+            #  Do not add data managers to the public index
+            if tool and tool.tool_type != 'manage_data':
+                tools[tool_id] = tool
+        fingerprints = dict((tool_id, self._tool_fingerprint(tool, index_help)) for tool_id, tool in tools.items())
+        if self.index_count == 0:
+            index = self._load_index(fingerprints)
+        else:
+            index = self._copy_index()
+        stale = set(tool_cache._removed_tool_ids).union(tool_id for tool_id in tool_cache._new_tool_ids if tool_id not in tools)
+        if self.index_count == 0:
+            # a saved index may have tools not in this toolbox
+            stale.update(tool_id for tool_id in index.lengths if tool_id not in tools)
+        stale.update(tool_id for tool_id in tools if index.fingerprints.get(tool_id) != fingerprints[tool_id])
+        stale.intersection_update(index.lengths)
+        index.remove_documents(stale)
+        added = 0
+        for tool_id, tool in tools.items():
+            if tool_id not in index:
+                index.add_document(tool_id, self._create_doc(tool_id=tool_id, tool=tool, index_help=index_help), fingerprints[tool_id])
+                added += 1
+        self.index = index
+        if self.index_dir and (stale or added):
+            self._save_index(index)
+        log.debug("Toolbox index finished (%d tools indexed, %d removed) %s", added, len(stale), execution_timer)
+
+    def _copy_index(self):
+        index = self.index
+        return ToolSearchIndex(
+            dict((term, dict((tool_id, list(frequencies)) for tool_id, frequencies in docs.items()))
+                 for term, docs in index.postings.items()),
+            dict(index.lengths),
+            dict(index.fingerprints),
+        )
+
+    def _tool_fingerprint(self, tool, index_help):
+        """
+        Return a hash of the tool properties indexed and of the modification
+        times of its files (for the help).
+        """
+        files = []
+        for path in [tool.config_file] + list(getattr(tool, '_macro_paths', None) or []):
+            try:
+                stat = os.stat(path)
+                files.append([path, stat.st_mtime, stat.st_size])
+            except (OSError, TypeError):
+                files.append([path])
+        state = [tool.version, tool.name, tool.description, tool.get_panel_section(), tool.labels, tool.guid, index_help, files]
+        return hashlib.sha1(json.dumps(state, sort_keys=True).encode('utf-8')).hexdigest()
+
+    def _index_path(self, fingerprints):
+        key = hashlib.sha1(json.dumps(sorted(fingerprints.items())).encode('utf-8')).hexdigest()
+        return os.path.join(self.index_dir, '%s.json' % key)
+
+    def _load_index(self, fingerprints):
+        """
+        Return the saved index of the tools with `fingerprints`, or else the
+        most recently saved index (to be updated) or a new one.
+        """
+        if not self.index_dir:
+            return ToolSearchIndex()
+        index = ToolSearchIndex.load(self._index_path(fingerprints))
+        if index is not None:
+            log.debug("Loaded toolbox index of %d tools", len(index))
+            return index
+        for path in reversed(self._saved_index_paths()):
+            index = ToolSearchIndex.load(path)
+            if index is not None:
+                return index
+        return ToolSearchIndex()
+
+    def _saved_index_paths(self):
+        """Return the paths of the saved indexes, oldest first."""
+        try:
+            paths = [os.path.join(self.index_dir, f) for f in os.listdir(self.index_dir) if f.endswith('.json')]
+            return sorted(paths, key=os.path.getmtime)
+        except OSError:
+            return []
+
+    def _save_index(self, index):
+        try:
+            index.save(self._index_path(index.fingerprints))
+            for path in self._saved_index_paths()[:-MAX_SAVED_INDEXES]:
+                os.remove(path)
+        except (IOError, OSError) as e:
+            log.warning("Failed to save toolbox index in %s: %s", self.index_dir, e)
 
     def _create_doc(self, tool_id, tool, index_help=True):
-        #  Do not add data managers to the public index
-        if tool.tool_type == 'manage_data':
-            return {}
         add_doc_kwds = {
-            "id": tool_id,
             "description": to_unicode(tool.description),
             "section": to_unicode(tool.get_panel_section()[1] if len(tool.get_panel_section()) == 2 else ''),
-            "help": to_unicode("")
+            "name": to_unicode(tool.name),
+            "help": to_unicode(""),
         }
-        if tool.name.find('-') != -1:
-            # Hyphens are wildcards in Whoosh causing bad things
-            add_doc_kwds['name'] = (' ').join([token.text for token in self.rex(to_unicode(tool.name))])
-        else:
-            add_doc_kwds['name'] = to_unicode(tool.name)
         if tool.guid:
             # Create a stub consisting of owner, repo, and tool from guid
             slash_indexes = [m.start() for m in re.finditer('/', tool.guid)]
-            id_stub = tool.guid[(slash_indexes[1] + 1): slash_indexes[4]]
-            add_doc_kwds['stub'] = (' ').join([token.text for token in self.rex(to_unicode(id_stub))])
+            add_doc_kwds['stub'] = to_unicode(tool.guid[(slash_indexes[1] + 1): slash_indexes[4]])
         else:
-            add_doc_kwds['stub'] = to_unicode(id)
+            add_doc_kwds['stub'] = to_unicode(tool_id)
         if tool.labels:
             add_doc_kwds['labels'] = to_unicode(" ".join(tool.labels))
         if index_help and tool.help:
@@ -119,53 +180,36 @@ class ToolBoxSearch(object):
         """
         Perform search on the in-memory index. Weight in the given boosts.
         """
-        # Change field boosts for searcher
-        searcher = self.index.searcher(
-            weighting=BM25F(
-                field_B={'name_B': float(tool_name_boost),
-                         'section_B': float(tool_section_boost),
-                         'description_B': float(tool_description_boost),
-                         'labels_B': float(tool_label_boost),
-                         'stub_B': float(tool_stub_boost),
-                         'help_B': float(tool_help_boost)}
-            )
-        )
-        # Set query to search name, description, section, help, and labels.
-        parser = MultifieldParser(['name', 'description', 'section', 'help', 'labels', 'stub'], schema=self.schema)
-        # Hyphens are wildcards in Whoosh causing bad things
-        if q.find('-') != -1:
-            q = (' ').join([token.text for token in self.rex(to_unicode(q))])
+        field_boosts = {
+            'name': tool_name_boost,
+            'description': tool_description_boost,
+            'section': tool_section_boost,
+            'help': tool_help_boost,
+            'labels': tool_label_boost,
+            'stub': tool_stub_boost,
+        }
+        boosts = [float(field_boosts[field]) for field in FIELDS]
+        index = self.index
         # Perform tool search with ngrams if set to true in the config file
         if (tool_enable_ngram_search is True or tool_enable_ngram_search == "True"):
-            hits_with_score = {}
-            token_analyzer = StandardAnalyzer() | analysis.NgramFilter(minsize=int(tool_ngram_minsize), maxsize=int(tool_ngram_maxsize))
-            ngrams = [token.text for token in token_analyzer(q)]
-            for query in ngrams:
-                # Get the tool list with respective scores for each qgram
-                curr_hits = searcher.search(parser.parse('*' + query + '*'), limit=float(tool_search_limit))
-                for i, curr_hit in enumerate(curr_hits):
-                    is_present = False
-                    for prev_hit in hits_with_score:
-                        # Check if the tool appears again for the next qgram search
-                        if curr_hit['id'] == prev_hit:
-                            is_present = True
-                            # Add the current score with the previous one if the
-                            # tool appears again for the next qgram
-                            hits_with_score[prev_hit] = curr_hits.score(i) + hits_with_score[prev_hit]
-                    # Add the tool if not present to the collection with its score
-                    if not is_present:
-                        hits_with_score[curr_hit['id']] = curr_hits.score(i)
-            # Sort the results based on aggregated BM25 score in decreasing order of scores
-            hits_with_score = sorted(hits_with_score.items(), key=lambda x: x[1], reverse=True)
-            # Return the tool ids
-            return [item[0] for item in hits_with_score[0:int(tool_search_limit)]]
+            # Sum the scores of the tools matching each ngram
+            scores = {}
+            for ngram in ngrams(tokenize(q), int(tool_ngram_minsize), int(tool_ngram_maxsize)):
+                for tool_id, score in index.score(index.matching_terms(ngram), boosts).items():
+                    scores[tool_id] = scores.get(tool_id, 0) + score
         else:
-            # Perform the search
-            hits = searcher.search(parser.parse('*' + q + '*'), limit=float(tool_search_limit))
-            return [hit['id'] for hit in hits]
-
-
-def _temp_storage(self, name=None):
-    path = tempfile.mkdtemp()
-    tempstore = FileStorage(path)
-    return tempstore.create()
+            # Match tools having all the words, like the query *q* did with
+            # Whoosh: the first word may end a term and the last word start one.
+            tokens = tokenize(q) or tokenize(q, stop_words=None)
+            scores = None
+            for i, token in enumerate(tokens):
+                terms = index.matching_terms(token, prefix=(i == len(tokens) - 1), suffix=(i == 0))
+                token_scores = index.score(terms, boosts)
+                if scores is None:
+                    scores = token_scores
+                else:
+                    scores = dict((tool_id, score + token_scores[tool_id]) for tool_id, score in scores.items() if tool_id in token_scores)
+        # Sort the results based on aggregated BM25 score in decreasing order of scores
+        hits_with_score = sorted((scores or {}).items(), key=lambda x: (-x[1], x[0]))
+        # Return the tool ids
+        return [item[0] for item in hits_with_score[0:int(float(tool_search_limit))]]
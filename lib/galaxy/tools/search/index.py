@@ -0,0 +1,208 @@
+"""
+In-memory inverted index of tool documents scored with BM25F.
+
+Documents have the text fields listed in ``FIELDS``. Postings map each term
+to the tools containing it and the term frequency in each field, so the index
+is updated one tool at a time and can be saved to and loaded from a JSON file
+as is.
+"""
+import bisect
+import json
+import logging
+import math
+import os
+import re
+import tempfile
+
+from galaxy.util.path import safe_makedirs
+
+log = logging.getLogger(__name__)
+
+FIELDS = ("name", "description", "section", "help", "labels", "stub")
+INDEX_VERSION = 1
+# Whoosh's default English stop words, not indexed in fields other than name.
+STOP_WORDS = frozenset(("a", "an", "and", "are", "as", "at", "be", "by", "can", "for", "from", "have", "if", "in",
+                        "is", "it", "may", "not", "of", "on", "or", "tbd", "that", "the", "this", "to", "us", "we",
+                        "when", "will", "with", "yet", "you", "your"))
+TOKEN_RE = re.compile(r"\w+(?:\.?\w+)*", re.UNICODE)
+
+
+def tokenize(text, stop_words=STOP_WORDS):
+    """
+    Return the lowercased words of `text`, without `stop_words` and single
+    characters (if stop words are removed).
+
+    >>> tokenize("Convert FASTQ to a tabular-file (v1.0)")
+    ['convert', 'fastq', 'tabular', 'file', 'v1.0']
+    """
+    tokens = TOKEN_RE.findall(text.lower())
+    if stop_words:
+        tokens = [t for t in tokens if len(t) > 1 and t not in stop_words]
+    return tokens
+
+
+def ngrams(tokens, minsize, maxsize):
+    """
+    Return the ngrams of `tokens` with minsize to maxsize characters; tokens
+    shorter than minsize are kept whole.
+
+    >>> ngrams(["fastq"], 3, 4)
+    ['fas', 'fast', 'ast', 'astq', 'stq']
+    """
+    grams = []
+    for token in tokens:
+        if len(token) <= minsize:
+            grams.append(token)
+            continue
+        for start in range(len(token) - minsize + 1):
+            for size in range(minsize, maxsize + 1):
+                if start + size <= len(token):
+                    grams.append(token[start:start + size])
+    return grams
+
+
+class ToolSearchIndex(object):
+    """
+    Inverted index of tool documents.
+
+    `postings` maps a term to {tool id: [frequency of the term in each field]},
+    `lengths` maps a tool id to [number of terms in each field] and
+    `fingerprints` a tool id to a string identifying the version of the tool
+    the document was created from.
+    """
+
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, postings=None, lengths=None, fingerprints=None):
+        self.postings = postings or {}
+        self.lengths = lengths or {}
+        self.fingerprints = fingerprints or {}
+        self._total_lengths = [0] * len(FIELDS)
+        for doc_lengths in self.lengths.values():
+            for i, length in enumerate(doc_lengths):
+                self._total_lengths[i] += length
+        self._terms = None
+
+    def __contains__(self, tool_id):
+        return tool_id in self.lengths
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add_document(self, tool_id, fields, fingerprint=None):
+        """
+        Index `fields`, a dictionary of field name to text, for `tool_id`,
+        replacing the previous document of the tool.
+        """
+        if tool_id in self.lengths:
+            self.remove_documents([tool_id])
+        doc_lengths = [0] * len(FIELDS)
+        for i, field in enumerate(FIELDS):
+            tokens = tokenize(fields.get(field) or "", stop_words=None if field == "name" else STOP_WORDS)
+            doc_lengths[i] = len(tokens)
+            for token in tokens:
+                frequencies = self.postings.setdefault(token, {}).setdefault(tool_id, [0] * len(FIELDS))
+                frequencies[i] += 1
+        self.lengths[tool_id] = doc_lengths
+        self.fingerprints[tool_id] = fingerprint
+        for i, length in enumerate(doc_lengths):
+            self._total_lengths[i] += length
+        self._terms = None
+
+    def remove_documents(self, tool_ids):
+        tool_ids = set(tool_id for tool_id in tool_ids if tool_id in self.lengths)
+        if not tool_ids:
+            return
+        for term in list(self.postings):
+            docs = self.postings[term]
+            for tool_id in tool_ids.intersection(docs):
+                del docs[tool_id]
+            if not docs:
+                del self.postings[term]
+        for tool_id in tool_ids:
+            for i, length in enumerate(self.lengths.pop(tool_id)):
+                self._total_lengths[i] -= length
+            self.fingerprints.pop(tool_id, None)
+        self._terms = None
+
+    def matching_terms(self, token, prefix=True, suffix=True):
+        """
+        Return the indexed terms containing `token`; terms must start with it
+        unless `suffix` and end with it unless `prefix` (like the Whoosh
+        wildcard queries ``token*``, ``*token`` and ``*token*``).
+        """
+        if not token:
+            return []
+        if self._terms is None:
+            # All terms in one string to find substrings without a Python loop.
+            terms = sorted(self.postings)
+            offsets = []
+            offset = 1
+            for term in terms:
+                offsets.append(offset)
+                offset += len(term) + 1
+            self._terms = (terms, offsets, "\n" + "\n".join(terms) + "\n")
+        terms, offsets, blob = self._terms
+        pattern = ("" if suffix else "\n") + token + ("" if prefix else "\n")
+        matches = []
+        position = blob.find(pattern)
+        while position != -1:
+            index = bisect.bisect_right(offsets, position if suffix else position + 1) - 1
+            matches.append(terms[index])
+            # skip to the next term
+            position = blob.find(pattern, offsets[index] + len(terms[index]))
+        return matches
+
+    def score(self, terms, boosts):
+        """
+        Return {tool id: BM25F score} of the tools containing any of `terms`,
+        where only the best scoring term counts for each tool. `boosts` is the
+        list of field weights in the order of FIELDS.
+        """
+        num_docs = len(self.lengths)
+        if not num_docs:
+            return {}
+        average_lengths = [float(total) / num_docs or 1.0 for total in self._total_lengths]
+        scores = {}
+        for term in terms:
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for tool_id, frequencies in docs.items():
+                lengths = self.lengths[tool_id]
+                weighted = 0.0
+                for i, frequency in enumerate(frequencies):
+                    if frequency:
+                        weighted += boosts[i] * frequency / (1 - self.B + self.B * lengths[i] / average_lengths[i])
+                term_score = idf * weighted / (self.K1 + weighted)
+                if term_score > scores.get(tool_id, 0):
+                    scores[tool_id] = term_score
+        return scores
+
+    def save(self, path):
+        """Write the index to `path`, replacing it atomically."""
+        directory = os.path.dirname(path)
+        safe_makedirs(directory)
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "version": INDEX_VERSION,
+                "postings": self.postings,
+                "lengths": self.lengths,
+                "fingerprints": self.fingerprints,
+            }, f, separators=(",", ":"))
+        os.rename(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Return the index saved in `path`, None if missing or unreadable."""
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(data["postings"], data["lengths"], data["fingerprints"])
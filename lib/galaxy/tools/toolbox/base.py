@@ -124,6 +124,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
                 directory_config_files = [config_file for config_file in directory_contents if config_file.endswith(".xml")]
                 config_filenames.remove(config_filename)
                 config_filenames.extend(directory_config_files)
+        self._prepare_tool_sources(config_filenames)
         for config_filename in config_filenames:
             try:
                 self._init_tools_from_config(config_filename)
@@ -169,7 +170,8 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
         tool_path = self.__resolve_tool_path(tool_path, config_filename)
         # Only load the panel_dict under certain conditions.
         load_panel_dict = not self._integrated_tool_panel_config_has_contents
-        for item in tool_conf_source.parse_items():
+        items = tool_conf_source.parse_items()
+        for item in items:
             index = self._index
             self._index += 1
             if parsing_shed_tool_conf:
@@ -189,6 +191,45 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
                                        config_elems=config_elems)
             self._dynamic_tool_confs.append(shed_tool_conf_dict)
 
+    def _prepare_tool_sources(self, config_filenames):
+        """Extension-point to parse the tool files referenced by all tool
+        config files ahead of loading them one by one.
+        """
+
+    def _tool_paths_for_configs(self, config_filenames):
+        """Return the paths of tool files referenced by `config_filenames`
+        (in panel order) that still need to be loaded.
+        """
+        tool_paths = []
+        for config_filename in config_filenames:
+            try:
+                tool_conf_source = get_toolbox_parser(config_filename)
+                tool_path = self.__resolve_tool_path(tool_conf_source.parse_tool_path(), config_filename)
+                tool_paths.extend(self._tool_paths_for_items(tool_conf_source.parse_items(), tool_path))
+            except Exception:
+                # Errors are reported when the tool config itself is loaded.
+                continue
+        return tool_paths
+
+    def _tool_paths_for_items(self, items, tool_path):
+        """Return the paths of tool files referenced by tool config `items`
+        that exist on disk and are not already in the tool cache.
+        """
+        tool_paths = []
+        for item in items:
+            if item.type == 'section':
+                tool_paths.extend(self._tool_paths_for_items(item.items, tool_path))
+            elif item.type == 'tool' and item.get("file"):
+                concrete_path = os.path.join(tool_path, self._tool_file_path(item))
+                if os.path.exists(concrete_path) and not self.load_tool_from_cache(concrete_path):
+                    tool_paths.append(concrete_path)
+        return tool_paths
+
+    def _tool_file_path(self, item):
+        path_template = item.get("file")
+        template_kwds = self._path_template_kwds()
+        return string.Template(path_template).safe_substitute(**template_kwds)
+
     def _get_tool_by_uuid(self, tool_uuid):
         if tool_uuid in self._tools_by_uuid:
             return self._tools_by_uuid[tool_uuid]
@@ -584,9 +625,7 @@ class AbstractToolBox(Dictifiable, ManagesIntegratedToolPanelMixin):
 
     def _load_tool_tag_set(self, item, panel_dict, integrated_panel_dict, tool_path, load_panel_dict, guid=None, index=None, internal=False):
         try:
-            path_template = item.get("file")
-            template_kwds = self._path_template_kwds()
-            path = string.Template(path_template).safe_substitute(**template_kwds)
+            path = self._tool_file_path(item)
             concrete_path = os.path.join(tool_path, path)
             if not os.path.exists(concrete_path):
                 # This is a lot faster than attempting to load a non-existing tool
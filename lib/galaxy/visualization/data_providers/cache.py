@@ -0,0 +1,197 @@
+"""
+Caches shared by the genome data providers: processed data for tiles of a
+genome region and open data file handles.
+"""
+import logging
+import sys
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+log = logging.getLogger(__name__)
+
+# Smallest tile width in bases; tiles at level n are MIN_TILE_WIDTH * 2 ** n wide.
+MIN_TILE_WIDTH = 1024
+
+
+def tiles_for_region(start, end):
+    """
+    Return (level, width, tile indices) for the aligned tiles covering the
+    region start:end. The level is chosen so a tile is at least as wide as the
+    region (and less than twice as wide), so a region is covered by at most
+    two tiles.
+
+    >>> tiles_for_region(0, 1000)
+    (0, 1024, [0])
+    >>> tiles_for_region(1000, 2000)
+    (0, 1024, [0, 1])
+    >>> tiles_for_region(5000, 9000)
+    (2, 4096, [1, 2])
+    """
+    span = max(end - start, 1)
+    level = 0
+    while MIN_TILE_WIDTH << level < span:
+        level += 1
+    width = MIN_TILE_WIDTH << level
+    return level, width, list(range(start // width, (max(end, start + 1) - 1) // width + 1))
+
+
+def approximate_size(value):
+    """
+    Return a rough estimate of the memory used by `value`, following lists,
+    tuples and dictionaries.
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            size += approximate_size(item)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            size += approximate_size(key) + approximate_size(item)
+    return size
+
+
+class DataFileHandles(object):
+    """
+    Keeps a bounded number of idle data file handles open so consecutive
+    requests for the same file don't reopen it (and reread its index).
+
+    A handle is only used by one caller at a time; callers asking for a file
+    whose handles are all in use get a newly opened one.
+    """
+
+    def __init__(self, max_open=32):
+        self.max_open = max_open
+        self.lock = threading.Lock()
+        # (key, handle, close function) in least recently used order
+        self._idle = []
+
+    @contextmanager
+    def open(self, key, opener, closer=None):
+        """
+        Yield an open handle for `key`, calling `opener()` if none is idle.
+        `closer(handle)` closes the handle (``handle.close()`` by default).
+        """
+        closer = closer or (lambda handle: handle.close())
+        handle = None
+        with self.lock:
+            for i in range(len(self._idle) - 1, -1, -1):
+                if self._idle[i][0] == key:
+                    handle = self._idle.pop(i)[1]
+                    break
+        if handle is None:
+            handle = opener()
+        try:
+            yield handle
+        except Exception:
+            # don't reuse handles left in an unknown state
+            closer(handle)
+            raise
+        to_close = []
+        with self.lock:
+            self._idle.append((key, handle, closer))
+            while len(self._idle) > self.max_open:
+                to_close.append(self._idle.pop(0))
+        for _, handle, closer in to_close:
+            closer(handle)
+
+    def close(self):
+        with self.lock:
+            idle, self._idle = self._idle, []
+        for _, handle, closer in idle:
+            try:
+                closer(handle)
+            except Exception:
+                log.exception("Failed to close data file handle")
+
+
+class RegionCache(object):
+    """
+    LRU cache of processed genome data, bounded by the approximate memory used
+    by the cached values. Data providers store the data of aligned tiles of
+    a chromosome (see `tiles_for_region`) under keys of dataset, chromosome,
+    tile level (resolution), tile index and the parameters used to process
+    the data.
+    """
+
+    def __init__(self, max_size, prefetch=False, max_open_files=32):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.file_handles = DataFileHandles(max_open=max_open_files)
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+        self._prefetching = set()
+
+    def get(self, key):
+        with self.lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = approximate_size(value)
+        if size > self.max_size:
+            return
+        with self.lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous[1]
+            self._entries[key] = (value, size)
+            self.size += size
+            while self.size > self.max_size:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self._entries
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def prefetch(self, key, compute):
+        """
+        Compute and cache the value for `key` in the background, if prefetching
+        is enabled and it's not cached or being computed already. `compute`
+        must not use the database session of the request.
+        """
+        if self._prefetch_executor is None:
+            return
+        with self.lock:
+            if key in self._entries or key in self._prefetching:
+                return
+            self._prefetching.add(key)
+
+        def run():
+            try:
+                value = compute()
+                if value is not None:
+                    self.put(key, value)
+            except Exception:
+                log.exception("Failed to prefetch genome data for %s", key)
+            finally:
+                with self.lock:
+                    self._prefetching.discard(key)
+
+        self._prefetch_executor.submit(run)
+
+    def stats(self):
+        with self.lock:
+            return dict(entries=len(self._entries), size=self.size, hits=self.hits, misses=self.misses)
+
+    def shutdown(self):
+        if self._prefetch_executor is not None:
+            self._prefetch_executor.shutdown(wait=True)
+        self.file_handles.close()
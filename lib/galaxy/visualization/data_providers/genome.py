@@ -21,13 +21,17 @@ from bx.interval_index_file import Indexes
 from galaxy.datatypes.interval import Bed, Gff, Gtf
 from galaxy.datatypes.util.gff_util import convert_gff_coords_to_bed, GFFFeature, GFFInterval, GFFReaderWrapper, parse_gff_attributes
 from galaxy.visualization.data_providers.basic import BaseDataProvider
+from galaxy.visualization.data_providers.cache import tiles_for_region
 from galaxy.visualization.data_providers.cigar import get_ref_based_read_seq_and_cigar
+from galaxy.visualization.data_providers.summary import can_summarize
 
 #
 # Utility functions.
 #
 
 PYSAM_INDEX_SYMLINK_NECESSARY = packaging.version.parse(pysam.__version__) <= packaging.version.parse('0.13.0')
+# Cached for tiles that hold more than max_vals features
+TRUNCATED_TILE = 'truncated'
 
 
 def float_nan(n):
@@ -137,12 +141,26 @@ class GenomeDataProvider(BaseDataProvider):
     """
     col_name_data_attr_mapping = {}
 
+    # Providers that set `tiled` cache the data of the tiles covering a region
+    # in `region_cache` (a RegionCache, set by the registry if one is
+    # configured) and build the data for a region from them. Their payload
+    # must start with [<guid>, <start>, ...], see `get_feature_bounds` and
+    # `get_feature_key`.
+    tiled = False
+    region_cache = None
+    # name of the data values in the max_vals message
+    data_values_name = "features"
+    # keyword arguments that are not used when processing data or that are
+    # specific to a single request, these are not part of the tile cache key
+    untiled_kwargs = ('start', 'end', 'mode', 'resolution', 'ref_seq', 'stats')
+
     def __init__(self, converted_dataset=None, original_dataset=None, dependencies=None,
                  error_max_vals="Only the first %i %s in this region are displayed."):
         super(GenomeDataProvider, self).__init__(converted_dataset=converted_dataset,
                                                  original_dataset=original_dataset,
                                                  dependencies=dependencies,
                                                  error_max_vals=error_max_vals)
+        self._data_file_paths = None
 
     def write_data_to_file(self, regions, filename):
         """
@@ -192,11 +210,158 @@ class GenomeDataProvider(BaseDataProvider):
             dataset_type, data
         """
         start, end = int(low), int(high)
+        if self.tiled and self.region_cache is not None:
+            return self.get_tiled_data(chrom, start, end, start_val, max_vals, **kwargs)
+        return self.get_region_data(chrom, start, end, start_val, max_vals, **kwargs)
+
+    def get_region_data(self, chrom, start, end, start_val=0, max_vals=sys.maxsize, **kwargs):
+        """
+        Returns data in region defined by chrom, start, and end without using
+        the region cache.
+        """
         with self.open_data_file() as data_file:
             iterator = self.get_iterator(data_file, chrom, start, end, **kwargs)
             data = self.process_data(iterator, start_val, max_vals, start=start, end=end, **kwargs)
         return data
 
+    def get_data_file_paths(self):
+        """
+        Returns the paths of the files data is read from; these identify the
+        dataset in region cache keys and are resolved once so background
+        prefetching doesn't need the database.
+        """
+        if self._data_file_paths is None:
+            self._data_file_paths = self._get_data_file_paths()
+        return self._data_file_paths
+
+    def _get_data_file_paths(self):
+        return tuple(d.file_name for d in (self.original_dataset, self.converted_dataset) if d is not None)
+
+    def get_feature_bounds(self, feature):
+        """
+        Returns the start and end of a feature in the payload.
+        """
+        return feature[1], feature[2]
+
+    def get_feature_key(self, feature):
+        """
+        Returns a key identifying a feature, used to drop the copies of
+        features that overlap more than one tile.
+        """
+        return feature[0]
+
+    def merge_features(self, feature, other):
+        """
+        Returns the feature to use for two features with the same key from
+        different tiles; by default the first one.
+        """
+        return feature
+
+    def get_tile_key(self, chrom, level, tile, max_vals, **kwargs):
+        params = tuple(sorted((k, v) for k, v in kwargs.items() if k not in self.untiled_kwargs))
+        return (self.__class__.__name__, self.get_data_file_paths(), str(chrom), level, tile, max_vals, params)
+
+    def can_tile(self, tile_start, tile_end, **kwargs):
+        """
+        Returns true if the data of the tile tile_start:tile_end can be
+        processed with the given arguments.
+        """
+        return True
+
+    def get_tile_data(self, chrom, tile_start, tile_end, max_vals, **kwargs):
+        """
+        Returns the data for a tile; None if it was truncated at max_vals and
+        can't be used for the regions it covers.
+        """
+        data = self.get_region_data(chrom, tile_start, tile_end, 0, max_vals, **kwargs)
+        if data is None or data.get('message'):
+            return None
+        return data
+
+    def get_tiled_data(self, chrom, start, end, start_val=0, max_vals=sys.maxsize, **kwargs):
+        """
+        Returns data in region defined by chrom, start, and end built from the
+        (cached) data of the tiles covering it.
+
+        Tiles are at most twice as wide as the region, so they're processed
+        with twice the max_vals. If that's not enough for a tile the region is
+        read directly.
+        """
+        level, width, tiles = tiles_for_region(start, end)
+        tile_max_vals = 2 * max_vals if max_vals else max_vals
+        tile_datas = []
+        for tile in tiles:
+            if not self.can_tile(tile * width, (tile + 1) * width, **kwargs):
+                return self.get_region_data(chrom, start, end, start_val, max_vals, **kwargs)
+            key = self.get_tile_key(chrom, level, tile, tile_max_vals, **kwargs)
+            tile_data = self.region_cache.get_or_compute(key, lambda tile=tile: self._compute_tile_data(chrom, tile * width, (tile + 1) * width,
+                                                                                                       tile_max_vals, **kwargs))
+            if tile_data == TRUNCATED_TILE:
+                return self.get_region_data(chrom, start, end, start_val, max_vals, **kwargs)
+            tile_datas.append(tile_data)
+        self.prefetch_tiles(chrom, level, width, [tiles[0] - 1, tiles[-1] + 1], tile_max_vals, **kwargs)
+
+        features = []
+        seen = {}
+        for tile_data in tile_datas:
+            for feature in tile_data['data']:
+                feature_start, feature_end = self.get_feature_bounds(feature)
+                if feature_end < start or feature_start > end:
+                    continue
+                key = self.get_feature_key(feature)
+                if key in seen:
+                    index = seen[key]
+                    features[index] = self.merge_features(features[index], feature)
+                    continue
+                seen[key] = len(features)
+                features.append(feature)
+
+        data = dict(tile_datas[0])
+        message = None
+        features = features[start_val:]
+        if max_vals and len(features) > max_vals:
+            features = features[:max_vals]
+            message = self.error_max_vals % (max_vals, self.data_values_name)
+        data['data'] = features
+        data['message'] = message
+        if 'max_low' in data:
+            data['max_low'], data['max_high'] = get_bounds(features, 1, 2) if features else (start, start)
+        return data
+
+    def prefetch_tiles(self, chrom, level, width, tiles, max_vals, **kwargs):
+        """
+        Fetches and caches the given tiles in the background (if the region
+        cache prefetches).
+        """
+        for tile in tiles:
+            if tile < 0 or not self.can_tile(tile * width, (tile + 1) * width, **kwargs):
+                continue
+            key = self.get_tile_key(chrom, level, tile, max_vals, **kwargs)
+            self.region_cache.prefetch(key, lambda tile=tile: self._compute_tile_data(chrom, tile * width, (tile + 1) * width,
+                                                                                      max_vals, **kwargs))
+
+    def _compute_tile_data(self, chrom, tile_start, tile_end, max_vals, **kwargs):
+        # Truncated tiles are cached as TRUNCATED_TILE so requests for the
+        # regions they cover don't read them again before reading the region.
+        tile_data = self.get_tile_data(chrom, tile_start, tile_end, max_vals, **kwargs)
+        return TRUNCATED_TILE if tile_data is None else tile_data
+
+    @contextmanager
+    def open_cached_file(self, opener, closer=None):
+        """
+        Open data file via `opener`, reusing an idle handle opened earlier if
+        there's a region cache.
+        """
+        if self.region_cache is None:
+            handle = opener()
+            try:
+                yield handle
+            finally:
+                (closer or (lambda h: h.close()))(handle)
+        else:
+            with self.region_cache.file_handles.open(self.get_data_file_paths(), opener, closer) as handle:
+                yield handle
+
     def get_genome_data(self, chroms_info, **kwargs):
         """
         Returns data for complete genome.
@@ -320,21 +485,26 @@ class TabixDataProvider(GenomeDataProvider, FilterableMixin):
 
     col_name_data_attr_mapping = {4: {'index': 4, 'name': 'Score'}}
 
+    def _get_data_file_paths(self):
+        return (self.dependencies['bgzip'].file_name, self.converted_dataset.file_name)
+
     @contextmanager
     def open_data_file(self):
+        bgzip_path, index_path = self.get_data_file_paths()
+        if not PYSAM_INDEX_SYMLINK_NECESSARY:
+            with self.open_cached_file(lambda: pysam.TabixFile(bgzip_path, index=index_path)) as f:
+                yield f
+            return
         # We create a symlink to the index file. This is
         # required until https://github.com/pysam-developers/pysam/pull/586 is merged.
-        if PYSAM_INDEX_SYMLINK_NECESSARY:
-            fd, index_path = tempfile.mkstemp(suffix='.tbi')
-            os.close(fd)
-            os.unlink(index_path)
-            os.symlink(self.converted_dataset.file_name, index_path)
-        else:
-            index_path = self.converted_dataset.file_name
-        with pysam.TabixFile(self.dependencies['bgzip'].file_name, index=index_path) as f:
+        # Handles aren't reused in this case as the symlink is removed after use.
+        fd, symlink_path = tempfile.mkstemp(suffix='.tbi')
+        os.close(fd)
+        os.unlink(symlink_path)
+        os.symlink(index_path, symlink_path)
+        with pysam.TabixFile(bgzip_path, index=symlink_path) as f:
             yield f
-        if PYSAM_INDEX_SYMLINK_NECESSARY:
-            os.unlink(index_path)
+        os.unlink(symlink_path)
 
     def get_iterator(self, data_file, chrom, start, end, **kwargs):
         # chrom must be a string, start/end integers.
@@ -547,7 +717,7 @@ class BedTabixDataProvider(TabixDataProvider, BedDataProvider):
     """
     Provides data from a BED file indexed via tabix.
     """
-    pass
+    tiled = True
 
 
 class RawBedDataProvider(BedDataProvider):
@@ -610,6 +780,14 @@ class VcfDataProvider(GenomeDataProvider):
 
     dataset_type = 'variant'
 
+    def get_feature_bounds(self, feature):
+        # variants have no end, use the length of the reference allele.
+        return feature[1], feature[1] + len(feature[3])
+
+    def get_feature_key(self, feature):
+        # GUID is unused (-1), a locus is identified by position and alleles.
+        return tuple(feature[1:5])
+
     def process_data(self, iterator, start_val=0, max_vals=None, **kwargs):
         """
         Returns a dict with the following attributes::
@@ -745,6 +923,7 @@ class VcfTabixDataProvider(TabixDataProvider, VcfDataProvider):
     """
     Provides data from a VCF file indexed via tabix.
     """
+    tiled = True
 
     dataset_type = 'variant'
 
@@ -807,6 +986,36 @@ class BamDataProvider(GenomeDataProvider, FilterableMixin):
     """
 
     dataset_type = 'bai'
+    tiled = True
+    data_values_name = "reads"
+
+    def get_tile_key(self, chrom, level, tile, max_vals, ref_seq=None, **kwargs):
+        # reads are compressed against the reference sequence if there is one
+        return super(BamDataProvider, self).get_tile_key(chrom, level, tile, max_vals,
+                                                         compressed=ref_seq is not None, **kwargs)
+
+    def can_tile(self, tile_start, tile_end, ref_seq=None, **kwargs):
+        return ref_seq is None or (ref_seq.start <= tile_start and tile_end <= ref_seq.end)
+
+    def merge_features(self, feature, other):
+        # A proper pair whose mates are in different tiles comes out of each
+        # tile with only one of its mates (the other is [<start>, <start>]),
+        # combine the mates read in each tile.
+        if not isinstance(feature[5], list) or not isinstance(other[5], list):
+            return feature
+
+        def mate(index):
+            for read in (feature, other):
+                if len(read[4 + index]) > 2:
+                    # mapq scores of reads with one mate are [<mapq>, 125]
+                    mapq = read[-1][index] if len(read[4]) > 2 and len(read[5]) > 2 else read[-1][0]
+                    return read[4 + index], mapq
+            return None, None
+
+        (read_1, mapq_1), (read_2, mapq_2) = mate(0), mate(1)
+        if read_1 is None or read_2 is None:
+            return feature
+        return [feature[0], read_1[0], read_2[1], feature[3], read_1, read_2, None, [mapq_1, mapq_2]]
 
     def get_filters(self):
         """
@@ -859,8 +1068,8 @@ class BamDataProvider(GenomeDataProvider, FilterableMixin):
     @contextmanager
     def open_data_file(self):
         # Attempt to open the BAM file with index
-        with pysam.AlignmentFile(self.original_dataset.file_name, mode='rb',
-                                 index_filename=self.converted_dataset.file_name) as f:
+        bam_path, index_path = self.get_data_file_paths()
+        with self.open_cached_file(lambda: pysam.AlignmentFile(bam_path, mode='rb', index_filename=index_path)) as f:
             yield f
 
     def get_iterator(self, data_file, chrom, start, end, **kwargs):
@@ -1116,39 +1325,126 @@ class BBIDataProvider(GenomeDataProvider):
     """
 
     dataset_type = 'bigwig'
+    tiled = True
+    # CoverageSummaryStore set by the registry if one is configured.
+    summary_store = None
 
     def valid_chroms(self):
         # No way to return this info as of now
         return None
 
     def has_data(self, chrom):
-        f, bbi = self._get_dataset()
-        all_dat = bbi.query(chrom, 0, 2147483647, 1) or \
-            bbi.query(_convert_between_ucsc_and_ensemble_naming(chrom), 0, 2147483647, 1)
-        f.close()
+        with self.open_data_file() as bbi:
+            all_dat = bbi.query(chrom, 0, 2147483647, 1) or \
+                bbi.query(_convert_between_ucsc_and_ensemble_naming(chrom), 0, 2147483647, 1)
         return all_dat is not None
 
+    @contextmanager
+    def open_data_file(self):
+        with self.open_bbi_file() as (f, bbi):
+            yield bbi
+
+    @contextmanager
+    def open_bbi_file(self):
+        """
+        Yields the open data file and the BBI file reading it.
+        """
+        # Bigwig can be a standalone bigwig file, in which case we use
+        # original_dataset, or coming from wig->bigwig conversion in
+        # which we use converted_dataset
+        path = self.get_data_file_paths()[0]
+
+        def opener():
+            f = open(path, 'rb')
+            return f, self.bbi_file_class(file=f)
+
+        with self.open_cached_file(opener, closer=lambda handle: handle[0].close()) as handle:
+            yield handle
+
     def get_data(self, chrom, start, end, start_val=0, max_vals=None, num_samples=1000, **kwargs):
         start = int(start)
         end = int(end)
+        num_samples = int(num_samples)
+        if self.summary_store is not None and 'stats' not in kwargs and end - start >= num_samples:
+            data = self.get_precomputed_summary(chrom, start, end, num_samples)
+            if data is not None:
+                return data
+        if self.tiled and self.region_cache is not None:
+            if 'stats' in kwargs:
+                # Stats are requested for the same region by several calls for a single track.
+                key = (self.__class__.__name__, self.get_data_file_paths(), str(chrom), start, end, 'stats')
+                return dict(self.region_cache.get_or_compute(key, lambda: self.get_region_data(chrom, start, end, stats=True)))
+            if end - start >= num_samples:
+                return self.get_tiled_summary(chrom, start, end, num_samples)
+        return self.get_region_data(chrom, start, end, num_samples=num_samples, **kwargs)
+
+    def get_precomputed_summary(self, chrom, start, end, num_samples):
+        """
+        Returns the summary of the region start:end from the precomputed
+        coverage summary of the chromosome (built if this is the first time
+        it's needed); None if the region is too small to be summarized from
+        it.
+        """
+        # Same number of points as _get_bbi_data samples.
+        step_size = (end - start) // num_samples
+        num_points = num_samples + (end - (start + step_size * num_samples)) // step_size
+        if not can_summarize(start, end, num_points):
+            # don't build the summary for regions it can't be used for
+            return None
+        pyramid = self.summary_store.get(self.get_data_file_paths()[0], str(chrom), self.open_bbi_file)
+        data = pyramid.summarize(start, end, num_points)
+        if data is None:
+            return None
+        return {
+            'data': data,
+            'dataset_type': self.dataset_type
+        }
+
+    def get_tiled_summary(self, chrom, start, end, num_samples):
+        """
+        Returns the summary of the region start:end built from the (cached)
+        summaries of the tiles covering it. As tiles are at most twice as wide
+        as the region, tiles are summarized using 2 * num_samples points so the
+        region has at least num_samples.
+        """
+        level, width, tiles = tiles_for_region(start, end)
+        tile_num_samples = 2 * num_samples
+        data = []
+        for tile in tiles:
+            key = self.get_tile_key(chrom, level, tile, None, num_samples=tile_num_samples)
+            tile_data = self.region_cache.get_or_compute(key, lambda: self.get_region_data(chrom, tile * width, (tile + 1) * width,
+                                                                                           num_samples=tile_num_samples))
+            data.extend(point for point in tile_data['data'] if start <= point[0] <= end)
+        for tile in (tiles[0] - 1, tiles[-1] + 1):
+            if tile >= 0:
+                key = self.get_tile_key(chrom, level, tile, None, num_samples=tile_num_samples)
+                self.region_cache.prefetch(key, lambda tile=tile: self.get_region_data(chrom, tile * width, (tile + 1) * width,
+                                                                                       num_samples=tile_num_samples))
+        return {
+            'data': data,
+            'dataset_type': self.dataset_type
+        }
 
+    def get_region_data(self, chrom, start, end, num_samples=1000, **kwargs):
+        """
+        Returns the summary of the region start:end without using the region
+        cache.
+        """
+        with self.open_data_file() as bbi:
+            return self._get_bbi_data(bbi, chrom, start, end, num_samples, **kwargs)
+
+    def _get_bbi_data(self, bbi, chrom, start, end, num_samples, **kwargs):
         # Helper function for getting summary data regardless of chromosome
         # naming convention.
         def _summarize_bbi(bbi, chrom, start, end, num_points):
             return bbi.summarize(chrom, start, end, num_points) or \
                 bbi.summarize(_convert_between_ucsc_and_ensemble_naming(chrom), start, end, num_points)
 
-        # Bigwig can be a standalone bigwig file, in which case we use
-        # original_dataset, or coming from wig->bigwig conversion in
-        # which we use converted_dataset
-        f, bbi = self._get_dataset()
-
         # If stats requested, compute overall summary data for the range
         # start:endbut no reduced data. This is currently used by client
         # to determine the default range.
         if 'stats' in kwargs:
             summary = _summarize_bbi(bbi, chrom, start, end, 1)
-            f.close()
 
             min_val = 0
             max_val = 0
@@ -1191,7 +1487,7 @@ class BBIDataProvider(GenomeDataProvider):
                 # sd = sqrt( var )
 
                 pos = start
-                step_size = (end - start) / num_points
+                step_size = (end - start) // num_points
 
                 for i in range(num_points):
                     result.append((pos, float_nan(summary.sum_data[i] / summary.valid_count[i])))
@@ -1223,17 +1519,15 @@ class BBIDataProvider(GenomeDataProvider):
 
             # Start with N samples.
             num_points = num_samples
-            step_size = (end - start) / num_points
+            step_size = (end - start) // num_points
             # Add additional points to sample in the remainder not covered by
             # the initial N samples.
             remainder_start = start + step_size * num_points
-            additional_points = (end - remainder_start) / step_size
+            additional_points = (end - remainder_start) // step_size
             num_points += additional_points
 
         result = summarize_region(bbi, chrom, start, end, num_points)
 
-        # Cleanup and return.
-        f.close()
         return {
             'data': result,
             'dataset_type': self.dataset_type
@@ -1241,10 +1535,11 @@ class BBIDataProvider(GenomeDataProvider):
 
 
 class BigBedDataProvider(BBIDataProvider):
-    def _get_dataset(self):
+    bbi_file_class = BigBedFile
+
+    def _get_data_file_paths(self):
         # Nothing converts to bigBed so we don't consider converted dataset
-        f = open(self.original_dataset.file_name)
-        return f, BigBedFile(file=f)
+        return (self.original_dataset.file_name, )
 
 
 class BigWigDataProvider(BBIDataProvider):
@@ -1253,12 +1548,12 @@ class BigWigDataProvider(BBIDataProvider):
     coordinate system, i.e. wiggle format.
     """
 
-    def _get_dataset(self):
+    bbi_file_class = BigWigFile
+
+    def _get_data_file_paths(self):
         if self.converted_dataset is not None:
-            f = open(self.converted_dataset.file_name)
-        else:
-            f = open(self.original_dataset.file_name)
-        return f, BigWigFile(file=f)
+            return (self.converted_dataset.file_name, )
+        return (self.original_dataset.file_name, )
 
 
 class IntervalIndexDataProvider(GenomeDataProvider, FilterableMixin):
@@ -22,7 +22,11 @@ class DataProviderRegistry(object):
     Registry for data providers that enables listing and lookup.
     """
 
-    def __init__(self):
+    def __init__(self, region_cache=None, summary_store=None):
+        # Cache shared by the genome data providers, if configured.
+        self.region_cache = region_cache
+        # Coverage summaries used by the bigWig and bigBed providers, if configured.
+        self.summary_store = summary_store
         # Mapping from dataset type name to a class that can fetch data from a file of that
         # type. First key is converted dataset type; if result is another dict, second key
         # is original dataset type.
@@ -117,4 +121,8 @@ class DataProviderRegistry(object):
                         except NoConverterException:
                             pass
 
+        if isinstance(data_provider, genome.GenomeDataProvider):
+            data_provider.region_cache = self.region_cache
+        if isinstance(data_provider, genome.BBIDataProvider):
+            data_provider.summary_store = self.summary_store
         return data_provider
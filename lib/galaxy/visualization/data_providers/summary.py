@@ -0,0 +1,255 @@
+"""
+Precomputed multi-resolution coverage summaries of bigWig and bigBed files.
+
+A summary pyramid holds, for each chromosome, the sum of the data values and
+the number of bases with data in fixed width bins (level 0) and in bins twice
+as wide at each following level. Zoomed out views are summarized from the
+coarsest level with enough bins per point, so they cost a slice of an array
+instead of a scan of the data file. BAM and interval datasets are visualized
+at low resolution via their bigWig conversion and use the same pyramids.
+"""
+import hashlib
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+from collections import OrderedDict
+
+import numpy
+
+log = logging.getLogger(__name__)
+
+# Width in bases of the finest bins.
+BIN_WIDTH = 256
+# Minimum number of bins summarized into a single point; regions needing finer
+# bins are summarized from the data file.
+MIN_BINS_PER_POINT = 4
+# Number of level 0 bins summarized from the data file at once when building.
+BUILD_CHUNK_BINS = 65536
+
+BIGWIG_MAGIC = 0x888FFC26
+BIGBED_MAGIC = 0x8789F2EB
+CHROM_TREE_MAGIC = 0x78CA8C91
+
+
+def can_summarize(start, end, num_points, bin_width=BIN_WIDTH):
+    """
+    Returns true if num_points points of the region start:end are wide enough
+    to be summarized from a pyramid, see `CoveragePyramid.summarize`.
+    """
+    return (end - start) / float(num_points) >= bin_width * MIN_BINS_PER_POINT
+
+
+def bbi_chrom_sizes(file):
+    """
+    Returns a dictionary of chromosome name to size read from the chromosome
+    B+ tree of the open bigWig or bigBed `file`.
+    """
+    file.seek(0)
+    header = file.read(16)
+    for byte_order in "<>":
+        magic, = struct.unpack(byte_order + "I", header[:4])
+        if magic in (BIGWIG_MAGIC, BIGBED_MAGIC):
+            break
+    else:
+        raise ValueError("Not a bigWig or bigBed file")
+    chrom_tree_offset, = struct.unpack(byte_order + "Q", header[8:16])
+    file.seek(chrom_tree_offset)
+    magic, _, key_size, _, _ = struct.unpack(byte_order + "IIIIQ", file.read(24))
+    if magic != CHROM_TREE_MAGIC:
+        raise ValueError("Invalid chromosome tree")
+    sizes = {}
+    nodes = [chrom_tree_offset + 32]
+    while nodes:
+        file.seek(nodes.pop())
+        is_leaf, _, count = struct.unpack(byte_order + "BBH", file.read(4))
+        item_format = byte_order + "%ds%s" % (key_size, "II" if is_leaf else "Q")
+        item_size = struct.calcsize(item_format)
+        items = file.read(item_size * count)
+        for i in range(count):
+            item = struct.unpack(item_format, items[i * item_size:(i + 1) * item_size])
+            if is_leaf:
+                sizes[item[0].rstrip(b"\0").decode("utf-8")] = item[2]
+            else:
+                nodes.append(item[1])
+    return sizes
+
+
+class CoveragePyramid(object):
+    """
+    Summary levels of a chromosome; `data` is a 2 x N array of the sum of the
+    data values and of the bases covered for the bins of all levels.
+    """
+
+    def __init__(self, data, num_bins, bin_width=BIN_WIDTH):
+        self.data = data
+        self.bin_width = bin_width
+        # (offset, number of bins) of each level in data
+        self.levels = [(0, num_bins)]
+        offset = num_bins
+        while num_bins > 1:
+            num_bins = (num_bins + 1) // 2
+            self.levels.append((offset, num_bins))
+            offset += num_bins
+
+    @staticmethod
+    def build_levels(sums, counts):
+        """
+        Returns the data of a pyramid with the level 0 bins `sums` and `counts`.
+        """
+        levels = [numpy.vstack((sums, counts)).astype(numpy.float32)]
+        while levels[-1].shape[1] > 1:
+            level = levels[-1]
+            if level.shape[1] % 2:
+                level = numpy.hstack((level, numpy.zeros((2, 1), dtype=level.dtype)))
+            levels.append(level[:, 0::2] + level[:, 1::2])
+        return numpy.hstack(levels)
+
+    def summarize(self, start, end, num_points):
+        """
+        Returns [(position, mean value)] for num_points equal intervals of
+        start:end, as BBIDataProvider does; None if the region is too small to
+        be summarized from the pyramid.
+        """
+        if not self.levels[0][1]:
+            # no data for the chromosome
+            return []
+        if not can_summarize(start, end, num_points, self.bin_width):
+            return None
+        step = (end - start) / float(num_points)
+        level = 0
+        while level + 1 < len(self.levels) and step >= (self.bin_width << (level + 1)) * MIN_BINS_PER_POINT:
+            level += 1
+        offset, num_bins = self.levels[level]
+        width = self.bin_width << level
+        # boundaries of the points in bins of the level
+        edges = numpy.floor((start + step * numpy.arange(num_points + 1)) / width).astype(numpy.int64)
+        edges = numpy.clip(edges, 0, num_bins)
+        first, last = edges[0], edges[-1]
+        values = numpy.full(num_points, numpy.nan)
+        if last > first:
+            bins = numpy.asarray(self.data[:, offset + first:offset + last], dtype=numpy.float64)
+            # reduceat sums bins[edge_i:edge_i+1]; points without bins are left as NaN
+            has_bins = edges[1:] > edges[:-1]
+            sums = numpy.add.reduceat(bins, edges[:-1][has_bins] - first, axis=1)
+            with numpy.errstate(divide="ignore", invalid="ignore"):
+                values[has_bins] = sums[0] / sums[1]
+        int_step = (end - start) // num_points
+        return [(start + i * int_step, None if value != value else float(value)) for i, value in enumerate(values)]
+
+
+class CoverageSummaryStore(object):
+    """
+    Builds, stores (in `directory`) and loads the coverage pyramids of bigWig
+    and bigBed files, one per file and chromosome.
+
+    Pyramids are built from the data file the first time a zoomed out region
+    of a chromosome is requested and stored as .npy files that are memory
+    mapped when used.
+    """
+
+    def __init__(self, directory, max_loaded=64):
+        self.directory = directory
+        self.max_loaded = max_loaded
+        self.lock = threading.Lock()
+        self._loaded = OrderedDict()
+        self._building = {}
+
+    def _path(self, data_file_path, chrom):
+        try:
+            stat = os.stat(data_file_path)
+            version = "%d:%d" % (stat.st_size, int(stat.st_mtime))
+        except OSError:
+            version = ""
+        key = hashlib.sha1(("%s\0%s\0%s" % (data_file_path, version, chrom)).encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, key[:2], key)
+
+    def get(self, data_file_path, chrom, open_bbi):
+        """
+        Returns the CoveragePyramid of `chrom` in the data file, building it
+        if necessary; None if the file has no data for the chromosome.
+        `open_bbi` is a context manager yielding (file, bbi file) for the data
+        file.
+        """
+        path = self._path(data_file_path, chrom)
+        with self.lock:
+            if path in self._loaded:
+                self._loaded[path] = pyramid = self._loaded.pop(path)
+                return pyramid
+            build_lock = self._building.setdefault(path, threading.Lock())
+        # only build a pyramid once in this process
+        with build_lock:
+            with self.lock:
+                if path in self._loaded:
+                    return self._loaded[path]
+            pyramid = self._load(path)
+            if pyramid is None:
+                with open_bbi() as (f, bbi):
+                    pyramid = self._build(path, f, bbi, chrom)
+            with self.lock:
+                self._loaded[path] = pyramid
+                while len(self._loaded) > self.max_loaded:
+                    self._loaded.popitem(last=False)
+                self._building.pop(path, None)
+        return pyramid
+
+    def _load(self, path):
+        try:
+            with open(path + ".json") as f:
+                info = json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+        if info["num_bins"] == 0:
+            return CoveragePyramid(None, 0)
+        try:
+            data = numpy.load(path + ".npy", mmap_mode="r")
+        except (IOError, OSError, ValueError):
+            log.exception("Failed to load coverage summary %s", path)
+            return None
+        return CoveragePyramid(data, info["num_bins"], info["bin_width"])
+
+    def _build(self, path, f, bbi, chrom):
+        # Chromosome names may be UCSC or Ensembl style.
+        sizes = bbi_chrom_sizes(f)
+        bbi_chrom = chrom
+        if bbi_chrom not in sizes:
+            bbi_chrom = chrom[3:] if chrom.startswith("chr") else "chr" + chrom
+        num_bins = (sizes.get(bbi_chrom, 0) + BIN_WIDTH - 1) // BIN_WIDTH
+        sums = numpy.zeros(num_bins)
+        counts = numpy.zeros(num_bins)
+        for chunk_start in range(0, num_bins, BUILD_CHUNK_BINS):
+            summary = bbi.summarize(bbi_chrom, chunk_start * BIN_WIDTH, (chunk_start + BUILD_CHUNK_BINS) * BIN_WIDTH,
+                                    BUILD_CHUNK_BINS)
+            if summary is not None:
+                chunk_end = min(chunk_start + BUILD_CHUNK_BINS, num_bins)
+                sums[chunk_start:chunk_end] = summary.sum_data[:chunk_end - chunk_start]
+                counts[chunk_start:chunk_end] = summary.valid_count[:chunk_end - chunk_start]
+        pyramid_data = CoveragePyramid.build_levels(sums, counts) if num_bins else None
+        try:
+            self._save(path, pyramid_data, dict(chrom=chrom, num_bins=num_bins, bin_width=BIN_WIDTH))
+        except (IOError, OSError):
+            log.exception("Failed to save coverage summary %s", path)
+        return CoveragePyramid(pyramid_data, num_bins)
+
+    def _save(self, path, data, info):
+        directory = os.path.dirname(path)
+        if not os.path.exists(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                # created concurrently
+                if not os.path.isdir(directory):
+                    raise
+        # Write to temporary files and rename so other processes never load a
+        # partial summary; the .json is written last and marks it complete.
+        if data is not None:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".npy")
+            with os.fdopen(fd, "wb") as f:
+                numpy.save(f, data)
+            os.rename(tmp_path, path + ".npy")
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".json")
+        with os.fdopen(fd, "w") as f:
+            json.dump(info, f)
+        os.rename(tmp_path, path + ".json")
@@ -231,7 +231,7 @@ class ConfiguresHandlers(object):
 
     # If these get to be any more complex we should probably modularize them, or at least move to a separate class
 
-    def _assign_handler_direct(self, obj, configured):
+    def _assign_handler_direct(self, obj, configured, flush=True):
         """Directly assign a handler if the object has been preconfigured to a known single static handler.
 
         :param obj:             Same as :method:`ConfiguresHandlers.assign_handler()`.
@@ -246,11 +246,11 @@ class ConfiguresHandlers(object):
                 handlers = None
             if handlers == (configured,):
                 obj.set_handler(configured)
-                _timed_flush_obj(obj)
+                _timed_flush_obj(obj, flush=flush)
                 return configured
         return False
 
-    def _assign_mem_self_handler(self, obj, method, configured, queue_callback=None, **kwargs):
+    def _assign_mem_self_handler(self, obj, method, configured, queue_callback=None, flush=True, **kwargs):
         """Assign object to this handler using this process's in-memory queue.
 
         This method ignores all handler configuration.
@@ -270,11 +270,11 @@ class ConfiguresHandlers(object):
             log.warning("(%s) Ignoring handler assignment to '%s' because configured handler assignment method"
                         " '' overrides per-tool handler assignment", obj.log_str(),
                         HANDLER_ASSIGNMENT_METHODS.MEM_SELF, configured)
-        _timed_flush_obj(obj)
+        _timed_flush_obj(obj, flush=flush)
         queue_callback()
         return self.app.config.server_name
 
-    def _assign_db_self_handler(self, obj, method, configured, **kwargs):
+    def _assign_db_self_handler(self, obj, method, configured, flush=True, **kwargs):
         """Assign object to this process by setting its ``handler`` column in the database to this process.
 
         This only occurs if there is not an explicitly configured handler assignment for the object. Otherwise, it is
@@ -291,10 +291,10 @@ class ConfiguresHandlers(object):
                 obj, method, configured, **kwargs
             )
         obj.set_handler(self.app.config.server_name)
-        _timed_flush_obj(obj)
+        _timed_flush_obj(obj, flush=flush)
         return self.app.config.server_name
 
-    def _assign_db_preassign_handler(self, obj, method, configured, index=None, **kwargs):
+    def _assign_db_preassign_handler(self, obj, method, configured, index=None, flush=True, **kwargs):
         """Assign object to a handler by setting its ``handler`` column in the database to a handler selected at random
         from the known handlers in the appropriate tag.
 
@@ -323,10 +323,10 @@ class ConfiguresHandlers(object):
             log.debug("(%s) Selected handler '%s' by random choice from handler tag '%s'", obj.log_str(),
                       handler_id, handler)
         obj.set_handler(handler_id)
-        _timed_flush_obj(obj)
+        _timed_flush_obj(obj, flush=flush)
         return handler_id
 
-    def _assign_db_tag(self, obj, method, configured, **kwargs):
+    def _assign_db_tag(self, obj, method, configured, flush=True, **kwargs):
         """Assign object to a handler by setting its ``handler`` column in the database to either the configured handler
         ID or tag, or to the default tag (or ``_default_``)
 
@@ -340,10 +340,10 @@ class ConfiguresHandlers(object):
         if handler is None:
             handler = self.default_handler_id or self.DEFAULT_HANDLER_TAG
         obj.set_handler(handler)
-        _timed_flush_obj(obj)
+        _timed_flush_obj(obj, flush=flush)
         return handler
 
-    def _assign_uwsgi_mule_message_handler(self, obj, method, configured, message_callback=None, **kwargs):
+    def _assign_uwsgi_mule_message_handler(self, obj, method, configured, message_callback=None, flush=True, **kwargs):
         """Assign object to a handler by sending a setup message to the appropriate handler pool (farm), where a handler
         (mule) will receive the message and assign itself.
 
@@ -366,12 +366,12 @@ class ConfiguresHandlers(object):
             log.debug("(%s) No handler pool (uWSGI farm) for '%s' found", obj.log_str(), tag)
             raise HandlerAssignmentSkip()
         else:
-            _timed_flush_obj(obj)
+            _timed_flush_obj(obj, flush=flush)
             message = message_callback()
             self.app.application_stack.send_message(pool, message)
         return pool
 
-    def assign_handler(self, obj, configured=None, **kwargs):
+    def assign_handler(self, obj, configured=None, flush=True, **kwargs):
         """Set a job handler, flush obj
 
         Called assignment methods should raise :exception:`HandlerAssignmentSkip` to indicate that the next method
@@ -382,6 +382,8 @@ class ConfiguresHandlers(object):
         :type obj:          instance of :class:`galaxy.model.Job` or other model object with a ``set_handler()`` method.
         :param configured:  Preconfigured handler (ID, tag, or None) for the given object.
         :type configured:   str or None.
+        :param flush:       Flush obj after assigning the handler, if False the caller must flush it.
+        :type flush:        bool
 
         :returns: bool -- True on successful assignment, False otherwise.
         """
@@ -389,14 +391,14 @@ class ConfiguresHandlers(object):
         # that's currently the best place for it. It's worth noting that this method is also part of the
         # WorkflowSchedulingManager, which acts like a combined JobConfiguration and JobManager. Combining those two
         # classes would probably be reasonable (and would remove the need for the queue callback).
-        if self._assign_handler_direct(obj, configured):
+        if self._assign_handler_direct(obj, configured, flush=flush):
             log.info("(%s) Skipped handler assignment logic due to explicit configuration to a single handler: %s",
                      obj.log_str(), configured)
             return True
         for method in self.handler_assignment_methods:
             try:
                 handler = self._handler_assignment_method_methods[method](
-                    obj, method, configured=configured, **kwargs)
+                    obj, method, configured=configured, flush=flush, **kwargs)
                 log.info("(%s) Handler '%s' assigned using '%s' assignment method", obj.log_str(), handler, method)
                 return handler
             except HandlerAssignmentSkip:
@@ -411,7 +413,9 @@ class ConfiguresHandlers(object):
             raise HandlerAssignmentError("Job handler assignment failed.", obj=obj)
 
 
-def _timed_flush_obj(obj):
+def _timed_flush_obj(obj, flush=True):
+    if not flush:
+        return
     obj_flush_timer = ExecutionTimer()
     sa_session = object_session(obj)
     sa_session.flush()
@@ -16,6 +16,7 @@ from galaxy.managers import (
     histories,
     history_contents
 )
+from galaxy.managers.base import ENCODE_IDS_BATCH_SIZE
 from galaxy.managers.collections_util import (
     api_payload_to_create_params,
     dictify_dataset_collection_instance,
@@ -51,6 +52,7 @@ class HistoryContentsController(BaseAPIController, UsesLibraryMixin, UsesLibrary
         self.hda_serializer = hdas.HDASerializer(app)
         self.hda_deserializer = hdas.HDADeserializer(app)
         self.hdca_serializer = hdcas.HDCASerializer(app)
+        self.history_contents_serializer = history_contents.HistoryContentsSerializer(app)
         self.history_contents_filters = history_contents.HistoryContentsFilters(app)
 
     @expose_api_anonymous
@@ -857,6 +859,22 @@ class HistoryContentsController(BaseAPIController, UsesLibraryMixin, UsesLibrary
             name    defaults to 'name-asc'
 
         'order' defaults to 'hid-asc'
+
+        Large histories can be listed without loading each dataset and collection
+        by requesting only columns of the contents listing:
+            columns: comma separated strings, one or more of the columns in
+                     galaxy/managers/history_contents/HistoryContentsManager.common_columns
+                     (e.g. 'hid,name,state'). A dictionary is returned mapping
+                     each column to the list of its values in order.
+            Filters that can't be applied to these columns are rejected.
+
+        ..example:
+            Page through the history by hid, 500 items at a time, asking for
+            the next page with the largest hid seen so far:
+                '?v=dev&columns=hid,type_id,name,state&q=hid-gt&qv=500&order=hid-asc&limit=500'
+
+            Poll for only the contents changed since a previous request:
+                '?v=dev&columns=hid,type_id,state,update_time&q=update_time-gt&qv=2018-05-01T12:00:00.123'
         """
         rval = []
 
@@ -867,6 +885,19 @@ class HistoryContentsController(BaseAPIController, UsesLibraryMixin, UsesLibrary
         filters = self.history_contents_filters.parse_filters(filter_params)
         limit, offset = self.parse_limit_offset(kwd)
         order_by = self._parse_order_by(manager=self.history_contents_manager, order_by_string=kwd.get('order', 'hid-asc'))
+
+        columns = kwd.get('columns', None)
+        if columns:
+            columns = util.listify(columns, do_strip=True)
+            common_columns = self.history_contents_manager.common_columns
+            unknown_columns = [c for c in columns if c not in common_columns]
+            if unknown_columns:
+                raise exceptions.RequestParameterInvalidException('Unknown columns: %s' % ', '.join(unknown_columns),
+                    available=common_columns)
+            rows = self.history_contents_manager.contents_rows(history,
+                filters=filters, limit=limit, offset=offset, order_by=order_by)
+            return self.history_contents_serializer.serialize_columns(rows, columns, user=trans.user, trans=trans)
+
         serialization_params = self._parse_serialization_params(kwd, 'summary')
         # TODO: > 16.04: remove these
         # TODO: remove 'dataset_details' and the following section when the UI doesn't need it
@@ -881,7 +912,9 @@ class HistoryContentsController(BaseAPIController, UsesLibraryMixin, UsesLibrary
 
         contents = self.history_contents_manager.contents(history,
             filters=filters, limit=limit, offset=offset, order_by=order_by)
-        for content in contents:
+        for i, content in enumerate(contents):
+            if i % ENCODE_IDS_BATCH_SIZE == 0:
+                self.hda_serializer.encode_ids_of(contents[i:i + ENCODE_IDS_BATCH_SIZE])
 
             # TODO: remove split
             if isinstance(content, trans.app.model.HistoryDatasetAssociation):
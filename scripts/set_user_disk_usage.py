@@ -4,6 +4,7 @@ from __future__ import print_function
 import argparse
 import os
 import sys
+from multiprocessing.dummy import Pool
 
 sys.path.insert(1, os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, 'lib')))
 
@@ -19,6 +20,8 @@ parser = argparse.ArgumentParser()
 parser.add_argument('-u', '--username', dest='username', help='Username of user to update', default='all')
 parser.add_argument('-e', '--email', dest='email', help='Email address of user to update', default='all')
 parser.add_argument('--dry-run', dest='dryrun', help='Dry run (show changes but do not save to database)', action='store_true', default=False)
+parser.add_argument('--batch-size', dest='batch_size', type=int, default=1000, help='Number of users whose usage is calculated with one query when updating all users')
+parser.add_argument('--processes', dest='processes', type=int, default=1, help='Number of batches of users calculated in parallel when updating all users')
 populate_config_args(parser)
 args = parser.parse_args()
 
@@ -37,7 +40,70 @@ def init():
     return galaxy.config.init_models_from_config(config, object_store=object_store), object_store, engine
 
 
-def quotacheck(sa_session, users, engine):
+def describe_change(current, new):
+    if new in (current, None):
+        change = 'none'
+    elif new > current:
+        change = '+%s' % (nice_size(new - current))
+    else:
+        change = '-%s' % (nice_size(current - new))
+    return 'old usage: %s change: %s' % (nice_size(current), change)
+
+
+def quotacheck_batch(model, user_ids):
+    """
+    Recalculate the usage of `user_ids` with one query and return the ids of
+    the users whose usage changed while calculating.
+    """
+    sa_session = model.context
+    user_table = model.User.table
+    try:
+        rows = sa_session.execute(
+            user_table.select().with_only_columns([user_table.c.id, user_table.c.username, user_table.c.email, user_table.c.disk_usage])
+            .where(user_table.c.id.in_(user_ids)).order_by(user_table.c.id)).fetchall()
+        usages = model.User.calculate_disk_usages(sa_session, [row.id for row in rows])
+        changed = []
+        for row in rows:
+            user_id = row.id
+            old, new = row.disk_usage or 0, usages[user_id]
+            if new != old and not args.dryrun:
+                # only update if the usage did not change while calculating
+                result = sa_session.execute(
+                    user_table.update().where(user_table.c.id == user_id)
+                    .where(user_table.c.disk_usage == row.disk_usage if row.disk_usage is not None else user_table.c.disk_usage.is_(None))
+                    .values(disk_usage=new))
+                if not result.rowcount:
+                    changed.append(user_id)
+                    continue
+            print('%s <%s>: %s' % (row.username, row.email, describe_change(old, new)))
+        return changed
+    finally:
+        sa_session.remove()
+
+
+def quotacheck_all(model):
+    """
+    Recalculate the usage of all users, in batches of `args.batch_size` users
+    processed by `args.processes` threads.
+    """
+    user_table = model.User.table
+    user_ids = [row.id for row in model.context.execute(user_table.select().with_only_columns([user_table.c.id]).order_by(user_table.c.id))]
+    model.context.remove()
+    print('Processing %i users...' % len(user_ids))
+    batch_size = max(args.batch_size, 1)
+    pool = Pool(max(args.processes, 1))
+    try:
+        while user_ids:
+            batches = [user_ids[i:i + batch_size] for i in range(0, len(user_ids), batch_size)]
+            user_ids = sorted(sum(pool.map(lambda batch: quotacheck_batch(model, batch), batches), []))
+            if user_ids:
+                print('usage of %i users changed while calculating, trying again...' % len(user_ids))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def quotacheck(sa_session, user, engine):
     sa_session.refresh(user)
     current = user.get_disk_usage()
     print(user.username, '<' + user.email + '>:', end=' ')
@@ -51,18 +117,11 @@ def quotacheck(sa_session, users, engine):
     else:
         new = pgcalc(sa_session, user.id, dryrun=args.dryrun)
     # yes, still a small race condition between here and the flush
-    print('old usage:', nice_size(current), 'change:', end=' ')
-    if new in (current, None):
-        print('none')
-    else:
-        if new > current:
-            print('+%s' % (nice_size(new - current)))
-        else:
-            print('-%s' % (nice_size(current - new)))
-        if not args.dryrun and engine not in ('postgres', 'postgresql'):
-            user.set_disk_usage(new)
-            sa_session.add(user)
-            sa_session.flush()
+    print(describe_change(current, new))
+    if new not in (current, None) and not args.dryrun and engine not in ('postgres', 'postgresql'):
+        user.set_disk_usage(new)
+        sa_session.add(user)
+        sa_session.flush()
 
 
 if __name__ == '__main__':
@@ -71,11 +130,7 @@ if __name__ == '__main__':
     sa_session = model.context.current
 
     if not args.username and not args.email:
-        user_count = sa_session.query(model.User).count()
-        print('Processing %i users...' % user_count)
-        for i, user in enumerate(sa_session.query(model.User).enable_eagerloads(False).yield_per(1000)):
-            print('%3i%%' % int(float(i) / user_count * 100), end=' ')
-            quotacheck(sa_session, user, engine)
+        quotacheck_all(model)
         print('100% complete')
         object_store.shutdown()
         sys.exit(0)
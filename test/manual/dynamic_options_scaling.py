@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""Measure building the dynamic options of a select parameter for the steps
+of a workflow run form.
+
+Builds the options of a parameter filtering a tool data table of
+``--row_count`` rows (through a static_value, param_value, unique_value and
+sort_by filter chain) once per step of a ``--step_count`` step workflow run
+form, with the result cache of ``DynamicOptions`` disabled and enabled.
+
+% python test/manual/dynamic_options_scaling.py --row_count 100000 --step_count 300
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy.tools.data import ToolDataTableManager  # noqa: I100,I202
+from galaxy.tools.parameters.dynamic_options import DEFAULT_CACHE_SIZE, DynamicOptions
+from galaxy.util import parse_xml_string
+from galaxy.util.bunch import Bunch
+from unit.tools.test_tool_data_tables import TABLE_CONF  # noqa: I100,I201
+
+DESCRIPTION = "Script to measure building the dynamic options of the steps of a workflow run form."
+OPTIONS_XML = """<options from_data_table="all_fasta">
+    <filter type="static_value" column="3" value="/data/excluded.fa" keep="false" />
+    <filter type="param_value" ref="build" column="1" />
+    <filter type="unique_value" column="0" />
+    <filter type="sort_by" column="2" />
+</options>"""
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--row_count", type=int, default=100000)
+    arg_parser.add_argument("--step_count", type=int, default=300)
+    args = arg_parser.parse_args(argv)
+
+    tool_data_path = tempfile.mkdtemp()
+    try:
+        loc_path = os.path.join(tool_data_path, "all_fasta.loc")
+        with open(loc_path, "w") as f:
+            for i in range(args.row_count):
+                f.write("build%d_%d\tbuild%d\tBuild %d\t/data/build%d.fa\n" % (i, i % 3, i // 3, i, i))
+        conf_path = os.path.join(tool_data_path, "tool_data_table_conf.xml")
+        with open(conf_path, "w") as f:
+            f.write(TABLE_CONF % ("", loc_path))
+        tool_data_tables = ToolDataTableManager(tool_data_path, conf_path)
+        tool_data_tables["all_fasta"].get_fields()
+
+        print("%-24s %14s %16s" % ("%d steps" % args.step_count, "total (s)", "per step (ms)"))
+        for label, cache_size in [("no cache", 0), ("cache", DEFAULT_CACHE_SIZE)]:
+            app = Bunch(tool_data_tables=tool_data_tables, config=Bunch(tool_form_dynamic_options_cache_size=cache_size))
+            options = DynamicOptions(parse_xml_string(OPTIONS_XML), Bunch(tool=Bunch(app=app)))
+            trans = Bunch(user=None, workflow_building_mode=False)
+            start = time.time()
+            for _ in range(args.step_count):
+                assert len(options.get_options(trans, {"build": "build42"})) == 3
+            duration = time.time() - start
+            print("%-24s %14.3f %16.3f" % (label, duration, 1000 * duration / args.step_count))
+    finally:
+        shutil.rmtree(tool_data_path)
+
+
+if __name__ == "__main__":
+    main()
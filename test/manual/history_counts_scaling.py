@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""Measure the cost of reading the state and active counts of a history as
+the number of datasets in it grows.
+
+Compares the aggregate queries run on every read with the summaries kept by
+``HistoryContentsSummaryCache`` (enabled with
+``history_counts_reconcile_interval``). Between reads a few datasets change
+state, as they would while jobs run. Uses a temporary sqlite database unless
+``--database_connection`` is given.
+
+% python test/manual/history_counts_scaling.py --item_counts 1000,10000,100000
+"""
+import datetime
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy import model  # noqa: I100,I202
+from galaxy.managers.history_contents import (
+    HistoryContentsManager,
+    HistoryContentsSummaryCache,
+)
+from unit.unittest_utils.galaxy_mock import MockApp  # noqa: I100,I201
+
+DESCRIPTION = "Script to measure the time taken to count the contents of large histories."
+CHANGES_PER_READ = 10
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--database_connection", default="sqlite://")
+    arg_parser.add_argument("--item_counts", default="1000,10000,100000")
+    arg_parser.add_argument("--reads", type=int, default=20)
+    args = arg_parser.parse_args(argv)
+
+    print("%10s %20s %20s" % ("items", "aggregate (ms)", "cached (ms)"))
+    for item_count in [int(c) for c in args.item_counts.split(",")]:
+        app = MockApp(database_connection=args.database_connection)
+        history_id, dataset_ids = _populate(app.model, item_count)
+        uncached = _time_reads(app, None, history_id, dataset_ids, args.reads)
+        cache = HistoryContentsSummaryCache(reconcile_interval=3600)
+        cached = _time_reads(app, cache, history_id, dataset_ids, args.reads)
+        print("%10d %20.2f %20.2f" % (item_count, 1000 * uncached, 1000 * cached))
+
+
+def _populate(model_mapping, item_count):
+    """Create a history of `item_count` datasets, returning the ids of the history and datasets."""
+    sa_session = model_mapping.context
+    history = model.History()
+    sa_session.add(history)
+    sa_session.flush()
+    # Insert rows directly, creating 100k items through the ORM takes minutes.
+    update_time = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    states = [model.Dataset.states.OK, model.Dataset.states.ERROR, model.Dataset.states.QUEUED]
+    for start in range(0, item_count, 10000):
+        rows = range(start, min(start + 10000, item_count))
+        sa_session.execute(model.Dataset.table.insert(), [
+            dict(state=states[i % len(states)], deleted=False, purged=False, update_time=update_time) for i in rows
+        ])
+    dataset_ids = [row[0] for row in sa_session.execute(model.Dataset.table.select().with_only_columns([model.Dataset.table.c.id]))]
+    for start in range(0, item_count, 10000):
+        sa_session.execute(model.HistoryDatasetAssociation.table.insert(), [
+            dict(history_id=history.id, dataset_id=dataset_id, hid=i + 1, name="dataset %d" % i, extension="txt",
+                 deleted=(i % 50 == 0), visible=(i % 20 != 0), update_time=update_time)
+            for i, dataset_id in enumerate(dataset_ids[start:start + 10000], start)
+        ])
+    return history.id, dataset_ids
+
+
+def _time_reads(app, cache, history_id, dataset_ids, reads):
+    """Return the mean duration of reading the counts after the first read."""
+    app.history_contents_summary_cache = cache
+    contents_manager = HistoryContentsManager(app)
+    history = app.model.context.query(model.History).get(history_id)
+    contents_manager.state_counts(history)
+    duration = 0
+    for read in range(reads):
+        # simulate jobs changing the state of a few datasets between polls
+        changed = dataset_ids[read * CHANGES_PER_READ:(read + 1) * CHANGES_PER_READ]
+        app.model.context.execute(model.Dataset.table.update()
+            .where(model.Dataset.table.c.id.in_(changed))
+            .values(state=model.Dataset.states.OK, update_time=datetime.datetime.utcnow()))
+        start = time.time()
+        contents_manager.state_counts(history)
+        contents_manager.active_counts(history)
+        duration += time.time() - start
+    return duration / reads
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+"""Measure how long importing a history takes as the number of datasets grows.
+
+Writes a synthetic history export (in the directory layout of extracted
+history archives) with a small dataset file for every dataset and a job for
+every pair of datasets, then imports it through ``galaxy.model.store`` with
+each ``history_import_batch_size``. Uses a temporary sqlite database unless
+``--database_connection`` is given; ids are only preallocated on PostgreSQL.
+
+% python test/manual/history_import_scaling.py --dataset_counts 1000,10000 --batch_sizes 0,1000
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy import model  # noqa: I100,I202
+from galaxy.model import store
+from unit.test_objectstore import TestConfig  # noqa: I100,I201
+from unit.tools.test_history_imp_exp import MockSetExternalTool
+from unit.unittest_utils.galaxy_mock import MockApp
+
+DESCRIPTION = "Script to measure the time taken to import large histories."
+HISTORY_KEY = "history1"
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--database_connection", default=None)
+    arg_parser.add_argument("--dataset_counts", default="1000,10000")
+    arg_parser.add_argument("--batch_sizes", default="0,100,1000")
+    args = arg_parser.parse_args(argv)
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    print("%10s %s" % ("datasets", " ".join("%16s" % ("batch %d (s)" % b) for b in batch_sizes)))
+    work_dir = tempfile.mkdtemp()
+    for dataset_count in [int(c) for c in args.dataset_counts.split(",")]:
+        archive_dir = os.path.join(work_dir, "export_%d" % dataset_count)
+        _write_export(archive_dir, dataset_count)
+        durations = []
+        for batch_size in batch_sizes:
+            database_connection = args.database_connection or "sqlite:///%s" % os.path.join(work_dir, "import_%d_%d.sqlite" % (dataset_count, batch_size))
+            app = _app(database_connection, batch_size)
+            durations.append(_import_duration(app, archive_dir, dataset_count))
+        print("%10d %s" % (dataset_count, " ".join("%16.2f" % d for d in durations)))
+
+
+def _app(database_connection, batch_size):
+    app = MockApp(database_connection=database_connection)
+    app.object_store = TestConfig().object_store
+    app.model.Dataset.object_store = app.object_store
+    app.datatypes_registry.set_external_metadata_tool = MockSetExternalTool()
+    app.config.history_import_batch_size = batch_size
+    return app
+
+
+def _write_export(archive_dir, dataset_count):
+    """Write the attribute and dataset files of a history export of `dataset_count` datasets."""
+    datasets_dir = os.path.join(archive_dir, "datasets")
+    os.makedirs(datasets_dir)
+    datasets_attrs = []
+    for i in range(dataset_count):
+        file_name = "datasets/dataset_%d.txt" % i
+        with open(os.path.join(archive_dir, file_name), "w") as f:
+            f.write("line %d\n" % i)
+        datasets_attrs.append(dict(
+            encoded_id="dataset%d" % i, history_encoded_id=HISTORY_KEY, hid=i + 1,
+            name="dataset %d" % i, extension="txt", info="", blurb="1 line", peek="line %d" % i,
+            designation=None, visible=True, deleted=False, metadata={"dbkey": "?"},
+            annotation=None, tags=[], file_name=file_name,
+        ))
+    jobs_attrs = []
+    for i in range(0, dataset_count - 1, 2):
+        jobs_attrs.append(dict(
+            encoded_id="job%d" % i, tool_id="cat1", tool_version="1.0.0", state="ok",
+            create_time="2020-01-01T00:00:00.000000", update_time="2020-01-01T00:00:00.000000",
+            params={"input1": {"src": "hda", "id": "dataset%d" % i}},
+            input_dataset_mapping={"input1": ["dataset%d" % i]},
+            output_dataset_mapping={"out_file1": ["dataset%d" % (i + 1)]},
+        ))
+    attrs = {
+        store.ATTRS_FILENAME_EXPORT: dict(galaxy_export_version=store.GALAXY_EXPORT_VERSION),
+        store.ATTRS_FILENAME_HISTORY: dict(name="Scaling", encoded_id=HISTORY_KEY, hid_counter=dataset_count + 1),
+        store.ATTRS_FILENAME_DATASETS: datasets_attrs,
+        store.ATTRS_FILENAME_JOBS: jobs_attrs,
+    }
+    for filename, value in attrs.items():
+        with open(os.path.join(archive_dir, filename), "w") as f:
+            json.dump(value, f)
+
+
+def _import_duration(app, archive_dir, dataset_count):
+    user = model.User(email="scaling@example.org", password="password")
+    app.model.context.add(user)
+    app.model.context.flush()
+    start = time.time()
+    import_model_store = store.get_import_model_store_for_directory(archive_dir, app=app, user=user)
+    with import_model_store.target_history() as new_history:
+        import_model_store.perform_import(new_history, new_history=True)
+    duration = time.time() - start
+    assert len(new_history.datasets) == dataset_count
+    return duration
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""Measure the throughput of serializing the ids of a large history contents
+response.
+
+Serializes the columns of ``--item_count`` synthetic history contents rows
+(as ``GET /api/histories/{id}/contents?v=dev&columns=...`` does) with
+``HistoryContentsSerializer.serialize_columns`` and an ``IdEncodingHelper``
+without id cache (encrypting every id separately, as before ids were
+cached), with the default cache size (a first response) and with a cache
+holding every id (a repeated response). Also times decoding the ids one at a
+time and with ``decode_ids``.
+
+% python test/manual/id_encoding_throughput.py --item_count 50000
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy.managers.history_contents import HistoryContentsSerializer  # noqa: I100,I202
+from galaxy.security.idencoding import DEFAULT_ID_CACHE_SIZE, IdEncodingHelper
+from galaxy.util.bunch import Bunch
+from unit.unittest_utils.galaxy_mock import MockApp  # noqa: I100,I201
+
+DESCRIPTION = "Script to measure the throughput of id encoding when serializing large histories."
+COLUMNS = ["id", "type_id", "history_id", "dataset_id", "hid", "name", "state"]
+ID_SECRET = "6e46ed6483a833c100e68cc3f1d0dd76"
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--item_count", type=int, default=50000)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    args = arg_parser.parse_args(argv)
+
+    app = MockApp()
+    serializer = HistoryContentsSerializer(app)
+    rows = _rows(args.item_count)
+
+    print("%-40s %12s %16s" % ("%d items" % args.item_count, "time (s)", "items/s"))
+    for label, cache_size, warm in [
+        ("encode, no id cache", 0, False),
+        ("encode, default cache, first response", DEFAULT_ID_CACHE_SIZE, False),
+        ("encode, cache of all ids, repeated", 4 * args.item_count, True),
+    ]:
+        def serialize():
+            app.security = IdEncodingHelper(id_secret=ID_SECRET, id_cache_size=cache_size)
+            if warm:
+                serializer.serialize_columns(rows, COLUMNS)
+            start = time.time()
+            serializer.serialize_columns(rows, COLUMNS)
+            return time.time() - start
+        _report(label, args.item_count, min(serialize() for _ in range(args.repeat)))
+
+    encoded_ids = IdEncodingHelper(id_secret=ID_SECRET).encode_ids([row.id for row in rows])
+    for label, decode in [
+        ("decode, one at a time", lambda helper: [helper.decode_id(i) for i in encoded_ids]),
+        ("decode, decode_ids", lambda helper: helper.decode_ids(encoded_ids)),
+    ]:
+        def time_decode():
+            helper = IdEncodingHelper(id_secret=ID_SECRET, id_cache_size=0)
+            start = time.time()
+            decode(helper)
+            return time.time() - start
+        _report(label, args.item_count, min(time_decode() for _ in range(args.repeat)))
+
+
+def _rows(item_count):
+    rows = []
+    for i in range(item_count):
+        rows.append(Bunch(id=i + 1, type_id="dataset-%d" % (i + 1), history_id=1, dataset_id=i + 100001,
+                          collection_id=None, hid=i + 1, name="dataset %d" % i, state="ok"))
+    return rows
+
+
+def _report(label, item_count, duration):
+    print("%-40s %12.3f %16.0f" % (label, duration, item_count / duration))
+
+
+if __name__ == "__main__":
+    main()
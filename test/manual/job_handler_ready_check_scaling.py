@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+"""Measure the cost of a job handler queue iteration as the number of queued
+jobs waiting on upstream datasets grows.
+
+Compares the default ready-jobs query with the incremental index enabled by
+``job_handler_incremental_ready_check``. Uses a temporary sqlite database
+unless ``--database_connection`` is given.
+
+% python test/manual/job_handler_ready_check_scaling.py --job_counts 1000,10000,50000
+"""
+import datetime
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib")]
+
+from galaxy import model  # noqa: I100,I202
+from galaxy.jobs.handler import JobHandlerQueue
+from galaxy.model import mapping
+from galaxy.util.bunch import Bunch
+
+DESCRIPTION = "Script to measure job handler iteration time with many waiting jobs."
+SERVER_NAME = "handler0"
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--database_connection", default="sqlite://")
+    arg_parser.add_argument("--job_counts", default="1000,5000,20000")
+    arg_parser.add_argument("--iterations", type=int, default=5)
+    args = arg_parser.parse_args(argv)
+
+    print("%10s %20s %20s" % ("jobs", "full query (s)", "incremental (s)"))
+    for job_count in [int(c) for c in args.job_counts.split(",")]:
+        app = _app(args.database_connection)
+        _populate(app.model, job_count)
+        legacy = _time_iterations(app, incremental=False, iterations=args.iterations)
+        incremental = _time_iterations(app, incremental=True, iterations=args.iterations)
+        print("%10d %20.4f %20.4f" % (job_count, legacy, incremental))
+
+
+def _app(database_connection):
+    config = Bunch(
+        track_jobs_in_database=True,
+        server_name=SERVER_NAME,
+        user_activation_on=False,
+        monitor_thread_join_timeout=0,
+    )
+    job_config = Bunch(handler_assignment_methods=[], self_handler_tags=[SERVER_NAME], handler_max_grab=None)
+    return Bunch(
+        config=config,
+        job_config=job_config,
+        model=mapping.init("/tmp", database_connection, create_tables=True),
+    )
+
+
+def _populate(model_mapping, job_count):
+    """Create `job_count` new jobs each waiting on a queued upstream dataset."""
+    sa_session = model_mapping.context
+    history = model.History()
+    sa_session.add(history)
+    for i in range(job_count):
+        hda = model.HistoryDatasetAssociation(history=history, create_dataset=True, sa_session=sa_session)
+        hda.dataset.state = model.Dataset.states.QUEUED
+        job = model.Job()
+        job.tool_id = "cat1"
+        job.state = model.Job.states.NEW
+        job.handler = SERVER_NAME
+        job.add_input_dataset("input1", hda)
+        sa_session.add(job)
+        if i % 1000 == 0:
+            sa_session.flush()
+    sa_session.flush()
+    # Simulate a steady state where the waiting jobs were created a while ago.
+    update_time = datetime.datetime.utcnow() - datetime.timedelta(hours=1)
+    for table in [model.Job.table, model.Dataset.table]:
+        sa_session.execute(table.update().values(update_time=update_time))
+    sa_session.flush()
+
+
+def _time_iterations(app, incremental, iterations):
+    """Return the mean duration of handler iterations after the first one."""
+    app.config.job_handler_incremental_ready_check = incremental
+    queue = JobHandlerQueue(app, dispatcher=None)
+    handle_waiting_jobs = getattr(queue, "_JobHandlerQueue__handle_waiting_jobs")
+    # The first iteration builds the index (a full check) in incremental mode.
+    handle_waiting_jobs()
+    start = time.time()
+    for _ in range(iterations):
+        handle_waiting_jobs()
+    return (time.time() - start) / iterations
+
+
+if __name__ == "__main__":
+    main()
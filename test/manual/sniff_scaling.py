@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+"""Measure how long datatype sniffing takes for a directory of files.
+
+Runs ``guess_ext`` with the sniff order of the sample datatypes
+configuration over every file in the given directories (by default
+``test-data`` and the datatype sniffer test files) and reports the time
+taken and the extensions detected.
+
+% python test/manual/sniff_scaling.py --repeat 5 test-data
+"""
+import os
+import sys
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib")]
+
+from galaxy.datatypes.registry import example_datatype_registry_for_sample  # noqa: I100,I202
+from galaxy.datatypes.sniff import guess_ext
+
+DESCRIPTION = "Script to measure the time taken to sniff the datatype of many files."
+DEFAULT_DIRECTORIES = [
+    os.path.join(galaxy_root, "test-data"),
+    os.path.join(galaxy_root, "lib", "galaxy", "datatypes", "test"),
+]
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("directories", nargs="*", default=DEFAULT_DIRECTORIES)
+    arg_parser.add_argument("--repeat", type=int, default=3)
+    arg_parser.add_argument("--verbose", action="store_true", default=False, help="print the extension sniffed for each file")
+    args = arg_parser.parse_args(argv)
+
+    sniff_order = example_datatype_registry_for_sample().sniff_order
+    paths = []
+    for directory in args.directories:
+        for name in sorted(os.listdir(directory)):
+            path = os.path.join(directory, name)
+            if os.path.isfile(path):
+                paths.append(path)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.time()
+        extensions = [_guess_ext(path, sniff_order) for path in paths]
+        timings.append(time.time() - start)
+    if args.verbose:
+        for path, ext in zip(paths, extensions):
+            print("%s\t%s" % (os.path.relpath(path, galaxy_root), ext))
+    best = min(timings)
+    print("Sniffed %d files: best of %d runs %.3f s (%.2f ms per file)" % (len(paths), args.repeat, best, 1000 * best / max(len(paths), 1)))
+
+
+def _guess_ext(path, sniff_order):
+    try:
+        return guess_ext(path, sniff_order)
+    except Exception as e:
+        return "error: %s" % e
+
+
+if __name__ == "__main__":
+    main()
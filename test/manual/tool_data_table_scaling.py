@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+"""Measure loading and lookups of a large tool data table.
+
+Writes a ``.loc`` file of ``--row_count`` genome builds and reports the time
+taken to configure a ``ToolDataTableManager`` with it (at startup, the file
+is not read), to read the file on first access, and the mean latency of
+``get_entry`` lookups compared to scanning the rows like the lookups did
+before the rows were indexed.
+
+% python test/manual/tool_data_table_scaling.py --row_count 200000
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy.tools.data import ToolDataTableManager  # noqa: I100,I202
+from unit.tools.test_tool_data_tables import TABLE_CONF  # noqa: I100,I201
+
+DESCRIPTION = "Script to measure tool data table load times and lookup latencies."
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--row_count", type=int, default=200000)
+    arg_parser.add_argument("--lookups", type=int, default=100)
+    args = arg_parser.parse_args(argv)
+
+    tool_data_path = tempfile.mkdtemp()
+    try:
+        loc_path = os.path.join(tool_data_path, "all_fasta.loc")
+        with open(loc_path, "w") as f:
+            for i in range(args.row_count):
+                f.write("build%d\tbuild%d\tBuild %d\t/data/build%d.fa\n" % (i, i, i, i))
+        conf_path = os.path.join(tool_data_path, "tool_data_table_conf.xml")
+        with open(conf_path, "w") as f:
+            f.write(TABLE_CONF % ("", loc_path))
+
+        start = time.time()
+        table = ToolDataTableManager(tool_data_path, conf_path)["all_fasta"]
+        configure = time.time() - start
+        start = time.time()
+        rows = table.get_fields()
+        first_access = time.time() - start
+
+        dbkeys = ["build%d" % (i * args.row_count // args.lookups) for i in range(args.lookups)]
+        start = time.time()
+        for dbkey in dbkeys:
+            [fields[3] for fields in rows if fields[1] == dbkey][:1]
+        scan = (time.time() - start) / args.lookups
+        start = time.time()
+        table.get_entry("dbkey", dbkeys[0], "path")
+        index_build = time.time() - start
+        start = time.time()
+        for dbkey in dbkeys:
+            table.get_entry("dbkey", dbkey, "path")
+        lookup = (time.time() - start) / args.lookups
+    finally:
+        shutil.rmtree(tool_data_path)
+    print("%d rows" % args.row_count)
+    print("configure table (startup)   %10.3f s" % configure)
+    print("read file on first access   %10.3f s" % first_access)
+    print("index dbkey column          %10.3f s" % index_build)
+    print("get_entry, row scan         %10.3f ms" % (1000 * scan))
+    print("get_entry, indexed          %10.3f ms" % (1000 * lookup))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+"""Measure how quickly jobs are created when a tool is run over many inputs.
+
+Runs a simple tool once per input dataset through ``galaxy.tools.execute``
+(the code path used when mapping a tool over a collection) and reports the
+number of jobs created per second for each ``tool_execution_batch_size``.
+Uses a temporary sqlite database unless ``--database_connection`` is given.
+
+% python test/manual/tool_execution_scaling.py --job_counts 100,1000 --batch_sizes 0,100
+"""
+import os
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+from sqlalchemy.orm import object_session
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from galaxy import model  # noqa: I100,I202
+from galaxy.tools import create_tool_from_source
+from galaxy.tools.execute import (
+    execute,
+    MappingParameters,
+)
+from galaxy.tools.parser import get_tool_source
+from galaxy.util.bunch import Bunch
+from unit.unittest_utils.galaxy_mock import MockApp  # noqa: I100,I201
+
+DESCRIPTION = "Script to measure the rate at which tool executions create jobs."
+SERVER_NAME = "handler0"
+TOOL_CONTENTS = '''<tool id="cat_scaling" name="Concatenate" version="1.0">
+    <command>cat "$input1" &gt; "$out_file1"</command>
+    <inputs>
+        <param type="data" format="txt" name="input1" />
+        <param type="text" name="label" value="" />
+    </inputs>
+    <outputs>
+        <data name="out_file1" format="input" label="Concatenated ($label)" />
+    </outputs>
+</tool>
+'''
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--database_connection", default=None)
+    arg_parser.add_argument("--job_counts", default="100,1000")
+    arg_parser.add_argument("--batch_sizes", default="0,50,500")
+    args = arg_parser.parse_args(argv)
+
+    batch_sizes = [int(b) for b in args.batch_sizes.split(",")]
+    print("%10s %s" % ("jobs", " ".join("%16s" % ("batch %d (j/s)" % b) for b in batch_sizes)))
+    work_dir = tempfile.mkdtemp()
+    tool_path = os.path.join(work_dir, "cat_scaling.xml")
+    with open(tool_path, "w") as f:
+        f.write(TOOL_CONTENTS)
+    for job_count in [int(c) for c in args.job_counts.split(",")]:
+        rates = []
+        for batch_size in batch_sizes:
+            database_connection = args.database_connection or "sqlite:///%s" % os.path.join(work_dir, "jobs_%d_%d.sqlite" % (job_count, batch_size))
+            app = _app(database_connection, work_dir, batch_size)
+            tool = create_tool_from_source(app, get_tool_source(tool_path), config_file=tool_path)
+            trans = MockTrans(app)
+            hdas = _populate(app, trans.history, job_count)
+            rates.append(_jobs_per_second(trans, tool, hdas))
+        print("%10d %s" % (job_count, " ".join("%16.1f" % r for r in rates)))
+
+
+def _app(database_connection, work_dir, batch_size):
+    app = MockApp(database_connection=database_connection)
+    app.config.new_file_path = work_dir
+    app.config.len_file_path = "moocow"
+    app.config.tool_secret = "testsecret"
+    app.config.track_jobs_in_database = True
+    app.config.legacy_eager_objectstore_initialization = False
+    app.config.tool_execution_batch_size = batch_size
+    app.job_config["get_job_tool_configurations"] = lambda ids: [Bunch(handler=Bunch())]
+    app.job_manager = DatabaseJobManager()
+    return app
+
+
+def _populate(app, history, count):
+    """Create `count` ok input datasets in `history`."""
+    sa_session = app.model.context
+    hdas = []
+    for i in range(count):
+        hda = model.HistoryDatasetAssociation(extension="txt", create_dataset=True, sa_session=sa_session)
+        hda.dataset.state = model.Dataset.states.OK
+        history.add_dataset(hda)
+        hdas.append(hda)
+    sa_session.flush()
+    return hdas
+
+
+def _jobs_per_second(trans, tool, hdas):
+    param_combinations = [dict(input1=hda, label="input %d" % i) for i, hda in enumerate(hdas)]
+    mapping_params = MappingParameters(dict(input1=hdas[0], label=""), param_combinations)
+    start = time.time()
+    execution_tracker = execute(trans, tool, mapping_params, trans.history, completed_jobs=[None] * len(param_combinations))
+    duration = time.time() - start
+    assert not execution_tracker.execution_errors, execution_tracker.execution_errors[0]
+    return len(execution_tracker.successful_jobs) / duration
+
+
+class DatabaseJobManager(object):
+    """Assign jobs to a handler the way the database handler assignment methods do."""
+
+    def enqueue(self, job, tool=None, flush=True):
+        job.set_handler(SERVER_NAME)
+        if flush:
+            object_session(job).flush()
+        return SERVER_NAME
+
+
+class MockTrans(object):
+
+    def __init__(self, app):
+        self.app = app
+        self.sa_session = app.model.context
+        self.model = app.model
+        self.user = None
+        self.history = model.History()
+        self.sa_session.add(self.history)
+        self.sa_session.flush()
+
+    def check_user_activation(self):
+        pass
+
+    def get_current_user_roles(self):
+        return []
+
+    def db_dataset_for(self, dbkey):
+        return None
+
+    def get_galaxy_session(self):
+        return None
+
+    def log_event(self, *args, **kwargs):
+        pass
+
+
+if __name__ == "__main__":
+    main()
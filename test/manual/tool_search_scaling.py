@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+"""Compare the tool search index with the Whoosh index it replaced.
+
+Indexes synthetic tools (a name, description, section and a help text of
+``--help_words`` words each) with ``galaxy.tools.search.ToolBoxSearch`` and
+with a Whoosh RamStorage index built and queried the way ToolBoxSearch used
+to, then reports the time taken to build the indexes, to load the saved
+index and the mean latency of a few queries.
+
+% python test/manual/tool_search_scaling.py --tool_counts 1000,5000
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser
+
+galaxy_root = os.path.abspath(os.path.join(os.path.dirname(__file__), os.path.pardir, os.path.pardir))
+sys.path[1:1] = [os.path.join(galaxy_root, "lib"), os.path.join(galaxy_root, "test")]
+
+from whoosh import analysis  # noqa: I100,I202
+from whoosh.fields import KEYWORD, Schema, STORED, TEXT
+from whoosh.filedb.filestore import RamStorage
+from whoosh.qparser import MultifieldParser
+from whoosh.scoring import BM25F
+
+from galaxy.tools.search import ToolBoxSearch  # noqa: I100
+from unit.tools.test_tool_search import MockTool, MockToolCache, SEARCH_KWDS  # noqa: I100,I201
+
+DESCRIPTION = "Script to compare tool search index build times and query latencies."
+QUERIES = ["fastq", "bam sort", "convert format", "align reads to", "vcf", "qual"]
+WORDS = ["align", "alignment", "assembly", "bam", "bed", "bowtie", "call", "column", "compute", "convert", "count",
+         "coverage", "data", "dataset", "fasta", "fastq", "filter", "format", "genome", "gff", "group", "join",
+         "mapping", "merge", "peak", "quality", "read", "reads", "reference", "region", "sam", "select", "sequence",
+         "sort", "statistics", "table", "tabular", "text", "trim", "variant", "vcf", "workflow"]
+
+
+def main(argv=None):
+    arg_parser = ArgumentParser(description=DESCRIPTION)
+    arg_parser.add_argument("--tool_counts", default="1000,5000")
+    arg_parser.add_argument("--help_words", type=int, default=200)
+    arg_parser.add_argument("--repeat", type=int, default=20)
+    args = arg_parser.parse_args(argv)
+
+    print("%8s %14s %14s %14s %16s %16s" % ("tools", "whoosh build", "index build", "index load", "whoosh query (ms)", "index query (ms)"))
+    for tool_count in [int(c) for c in args.tool_counts.split(",")]:
+        tools = _tools(tool_count, args.help_words)
+        index_dir = tempfile.mkdtemp()
+        try:
+            start = time.time()
+            whoosh_index = _whoosh_index(tools)
+            whoosh_build = time.time() - start
+
+            start = time.time()
+            _toolbox_search(tools, index_dir)
+            index_build = time.time() - start
+            start = time.time()
+            toolbox_search = _toolbox_search(tools, index_dir)
+            index_load = time.time() - start
+
+            whoosh_query = _query_latency(lambda q: _whoosh_search(whoosh_index, q), args.repeat)
+            index_query = _query_latency(lambda q: toolbox_search.search(q=q, **SEARCH_KWDS), args.repeat)
+        finally:
+            shutil.rmtree(index_dir)
+        print("%8d %14.2f %14.2f %14.2f %16.2f %16.2f" % (tool_count, whoosh_build, index_build, index_load, 1000 * whoosh_query, 1000 * index_query))
+
+
+def _tools(tool_count, help_words):
+    rng = random.Random(tool_count)
+    tools = []
+    for i in range(tool_count):
+        name = "%s %s %d" % (rng.choice(WORDS).title(), rng.choice(WORDS), i)
+        tool = MockTool("tool_%d" % i, name, " ".join(rng.sample(WORDS, 5)), section=rng.choice(WORDS).title())
+        tool.help_text = " ".join(rng.choice(WORDS) for _ in range(help_words))
+        tools.append(tool)
+    return tools
+
+
+class _ToolBoxSearch(ToolBoxSearch):
+    """Index the synthetic help texts, MockTool has no rendered help."""
+
+    def _create_doc(self, tool_id, tool, index_help=True):
+        doc = super(_ToolBoxSearch, self)._create_doc(tool_id, tool, index_help)
+        doc["help"] = tool.help_text
+        return doc
+
+
+def _toolbox_search(tools, index_dir):
+    toolbox_search = _ToolBoxSearch(None, index_dir=index_dir)
+    toolbox_search.build_index(MockToolCache(tools))
+    return toolbox_search
+
+
+def _whoosh_index(tools):
+    schema = Schema(id=STORED, stub=KEYWORD, name=TEXT(analyzer=analysis.SimpleAnalyzer()), description=TEXT,
+                    section=TEXT, help=TEXT, labels=KEYWORD)
+    index = RamStorage().create_index(schema)
+    writer = index.writer()
+    for tool in tools:
+        writer.add_document(id=tool.id, stub=tool.id, name=tool.name, description=tool.description,
+                            section=tool.section, help=tool.help_text)
+    writer.commit()
+    return index
+
+
+def _whoosh_search(index, q):
+    searcher = index.searcher(weighting=BM25F())
+    parser = MultifieldParser(['name', 'description', 'section', 'help', 'labels', 'stub'], schema=index.schema)
+    hits = searcher.search(parser.parse('*' + q + '*'), limit=float(SEARCH_KWDS["tool_search_limit"]))
+    return [hit['id'] for hit in hits]
+
+
+def _query_latency(search, repeat):
+    start = time.time()
+    for _ in range(repeat):
+        for q in QUERIES:
+            search(q)
+    return (time.time() - start) / (repeat * len(QUERIES))
+
+
+if __name__ == "__main__":
+    main()
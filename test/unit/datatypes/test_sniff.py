@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+import gzip
+import io
+import os
+import re
+import tarfile
+import tempfile
+
+import pytest
+
+from galaxy.datatypes import sniff
+
+CONTENTS = [
+    b"",
+    b"\n",
+    b"a b\n",
+    b"a b",
+    b"1 2\r\n3  4\r\n",
+    b"1 2\r3\t4\r",
+    b"\r\r\n\n\r",
+    b" lead\ttrail \nmixed \r\nend",
+    u"café über\r\n中文 x\r".encode("utf-8"),
+]
+
+
+def _legacy_convert(contents, sep2tabs):
+    # Equivalent of the original line based implementation.
+    lines = io.TextIOWrapper(io.BytesIO(contents), encoding="utf-8").readlines()
+    out = []
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if sep2tabs:
+            line = u"\t".join(re.split(r"\s+", line))
+        out.append(line + "\n")
+    return len(lines), u"".join(out).encode("utf-8")
+
+
+def _write(contents):
+    fd, path = tempfile.mkstemp()
+    with os.fdopen(fd, "wb") as fh:
+        fh.write(contents)
+    return path
+
+
+def _read(path):
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+@pytest.mark.parametrize("block_size", [1, 2, 3, 7, 2 ** 20])
+@pytest.mark.parametrize("contents", CONTENTS)
+def test_conversion_matches_line_based(monkeypatch, contents, block_size):
+    monkeypatch.setattr(sniff, "CONVERSION_BLOCK_SIZE", block_size)
+    for convert, sep2tabs in [(sniff.convert_newlines, False), (sniff.convert_newlines_sep2tabs, True), (sniff.sep2tabs, True)]:
+        path = _write(contents)
+        try:
+            line_count, converted = convert(path)
+            assert converted is None
+            assert (line_count, _read(path)) == _legacy_convert(contents, sep2tabs)
+        finally:
+            os.remove(path)
+
+
+def test_custom_separator(monkeypatch):
+    monkeypatch.setattr(sniff, "CONVERSION_BLOCK_SIZE", 4)
+    path = _write(b"a,b,,c\r\nd,e\r")
+    try:
+        assert sniff.sep2tabs(path, patt=",+") == (2, None)
+        assert _read(path) == b"a\tb\tc\nd\te\n"
+    finally:
+        os.remove(path)
+
+
+def test_posix_file_not_rewritten():
+    path = _write(b"1 2\n3 4\n")
+    try:
+        mtime = os.stat(path).st_mtime
+        assert sniff.convert_newlines(path, in_place=False) == (2, path)
+        assert sniff.convert_newlines(path) == (2, None)
+        assert os.stat(path).st_mtime == mtime
+    finally:
+        os.remove(path)
+
+
+def test_not_in_place():
+    path = _write(b"1 2\r3 4")
+    try:
+        line_count, converted = sniff.convert_newlines(path, in_place=False)
+        assert line_count == 2
+        assert _read(converted) == b"1 2\n3 4\n"
+        assert _read(path) == b"1 2\r3 4"
+        os.remove(converted)
+    finally:
+        os.remove(path)
+
+
+def test_invalid_utf8_raises(monkeypatch):
+    monkeypatch.setattr(sniff, "CONVERSION_BLOCK_SIZE", 2)
+    for contents in [b"ab\n\xff\n", b"ab\r\xff\n"]:
+        path = _write(contents)
+        try:
+            with pytest.raises(UnicodeDecodeError):
+                sniff.convert_newlines(path)
+        finally:
+            os.remove(path)
+
+
+class _RequiresMagic(object):
+
+    @sniff.magic_prefix(b"MAGIC", b"\x89M")
+    def sniff(self, filename):
+        return True
+
+
+class _RequiresTar(object):
+
+    @sniff.requires_tar
+    def sniff(self, filename):
+        return True
+
+
+class _PrefixSniffer(object):
+    file_ext = "prefix"
+
+    def __init__(self):
+        self.calls = 0
+
+    @sniff.requires_first_char("@>", skip_space=True)
+    @sniff.requires_lines(2)
+    def sniff_prefix(self, file_prefix):
+        self.calls += 1
+        return True
+
+
+def _tar(path, mode="w"):
+    member = _write(b"member contents\n")
+    try:
+        with tarfile.open(path, mode) as tar:
+            tar.add(member, arcname="member.txt")
+    finally:
+        os.remove(member)
+    return path
+
+
+def test_magic_prefix():
+    for contents, met in [(b"MAGIC and more", True), (b"\x89M\x00\x01", True), (b"MAGI", False), (b"some MAGIC", False), (b"", False)]:
+        path = _write(contents)
+        try:
+            assert sniff.sniff_requirement_met(_RequiresMagic(), sniff.FilePrefix(path)) is met, contents
+        finally:
+            os.remove(path)
+
+
+def test_magic_prefix_reads_raw_bytes():
+    # the magic number of a compressed file is checked before decompression
+    fd, path = tempfile.mkstemp(suffix=".gz")
+    os.close(fd)
+    try:
+        with gzip.open(path, "wb") as fh:
+            fh.write(b"MAGIC")
+        assert not sniff.sniff_requirement_met(_RequiresMagic(), sniff.FilePrefix(path))
+    finally:
+        os.remove(path)
+
+
+def test_requires_tar():
+    for mode in ["w", "w:gz"]:
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            _tar(path, mode)
+            assert sniff.sniff_requirement_met(_RequiresTar(), sniff.FilePrefix(path)), mode
+        finally:
+            os.remove(path)
+    path = _write(b"member.txt\tnot a tar file\n")
+    try:
+        assert not sniff.sniff_requirement_met(_RequiresTar(), sniff.FilePrefix(path))
+    finally:
+        os.remove(path)
+
+
+def test_sniff_requirement_met():
+    path = _write(b"\n  >seq1\nACGT\n")
+    try:
+        file_prefix = sniff.FilePrefix(path)
+        # stacked requirements all have to pass
+        assert sniff.sniff_requirement_met(_PrefixSniffer(), file_prefix)
+        assert not sniff.sniff_requirement_met(_RequiresMagic(), file_prefix)
+        # sniffers without a requirement always run
+        assert sniff.sniff_requirement_met(object(), file_prefix)
+    finally:
+        os.remove(path)
+    for contents in [b"seq1\nACGT\n", b">seq1", b""]:
+        path = _write(contents)
+        try:
+            assert not sniff.sniff_requirement_met(_PrefixSniffer(), sniff.FilePrefix(path)), contents
+        finally:
+            os.remove(path)
+
+
+def test_file_prefix_text_features():
+    path = _write(b" \t\nchr1\t10\t20\n" + b"x,y\n" * 200)
+    try:
+        file_prefix = sniff.FilePrefix(path)
+        assert file_prefix.first_char == " "
+        assert file_prefix.first_nonspace_char == "c"
+        assert file_prefix.line_count == sniff.SNIFF_MAX_LINE_COUNT
+        assert file_prefix.contains("\t")
+        assert file_prefix.contains(",")
+        assert not file_prefix.contains(";")
+    finally:
+        os.remove(path)
+    path = _write(b"")
+    try:
+        file_prefix = sniff.FilePrefix(path)
+        assert file_prefix.first_char == ""
+        assert file_prefix.first_nonspace_char == ""
+        assert file_prefix.line_count == 0
+    finally:
+        os.remove(path)
+
+
+def test_run_sniffers_raw_skips_unmet_requirements():
+    sniffer = _PrefixSniffer()
+    path = _write(b"chr1\t10\t20\nchr1\t30\t40\n")
+    try:
+        assert sniff.run_sniffers_raw(path, [sniffer]) is None
+        assert sniffer.calls == 0
+    finally:
+        os.remove(path)
+    path = _write(b"@read\nACGT\n+\nIIII\n")
+    try:
+        assert sniff.run_sniffers_raw(path, [sniffer]) == "prefix"
+        assert sniffer.calls == 1
+    finally:
+        os.remove(path)
+
+
+def test_text_requirements_match_sniffers():
+    from galaxy.datatypes.interval import Interval
+    from galaxy.datatypes.sequence import Fasta, FastqSanger
+    from galaxy.datatypes.tabular import CSV
+    for fname, datatype in [("sequence.fasta", Fasta()), ("1.fastqsanger", FastqSanger()), ("interval.interval", Interval()), ("interval.interval", CSV())]:
+        matching = sniff.FilePrefix(sniff.get_test_fname(fname))
+        assert sniff.sniff_requirement_met(datatype, matching), fname
+    for fname, datatype in [("1.fastqsanger", Fasta()), ("sequence.fasta", FastqSanger()), ("sequence.fasta", Interval()), ("sequence.fasta", CSV())]:
+        other = sniff.FilePrefix(sniff.get_test_fname(fname))
+        assert not datatype.sniff(other.filename)
+        assert not sniff.sniff_requirement_met(datatype, other), (fname, datatype)
+    path = _write(b"a,b\n1,2\n")
+    try:
+        assert CSV().sniff(path)
+        assert sniff.sniff_requirement_met(CSV(), sniff.FilePrefix(path))
+    finally:
+        os.remove(path)
@@ -0,0 +1,53 @@
+from galaxy.jobs.handler import (
+    JobConcurrencyLedger,
+    WaitingJobsIndex
+)
+from galaxy.model import Job
+
+
+def test_waiting_jobs_index():
+    index = WaitingJobsIndex()
+    index.add(1, 10)
+    index.add(1, 11)
+    index.add(2, 11)
+    assert len(index) == 2
+    assert 1 in index
+    assert index.job_ids_for_datasets([11]) == {1, 2}
+    assert index.job_ids_for_datasets([10, 12]) == {1}
+
+    index.remove(1)
+    assert 1 not in index
+    assert index.job_ids_for_datasets([10, 11]) == {2}
+    assert 10 not in index.job_ids_by_dataset_id
+
+    index.clear()
+    assert len(index) == 0
+    assert index.job_ids_for_datasets([11]) == set()
+
+
+def test_job_concurrency_ledger():
+    ledger = JobConcurrencyLedger()
+    assert ledger.needs_reconcile(60)
+    ledger.reconcile([
+        (1, 1, "local", Job.states.RUNNING),
+        (2, 1, "cluster", Job.states.QUEUED),
+        (3, 2, "cluster", Job.states.RUNNING),
+        (4, 1, "cluster", Job.states.RESUBMITTED),
+        (5, None, "local", Job.states.QUEUED),
+    ])
+    assert not ledger.needs_reconcile(60)
+    assert ledger.user_job_count == {1: 3, 2: 1}
+    assert ledger.user_job_count_per_destination[1] == {"local": 1, "cluster": 1}
+    assert ledger.total_job_count_per_destination == {"local": 2, "cluster": 2}
+
+    # The resubmitted job is dispatched to a new destination.
+    ledger.job_dispatched(4, 1, "local")
+    assert ledger.user_job_count[1] == 3
+    assert ledger.user_job_count_per_destination[1] == {"local": 2, "cluster": 1}
+    assert ledger.total_job_count_per_destination == {"local": 3, "cluster": 2}
+
+    ledger.job_finished(3)
+    ledger.job_finished(3)
+    ledger.job_finished(42)
+    assert ledger.user_job_count == {1: 3, 2: 0}
+    assert ledger.total_job_count_per_destination == {"local": 3, "cluster": 1}
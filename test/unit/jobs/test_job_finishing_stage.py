@@ -0,0 +1,73 @@
+import threading
+import time
+
+from galaxy.jobs.runners import (
+    AsynchronousJobState,
+    JobFinishingStage,
+    RunnerWorkQueue,
+)
+from galaxy.util.bunch import Bunch
+
+
+def _job_state(job_id):
+    job_wrapper = Bunch(
+        job_id=job_id,
+        get_id_tag=lambda: str(job_id),
+        app=Bunch(config=Bunch(redact_email_in_job_name=True)),
+        tool=Bunch(old_id="cat1"),
+    )
+    return AsynchronousJobState(job_wrapper=job_wrapper, job_destination={})
+
+
+def test_slow_job_does_not_block_other_shards():
+    stage = JobFinishingStage("TestRunner", 2)
+    stage.start()
+    release = threading.Event()
+    finished = []
+
+    def finish_job(job_state):
+        if job_state.job_wrapper.job_id == 2:
+            release.wait(10)
+        finished.append(job_state.job_wrapper.job_id)
+
+    try:
+        # Job 2 and 4 share a shard, job 3 does not.
+        for job_id in [2, 4, 3]:
+            stage.put(finish_job, _job_state(job_id))
+        _wait_for(lambda: finished == [3])
+        assert stage.stats()["queue_depths"] == [1, 0]
+        release.set()
+        _wait_for(lambda: len(finished) == 3)
+        # Work for jobs in the same shard is done in order.
+        assert finished == [3, 2, 4]
+        _wait_for(lambda: stage.stats()["processed"] == 3)
+        stats = stage.stats()
+        assert stats["max_duration"] >= stats["mean_duration"] > 0
+    finally:
+        release.set()
+        stage.shutdown()
+
+
+def test_work_queue_routes_finishing():
+    stage = JobFinishingStage("TestRunner", 1)
+    work_queue = RunnerWorkQueue(stage)
+
+    def finish_job(job_state):
+        pass
+
+    def queue_job(job_wrapper):
+        pass
+
+    job_state = _job_state(1)
+    work_queue.put((finish_job, job_state))
+    work_queue.put((queue_job, job_state.job_wrapper))
+    assert stage.stats()["queue_depths"] == [1]
+    assert work_queue.get() == (queue_job, job_state.job_wrapper)
+    assert work_queue.empty()
+
+
+def _wait_for(condition, timeout=10):
+    start = time.time()
+    while not condition():
+        assert time.time() - start < timeout, "condition not met in time"
+        time.sleep(0.01)
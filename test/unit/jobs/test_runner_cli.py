@@ -0,0 +1,64 @@
+from galaxy.jobs import JobDestination
+from galaxy.jobs.runners.cli import ShellJobRunner
+from galaxy.jobs.runners.util.cli.job.slurm import Slurm
+from galaxy.model import Job
+from galaxy.util.bunch import Bunch
+
+SQUEUE_OUTPUT = """JOBID ST
+1 R
+2 PD
+3 R
+4 R
+"""
+
+
+class RecordingShell(object):
+
+    def __init__(self, commands):
+        self.commands = commands
+
+    def execute(self, cmd):
+        self.commands.append(cmd)
+        return Bunch(returncode=0, stdout=SQUEUE_OUTPUT, stderr="")
+
+
+class StatusOnlyShellJobRunner(ShellJobRunner):
+
+    def __init__(self):
+        # No app, monitor or worker threads are needed to check job states.
+        self.commands = {}
+
+    def get_cli_plugins(self, shell_params, job_params):
+        host = shell_params.get("hostname")
+        shell = RecordingShell(self.commands.setdefault(host, []))
+        return shell, Slurm(**job_params)
+
+
+def _watched(job_id, destination_id, hostname, partition):
+    destination = JobDestination(id=destination_id, runner="cli", params={
+        "shell_plugin": "SecureShell",
+        "shell_hostname": hostname,
+        "job_plugin": "Slurm",
+        "job_partition": partition,
+    })
+    return Bunch(job_id=job_id, job_destination=destination)
+
+
+def test_job_states_queried_once_per_cluster():
+    runner = StatusOnlyShellJobRunner()
+    watched = [
+        _watched("1", "short", "cluster1", "short"),
+        _watched("2", "long", "cluster1", "long"),
+        _watched("3", "short", "cluster1", "short"),
+        _watched("4", "other", "cluster2", "main"),
+    ]
+    job_states = runner.get_watched_job_states(watched)
+    assert job_states == {
+        "1": Job.states.RUNNING,
+        "2": Job.states.QUEUED,
+        "3": Job.states.RUNNING,
+        "4": Job.states.RUNNING,
+    }
+    # Destinations on the same cluster share a single status query.
+    assert len(runner.commands["cluster1"]) == 1
+    assert len(runner.commands["cluster2"]) == 1
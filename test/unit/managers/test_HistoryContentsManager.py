@@ -8,6 +8,7 @@ import unittest
 from sqlalchemy import column, desc, false, true
 from sqlalchemy.sql import text
 
+from galaxy import exceptions
 from galaxy.managers import base, collections, hdas, history_contents
 from galaxy.managers.histories import HistoryManager
 from .base import BaseTestCase
@@ -296,6 +297,56 @@ class HistoryAsContainerTestCase(HistoryAsContainerBaseTestCase):
         filters = [parsed_filter("orm", column('type_id').in_([u'dataset-2', u'dataset_collection-2']))]
         self.assertEqual(self.contents_manager.contents(history, filters=filters), [contents[1], contents[6]])
 
+    def test_contents_rows(self):
+        user2 = self.user_manager.create(**user2_data)
+        history = self.history_manager.create(name='history', user=user2)
+        contents = []
+        contents.extend([self.add_hda_to_history(history, name=('hda-' + str(x))) for x in range(3)])
+        contents.append(self.add_list_collection_to_history(history, contents[:3]))
+
+        self.log("should return the union rows in hid order without loading models")
+        rows = self.contents_manager.contents_rows(history)
+        self.assertEqual([row.hid for row in rows], [c.hid for c in contents])
+        self.assertEqual([row.history_content_type for row in rows], ['dataset'] * 3 + ['dataset_collection'])
+        self.assertEqual(rows[0].name, 'hda-0')
+        self.assertIsNone(rows[3].dataset_id)
+
+        self.log("should not allow filters that need loaded models")
+        filters = [parsed_filter("function", lambda c: True)]
+        self.assertRaises(exceptions.RequestParameterInvalidException,
+            self.contents_manager.contents_rows, history, filters=filters)
+
+    def test_contents_rows_keyset_pagination(self):
+        user2 = self.user_manager.create(**user2_data)
+        history = self.history_manager.create(name='history', user=user2)
+        [self.add_hda_to_history(history, name=('hda-' + str(x))) for x in range(7)]
+        filter_parser = history_contents.HistoryContentsFilters(self.app)
+
+        self.log("should be able to page through rows using the last hid seen")
+        hids, last_hid = [], 0
+        while True:
+            filters = filter_parser.parse_filters([('hid', 'gt', str(last_hid))])
+            page = self.contents_manager.contents_rows(history, filters=filters, limit=3)
+            if not page:
+                break
+            hids.append([row.hid for row in page])
+            last_hid = page[-1].hid
+        self.assertEqual(hids, [[1, 2, 3], [4, 5, 6], [7]])
+
+    def test_contents_rows_update_time_delta(self):
+        user2 = self.user_manager.create(**user2_data)
+        history = self.history_manager.create(name='history', user=user2)
+        contents = [self.add_hda_to_history(history, name=('hda-' + str(x))) for x in range(3)]
+        filter_parser = history_contents.HistoryContentsFilters(self.app)
+        since = max(row.update_time for row in self.contents_manager.contents_rows(history))
+
+        self.log("should return only the rows updated after the given time")
+        contents[1].update_time = since + datetime.timedelta(seconds=1)
+        self.app.model.context.flush()
+        filters = filter_parser.parse_filters([('update_time', 'gt', since.isoformat())])
+        rows = self.contents_manager.contents_rows(history, filters=filters)
+        self.assertEqual([row.hid for row in rows], [contents[1].hid])
+
 
 class HistoryContentsFilterParserTestCase(HistoryAsContainerBaseTestCase):
 
@@ -341,6 +392,114 @@ class HistoryContentsFilterParserTestCase(HistoryAsContainerBaseTestCase):
         self.assertRaises(ValueError, self.filter_parser.parse_date, '2009-02-13 18:13:00.1234567')
 
 
+# =============================================================================
+class HistoryContentsSummaryCacheTestCase(HistoryAsContainerBaseTestCase):
+
+    def set_up_managers(self):
+        self.app.history_contents_summary_cache = history_contents.HistoryContentsSummaryCache(reconcile_interval=3600)
+        super(HistoryContentsSummaryCacheTestCase, self).set_up_managers()
+        self.uncached_contents_manager = history_contents.HistoryContentsManager(self.app)
+        self.uncached_contents_manager.summary_cache = None
+
+    def set_up_history(self):
+        user2 = self.user_manager.create(**user2_data)
+        history = self.history_manager.create(name='history', user=user2)
+        hdas = [self.add_hda_to_history(history, name=('hda-' + str(x))) for x in range(5)]
+        hdas[0].dataset.state = 'ok'
+        hdas[1].dataset.state = 'error'
+        hdas[2].visible = False
+        hdas[3].deleted = True
+        self.add_list_collection_to_history(history, hdas[:2])
+        self.app.model.context.flush()
+        return history, hdas
+
+    def assertCountsMatchUncached(self, history):
+        self.assertEqual(self.contents_manager.state_counts(history), self.uncached_contents_manager.state_counts(history))
+        self.assertEqual(self.contents_manager.active_counts(history), self.uncached_contents_manager.active_counts(history))
+
+    def test_counts(self):
+        history, hdas = self.set_up_history()
+
+        self.log("cached counts should match the aggregated counts")
+        self.assertCountsMatchUncached(history)
+        self.assertEqual(self.contents_manager.active_counts(history), dict(active=4, deleted=1, hidden=1))
+        self.assertEqual(self.contents_manager.dataset_state_counts(history),
+                         {'ok': 1, 'error': 1, hdas[2].state: 2})
+        self.assertIsNone(self.uncached_contents_manager.dataset_state_counts(history))
+
+    def test_updated_between_reconciliations(self):
+        history, hdas = self.set_up_history()
+        self.assertCountsMatchUncached(history)
+
+        self.log("state, deleted and visible changes should be counted without a reconciliation")
+        hdas[0].dataset.state = 'error'
+        hdas[1].visible = False
+        hdas[3].deleted = False
+        new_hda = self.add_hda_to_history(history, name='hda-new')
+        self.app.model.context.flush()
+        self.assertCountsMatchUncached(history)
+        self.assertEqual(self.contents_manager.active_counts(history)['active'], 5)
+
+        self.log("collections should always be read in full")
+        hdca = self.add_list_collection_to_history(history, [new_hda])
+        self.assertCountsMatchUncached(history)
+        hdca.deleted = True
+        self.app.model.context.flush()
+        self.assertCountsMatchUncached(history)
+
+    def test_reconciliation(self):
+        history, hdas = self.set_up_history()
+        self.assertCountsMatchUncached(history)
+
+        self.log("changes that don't update an update_time should show after a reconciliation")
+        HDA = self.hda_manager.model_class
+        self.app.model.context.execute(HDA.table.delete().where(HDA.table.c.id == hdas[4].id))
+        self.assertNotEqual(self.contents_manager.active_counts(history), self.uncached_contents_manager.active_counts(history))
+        self.app.history_contents_summary_cache.reconcile_interval = 0
+        self.assertCountsMatchUncached(history)
+
+    def test_summary_rows_applied_once(self):
+        summary = history_contents.HistoryContentsSummary()
+        now = datetime.datetime.utcnow()
+        summary.reconcile([(1, 'ok', None, False, True), (2, 'queued', None, False, True)], [(1, 'ok', False, True)], now)
+        self.assertEqual(summary.counts, {
+            ('dataset', 'ok', 'ok', False, True): 1,
+            ('dataset', 'queued', 'queued', False, True): 1,
+            ('dataset_collection', 'ok', 'ok', False, True): 1,
+        })
+
+        self.log("applying the same or changed rows again should not count items twice")
+        later = now + datetime.timedelta(seconds=1)
+        summary.update([(2, 'ok', None, False, True), (2, 'ok', None, False, True)], [], later)
+        self.assertEqual(summary.counts, {('dataset', 'ok', 'ok', False, True): 2})
+        self.assertEqual(summary.checked_at, later)
+
+
+# =============================================================================
+class HistoryContentsSerializerTestCase(HistoryAsContainerBaseTestCase):
+
+    def set_up_managers(self):
+        super(HistoryContentsSerializerTestCase, self).set_up_managers()
+        self.serializer = history_contents.HistoryContentsSerializer(self.app)
+
+    def test_serialize_columns(self):
+        user2 = self.user_manager.create(**user2_data)
+        history = self.history_manager.create(name='history', user=user2)
+        hdas = [self.add_hda_to_history(history, name=('hda-' + str(x))) for x in range(2)]
+        hdca = self.add_list_collection_to_history(history, hdas)
+        rows = self.contents_manager.contents_rows(history)
+
+        self.log("should serialize rows into a list of values per key")
+        columns = self.serializer.serialize_columns(rows, ['hid', 'name', 'type_id', 'dataset_id', 'extension'])
+        encode_id = self.app.security.encode_id
+        self.assertEqual(columns['hid'], [1, 2, 3])
+        self.assertEqual(columns['name'], ['hda-0', 'hda-1', 'test collection'])
+        self.assertEqual(columns['type_id'], ['dataset-' + encode_id(hdas[0].id), 'dataset-' + encode_id(hdas[1].id),
+                                              'dataset_collection-' + encode_id(hdca.id)])
+        self.assertEqual(columns['dataset_id'], [encode_id(hdas[0].dataset_id), encode_id(hdas[1].dataset_id), None])
+        self.assertEqual(columns['extension'][:2], [hdas[0].extension, hdas[1].extension])
+
+
 if __name__ == '__main__':
     # or more generally, nosetests test_resourcemanagers.py -s -v
     unittest.main()
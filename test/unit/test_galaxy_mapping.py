@@ -252,6 +252,45 @@ class MappingTests(unittest.TestCase):
         user_reload = model.session.query(model.User).get(u_id)
         assert user_reload.disk_usage == 1
 
+    def test_calculate_disk_usage(self):
+        model = self.model
+
+        u = model.User(email="disk_calculate@test.com", password="password")
+        u2 = model.User(email="disk_calculate2@test.com", password="password")
+        h = model.History(name="History for disk usage", user=u)
+        h2 = model.History(name="Other history for disk usage", user=u)
+        purged_history = model.History(name="Purged history", user=u)
+        purged_history.purged = True
+        other_user_history = model.History(name="History of other user", user=u2)
+        self.persist(u, u2, h, h2, purged_history, other_user_history)
+
+        d1 = self.new_hda(h, name="1")
+        d1.dataset.total_size = 100
+        # copies of a dataset count once per user
+        self.persist(d1.copy(), d1.copy(), d1)
+        h2.add_dataset(d1.copy())
+        other_user_history.add_dataset(d1.copy())
+        purged_hda = self.new_hda(h, name="purged")
+        purged_hda.dataset.total_size = 1000
+        purged_hda.purged = True
+        purged_dataset = self.new_hda(h, name="purged dataset")
+        purged_dataset.dataset.total_size = 1000
+        purged_dataset.dataset.purged = True
+        self.new_hda(purged_history, name="in purged history").dataset.total_size = 1000
+        library_hda = self.new_hda(h, name="in library")
+        library_hda.dataset.total_size = 1000
+        self.persist(model.LibraryDatasetDatasetAssociation(dataset=library_hda.dataset))
+        # total size is set from the object store if unset
+        stale = self.new_hda(h2, name="stale")
+        stale.dataset.total_size = None
+        self.persist(h, h2, purged_history, other_user_history)
+
+        assert u.calculate_disk_usage() == 142
+        assert stale.dataset.total_size == 42
+        assert model.User.calculate_disk_usages(self.session(), [u.id, u2.id, -1]) == {u.id: 142, u2.id: 100, -1: 0}
+        u.calculate_and_set_disk_usage()
+        assert u.get_disk_usage() == 142
+
     def test_basic(self):
         model = self.model
 
@@ -131,3 +131,44 @@ def test_encode_decode_guid():
     encoded_key = test_helper_1.encode_guid(session_key)
     decoded_key = test_helper_1.decode_guid(encoded_key)
     assert session_key == decoded_key, "%s != %s" % (session_key, decoded_key)
+
+
+def test_encode_decode_ids():
+    # ids longer than a block, repeated ids and strings
+    ids = [1, 2, 12345678901234, 2, "3"]
+    encoded_ids = test_helper_1.encode_ids(ids)
+    assert encoded_ids == [test_helper_1.encode_id(i) for i in ids]
+    assert encoded_ids[1] == encoded_ids[3]
+    assert test_helper_1.decode_ids(encoded_ids) == [1, 2, 12345678901234, 2, 3]
+    assert test_helper_1.encode_ids(ids, kind="k1") == [test_helper_1.encode_id(i, kind="k1") for i in ids]
+    assert test_helper_1.encode_ids([]) == []
+
+    # not cached
+    helper = idencoding.IdEncodingHelper(id_secret="secu1")
+    assert helper.decode_ids(encoded_ids) == [1, 2, 12345678901234, 2, 3]
+    assert helper.encode_ids(ids) == encoded_ids
+
+    for invalid in (["abc"], [encoded_ids[0][:-2], encoded_ids[1] + "00"]):
+        threw_exception = False
+        try:
+            helper.decode_ids(invalid)
+        except (TypeError, ValueError):
+            threw_exception = True
+        assert threw_exception
+
+
+def test_id_cache():
+    helper = idencoding.IdEncodingHelper(id_secret="secu1", id_cache_size=2)
+    encoded_ids = helper.encode_ids([1, 2, 3])
+    # the least recently used id was dropped
+    assert list(helper._encoded_ids._entries) == [(None, 2), (None, 3)]
+    assert helper.encode_id(1) == encoded_ids[0]
+    assert helper.encode_ids(["3", 2]) == encoded_ids[2:0:-1]
+    assert helper.decode_id(encoded_ids[2]) == 3
+
+    helper = idencoding.IdEncodingHelper(id_secret="secu1", id_cache_size=0)
+    assert helper.encode_ids([1, 2, 3]) == encoded_ids
+    assert helper.encode_id(3) == encoded_ids[2]
+    assert helper.decode_id(encoded_ids[2]) == 3
+    assert not helper._encoded_ids._entries
+    assert not helper._decoded_ids._entries
@@ -1,12 +1,17 @@
 """Unit tests for importing and exporting data from model stores."""
 import json
 import os
+import tarfile
 from tempfile import mkdtemp, NamedTemporaryFile
 
+from sqlalchemy import event
+from sqlalchemy.exc import ProgrammingError
+
 from galaxy import model
 from galaxy.model import store
 from galaxy.model.metadata import MetadataTempFile
 from galaxy.tools.imp_exp import unpack_tar_gz_archive
+from galaxy.util.bunch import Bunch
 from .tools.test_history_imp_exp import _create_datasets, _mock_app, Dummy
 
 
@@ -21,6 +26,110 @@ def test_import_export_history():
     _assert_simple_cat_job_imported(imported_history)
 
 
+def test_import_export_history_streamed():
+    """Test a simple job import/export reading the archive as a stream (with history_import_streaming)."""
+    app = _mock_app()
+
+    u, h, d1, d2, j = _setup_simple_cat_job(app)
+
+    imported_history = _import_export_history(app, h, export_files="copy", stream=True)
+
+    _assert_simple_cat_job_imported(imported_history)
+
+
+def test_import_history_archive_attrs_unordered_streamed():
+    """Test importing an archive written before attribute files came first, reading it as a stream."""
+    app = _mock_app()
+
+    u, h, d1, d2, j = _setup_simple_cat_job(app)
+
+    export_directory = mkdtemp()
+    with store.DirectoryModelExportStore(export_directory, app=app, export_files="copy") as export_store:
+        export_store.export_history(h)
+    dest_export = os.path.join(mkdtemp(), "moo.tgz")
+    with tarfile.open(dest_export, "w:gz") as archive:
+        names = [store.ATTRS_FILENAME_EXPORT, store.ATTRS_FILENAME_HISTORY, store.ATTRS_FILENAME_DATASETS]
+        names += sorted(name for name in os.listdir(export_directory) if name not in names)
+        for name in names:
+            archive.add(os.path.join(export_directory, name), arcname=name)
+
+    import_model_store = store.get_import_model_store_for_archive(dest_export, app=app, user=u)
+    assert not isinstance(import_model_store, store.TarImportModelStore)
+    assert isinstance(import_model_store, store.DirectoryImportModelStoreLatest)
+    assert import_model_store.defines_new_history()
+
+    imported_history = import_archive(dest_export, app, u, stream=True)
+    _assert_simple_cat_job_imported(imported_history)
+
+
+def test_import_export_history_batched():
+    """Test a job import/export creating datasets and jobs in batches (with history_import_batch_size)."""
+    app = _mock_app()
+    sa_session = app.model.context
+
+    u, h, d1, d2, j = _setup_simple_cat_job(app)
+    extra_datasets = _create_datasets(sa_session, h, 3)
+    for i, d in enumerate(extra_datasets):
+        d.hid = i + 3
+        d.name = "extra %d" % i
+    sa_session.add_all(extra_datasets)
+    sa_session.flush()
+    for d in extra_datasets:
+        app.object_store.update_from_file(d, file_name="test-data/1.txt", create=True)
+
+    flushes = []
+    event.listen(app.model.context.current, "after_flush", lambda *args: flushes.append(1))
+    flush_counts = []
+    for batch_size in (0, 2):
+        app.config.history_import_batch_size = batch_size
+        del flushes[:]
+        imported_history = _import_export_history(app, h, export_files="copy")
+        flush_counts.append(len(flushes))
+
+        datasets = imported_history.datasets
+        assert [d.hid for d in datasets] == [1, 2, 3, 4, 5]
+        imported_job = datasets[1].creating_job
+        assert imported_job.input_datasets[0].dataset == datasets[0]
+        assert imported_job.output_datasets[0].dataset == datasets[1]
+        assert [d.name for d in datasets[2:]] == ["extra 0", "extra 1", "extra 2"]
+        for d in datasets[2:]:
+            with open(d.file_name, "r") as f:
+                assert f.read().startswith("chr1    4225    19670")
+    assert flush_counts[1] < flush_counts[0], flush_counts
+
+
+def test_preallocate_ids_looks_up_sequences():
+    """Test ids are taken from the sequence of each table, whatever its name."""
+    app = _mock_app()
+    import_store = store.DirectoryImportModelStoreLatest(mkdtemp(), app=app)
+    datasets = [model.Dataset(), model.Dataset()]
+    job = model.Job()
+    import_store.sa_session = PostgresSession(datasets + [job], sequences={"dataset": "public.renamed_seq"})
+    import_store._preallocate_ids()
+    assert [d.id for d in datasets] == [1, 2]
+    # The job sequence can't be found, its ids are generated on insert.
+    assert job.id is None
+
+    import_store.sa_session.new = [model.Dataset(), model.Job()]
+    import_store._preallocate_ids()
+    statements = import_store.sa_session.statements
+    # Sequences are only looked up once.
+    assert [params for sql, params in statements if "pg_get_serial_sequence" in sql] == [{"table": "dataset"}, {"table": "job"}]
+    assert [params["sequence"] for sql, params in statements if "nextval" in sql] == ["public.renamed_seq"] * 2
+
+
+def test_preallocate_ids_failure():
+    """Test objects are imported without preallocated ids if nextval fails."""
+    app = _mock_app()
+    import_store = store.DirectoryImportModelStoreLatest(mkdtemp(), app=app)
+    dataset = model.Dataset()
+    import_store.sa_session = PostgresSession([dataset], sequences={"dataset": "dataset_id_seq"}, fail_nextval=True)
+    import_store._preallocate_ids()
+    assert dataset.id is None
+    import_store._preallocate_ids()
+    assert len([sql for sql, _ in import_store.sa_session.statements if "nextval" in sql]) == 1
+
+
 def test_import_export_bag_archive():
     """Test a simple job import/export using a BagIt archive."""
     dest_parent = mkdtemp()
@@ -281,7 +390,45 @@ def test_import_export_composite_datasets():
 
     u = model.User(email="collection@example.com", password="password")
     h = model.History(name="Test History", user=u)
+    d1 = _setup_composite_dataset(app, h)
 
+    temp_directory = mkdtemp()
+    with store.DirectoryModelExportStore(temp_directory, app=app, export_files="copy") as export_store:
+        export_store.add_dataset(d1)
+
+    import_history = model.History(name="Test History for Import", user=u)
+    sa_session.add(import_history)
+    sa_session.flush()
+    _perform_import_from_directory(temp_directory, app, u, import_history)
+    _assert_composite_dataset_imported(import_history)
+
+
+def test_import_export_composite_datasets_streamed():
+    app = _mock_app()
+    sa_session = app.model.context
+
+    u = model.User(email="collection@example.com", password="password")
+    h = model.History(name="Test History", user=u)
+    d1 = _setup_composite_dataset(app, h)
+
+    dest_export = os.path.join(mkdtemp(), "moo.tgz")
+    with store.TarModelExportStore(dest_export, app=app, export_files="copy") as export_store:
+        export_store.add_dataset(d1)
+        # dataset files are added to the archive without being staged
+        assert not os.path.exists(os.path.join(export_store.export_directory, "datasets"))
+
+    import_history = model.History(name="Test History for Import", user=u)
+    sa_session.add(import_history)
+    sa_session.flush()
+    import_model_store = store.get_import_model_store_for_archive(dest_export, app=app, user=u)
+    assert isinstance(import_model_store, store.TarImportModelStore)
+    with import_model_store.target_history(default_history=import_history):
+        import_model_store.perform_import(import_history)
+    _assert_composite_dataset_imported(import_history)
+
+
+def _setup_composite_dataset(app, h):
+    sa_session = app.model.context
     d1 = _create_datasets(sa_session, h, 1, extension="html")[0]
     sa_session.add_all((h, d1))
     sa_session.flush()
@@ -308,15 +455,10 @@ def test_import_export_composite_datasets():
         create=True,
         preserve_symlinks=True
     )
+    return d1
 
-    temp_directory = mkdtemp()
-    with store.DirectoryModelExportStore(temp_directory, app=app, export_files="copy") as export_store:
-        export_store.add_dataset(d1)
 
-    import_history = model.History(name="Test History for Import", user=u)
-    sa_session.add(import_history)
-    sa_session.flush()
-    _perform_import_from_directory(temp_directory, app, u, import_history)
+def _assert_composite_dataset_imported(import_history):
     assert len(import_history.datasets) == 1
     import_dataset = import_history.datasets[0]
     root_extra_files_path = import_dataset.extra_files_path
@@ -444,7 +586,7 @@ def _setup_simple_cat_job(app):
     return u, h, d1, d2, j
 
 
-def _import_export_history(app, h, dest_export=None, export_files=None):
+def _import_export_history(app, h, dest_export=None, export_files=None, stream=False):
     if dest_export is None:
         dest_parent = mkdtemp()
         dest_export = os.path.join(dest_parent, "moo.tgz")
@@ -452,7 +594,7 @@ def _import_export_history(app, h, dest_export=None, export_files=None):
     with store.TarModelExportStore(dest_export, app=app, export_files=export_files) as export_store:
         export_store.export_history(h)
 
-    imported_history = import_archive(dest_export, app, h.user)
+    imported_history = import_archive(dest_export, app, h.user, stream=stream)
     assert imported_history
     return imported_history
 
@@ -463,7 +605,7 @@ def _perform_import_from_directory(directory, app, user, import_history, import_
         import_model_store.perform_import(import_history)
 
 
-def import_archive(archive_path, app, user):
+def import_archive(archive_path, app, user, stream=False):
     dest_parent = mkdtemp()
     dest_dir = os.path.join(dest_parent, 'dest')
 
@@ -471,6 +613,7 @@ def import_archive(archive_path, app, user):
     options.is_url = False
     options.is_file = True
     options.is_b64encoded = False
+    options.stream = stream
 
     args = (archive_path, dest_dir)
     unpack_tar_gz_archive.main(options, args)
@@ -481,3 +624,26 @@ def import_archive(archive_path, app, user):
         model_store.perform_import(new_history)
 
     return new_history
+
+
+class PostgresSession(object):
+    """Session recording the SQL executed by ModelImportStore._preallocate_ids."""
+
+    def __init__(self, new, sequences, fail_nextval=False):
+        self.new = new
+        self.bind = Bunch(dialect=Bunch(name="postgresql"))
+        self.sequences = sequences
+        self.fail_nextval = fail_nextval
+        self.statements = []
+        self.next_id = 1
+
+    def execute(self, statement, params):
+        sql = str(statement)
+        self.statements.append((sql, params))
+        if "pg_get_serial_sequence" in sql:
+            return Bunch(scalar=lambda: self.sequences.get(params["table"]))
+        if self.fail_nextval:
+            raise ProgrammingError(sql, params, Exception("relation does not exist"))
+        ids = [(i,) for i in range(self.next_id, self.next_id + params["count"])]
+        self.next_id += params["count"]
+        return Bunch(fetchall=lambda: ids)
@@ -1,4 +1,5 @@
 import os
+import time
 from contextlib import contextmanager
 from shutil import rmtree
 from string import Template
@@ -95,6 +96,44 @@ def test_disk_store():
             assert not os.path.exists(to_delete_real_path)
 
 
+def test_disk_store_metadata_cache():
+    with TestConfig(DISK_TEST_CONFIG_YAML, metadata_cache_size=3) as (directory, object_store):
+        cache = object_store.metadata_cache
+        dataset = MockDataset(1)
+        dataset.state = "ok"
+        # Absence is not cached, the file may be written by a job.
+        assert not object_store.exists(dataset)
+        directory.write("Hello", "files1/000/dataset_1.dat")
+        assert object_store.exists(dataset)
+        misses = cache.misses
+        assert object_store.exists(dataset)
+        assert object_store.size(dataset) == 5
+        assert object_store.size(dataset) == 5
+        # Only the first size lookup goes to disk.
+        assert cache.misses == misses + 1
+
+        # Changes made through the object store invalidate cached lookups.
+        new_contents_path = directory.write("Hello World!", "job_working_directory1/example_output")
+        object_store.update_from_file(dataset, file_name=new_contents_path)
+        assert object_store.size(dataset) == 12
+        assert object_store.delete(dataset)
+        assert not object_store.exists(dataset)
+        assert object_store.size(dataset) == 0
+
+        # Size of datasets that may still be written to is not cached.
+        running_dataset = MockDataset(2)
+        running_dataset.state = "running"
+        directory.write("Hello", "files1/000/dataset_2.dat")
+        assert object_store.size(running_dataset) == 5
+        directory.write("Hello World!", "files1/000/dataset_2.dat")
+        assert object_store.size(running_dataset) == 12
+
+        for i in range(10):
+            object_store.create(MockDataset(10 + i))
+            assert object_store.exists(MockDataset(10 + i))
+        assert cache.stats()["objects"] == 3
+
+
 DISK_TEST_CONFIG_BY_UUID_YAML = """
 type: disk
 files_dir: "${temp_directory}/files1"
@@ -337,6 +376,39 @@ def test_distributed_store():
             assert len(extra_dirs) == 2
 
 
+def test_distributed_store_adaptive_placement():
+    config_str = DISTRIBUTED_TEST_CONFIG_YAML.replace("type: distributed\n", "type: distributed\nplacement: adaptive\n")
+    with TestConfig(config_str) as (directory, object_store):
+        assert object_store.to_dict()["placement"] == "adaptive"
+        now = time.time()
+        full_stats = object_store.placement_stats["files1"]
+        full_stats.usage_percent = 99.0
+        full_stats.usage_checked = now
+        object_store.placement_stats["files2"].usage_percent = 10.0
+        object_store.placement_stats["files2"].usage_checked = now
+        with __stubbed_persistence() as persisted_ids:
+            for i in range(100):
+                object_store.create(MockDataset(100 + i))
+
+        # files1 has twice the weight but is almost full.
+        backend_1_count = len([v for v in persisted_ids.values() if v == "files1"])
+        backend_2_count = len([v for v in persisted_ids.values() if v == "files2"])
+        assert backend_2_count > backend_1_count
+
+        # Writes are recorded for the backend holding the object.
+        dataset = MockDataset(1)
+        dataset.object_store_id = "files2"
+        output_path = directory.write("NEW CONTENTS", "job_working_directory1/example_output")
+        object_store.update_from_file(dataset, file_name=output_path, create=True)
+        metrics = object_store.placement_metrics()
+        assert metrics["placement"] == "adaptive"
+        files2_metrics = metrics["backends"]["files2"]
+        assert files2_metrics["placements"] == backend_2_count + 1
+        assert files2_metrics["write_bytes_per_second"] > 0
+        assert files2_metrics["create_latency_seconds"] is not None
+        assert metrics["backends"]["files1"]["usage_percent"] == 99.0
+
+
 # Unit testing the cloud and advanced infrastructure object stores is difficult, but
 # we can at least stub out initializing and test the configuration of these things from
 # XML and dicts.
@@ -740,14 +812,14 @@ def test_config_parse_azure():
 
 
 class TestConfig(object):
-    def __init__(self, config_str=DISK_TEST_CONFIG, clazz=None, store_by="id"):
+    def __init__(self, config_str=DISK_TEST_CONFIG, clazz=None, store_by="id", metadata_cache_size=0):
         self.temp_directory = mkdtemp()
         if config_str.startswith("<"):
             config_file = "store.xml"
         else:
             config_file = "store.yaml"
         self.write(config_str, config_file)
-        config = MockConfig(self.temp_directory, config_file, store_by=store_by)
+        config = MockConfig(self.temp_directory, config_file, store_by=store_by, metadata_cache_size=metadata_cache_size)
         if clazz is None:
             self.object_store = objectstore.build_object_store_from_config(config)
         elif config_file == "store.xml":
@@ -774,12 +846,14 @@ class TestConfig(object):
 
 class MockConfig(object):
 
-    def __init__(self, temp_directory, config_file, store_by="id"):
+    def __init__(self, temp_directory, config_file, store_by="id", metadata_cache_size=0):
         self.file_path = temp_directory
         self.object_store_config_file = os.path.join(temp_directory, config_file)
         self.object_store_check_old_style = False
         self.object_store_cache_path = os.path.join(temp_directory, "staging")
         self.object_store_store_by = store_by
+        self.object_store_metadata_cache_size = metadata_cache_size
+        self.object_store_metadata_cache_ttl = 60
         self.jobs_directory = temp_directory
         self.new_file_path = temp_directory
         self.umask = 0000
@@ -2,12 +2,20 @@ import string
 import unittest
 from xml.etree.ElementTree import XML
 
+from sqlalchemy import select
+
 from galaxy import model
 from galaxy.exceptions import UserActivationRequiredException
 from galaxy.tools.actions import (
     DefaultToolAction,
     determine_output_format,
-    on_text_for_names
+    on_text_for_names,
+    ToolExecutionCache
+)
+from galaxy.tools.actions.data_manager import DataManagerToolAction
+from galaxy.tools.execute import (
+    execute,
+    MappingParameters
 )
 from galaxy.tools.parser.output_objects import ToolOutput
 from .. import tools_support
@@ -119,6 +127,106 @@ class DefaultToolActionTestCase(unittest.TestCase, tools_support.UsesApp, tools_
             return
         assert False, "Tool execution succeeded for inactive user!"
 
+    def test_input_permissions_cached(self):
+        hda = self.__add_dataset()
+        get_permissions_calls = []
+        get_permissions = self.app.security_agent.get_permissions
+
+        def counting_get_permissions(item):
+            get_permissions_calls.append(item)
+            return get_permissions(item)
+
+        self.app.security_agent.get_permissions = counting_get_permissions
+        self.app.config.legacy_eager_objectstore_initialization = False
+        execution_cache = ToolExecutionCache(self.trans)
+        self._init_tool(tools_support.SIMPLE_CAT_TOOL_CONTENTS)
+        for _ in range(3):
+            self.action.execute(
+                tool=self.tool,
+                trans=self.trans,
+                history=self.history,
+                incoming=dict(param1=hda, repeat1=[]),
+                execution_cache=execution_cache,
+            )
+        assert len(get_permissions_calls) == 1
+        assert list(execution_cache.dataset_permissions.keys()) == [hda.dataset.id]
+
+    def test_hid_reservation(self):
+        execution_cache = ToolExecutionCache(self.trans)
+        first_hid = self.history._next_hid()
+        execution_cache.expected_jobs = 3
+        assert execution_cache.next_hid(self.history, 2) == first_hid + 1
+        assert execution_cache.next_hid(self.history, 2) == first_hid + 3
+        assert self.__hid_counter() == first_hid + 7
+        execution_cache.release_hids()
+        assert self.__hid_counter() == first_hid + 5
+        # Without expected jobs hids are allocated as needed.
+        assert execution_cache.next_hid(self.history, 2) == first_hid + 5
+        assert self.__hid_counter() == first_hid + 7
+
+    def test_execute_without_enqueue(self):
+        job_manager = RecordingJobManager()
+        self.app.job_manager = job_manager
+        self._init_tool(tools_support.SIMPLE_TOOL_CONTENTS)
+        job, output = self.action.execute(
+            tool=self.tool,
+            trans=self.trans,
+            history=self.history,
+            incoming=dict(param1="moo"),
+            enqueue_job=False,
+        )
+        assert not job_manager.enqueued
+        assert job in self.trans.sa_session
+        assert job.id is None
+        assert output["out1"].name == "Output (moo)"
+
+    def test_data_manager_execute_without_enqueue(self):
+        self.app.job_manager = RecordingJobManager()
+        self._init_tool(tools_support.SIMPLE_TOOL_CONTENTS)
+        self.tool.data_manager_id = "test_data_manager"
+        job, _ = DataManagerToolAction().execute(
+            tool=self.tool,
+            trans=self.trans,
+            history=self.history,
+            incoming=dict(param1="moo"),
+            enqueue_job=False,
+        )
+        # The association is left to be flushed with the batch of jobs.
+        assert job.id is None
+        self.trans.sa_session.flush()
+        assoc = self.trans.sa_session.query(model.DataManagerJobAssociation).filter_by(job_id=job.id).one()
+        assert assoc.data_manager_id == "test_data_manager"
+
+    def test_batch_execution(self):
+        job_manager = RecordingJobManager()
+        self.app.job_manager = job_manager
+        self.app.config.tool_execution_batch_size = 2
+        self.app.config.legacy_eager_objectstore_initialization = False
+        self._init_tool(tools_support.SIMPLE_TOOL_CONTENTS)
+        param_combinations = [dict(param1="moo%d" % i) for i in range(5)]
+        execution_tracker = execute(
+            self.trans,
+            self.tool,
+            MappingParameters(dict(param1="moo"), param_combinations),
+            self.history,
+            completed_jobs=[None] * len(param_combinations),
+        )
+        jobs = execution_tracker.successful_jobs
+        assert len(jobs) == 5
+        assert not execution_tracker.execution_errors
+        # Jobs are flushed before being enqueued, handler assignments are flushed per batch.
+        assert [job for job, _ in job_manager.enqueued] == jobs
+        assert all(job.id is not None for job in jobs)
+        assert all(flush is False for _, flush in job_manager.enqueued)
+        names = [dataset.name for _, dataset in execution_tracker.output_datasets]
+        assert names == ["Output (moo%d)" % i for i in range(5)]
+        hids = [dataset.hid for _, dataset in execution_tracker.output_datasets]
+        assert hids == list(range(hids[0], hids[0] + 5))
+
+    def __hid_counter(self):
+        table = model.History.table
+        return self.app.model.context.execute(select([table.c.hid_counter], table.c.id == self.history.id)).scalar()
+
     def __add_dataset(self, state='ok'):
         hda = model.HistoryDatasetAssociation()
         hda.dataset = model.Dataset()
@@ -267,6 +375,15 @@ class MockTrans(object):
         pass
 
 
+class RecordingJobManager(object):
+
+    def __init__(self):
+        self.enqueued = []
+
+    def enqueue(self, job, tool=None, flush=True):
+        self.enqueued.append((job, flush))
+
+
 class MockObjectStore(object):
 
     def __init__(self):
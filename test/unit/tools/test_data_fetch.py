@@ -0,0 +1,72 @@
+import json
+import os
+import shutil
+import tempfile
+
+from galaxy.datatypes.registry import example_datatype_registry_for_sample
+from galaxy.tools.data_fetch import (
+    _request_to_galaxy_json,
+    map_in_order,
+    UploadConfig,
+)
+
+TABULAR = "chr1\t100\t200\nchr2\t300\t400\n"
+FASTA = ">seq1\nACGT\n>seq2\nTTGA\n"
+
+
+def test_map_in_order():
+    finished = []
+
+    def finish(value):
+        finished.append(value)
+        return value + 1
+
+    assert map_in_order(lambda x: x * 2, finish, list(range(20)), workers=4) == [2 * i + 1 for i in range(20)]
+    assert finished == [2 * i for i in range(20)]
+
+
+def test_fetch_concurrently_matches_serial():
+    registry = example_datatype_registry_for_sample()
+    source_directory = tempfile.mkdtemp()
+    try:
+        elements = []
+        for i in range(12):
+            path = os.path.join(source_directory, "input_%d.txt" % i)
+            with open(path, "w") as f:
+                f.write(TABULAR if i % 2 else FASTA)
+            elements.append({"src": "path", "path": path, "name": "input_%d" % i})
+        elements.insert(3, {"name": "nested", "elements": [{"src": "pasted", "paste_content": TABULAR, "name": "pasted"}]})
+        request = {
+            "targets": [{"destination": {"type": "hdca"}, "collection_type": "list", "elements": elements}],
+            "purge_source": False,
+        }
+        for item in elements[:3] + elements[4:]:
+            item["purge_source"] = False
+
+        serial = _fetch(request, registry, workers=1)
+        concurrent = _fetch(request, registry, workers=4)
+        assert serial == concurrent
+        fetched_elements = serial["__unnamed_outputs"][0]["elements"]
+        assert [e.get("name") for e in fetched_elements][:5] == ["input_0", "input_1", "input_2", "nested", "input_3"]
+        assert fetched_elements[0]["ext"] == "fasta"
+        assert fetched_elements[1]["ext"] == "bed"
+        assert fetched_elements[3]["elements"][0]["filename"] == "gxupload_3"
+    finally:
+        shutil.rmtree(source_directory)
+
+
+def _fetch(request, registry, workers):
+    working_directory = tempfile.mkdtemp()
+    cwd = os.getcwd()
+    try:
+        os.chdir(working_directory)
+        request = json.loads(json.dumps(request))
+        galaxy_json = _request_to_galaxy_json(UploadConfig(request, registry, workers=workers), request)
+        for target in galaxy_json["__unnamed_outputs"]:
+            for element in target["elements"]:
+                if "filename" in element:
+                    assert os.path.exists(element["filename"])
+        return galaxy_json
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(working_directory)
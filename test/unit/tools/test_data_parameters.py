@@ -1,4 +1,8 @@
 from galaxy import model
+from galaxy.tools.parameters.dataset_matcher import (
+    DatasetMatcherFactory,
+    DatasetOptionsCache,
+)
 from .test_parameter_parsing import BaseParameterTestCase
 from ..unittest_utils import galaxy_mock
 
@@ -136,10 +140,43 @@ class DataToolParameterTestCase(BaseParameterTestCase):
         self.stub_active_datasets(hda1)
         assert hda1 == self.param.get_initial_value(self.trans, {}), hda1
 
-    def _new_hda(self):
-        hda = model.HistoryDatasetAssociation()
+    def test_field_options_matched_once_per_request(self):
+        hda1 = MockHistoryDatasetAssociation(name="hda1", id=1)
+        hda1.extension = 'data'
+        hda1.conversion_destination = ("tabular", None)
+        self.stub_active_datasets(hda1, MockHistoryDatasetAssociation(name="hda2", id=2))
+        self.trans.dataset_matcher_factory = DatasetMatcherFactory(self.trans)
+        for _ in range(3):
+            field = self._simple_field()
+            assert [o['name'] for o in field['options']['hda']] == ["hda2", "hda1 (as tabular)"]
+        assert hda1.conversion_checks == 1
+
+    def test_field_options_cached_across_requests(self):
+        self.trans.app.dataset_options_cache = DatasetOptionsCache()
+        hda1 = self._new_hda(history=self.test_history, hid=1, name="hda1", extension="txt")
+        hda2 = self._new_hda(history=self.test_history, hid=2, name="hda2", extension="data")
+
+        def field_names():
+            return [o['name'] for o in self._simple_field()['options']['hda']]
+
+        assert field_names() == ["hda1"]
+        # datasets are not matched again while the history is unchanged
+        self.test_history._active_visible_datasets_and_roles = []
+        assert field_names() == ["hda1"]
+        del self.test_history._active_visible_datasets_and_roles
+        hda1.name = "renamed"
+        hda2.extension = "txt"
+        self.app.model.context.flush()
+        assert field_names() == ["hda2", "renamed"]
+        del self.test_history._active_visible_datasets_and_roles
+        hda1.dataset.state = model.Dataset.states.ERROR
+        self.app.model.context.flush()
+        assert field_names() == ["hda2"]
+
+    def _new_hda(self, **kwds):
+        hda = model.HistoryDatasetAssociation(**kwds)
         hda.visible = True
-        hda.dataset = model.Dataset()
+        hda.dataset = model.Dataset(state=model.Dataset.states.OK)
         self.app.model.context.add(hda)
         self.app.model.context.flush()
         return hda
@@ -191,6 +228,7 @@ class MockHistoryDatasetAssociation(object):
         self.dataset = test_dataset
         self.visible = True
         self.conversion_destination = (None, None)
+        self.conversion_checks = 0
         self.extension = "txt"
         self.dbkey = "hg19"
         self.implicitly_converted_parent_datasets = False
@@ -208,4 +246,5 @@ class MockHistoryDatasetAssociation(object):
         return self.dbkey
 
     def find_conversion_destination(self, formats):
+        self.conversion_checks += 1
         return self.conversion_destination
@@ -679,7 +679,7 @@ def test_import_1901_default():
     assert input2_param["id"] == dataset0.id
 
 
-def import_archive(archive_path, app=None):
+def import_archive(archive_path, app=None, stream=False):
     dest_parent = mkdtemp()
     dest_dir = os.path.join(dest_parent, 'dest')
 
@@ -687,6 +687,7 @@ def import_archive(archive_path, app=None):
     options.is_url = False
     options.is_file = True
     options.is_b64encoded = False
+    options.stream = stream
 
     args = (archive_path, dest_dir)
     unpack_tar_gz_archive.main(options, args)
@@ -694,7 +695,40 @@ def import_archive(archive_path, app=None):
     return app, new_history
 
 
-def _run_unpack(history_archive, dest_parent, msg):
+def test_import_1901_streamed():
+    # Archives without export attributes are extracted completely.
+    app, new_history = import_archive('test-data/exports/1901_two_datasets.tgz', stream=True)
+    assert new_history
+    assert len(new_history.datasets) == 2
+
+
+def test_history_import_symlink_streamed():
+    """ Ensure a streamed history import rejects symlinks in the archive
+    """
+    dest_parent = mkdtemp()
+    with HistoryArchive() as history_archive:
+        history_archive.write_metafiles()
+        link = tarfile.TarInfo('datasets/Pasted_Entry_1.txt')
+        link.type = tarfile.SYMTYPE
+        link.linkname = '../target.txt'
+        history_archive.tar_file.addfile(link)
+        history_archive.finalize()
+        _run_unpack(history_archive, dest_parent, 'Symlink in streamed import archive allowed', stream=True)
+
+
+def test_history_import_relpath_in_archive_streamed():
+    """ Ensure a streamed history import archive cannot reference a relative
+    path outside the archive
+    """
+    dest_parent = mkdtemp()
+    with HistoryArchive(arcname_prefix='../insecure') as history_archive:
+        history_archive.write_metafiles()
+        history_archive.write_file('datasets/Pasted_Entry_1.txt', 'foo')
+        history_archive.finalize()
+        _run_unpack(history_archive, dest_parent, 'Relative parent path in streamed import archive allowed', stream=True)
+
+
+def _run_unpack(history_archive, dest_parent, msg, stream=False):
     dest_dir = os.path.join(dest_parent, 'dest')
     insecure_dir = os.path.join(dest_parent, 'insecure')
     os.makedirs(dest_dir)
@@ -702,11 +736,19 @@ def _run_unpack(history_archive, dest_parent, msg):
     options.is_url = False
     options.is_file = True
     options.is_b64encoded = False
+    options.stream = stream
     args = (history_archive.tar_file_path, dest_dir)
     try:
         unpack_tar_gz_archive.main(options, args)
     except AssertionError:
         pass
+    if stream:
+        # the archive is only read when the history is imported
+        try:
+            _run_jihaw_cleanup(dest_dir)
+            raise AssertionError(msg)
+        except MalformedContents:
+            pass
     assert not os.path.exists(insecure_dir), msg
 
 
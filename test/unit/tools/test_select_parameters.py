@@ -56,6 +56,25 @@ class SelectToolParameterTestCase(BaseParameterTestCase):
         assert ("testname2", "testpath2", False) in self.param.get_options(self.trans, {"input_bam": "testpath2"})
         assert len(self.param.get_options(self.trans, {"input_bam": "testpath3"})) == 0
 
+    def test_filtered_options_cached(self):
+        self.options_xml = '''<options from_data_table="test_table"><filter type="param_value" ref="input_bam" column="0" /></options>'''
+        table = self.app.tool_data_tables["test_table"]
+        lookups = []
+
+        def get_fields_by_column(column, value):
+            lookups.append(value)
+            return MockToolDataTable.get_fields_by_column(table, column, value)
+
+        table.get_fields_by_column = get_fields_by_column
+        for _ in range(3):
+            assert self.param.get_options(self.trans, {"input_bam": "testname1"}) == [("testname1", "testpath1", False)]
+        assert self.param.get_options(self.trans, {"input_bam": "testname2"}) == [("testname2", "testpath2", False)]
+        assert lookups == ["testname1", "testname2"]
+        # options are filtered again when the table changes
+        table.version += 1
+        assert self.param.get_options(self.trans, {"input_bam": "testname1"}) == [("testname1", "testpath1", False)]
+        assert lookups == ["testname1", "testname2", "testname1"]
+
     # TODO: Good deal of overlap here with DataToolParameterTestCase,
     # refactor.
     def setUp(self):
@@ -106,6 +125,13 @@ class MockToolDataTable(object):
             value=1,
         )
         self.missing_index_file = None
+        self.version = 1
 
     def get_fields(self):
         return [["testname1", "testpath1"], ["testname2", "testpath2"]]
+
+    def get_version_fields(self):
+        return (self.version, self.get_fields())
+
+    def get_fields_by_column(self, column, value):
+        return [fields for fields in self.get_fields() if fields[column] == value]
@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from galaxy.tools.data import ToolDataTableManager
+
+TABLE_CONF = """<tables>
+    <table name="all_fasta" comment_char="#" %s>
+        <columns>value, dbkey, name, path</columns>
+        <file path="%s" />
+    </table>
+</tables>
+"""
+
+
+class ToolDataTableTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tool_data_path = tempfile.mkdtemp()
+        self.loc_path = self._write("all_fasta.loc", [
+            ["hg19", "hg19", "Human (hg19)", "/data/hg19.fa"],
+            ["hg19_female", "hg19", "Human (hg19) female", "/data/hg19_female.fa"],
+            ["mm10", "mm10", "Mouse (mm10)", "/data/mm10.fa"],
+        ])
+        self.conf_path = os.path.join(self.tool_data_path, "tool_data_table_conf.xml")
+        with open(self.conf_path, "w") as f:
+            f.write(TABLE_CONF % ("", self.loc_path))
+
+    def tearDown(self):
+        shutil.rmtree(self.tool_data_path)
+
+    def _write(self, name, rows):
+        path = os.path.join(self.tool_data_path, name)
+        with open(path, "w") as f:
+            f.write("# value, dbkey, name, path\n")
+            for row in rows:
+                f.write("\t".join(row) + "\n")
+        return path
+
+    def _table(self, config_filename=None):
+        manager = ToolDataTableManager(self.tool_data_path, config_filename or self.conf_path)
+        return manager, manager["all_fasta"]
+
+    def test_lazy_loading(self):
+        manager, table = self._table()
+        assert manager.get_table_names_by_path(self.loc_path) == ["all_fasta"]
+        assert not table._data
+        # the file is read on first access
+        self._write("all_fasta.loc", [["dm6", "dm6", "Fly (dm6)", "/data/dm6.fa"]])
+        assert table.get_fields() == [["dm6", "dm6", "Fly (dm6)", "/data/dm6.fa"]]
+
+    def test_lookups(self):
+        _, table = self._table()
+        assert table.get_entry("dbkey", "mm10", "path") == "/data/mm10.fa"
+        assert table.get_entry("dbkey", "dm6", "path") is None
+        assert table.get_entries("dbkey", "hg19", "value") == ["hg19", "hg19_female"]
+        assert table.get_entries("dbkey", "hg19", None, limit=1) == [
+            {"value": "hg19", "dbkey": "hg19", "name": "Human (hg19)", "path": "/data/hg19.fa"}
+        ]
+        assert table.get_field("hg19_female")["name"] == "Human (hg19) female"
+        assert table.get_field("hg18") is None
+        # the indexes follow added entries
+        table.add_entry(["hg19_male", "hg19", "Human (hg19) male", "/data/hg19_male.fa"])
+        assert table.get_entries("dbkey", "hg19", "value") == ["hg19", "hg19_female", "hg19_male"]
+        assert table.get_fields_by_column(1, ["unhashable"]) == []
+
+    def test_merged_tables(self):
+        other_loc_path = self._write("all_fasta_shed.loc", [
+            ["mm10", "mm10", "Mouse (mm10)", "/data/mm10.fa"],
+            ["dm6", "dm6", "Fly (dm6)", "/data/dm6.fa"],
+        ])
+        other_conf_path = os.path.join(self.tool_data_path, "shed_tool_data_table_conf.xml")
+        with open(other_conf_path, "w") as f:
+            f.write(TABLE_CONF % ('allow_duplicate_entries="False"', other_loc_path))
+        _, table = self._table([self.conf_path, other_conf_path])
+        assert not table._data
+        assert [fields[0] for fields in table.get_fields()] == ["hg19", "hg19_female", "mm10", "dm6"]
+        assert table.get_entries("dbkey", "mm10", "value") == ["mm10"]
+
+    def test_reload_modified_files(self):
+        manager, table = self._table()
+        assert len(table.get_fields()) == 3
+        table.add_entry(["dm6", "dm6", "Fly (dm6)", "/data/dm6.fa"])
+        # unmodified files are not read again
+        assert not table.files_modified()
+        manager.reload_tables(path=self.loc_path)
+        assert table.get_entry("dbkey", "dm6", "value") == "dm6"
+
+        self._write("all_fasta.loc", [["dm6", "dm6", "Fly (dm6)", "/data/dm6.fa"]])
+        os.utime(self.loc_path, (0, 0))
+        assert table.files_modified()
+        manager.reload_tables(path=self.loc_path)
+        assert table.get_entries("dbkey", "dm6", "path") == ["/data/dm6.fa"]
+        assert table.get_entry("dbkey", "hg19", "value") is None
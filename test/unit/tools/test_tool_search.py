@@ -0,0 +1,181 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from galaxy.tools.search import ToolBoxSearch
+from galaxy.tools.search.index import ToolSearchIndex
+
+SEARCH_KWDS = dict(
+    tool_name_boost=9,
+    tool_section_boost=3,
+    tool_description_boost=2,
+    tool_label_boost=1,
+    tool_stub_boost=5,
+    tool_help_boost=0.5,
+    tool_search_limit=20,
+    tool_enable_ngram_search=False,
+    tool_ngram_minsize=3,
+    tool_ngram_maxsize=4,
+)
+
+
+class MockTool(object):
+    tool_type = "default"
+    version = "1.0.0"
+    guid = None
+    help = None
+    config_file = None
+
+    def __init__(self, id, name, description="", section="Text Manipulation", labels=None):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.section = section
+        self.labels = labels or []
+
+    def get_panel_section(self):
+        return (self.section.lower(), self.section)
+
+
+class MockToolCache(object):
+
+    def __init__(self, tools):
+        self.tools = dict((tool.id, tool) for tool in tools)
+        self._new_tool_ids = set(self.tools)
+        self._removed_tool_ids = set()
+
+    def get_tool_by_id(self, tool_id):
+        return self.tools.get(tool_id)
+
+    def update(self, tool):
+        self.tools[tool.id] = tool
+        self._new_tool_ids.add(tool.id)
+
+    def remove(self, tool_id):
+        del self.tools[tool_id]
+        self._removed_tool_ids.add(tool_id)
+
+    def reset_status(self):
+        self._new_tool_ids = set()
+        self._removed_tool_ids = set()
+
+
+def _tools():
+    return [
+        MockTool("cat1", "Concatenate", "datasets tail-to-head"),
+        MockTool("sort1", "Sort", "data in ascending or descending order", section="Filter and Sort"),
+        MockTool("fastq_groomer", "FASTQ Groomer", "convert between various FASTQ quality formats", section="NGS: QC", labels=["new"]),
+        MockTool("fastq_to_fasta", "FASTQ to FASTA", "converter", section="Convert Formats"),
+        MockTool("bowtie2", "Bowtie2", "map reads against reference genome", section="NGS: Mapping"),
+    ]
+
+
+class ToolBoxSearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.index_dir = tempfile.mkdtemp()
+        self.tool_cache = MockToolCache(_tools())
+
+    def tearDown(self):
+        shutil.rmtree(self.index_dir)
+
+    def _search(self, q, **kwds):
+        search_kwds = SEARCH_KWDS.copy()
+        search_kwds.update(kwds)
+        return self.toolbox_search.search(q=q, **search_kwds)
+
+    def _build(self, index_dir=None):
+        self.toolbox_search = ToolBoxSearch(None, index_dir=index_dir)
+        self.toolbox_search.build_index(self.tool_cache)
+        self.tool_cache.reset_status()
+
+    def test_search(self):
+        self._build()
+        assert self._search("concatenate") == ["cat1"]
+        # substrings of words
+        assert self._search("atenat") == ["cat1"]
+        assert self._search("fastq") == ["fastq_groomer", "fastq_to_fasta"]
+        # name and section matches score higher than description matches
+        assert self._search("convert") == ["fastq_to_fasta", "fastq_groomer"]
+        # all words must match, the last one may be the start of a word
+        assert self._search("fastq fasta") == ["fastq_to_fasta"]
+        assert self._search("map reads gen") == ["bowtie2"]
+        assert self._search("map cat") == []
+        assert self._search("NGS") == ["bowtie2", "fastq_groomer"]
+        assert self._search("fastq", tool_search_limit=1) == ["fastq_groomer"]
+
+    def test_search_boosts(self):
+        self._build()
+        assert self._search("sort") == ["sort1"]
+        assert self._search("quality") == ["fastq_groomer"]
+        # only the section of fastq_to_fasta matches
+        assert self._search("formats", tool_description_boost=0) == ["fastq_to_fasta"]
+        assert self._search("formats", tool_section_boost=0) == ["fastq_groomer"]
+
+    def test_ngram_search(self):
+        self._build()
+        results = self._search("bowtei", tool_enable_ngram_search=True)
+        assert results[0] == "bowtie2"
+
+    def test_incremental_updates(self):
+        self._build()
+        self.tool_cache.remove("cat1")
+        self.tool_cache.update(MockTool("sort1", "Sort rows", "on one or more columns"))
+        self.tool_cache.update(MockTool("paste1", "Paste", "two files side by side"))
+        self.toolbox_search.build_index(self.tool_cache)
+        assert self._search("concatenate") == []
+        assert self._search("columns") == ["sort1"]
+        assert self._search("ascending") == []
+        assert self._search("paste") == ["paste1"]
+        assert self._search("fastq fasta") == ["fastq_to_fasta"]
+
+    def test_saved_index(self):
+        self._build(index_dir=self.index_dir)
+        assert len(os.listdir(self.index_dir)) == 1
+
+        # A new process with the same tools loads the index.
+        self.tool_cache = MockToolCache(_tools())
+        toolbox_search = ToolBoxSearch(None, index_dir=self.index_dir)
+
+        def fail(*args, **kwds):
+            raise AssertionError("tool indexed again")
+
+        toolbox_search._create_doc = fail
+        toolbox_search.build_index(self.tool_cache)
+        self.toolbox_search = toolbox_search
+        assert self._search("concatenate") == ["cat1"]
+
+        # Only changed tools are indexed when the tools changed.
+        tools = _tools()
+        tools[0].description = "files together"
+        self.tool_cache = MockToolCache(tools)
+        toolbox_search = ToolBoxSearch(None, index_dir=self.index_dir)
+        indexed = []
+        create_doc = toolbox_search._create_doc
+
+        def record(tool_id, **kwds):
+            indexed.append(tool_id)
+            return create_doc(tool_id=tool_id, **kwds)
+
+        toolbox_search._create_doc = record
+        toolbox_search.build_index(self.tool_cache)
+        self.toolbox_search = toolbox_search
+        assert indexed == ["cat1"]
+        assert self._search("together") == ["cat1"]
+        assert self._search("tail") == []
+        assert len(os.listdir(self.index_dir)) == 2
+
+
+def test_matching_terms():
+    index = ToolSearchIndex()
+    index.add_document("t1", {"name": "fastq fasta fastqc", "help": "groom a fastq file"})
+    index.add_document("t2", {"name": "sanger_fastq"})
+    assert sorted(index.matching_terms("fastq")) == ["fastq", "fastqc", "sanger_fastq"]
+    assert sorted(index.matching_terms("fastq", suffix=False)) == ["fastq", "fastqc"]
+    assert sorted(index.matching_terms("fastq", prefix=False)) == ["fastq", "sanger_fastq"]
+    assert index.matching_terms("fastq", prefix=False, suffix=False) == ["fastq"]
+    assert index.matching_terms("qc") == ["fastqc"]
+    index.remove_documents(["t2"])
+    assert sorted(index.matching_terms("fastq")) == ["fastq", "fastqc"]
+    assert "t2" not in index
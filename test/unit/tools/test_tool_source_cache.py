@@ -0,0 +1,98 @@
+import os
+import time
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from galaxy.tools.cache import ToolSourceCache
+from galaxy.tools.loader import load_tool_with_refereces
+
+
+TOOL_WITH_MACRO = """<tool id="tool_with_macro" name="macro_annotation" version="@WRAPPER_VERSION@">
+    <expand macro="inputs" />
+    <macros>
+        <import>external.xml</import>
+    </macros>
+</tool>"""
+
+MACRO_TEMPLATE = """<macros>
+    <token name="@WRAPPER_VERSION@">%s</token>
+    <macro name="inputs">
+        <inputs/>
+    </macro>
+</macros>
+"""
+
+
+class CountingLoader(object):
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return load_tool_with_refereces(path)
+
+
+def test_tool_source_cache():
+    tool_dir = mkdtemp()
+    cache_dir = mkdtemp()
+    try:
+        tool_path = os.path.join(tool_dir, "tool.xml")
+        macro_path = os.path.join(tool_dir, "external.xml")
+        with open(tool_path, "w") as f:
+            f.write(TOOL_WITH_MACRO)
+        with open(macro_path, "w") as f:
+            f.write(MACRO_TEMPLATE % "1.0")
+        loader = CountingLoader()
+
+        cache = ToolSourceCache(cache_dir)
+        tree, macro_paths = cache.get_tool_source_tree(tool_path, loader)
+        assert loader.calls == 1
+        assert tree.getroot().get("version") == "1.0"
+        assert macro_paths == [macro_path]
+
+        # A fresh cache (e.g. in another process) reads the persisted entry.
+        cache = ToolSourceCache(cache_dir)
+        tree, macro_paths = cache.get_tool_source_tree(tool_path, loader)
+        assert loader.calls == 1
+        assert cache.hits == 1
+        assert tree.getroot().get("version") == "1.0"
+        assert tree.getroot().find("inputs") is not None
+        assert macro_paths == [macro_path]
+
+        # Changing a macro file invalidates the entry.
+        time.sleep(0.01)
+        with open(macro_path, "w") as f:
+            f.write(MACRO_TEMPLATE % "2.0")
+        tree, _ = cache.get_tool_source_tree(tool_path, loader)
+        assert loader.calls == 2
+        assert cache.misses == 1
+        assert tree.getroot().get("version") == "2.0"
+    finally:
+        rmtree(tool_dir)
+        rmtree(cache_dir)
+
+
+def test_tool_source_cache_same_tool_in_two_directories():
+    tool_dirs = [mkdtemp(), mkdtemp()]
+    cache_dir = mkdtemp()
+    try:
+        for tool_dir, version in zip(tool_dirs, ["1.0", "2.0"]):
+            with open(os.path.join(tool_dir, "tool.xml"), "w") as f:
+                f.write(TOOL_WITH_MACRO)
+            with open(os.path.join(tool_dir, "external.xml"), "w") as f:
+                f.write(MACRO_TEMPLATE % version)
+        loader = CountingLoader()
+        cache = ToolSourceCache(cache_dir)
+        for _ in range(2):
+            for tool_dir, version in zip(tool_dirs, ["1.0", "2.0"]):
+                tree, macro_paths = cache.get_tool_source_tree(os.path.join(tool_dir, "tool.xml"), loader)
+                assert tree.getroot().get("version") == version
+                assert macro_paths == [os.path.join(tool_dir, "external.xml")]
+        # each tool was loaded once and then read from its own entry
+        assert loader.calls == 2
+        assert cache.hits == 2
+    finally:
+        for tool_dir in tool_dirs:
+            rmtree(tool_dir)
+        rmtree(cache_dir)
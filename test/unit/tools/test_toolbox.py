@@ -5,13 +5,17 @@ import string
 import time
 import unittest
 
+import mock
 import routes
 from six import string_types
 
 from galaxy import model
 from galaxy.model import tool_shed_install
 from galaxy.model.tool_shed_install import mapping
-from galaxy.tools import ToolBox
+from galaxy.tools import (
+    loader_directory,
+    ToolBox
+)
 from galaxy.tools.cache import ToolCache
 from galaxy.webapps.galaxy.config_watchers import ConfigWatchers
 from .test_tool_loader import (
@@ -186,6 +190,38 @@ class ToolBoxTestCase(BaseToolBoxTestCase):
         assert tool is not None
         assert len(tool._macro_paths) == 1
 
+    def test_parse_tools_in_parallel(self):
+        self.app.config.tool_parsing_processes = 2
+        self._init_tool()
+        self._init_tool(filename="tool_with_macro.xml",
+                        tool_contents=SIMPLE_TOOL_WITH_MACRO,
+                        extra_file_contents=SIMPLE_MACRO.substitute(tool_version="2.0"),
+                        extra_file_path="external.xml")
+        self._add_config("""<toolbox><section id="t" name="T"><tool file="tool.xml" /></section></toolbox>""")
+        self._add_config("""<toolbox><tool file="tool_with_macro.xml"/></toolbox>""", name="tool_conf_2.xml")
+        calls = []
+
+        def parse_tool_xml_in_parallel(paths, *args, **kwds):
+            calls.append(paths)
+            for result in loader_directory.parse_tool_xml_in_parallel(paths, *args, **kwds):
+                yield result
+
+        with mock.patch("galaxy.tools.parse_tool_xml_in_parallel", parse_tool_xml_in_parallel):
+            toolbox = self.toolbox
+            assert toolbox.get_tool("test_tool") is not None
+            tool = toolbox.get_tool("tool_with_macro")
+            assert tool is not None
+            assert tool.version == "2.0"
+            assert len(tool._macro_paths) == 1
+            assert not toolbox._preparsed_tool_sources
+            # A single pool is used for all tool config files.
+            assert calls == [[self._tool_path(), self._tool_path("tool_with_macro.xml")]]
+            # But not when the toolbox is reloaded.
+            self.app.tool_cache.cleanup()
+            self._toolbox = self.app.toolbox = SimplifiedToolBox(self)
+            assert self.toolbox.get_tool("tool_with_macro") is not None
+            assert len(calls) == 1
+
     def test_tool_reload_when_macro_is_altered(self):
         self._init_tool(filename="tool_with_macro.xml",
                         tool_contents=SIMPLE_TOOL_WITH_MACRO,
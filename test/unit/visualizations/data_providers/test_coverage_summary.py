@@ -0,0 +1,102 @@
+"""
+Test lib/galaxy/visualization/data_providers/summary.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from galaxy.util.bunch import Bunch
+from galaxy.visualization.data_providers.genome import (
+    BigBedDataProvider,
+    BigWigDataProvider,
+)
+from galaxy.visualization.data_providers.summary import (
+    bbi_chrom_sizes,
+    BIN_WIDTH,
+    CoveragePyramid,
+    CoverageSummaryStore,
+)
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), os.pardir, os.pardir, os.pardir, os.pardir, "test-data")
+
+
+class CoveragePyramidTestCase(unittest.TestCase):
+
+    def setUp(self):
+        # bins alternate between 1 and 3 over the first half of the chromosome
+        self.num_bins = 1001
+        counts = numpy.zeros(self.num_bins)
+        counts[:500] = BIN_WIDTH
+        sums = counts * numpy.array([1, 3] * 500 + [0])
+        self.pyramid = CoveragePyramid(CoveragePyramid.build_levels(sums, counts), self.num_bins)
+
+    def test_levels(self):
+        assert [n for _, n in self.pyramid.levels] == [1001, 501, 251, 126, 63, 32, 16, 8, 4, 2, 1]
+        offset, _ = self.pyramid.levels[-1]
+        assert self.pyramid.data[0, offset] == 1000 * BIN_WIDTH
+        assert self.pyramid.data[1, offset] == 500 * BIN_WIDTH
+
+    def test_summarize(self):
+        end = self.num_bins * BIN_WIDTH
+        data = self.pyramid.summarize(0, end, 10)
+        assert [pos for pos, _ in data] == [i * (end // 10) for i in range(10)]
+        values = [value for _, value in data]
+        assert all(abs(value - 2) < 0.05 for value in values[:4])
+        assert values[6:] == [None] * 4
+
+    def test_small_regions_not_summarized(self):
+        assert self.pyramid.summarize(0, 1000 * BIN_WIDTH, 1000) is None
+
+
+class BBISummaryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.summary_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.summary_dir)
+
+    def _compare(self, provider_class, file_name, chrom, regions):
+        dataset = Bunch(file_name=os.path.join(TEST_DATA, file_name))
+        provider = provider_class(original_dataset=dataset)
+        summarized = provider_class(original_dataset=dataset)
+        summarized.summary_store = CoverageSummaryStore(self.summary_dir)
+        for start, end in regions:
+            expected = provider.get_data(chrom, start, end, num_samples=500)["data"]
+            data = summarized.get_data(chrom, start, end, num_samples=500)["data"]
+            assert [pos for pos, _ in data] == [pos for pos, _ in expected]
+            for (_, value), (_, expected_value) in zip(data, expected):
+                if value is not None and expected_value is not None:
+                    assert abs(value - expected_value) <= 1e-3 * abs(expected_value)
+        return summarized
+
+    def test_bigwig(self):
+        with open(os.path.join(TEST_DATA, "1.bigwig"), "rb") as f:
+            assert bbi_chrom_sizes(f) == {"chr21": 48129895}
+        # regions whose points are aligned to summary bins
+        provider = self._compare(BigWigDataProvider, "1.bigwig", "chr21", [(0, 16384000), (9216000, 13312000)])
+        assert os.listdir(self.summary_dir)
+        # regions needing more detail are read from the file
+        assert len(provider.get_data("chr21", 9411000, 9412000, num_samples=500)["data"]) == 500
+
+    def test_bigbed(self):
+        self._compare(BigBedDataProvider, "1.bigbed", "chr7", [(0, 32768000), (14336000, 16384000)])
+
+    def test_summaries_reused(self):
+        dataset = Bunch(file_name=os.path.join(TEST_DATA, "1.bigwig"))
+        provider = BigWigDataProvider(original_dataset=dataset)
+        CoverageSummaryStore(self.summary_dir).get(dataset.file_name, "chr21", provider.open_bbi_file)
+        # a new store loads the summary saved by the first one rather than building it
+        provider.summary_store = CoverageSummaryStore(self.summary_dir)
+        provider.open_bbi_file = None
+        assert provider.get_precomputed_summary("chr21", 0, 48129895, 500)
+
+    def test_zoomed_in_regions_dont_build_summaries(self):
+        dataset = Bunch(file_name=os.path.join(TEST_DATA, "1.bigwig"))
+        provider = BigWigDataProvider(original_dataset=dataset)
+        provider.summary_store = CoverageSummaryStore(self.summary_dir)
+        assert len(provider.get_data("chr21", 9411000, 9611000, num_samples=500)["data"]) == 500
+        assert not os.listdir(self.summary_dir)
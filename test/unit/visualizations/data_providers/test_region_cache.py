@@ -0,0 +1,208 @@
+"""
+Test lib/galaxy/visualization/data_providers/cache.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+from contextlib import contextmanager
+
+import pysam
+
+from galaxy.util.bunch import Bunch
+from galaxy.visualization.data_providers.cache import (
+    DataFileHandles,
+    RegionCache,
+    tiles_for_region,
+)
+from galaxy.visualization.data_providers.genome import (
+    BamDataProvider,
+    GenomeDataProvider,
+)
+
+# (guid, start, end) of features spread over a chromosome, some spanning tile boundaries
+FEATURES = [(i, i * 300, i * 300 + 500) for i in range(100)]
+
+
+class FeatureListDataProvider(GenomeDataProvider):
+    """
+    Provides FEATURES, counting the number of times the "file" is read.
+    """
+    tiled = True
+
+    def __init__(self, features=FEATURES):
+        super(FeatureListDataProvider, self).__init__(original_dataset=Bunch(file_name="features.bed"))
+        self.features = features
+        self.reads = 0
+
+    @contextmanager
+    def open_data_file(self):
+        self.reads += 1
+        yield self.features
+
+    def get_iterator(self, data_file, chrom, start, end, **kwargs):
+        return (f for f in data_file if f[2] >= start and f[1] <= end)
+
+    def process_data(self, iterator, start_val=0, max_vals=None, **kwargs):
+        features = []
+        message = None
+        for count, feature in enumerate(iterator):
+            if count < start_val:
+                continue
+            if max_vals and len(features) >= max_vals:
+                message = self.error_max_vals % (max_vals, "features")
+                break
+            features.append(list(feature))
+        return {'data': features, 'message': message}
+
+
+class TilesForRegionTestCase(unittest.TestCase):
+
+    def test_tiles_cover_region(self):
+        for start, end in [(0, 1), (1023, 1025), (5000, 9000), (123456, 987654)]:
+            level, width, tiles = tiles_for_region(start, end)
+            assert tiles[0] * width <= start
+            assert (tiles[-1] + 1) * width >= end
+            assert len(tiles) <= 2
+            assert width < 2 * max(end - start, 1024)
+
+
+class RegionCacheTestCase(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = RegionCache(max_size=10000)
+        for i in range(3):
+            cache.put(i, "x" * 2000)
+        assert cache.get(0) is not None
+        for i in range(3, 6):
+            cache.put(i, "x" * 2000)
+        assert cache.size <= cache.max_size
+        assert 0 in cache
+        assert 1 not in cache
+        assert 5 in cache
+        assert cache.get(1) is None
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+
+    def test_does_not_cache_values_larger_than_cache(self):
+        cache = RegionCache(max_size=100)
+        cache.put("key", "x" * 200)
+        assert "key" not in cache
+        assert cache.size == 0
+
+    def test_file_handles_reused(self):
+        opened = []
+        closed = []
+
+        def opener():
+            opened.append(object())
+            return opened[-1]
+
+        handles = DataFileHandles(max_open=1)
+        with handles.open("a", opener, closed.append) as first:
+            pass
+        with handles.open("a", opener, closed.append) as second:
+            # a handle in use isn't handed out twice
+            with handles.open("a", opener, closed.append) as third:
+                assert third is not second
+        assert first is second
+        assert len(opened) == 2
+        # only max_open handles are kept open
+        assert len(closed) == 1
+        handles.close()
+        assert len(closed) == 2
+
+
+class TiledDataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.provider = FeatureListDataProvider()
+        self.provider.region_cache = RegionCache(max_size=1024 * 1024)
+
+    def _region_data(self, start, end, **kwargs):
+        return FeatureListDataProvider().get_data("chr1", start, end, **kwargs)
+
+    def test_tiled_data_matches_region_data(self):
+        for start, end in [(0, 1000), (900, 2100), (5000, 9000), (10000, 30000)]:
+            data = self.provider.get_data("chr1", start, end)
+            assert data == self._region_data(start, end), (start, end)
+
+    def test_tiles_cached(self):
+        self.provider.get_data("chr1", 1000, 2000)
+        reads = self.provider.reads
+        self.provider.get_data("chr1", 1100, 1900)
+        self.provider.get_data("chr1", 1500, 1800)
+        assert self.provider.reads == reads
+        assert self.provider.region_cache.stats()["hits"] > 0
+
+    def test_max_vals(self):
+        data = self.provider.get_data("chr1", 0, 30000, max_vals=10)
+        region_data = self._region_data(0, 30000, max_vals=10)
+        assert data["data"] == region_data["data"]
+        assert data["message"] == region_data["message"]
+        data = self.provider.get_data("chr1", 0, 30000, start_val=5, max_vals=10)
+        assert data["data"] == self._region_data(0, 30000, start_val=5, max_vals=10)["data"]
+
+    def test_truncated_tile_falls_back_to_region(self):
+        # tiles are twice as wide as the region and hold more than 2 * max_vals features
+        self.provider.features = [(i, i, i + 1) for i in range(2048)]
+        data = self.provider.get_data("chr1", 1024, 1536, max_vals=200)
+        assert data["data"] == [[i, i, i + 1] for i in range(1023, 1223)]
+        # the truncated tile is remembered, so it isn't read again
+        reads = self.provider.reads
+        data = self.provider.get_data("chr1", 1100, 1500, max_vals=200)
+        assert data["data"] == [[i, i, i + 1] for i in range(1099, 1299)]
+        assert self.provider.reads == reads + 1
+
+
+class BamTiledDataTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        bam_path = os.path.join(self.tmp_dir, "reads.bam")
+        header = {'HD': {'VN': '1.0', 'SO': 'coordinate'}, 'SQ': [{'LN': 100000, 'SN': 'chr1'}]}
+        with pysam.AlignmentFile(bam_path, "wb", header=header) as bam:
+            # (name, flag, start, mate start, mapq): a proper pair whose mates
+            # are on either side of the tile boundary at 1024 and a single read
+            for name, flag, pos, mpos, mapq in [("pair", 99, 900, 1100, 30),
+                                                ("single", 0, 1000, -1, 50),
+                                                ("pair", 147, 1100, 900, 40)]:
+                read = pysam.AlignedSegment()
+                read.query_name = name
+                read.flag = flag
+                read.reference_id = 0
+                read.reference_start = pos
+                read.mapping_quality = mapq
+                read.cigartuples = [(0, 50)]
+                read.query_sequence = "ACGT" * 12 + "AC"
+                read.next_reference_id = 0 if mpos >= 0 else -1
+                read.next_reference_start = mpos
+                bam.write(read)
+        pysam.index(bam_path)
+        self.bam = Bunch(file_name=bam_path)
+        self.bai = Bunch(file_name=bam_path + ".bai")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def _provider(self, region_cache=None):
+        provider = BamDataProvider(original_dataset=self.bam, converted_dataset=self.bai)
+        provider.region_cache = region_cache
+        return provider
+
+    def test_pair_across_tiles_merged(self):
+        provider = self._provider(RegionCache(max_size=1024 * 1024))
+        assert tiles_for_region(800, 1300)[2] == [0, 1]
+        data = provider.get_data("chr1", 800, 1300, mean_depth=10)
+        region_data = self._provider().get_data("chr1", 800, 1300, mean_depth=10)
+        assert sorted(data["data"]) == sorted(region_data["data"])
+        pair = [read for read in data["data"] if read[3] == "pair"]
+        assert pair == [[pair[0][0], 900, 1150, "pair",
+                         [900, 950, "50M", "+", "ACGT" * 12 + "AC"],
+                         [1100, 1150, "50M", "-", "ACGT" * 12 + "AC"],
+                         None, [30, 40]]]
+
+    def test_mean_depth_in_tile_key(self):
+        provider = self._provider()
+        assert provider.get_tile_key("chr1", 0, 1, 200, mean_depth=10) != provider.get_tile_key("chr1", 0, 1, 200, mean_depth=20)